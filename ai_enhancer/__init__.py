@@ -0,0 +1,31 @@
+"""
+Headless Python tooling for AI Content-to-PDF Enhancer
+
+Mirrors the Chrome extension's extract -> enhance -> PDF flow so large URL
+lists can be processed without a browser.
+"""
+
+from .cache import ResponseCache
+from .config import load_config
+from .dedupe import NearDuplicateIndex
+from .extractor import ContentExtractor
+from .gemini import GeminiClient, GeminiError
+from .pdf import PDFRenderer
+from .pipeline import BatchPipeline
+from .routing import ModelRouter
+from .scheduler import RequestScheduler
+
+__version__ = "1.0.0"
+
+__all__ = [
+    "BatchPipeline",
+    "ContentExtractor",
+    "GeminiClient",
+    "GeminiError",
+    "ModelRouter",
+    "NearDuplicateIndex",
+    "PDFRenderer",
+    "RequestScheduler",
+    "ResponseCache",
+    "load_config",
+]
@@ -0,0 +1,234 @@
+"""
+Token-budgeted prompt content
+
+Same approach as PromptBudget in background.js: the article is split into
+blocks, boilerplate and repeated blocks are dropped and, when the text does not
+fit the model's input budget (or max_content_length), the most salient
+paragraphs are kept in their original order.
+"""
+
+import html
+import math
+import re
+from typing import Dict, List, Optional
+
+MODEL_INPUT_TOKEN_LIMITS = {
+    "gemini-2.5-flash": 1048576,
+    "gemini-2.5-flash-lite": 1048576,
+    "gemini-2.5-pro": 1048576,
+    "gemini-2.0-flash": 1048576,
+    "gemini-1.5-flash": 1048576,
+}
+DEFAULT_INPUT_TOKEN_LIMIT = 32768
+DEFAULT_MAX_CONTENT_LENGTH = 50000
+# Tokens kept free for the prompt template and enhancement instructions
+RESERVED_TOKENS = 2048
+
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯"
+TOKEN_PATTERN = re.compile(rf"[{_CJK}]|[^\W{_CJK}]+|[^\w\s]", re.UNICODE)
+BLOCK_PATTERN = re.compile(
+    r"<(/?)(h[1-6]|p|li|blockquote|pre|td|th|dt|dd|figcaption|div|section|article|tr|br|hr)\b[^>]*>", re.I)
+BOILERPLATE = re.compile(
+    r"^(?:advertisement|sponsored|share (?:this|on)|follow us|subscribe|sign up|newsletter|"
+    r"related (?:articles|posts|stories)|read more|recommended for you|we use cookies|accept cookies|"
+    r"all rights reserved|copyright|©|click here|skip to|back to top|print this|tags?:)", re.I)
+STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has have his how its may new now see
+    who did get him she too use that with this from they will would there their what about which when were
+    been more also into than then them these some such only over most other just like your each very could
+    should
+""".split())
+
+
+def estimate_tokens(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    """Approximate Gemini's tokenizer: ~4 chars per word piece, 1 per CJK char or punctuation mark
+
+    start/end count a span of text without slicing it.
+    """
+    tokens = 0
+    text = text or ""
+    for match in TOKEN_PATTERN.finditer(text, start, len(text) if end is None else end):
+        piece = match.group(0)
+        tokens += math.ceil(len(piece) / 4) if len(piece) > 4 else 1
+    return tokens
+
+
+def split_long(text: str, size: int = 1200) -> List[str]:
+    """Break very long runs (e.g. collapsed textContent) into sentence groups of about `size` chars"""
+    if len(text) <= size:
+        return [text]
+    parts, current = [], ""
+    for sentence in re.findall(r"[^.!?]+(?:[.!?]+|$)\s*", text) or [text]:
+        if current and len(current) + len(sentence) > size:
+            parts.append(current.strip())
+            current = ""
+        current += sentence
+        while len(current) > size * 2:
+            cut = current.rfind(" ", 0, size)
+            index = cut if cut > 0 else size
+            parts.append(current[:index].strip())
+            current = current[index:]
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def segment(content: Dict) -> List[Dict]:
+    """Blocks from the article HTML when available, else from textContent lines"""
+    blocks = blocks_from_html(content.get("content") or "")
+    if blocks:
+        return blocks
+    lines = (re.sub(r"\s+", " ", line).strip() for line in re.split(r"\n\s*\n|\n", content.get("textContent") or ""))
+    return [{"text": part, "level": 0} for line in lines if line for part in split_long(line)]
+
+
+def blocks_from_html(markup: str) -> List[Dict]:
+    source = re.sub(r"<(script|style|noscript|template)\b[\s\S]*?</\1\s*>", " ", markup, flags=re.I)
+    source = re.sub(r"<!--[\s\S]*?-->", " ", source)
+    blocks = []
+    cursor, level = 0, 0
+
+    def flush(end):
+        text = re.sub(r"\s+", " ", html.unescape(re.sub(r"<[^>]*>", " ", source[cursor:end]))).strip()
+        if text:
+            blocks.extend({"text": part, "level": level} for part in split_long(text))
+
+    for match in BLOCK_PATTERN.finditer(source):
+        flush(match.start())
+        cursor = match.end()
+        tag = match.group(2).lower()
+        if re.fullmatch(r"h[1-6]", tag):
+            level = 0 if match.group(1) else int(tag[1])
+    flush(len(source))
+    return blocks
+
+
+def terms(text: str) -> List[str]:
+    return [term for term in re.findall(r"[^\W_]{3,}", text.lower()) if term not in STOPWORDS]
+
+
+class PromptBudget:
+    """Fit article content into a per-model token budget"""
+
+    def __init__(self, model: str, max_content_length: Optional[int] = None,
+                 max_tokens: Optional[int] = None, reserved_tokens: int = RESERVED_TOKENS):
+        self.model = model
+        self.max_content_length = max_content_length or DEFAULT_MAX_CONTENT_LENGTH
+        self.input_limit = MODEL_INPUT_TOKEN_LIMITS.get(model, DEFAULT_INPUT_TOKEN_LIMIT)
+        self.max_tokens = max_tokens or self.input_limit - reserved_tokens
+
+    def fit(self, content: Dict, max_tokens: Optional[int] = None) -> Dict:
+        max_tokens = max_tokens or self.max_tokens
+        all_blocks = segment(content)
+        seen = set()
+        blocks = [block for block in all_blocks if not self.is_boilerplate(block, seen)]
+        for block in blocks:
+            block["tokens"] = estimate_tokens(block["text"])
+
+        total_tokens = sum(block["tokens"] for block in blocks)
+        total_chars = sum(len(block["text"]) + 2 for block in blocks)
+        kept = blocks
+        if total_tokens > max_tokens or total_chars > self.max_content_length:
+            kept = self.select(blocks, content.get("title") or "", max_tokens)
+
+        text = self.join(blocks, kept)
+        return {
+            "text": text,
+            "tokens": estimate_tokens(text),
+            "budget": max_tokens,
+            "totalTokens": total_tokens,
+            "blocks": len(all_blocks),
+            "keptBlocks": len(kept),
+            "boilerplateBlocks": len(all_blocks) - len(blocks),
+            "trimmed": len(kept) < len(blocks),
+        }
+
+    @staticmethod
+    def is_boilerplate(block: Dict, seen: set) -> bool:
+        key = block["text"].lower()
+        if key in seen:
+            return True  # repeated bylines, captions, share bars
+        seen.add(key)
+        return len(block["text"]) < 200 and bool(BOILERPLATE.match(block["text"]))
+
+    @staticmethod
+    def rank(blocks: List[Dict], title: str) -> None:
+        """Salience = position + overlap with title and section heading + term centrality"""
+        title_terms = set(terms(title))
+        term_sets = [set(terms(block["text"])) for block in blocks]
+        document_frequency: Dict[str, int] = {}
+        for block_terms in term_sets:
+            for term in block_terms:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        # Terms shared with other blocks signal the topic; terms in most blocks are template noise
+        common = max(2, len(blocks) // 2)
+        section_terms: set = set()
+        section_start = True
+        for block, block_terms in zip(blocks, term_sets):
+            if block["level"]:
+                section_terms, section_start = block_terms, True
+                continue
+            focus = sum(1 for term in block_terms if term in title_terms or term in section_terms)
+            size = len(block_terms)
+            block["focus"] = min(1.0, focus / math.sqrt(size)) if size else 0.0
+            shared = sum(1 for term in block_terms if 2 <= document_frequency[term] <= common)
+            block["centrality"] = shared / size if size else 0.0
+            block["lead"] = 0.1 if section_start else 0.0
+            section_start = False
+
+        for index, block in enumerate(blocks):
+            if block["level"]:
+                continue
+            position = 1 - index / len(blocks)
+            block["salience"] = 0.35 * position + 0.4 * block["focus"] + 0.25 * block["centrality"] + block["lead"]
+
+    def select(self, blocks: List[Dict], title: str, max_tokens: int) -> List[Dict]:
+        self.rank(blocks, title)
+
+        # The section heading is paid for with its first kept paragraph
+        heading_of, heading = {}, None
+        for index, block in enumerate(blocks):
+            if block["level"]:
+                heading = index
+            else:
+                heading_of[index] = heading
+
+        chosen = set()
+        tokens = chars = 0
+        candidates = sorted((index for index, block in enumerate(blocks) if not block["level"]),
+                            key=lambda index: -blocks[index]["salience"])
+        for index in candidates:
+            section = heading_of[index]
+            extra = [section, index] if section is not None and section not in chosen else [index]
+            cost = sum(blocks[item]["tokens"] + 2 for item in extra)
+            length = sum(len(blocks[item]["text"]) + 7 for item in extra)  # separator or gap marker
+            if tokens + cost > max_tokens or chars + length > self.max_content_length:
+                continue
+            chosen.update(extra)
+            tokens += cost
+            chars += length
+
+        if not chosen and candidates:
+            # Nothing fits whole: keep the start of the most salient paragraph
+            best = blocks[candidates[0]]
+            limit = min(self.max_content_length, max_tokens * 4)
+            return [{**best, "text": best["text"][:limit]}]
+        return [blocks[index] for index in sorted(chosen)]
+
+    @staticmethod
+    def join(blocks: List[Dict], kept: List[Dict]) -> str:
+        kept_ids = {id(block) for block in kept}
+        parts, gap = [], False
+        for block in blocks:
+            if id(block) not in kept_ids:
+                gap = True
+                continue
+            if gap and parts:
+                parts.append("[…]")
+            gap = False
+            parts.append(f"{'#' * block['level']} {block['text']}" if block["level"] else block["text"])
+        # The oversized-paragraph fallback returns a copy that is not in `blocks`
+        if not parts and kept:
+            parts = [block["text"] for block in kept]
+        return "\n\n".join(parts)
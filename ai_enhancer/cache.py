@@ -0,0 +1,173 @@
+"""
+Content-addressed on-disk cache for Gemini enhancement results
+
+Same keying scheme as EnhancementCache in background.js: a SHA-256 of the
+normalized text plus every setting that changes the model output.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _response_fields(settings: Dict, model: str, generation_config: Dict) -> Dict:
+    return {
+        "enhancementType": settings.get("enhancementType"),
+        "pdfStyle": settings.get("pdfStyle"),
+        "includeSources": bool(settings.get("includeSources", True)),
+        "includeImages": bool(settings.get("includeImages", True)),
+        "mode": settings.get("mode", "single"),
+        "model": model,
+        "generationConfig": generation_config,
+    }
+
+
+def cache_key(text: str, settings: Dict, model: str, generation_config: Dict) -> str:
+    """Hash the normalized text together with everything that affects the response"""
+    material = json.dumps({"text": normalize_text(text), **_response_fields(settings, model, generation_config)},
+                          ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def result_scope(settings: Dict, model: str, generation_config: Dict) -> str:
+    """Hash of the cache_key fields other than the text and the processing mode.
+
+    Results with the same scope answer the same request, so one can stand in for another
+    """
+    fields = _response_fields(settings, model, generation_config)
+    del fields["mode"]
+    material = json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache with TTL expiry, one JSON file per entry"""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0}
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    def load_index(self) -> None:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        entries = sorted(stored.get("entries", {}).items(), key=lambda item: item[1]["last_access"])
+        self.entries = OrderedDict(entries)
+        self.stats.update(stored.get("stats", {}))
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry["stored_at"] > self.ttl:
+                self.stats["expired"] += 1
+                self.discard(key)
+                entry = None
+
+            if entry is not None:
+                try:
+                    with open(self.entry_path(key), "r", encoding="utf-8") as f:
+                        value = json.load(f)
+                except (OSError, ValueError):
+                    self.discard(key)
+                else:
+                    entry["last_access"] = time.time()
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Dict) -> bool:
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return False
+
+        with self.lock:
+            self.discard(key)
+            self.evict(len(data))
+
+            tmp_path = self.entry_path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.entry_path(key))
+
+            now = time.time()
+            self.entries[key] = {"size": len(data), "stored_at": now, "last_access": now}
+            self.stats["writes"] += 1
+            self.save_index()
+        return True
+
+    def evict(self, incoming_size: int) -> None:
+        """Drop expired entries, then least recently used ones until the new entry fits"""
+        now = time.time()
+        for key in [key for key, entry in self.entries.items() if now - entry["stored_at"] > self.ttl]:
+            self.stats["expired"] += 1
+            self.discard(key)
+
+        total = sum(entry["size"] for entry in self.entries.values())
+        while self.entries and total + incoming_size > self.max_bytes:
+            key, entry = next(iter(self.entries.items()))
+            total -= entry["size"]
+            self.stats["evictions"] += 1
+            self.discard(key)
+
+    def discard(self, key: str) -> None:
+        self.entries.pop(key, None)
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        with self.lock:
+            for key in list(self.entries):
+                self.discard(key)
+            self.stats = {name: 0 for name in self.stats}
+            self.save_index()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self.entries),
+                "bytes": sum(entry["size"] for entry in self.entries.values()),
+                "max_bytes": self.max_bytes,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    def flush(self) -> None:
+        """Persist access times and counters (writes persist immediately)"""
+        with self.lock:
+            self.save_index()
+
+    def save_index(self) -> None:
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries, "stats": self.stats}, f)
+        os.replace(tmp_path, self.index_path)
@@ -0,0 +1,141 @@
+"""
+Sentence- and heading-aware chunking
+
+Same algorithm as ContentChunker in background.js. The text is segmented into
+headings and sentences as (start, end) spans, without copying it. Sentence
+ends keep their punctuation and skip decimals, URLs, initials and common
+abbreviations. Chunks are filled greedily up to a token budget. A heading
+starts a new chunk once the current one is half full, and consecutive chunks
+can share a few trailing sentences of overlap. Everything is a single pass
+over the text.
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+from .budget import estimate_tokens
+
+CHUNK_TOKENS = 1000
+CHARS_PER_TOKEN = 4
+
+BLOCK_BREAK = re.compile(r"\n[ \t]*\n\s*|\n(?=#{1,6}\s)")
+HEADING = re.compile(r"#{1,6}\s")
+SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(?=\s|$)|[。！？]+[\"'”’」』)\]]*")
+WHITESPACE = re.compile(r"\s*")
+WORD = re.compile(r"\S+\s*")
+DOTTED = re.compile(r"(?:\w\.)+\w")
+ABBREVIATIONS = frozenset("""
+    mr mrs ms dr prof sr jr st mt vs etc inc ltd co corp dept est approx fig figs eq no nos vol vols
+    p pp ch sec jan feb mar apr jun jul aug sep sept oct nov dec
+""".split())
+
+
+def skip_space(text: str, position: int) -> int:
+    return WHITESPACE.match(text, position).end()
+
+
+def is_abbreviation(text: str, sentence_start: int, match: "re.Match", end: int) -> bool:
+    """Punctuation followed by a lowercase word, or a single '.' after an abbreviation or initial"""
+    following = skip_space(text, match.end())
+    if following < end and text[following].islower():
+        return True
+    if match.group() != ".":
+        return False
+    word = text[max(sentence_start, text.rfind(" ", sentence_start, match.start()) + 1):match.start()]
+    word = word.lstrip("(\"'“‘")
+    return word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper()) or bool(DOTTED.fullmatch(word))
+
+
+def blocks(text: str):
+    """(start, end) of each paragraph; a Markdown heading line always starts a new block"""
+    position = 0
+    for match in BLOCK_BREAK.finditer(text):
+        yield position, match.start()
+        position = match.end()
+    yield position, len(text)
+
+
+def segments(text: str) -> List[Tuple[int, int, str]]:
+    """(start, end, kind) spans in order; kind is "heading" or "sentence" """
+    spans = []
+    for start, end in blocks(text):
+        start = skip_space(text, start)
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start >= end:
+            continue
+        if HEADING.match(text, start):
+            line_end = text.find("\n", start, end)
+            line_end = end if line_end == -1 else line_end
+            spans.append((start, line_end, "heading"))
+            start = skip_space(text, line_end)
+
+        sentence_start = start
+        for match in SENTENCE_END.finditer(text, start, end):
+            if is_abbreviation(text, sentence_start, match, end):
+                continue
+            spans.append((sentence_start, match.end(), "sentence"))
+            sentence_start = skip_space(text, match.end())
+        if sentence_start < end:
+            spans.append((sentence_start, end, "sentence"))
+    return spans
+
+
+def split_words(text: str, start: int, end: int, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """Break a run longer than max_tokens at word boundaries"""
+    pieces, piece_start, tokens, last = [], start, 0, start
+    for match in WORD.finditer(text, start, end):
+        word_tokens = estimate_tokens(text, match.start(), match.end())
+        if tokens and tokens + word_tokens > max_tokens:
+            pieces.append((piece_start, last, tokens))
+            piece_start, tokens = match.start(), 0
+        tokens += word_tokens
+        last = match.start() + len(match.group().rstrip())
+    if tokens:
+        pieces.append((piece_start, last, tokens))
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = 0) -> List[Dict]:
+    """Chunks as {start, end, tokens} offsets into text, in order
+
+    Each chunk ends on a sentence boundary and holds at most max_tokens
+    estimated tokens, including up to overlap_tokens repeated from the end of
+    the previous chunk. Overlap is never carried across a heading.
+    """
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    pieces = []
+    for start, end, kind in segments(text):
+        tokens = estimate_tokens(text, start, end)
+        if tokens <= max_tokens:
+            pieces.append((start, end, kind, tokens))
+        else:
+            pieces.extend((s, e, kind if s == start else "sentence", t) for s, e, t in split_words(text, start, end, max_tokens))
+
+    chunks = []
+    first, tokens, fresh = 0, 0, 0
+    for index, (start, end, kind, piece_tokens) in enumerate(pieces):
+        at_heading = kind == "heading" and tokens >= max_tokens // 2
+        if fresh and (tokens + piece_tokens > max_tokens or at_heading):
+            chunks.append({"start": pieces[first][0], "end": pieces[index - 1][1], "tokens": tokens})
+            previous, first, tokens, fresh = first, index, 0, 0
+            # Trailing sentences of the finished chunk are repeated as context
+            while (overlap_tokens and not at_heading and first - 1 > previous and pieces[first - 1][2] != "heading"
+                   and tokens + pieces[first - 1][3] <= overlap_tokens):
+                first -= 1
+                tokens += pieces[first][3]
+        if tokens + piece_tokens > max_tokens:
+            # Overlap only: drop it rather than exceed the budget
+            first, tokens = index, 0
+        tokens += piece_tokens
+        fresh += 1
+    if fresh:
+        chunks.append({"start": pieces[first][0], "end": pieces[-1][1], "tokens": tokens})
+    return chunks
+
+
+def chunk_content(text: str, max_chunk_size: int = CHUNK_TOKENS * CHARS_PER_TOKEN) -> List[str]:
+    """Chunk texts of about max_chunk_size characters, as used for map-reduce enhancement"""
+    return [text[chunk["start"]:chunk["end"]]
+            for chunk in chunk_text(text, max(1, max_chunk_size // CHARS_PER_TOKEN))]
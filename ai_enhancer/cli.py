@@ -0,0 +1,131 @@
+"""
+Command line entry point: python -m ai_enhancer urls.txt -o output/
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from .cache import ResponseCache
+from .config import extension_settings, load_config
+from .dedupe import DEFAULT_THRESHOLD, NearDuplicateIndex
+from .extractive import EXTRACTIVE_RATIO
+from .extractor import ContentExtractor
+from .gemini import GeminiClient, GeminiError
+from .pdf import PDFRenderer
+from .pipeline import DEFAULT_WORKERS, BatchPipeline
+from .revisions import REVISION_TTL
+from .routing import BUDGETS, ModelRouter
+from .scheduler import RequestScheduler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="ai_enhancer",
+        description="Extract, enhance and render a list of URLs to PDF without a browser.",
+    )
+    parser.add_argument("urls", help="File with one URL per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="output", help="Directory for PDFs and checkpoint")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"),
+                        help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--model", help="Pin every request to this Gemini model (default: route by page size and "
+                                         "enhancement type using the model_routes table)")
+    parser.add_argument("--budget", choices=BUDGETS, help="Latency/cost budget used to route requests")
+    parser.add_argument("--config", help="Path to config.json")
+    parser.add_argument("--enhancement-type", choices=["summarize", "expand", "validate", "comprehensive"])
+    parser.add_argument("--pdf-style", choices=["academic", "executive", "casual"])
+    parser.add_argument("--parallel-chunks", type=int, metavar="N",
+                        help="Enhance long pages as chunks, N requests at a time, then merge")
+    parser.add_argument("--requests-per-minute", type=float, default=60,
+                        help="Gemini request rate limit per API key (default: 60)")
+    parser.add_argument("--max-concurrent-requests", type=int, default=4,
+                        help="Maximum Gemini requests in flight (default: 4)")
+    parser.add_argument("--cache-dir", help="Response cache directory (default: <output>/.cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="Ignore cached responses but store the fresh ones")
+    parser.add_argument("--no-incremental", action="store_true",
+                        help="Always re-enhance whole pages instead of only the paragraphs that changed")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Do not check pages against the near-duplicate index before enhancing")
+    parser.add_argument("--duplicate-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Similarity at which a page counts as a copy of an earlier one (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--extractive", action="store_true",
+                        help="Summarize mode: pre-summarize long pages locally and send only the top-ranked sentences")
+    parser.add_argument("--extractive-ratio", type=float, default=EXTRACTIVE_RATIO,
+                        help=f"Share of a page's tokens kept by --extractive (default: {EXTRACTIVE_RATIO})")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>/checkpoint.jsonl)")
+    parser.add_argument("--queue-size", type=int, default=64, help="Maximum jobs waiting per stage")
+    for stage, count in DEFAULT_WORKERS.items():
+        parser.add_argument(f"--{stage}-workers", type=int, default=count,
+                            help=f"Worker threads for the {stage} stage (default: {count})")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging")
+    return parser
+
+
+def read_urls(path: str):
+    if path == "-":
+        return sys.stdin.read().splitlines()
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+
+    config = load_config(args.config)
+    settings = extension_settings(config, enhancementType=args.enhancement_type, pdfStyle=args.pdf_style,
+                                  routingBudget=args.budget)
+    if args.parallel_chunks:
+        settings.update(parallelChunkEnhancement=True, chunkParallelism=args.parallel_chunks)
+    if args.extractive:
+        settings.update(extractiveSummary=True, extractiveRatio=args.extractive_ratio)
+    if args.refresh_cache:
+        settings["bypassCache"] = True
+
+    cache_dir = args.cache_dir or os.path.join(args.output, ".cache")
+    cache = None if args.no_cache else ResponseCache(cache_dir)
+    revisions = None if args.no_incremental else ResponseCache(os.path.join(cache_dir, "revisions"), ttl=REVISION_TTL)
+    duplicates = None
+    if not args.no_dedupe:
+        duplicates = NearDuplicateIndex(os.path.join(cache_dir, "duplicates.db"), args.duplicate_threshold)
+
+    timeout = config["default_settings"]["processing_timeout"] * 2
+    scheduler = RequestScheduler(requests_per_minute=args.requests_per_minute,
+                                 max_concurrent=args.max_concurrent_requests, deadline=timeout)
+    try:
+        client = GeminiClient(args.api_key, cache=cache, scheduler=scheduler, timeout=timeout,
+                              revisions=revisions, duplicates=duplicates,
+                              router=ModelRouter(config["model_routing"], pinned_model=args.model))
+    except GeminiError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    pipeline = BatchPipeline(
+        ContentExtractor(),
+        client,
+        PDFRenderer(),
+        args.output,
+        settings,
+        workers={stage: getattr(args, f"{stage}_workers") for stage in DEFAULT_WORKERS},
+        queue_size=args.queue_size,
+        checkpoint_path=args.checkpoint,
+    )
+    summary = pipeline.run(read_urls(args.urls))
+    if cache is not None:
+        cache.flush()
+        summary["cache"] = cache.get_stats()
+    if revisions is not None:
+        revisions.flush()
+    if duplicates is not None:
+        summary["duplicates"] = duplicates.get_stats()
+        duplicates.close()
+    summary["scheduler"] = scheduler.get_stats()
+
+    print(json.dumps({key: value for key, value in summary.items() if key != "results"}, indent=2))
+    return 0 if summary["failed"] == 0 else 1
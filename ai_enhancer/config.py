@@ -0,0 +1,52 @@
+"""
+Project configuration loading shared by the Python tooling
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+from .routing import load_routes
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
+
+DEFAULT_SETTINGS = {
+    "enhancement_type": "summarize",
+    "pdf_style": "academic",
+    "include_images": True,
+    "include_sources": True,
+    "max_content_length": 50000,
+    "processing_timeout": 60,
+    "routing_budget": "balanced",
+    "enable_logging": True,
+}
+
+
+def load_config(path: Optional[str] = None) -> Dict:
+    """Load config.json, filling in defaults for anything missing"""
+    config = {}
+    path = path or CONFIG_PATH
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+    config["default_settings"] = {**DEFAULT_SETTINGS, **config.get("default_settings", {})}
+    # The routing table is shared with the extension; the path is relative to config.json
+    routes = config.get("model_routes")
+    config["model_routing"] = load_routes(os.path.join(os.path.dirname(path), routes) if routes else None)
+    return config
+
+
+def extension_settings(config: Dict, **overrides) -> Dict:
+    """Translate config.json defaults into the extension's camelCase settings object"""
+    defaults = config["default_settings"]
+    settings = {
+        "enhancementType": defaults["enhancement_type"],
+        "pdfStyle": defaults["pdf_style"],
+        "includeImages": defaults["include_images"],
+        "includeSources": defaults["include_sources"],
+        "maxContentLength": defaults["max_content_length"],
+        "routingBudget": defaults["routing_budget"],
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
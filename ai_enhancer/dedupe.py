@@ -0,0 +1,168 @@
+"""
+Near-duplicate detection across runs with MinHash and LSH
+
+Syndicated copies of an article differ only in a byline, a paragraph or the
+surrounding boilerplate. Each document is reduced to word 5-gram shingles and
+summarised as a 64-value MinHash signature, which is split into 16 LSH bands
+of 4 rows. Documents sharing any band are candidates; candidates are then
+verified by the estimated Jaccard similarity of their signatures. Pairs at
+0.8 similarity share a band with ~99.98% probability.
+
+The index lives in SQLite so it stays small in memory and each lookup is one
+indexed query, independent of how many documents have been added. Entries are
+scoped by the settings and model that produced their result (see
+cache.result_scope): a copy enhanced with other settings is not a match.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from .budget import TOKEN_PATTERN
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+# Above this a copy is treated as the same article and its enhanced result reused as is
+REUSE_THRESHOLD = 0.9
+# Shorter texts share too few shingles for the estimate to mean anything; they are not indexed
+MIN_SHINGLES = 20
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SCHEMA_VERSION = 2
+
+
+def _permutations(count: int):
+    # Fixed coefficients: signatures must stay comparable across runs
+    seed = hashlib.sha256(b"ai_enhancer.dedupe").digest()
+    values = []
+    while len(values) < count * 2:
+        seed = hashlib.sha256(seed).digest()
+        values.extend(int.from_bytes(seed[i:i + 8], "big") % _PRIME for i in range(0, 32, 8))
+    return [(values[i] | 1, values[count + i]) for i in range(count)]
+
+
+PERMUTATIONS = _permutations(NUM_PERM)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Hashed word n-grams; CJK characters count as words"""
+    words = [token.lower() for token in TOKEN_PATTERN.findall(text or "") if token[0].isalnum()]
+    if not words:
+        return set()
+    size = min(size, len(words))
+    return {int.from_bytes(hashlib.blake2b(" ".join(words[i:i + size]).encode("utf-8"), digest_size=8).digest(), "big")
+            for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> Optional[array]:
+    """64 unsigned 32-bit minimums, one per hash permutation; None below MIN_SHINGLES shingles"""
+    hashes = shingles(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    return array("I", [min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in PERMUTATIONS])
+
+
+def band_keys(signature: array) -> List[int]:
+    keys = []
+    for band in range(BANDS):
+        data = bytes([band]) + signature[band * ROWS:(band + 1) * ROWS].tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big", signed=True))
+    return keys
+
+
+def similarity(first: array, second: array) -> float:
+    """Estimated Jaccard similarity of the two shingle sets"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash/LSH index of enhanced documents, keyed by URL and result scope"""
+
+    def __init__(self, path: str, threshold: float = DEFAULT_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "added": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            # Unscoped entries from an older index cannot be matched safely; the index is only a cache
+            self.db.executescript("DROP TABLE IF EXISTS documents; DROP TABLE IF EXISTS bands;")
+            self.db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                result_key TEXT,
+                added_at REAL NOT NULL,
+                UNIQUE (url, scope)
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                key INTEGER NOT NULL,
+                document INTEGER NOT NULL,
+                PRIMARY KEY (key, document)
+            ) WITHOUT ROWID;
+        """)
+
+    def query(self, signature: array, exclude_url: Optional[str] = None, scope: str = "") -> Optional[Dict]:
+        """Most similar document indexed under `scope` at or above the threshold, or None"""
+        keys = band_keys(signature)
+        with self.lock:
+            self.stats["lookups"] += 1
+            rows = self.db.execute(
+                f"SELECT DISTINCT d.url, d.signature, d.result_key FROM bands b JOIN documents d ON d.id = b.document "
+                f"WHERE d.scope = ? AND b.key IN ({','.join('?' * len(keys))})", [scope, *keys]).fetchall()
+
+        best = None
+        for url, blob, result_key in rows:
+            if url == exclude_url:
+                continue
+            score = similarity(signature, array("I", blob))
+            if score >= self.threshold and (best is None or score > best["similarity"]):
+                best = {"url": url, "similarity": score, "result_key": result_key}
+        if best is not None:
+            with self.lock:
+                self.stats["hits"] += 1
+        return best
+
+    def add(self, url: str, signature: array, result_key: Optional[str] = None, scope: str = "") -> None:
+        """Index a document, replacing any earlier entry for the same URL and scope"""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT id, signature FROM documents WHERE url = ? AND scope = ?",
+                                  (url, scope)).fetchone()
+            if row is None:
+                document = self.db.execute(
+                    "INSERT INTO documents (url, scope, signature, result_key, added_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, scope, signature.tobytes(), result_key, time.time())).lastrowid
+            else:
+                # Old band rows are removed by primary key; `bands` has no index on document
+                document = row[0]
+                self.db.executemany("DELETE FROM bands WHERE key = ? AND document = ?",
+                                    [(key, document) for key in band_keys(array("I", row[1]))])
+                self.db.execute("UPDATE documents SET signature = ?, result_key = ?, added_at = ? WHERE id = ?",
+                                (signature.tobytes(), result_key, time.time(), document))
+            self.db.executemany("INSERT OR IGNORE INTO bands (key, document) VALUES (?, ?)",
+                                [(key, document) for key in band_keys(signature)])
+            self.stats["added"] += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            documents = self.db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            return {**self.stats, "documents": documents}
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
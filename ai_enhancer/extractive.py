@@ -0,0 +1,162 @@
+"""
+Extractive pre-summarization with TF-IDF and TextRank
+
+Same algorithm as ExtractiveSummarizer in background.js. For summarize mode
+the fitted prompt text is split into sentences, each sentence becomes a
+sublinear TF-IDF vector and TextRank runs over their cosine-similarity graph.
+The highest-ranked sentences are kept, in document order, until the token
+budget is spent; a section heading is kept with its first kept sentence.
+
+The similarity graph is never materialised: with L2-normalised rows N, one
+TextRank step needs (N Nᵀ - I) x, computed as two sparse products over the
+(sentence, term, weight) triples. A long page is a few milliseconds of NumPy
+and needs no model or network access.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .budget import estimate_tokens, terms
+from .chunking import segments
+
+EXTRACTIVE_RATIO = 0.35
+# Shorter pages are sent whole: the prompt is already cheap
+MIN_TOKENS = 1500
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+# Paragraph openers tend to carry the topic sentence
+LEAD_BOOST = 1.2
+GAP_MARKER = "[…]"
+CJK_RUN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+
+
+def sentence_terms(text: str) -> List[str]:
+    """Content words; CJK runs, which have no spaces, become character bigrams"""
+    words = terms(CJK_RUN.sub(" ", text))
+    for run in CJK_RUN.findall(text):
+        words.extend(run[i:i + 2] for i in range(max(1, len(run) - 1)))
+    return words
+
+
+def tfidf(sentence_terms: List[List[str]]):
+    """(rows, columns, weights, vocabulary size) of the L2-normalised TF-IDF matrix"""
+    vocabulary: Dict[str, int] = {}
+    rows, columns, counts = [], [], []
+    for row, words in enumerate(sentence_terms):
+        frequency: Dict[int, int] = {}
+        for word in words:
+            column = vocabulary.setdefault(word, len(vocabulary))
+            frequency[column] = frequency.get(column, 0) + 1
+        rows.extend([row] * len(frequency))
+        columns.extend(frequency)
+        counts.extend(frequency.values())
+
+    rows = np.asarray(rows, dtype=np.int64)
+    columns = np.asarray(columns, dtype=np.int64)
+    document_frequency = np.bincount(columns, minlength=len(vocabulary))
+    idf = np.log((1 + len(sentence_terms)) / (1 + document_frequency)) + 1
+    weights = (1 + np.log(np.asarray(counts, dtype=np.float64))) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(sentence_terms)))
+    weights /= np.maximum(norms, 1e-12)[rows]
+    return rows, columns, weights, len(vocabulary)
+
+
+def textrank(rows, columns, weights, sentences: int, vocabulary: int) -> np.ndarray:
+    """Stationary TextRank scores over the cosine-similarity graph; 0 for sentences without edges"""
+    def similarity_times(vector):
+        # (N Nᵀ - I) vector; the identity removes each sentence's self-similarity
+        projected = np.bincount(columns, weights=weights * vector[rows], minlength=vocabulary)
+        return np.bincount(rows, weights=weights * projected[columns], minlength=sentences) - vector
+
+    degree = similarity_times(np.ones(sentences))
+    has_edges = degree > 1e-9
+    degree = np.where(has_edges, degree, 1.0)
+    scores = np.full(sentences, 1.0 / sentences)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / sentences + DAMPING * similarity_times(np.where(has_edges, scores / degree, 0.0))
+        converged = np.abs(updated - scores).sum() < TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return np.where(has_edges, scores, 0.0)
+
+
+def summarize(text: str, max_tokens: Optional[int] = None, ratio: float = EXTRACTIVE_RATIO,
+              min_tokens: int = MIN_TOKENS) -> Dict:
+    """Keep the top-ranked sentences of text within max_tokens (default: ratio of its tokens)"""
+    original_tokens = estimate_tokens(text)
+    max_tokens = max_tokens or max(1, int(original_tokens * ratio))
+    spans = segments(text)
+    result = {"text": text, "tokens": original_tokens, "originalTokens": original_tokens,
+              "budget": max_tokens, "sentences": 0, "keptSentences": 0, "applied": False}
+    if original_tokens < min_tokens or original_tokens <= max_tokens:
+        return result
+
+    # Sentences without content terms (gap markers, bare numbers) are never worth a slot
+    sentences, heading_of = [], {}
+    heading, previous_end = None, 0
+    for index, (start, end, kind) in enumerate(spans):
+        opens_paragraph = index == 0 or "\n" in text[previous_end:start]
+        previous_end = end
+        if kind == "heading":
+            heading = index
+            continue
+        words = sentence_terms(text[start:end])
+        if words and text[start:end] != GAP_MARKER:
+            sentences.append((index, words, opens_paragraph))
+            heading_of[index] = heading
+    result["sentences"] = len(sentences)
+    if len(sentences) < 2:
+        return result
+
+    rows, columns, weights, vocabulary = tfidf([words for _, words, _ in sentences])
+    scores = textrank(rows, columns, weights, len(sentences), vocabulary)
+    scores *= np.array([LEAD_BOOST if lead else 1.0 for _, _, lead in sentences])
+
+    chosen, tokens = set(), 0
+    for position in np.argsort(-scores, kind="stable"):
+        if scores[position] <= 0:
+            break  # Shares no terms with the rest of the page
+        index = sentences[position][0]
+        section = heading_of[index]
+        extra = [index] if section is None or section in chosen else [section, index]
+        cost = sum(estimate_tokens(text, spans[item][0], spans[item][1]) + 1 for item in extra)
+        if tokens + cost > max_tokens:
+            continue
+        chosen.update(extra)
+        tokens += cost
+
+    if not chosen:
+        return result
+    summary = join(text, spans, chosen)
+    result.update(text=summary, tokens=estimate_tokens(summary), keptSentences=len(chosen) - sum(
+        1 for index in chosen if spans[index][2] == "heading"), applied=True)
+    return result
+
+
+def join(text: str, spans, chosen) -> str:
+    """Kept spans in order: a paragraph's kept sentences on one line, a gap marker where text was dropped"""
+    paragraphs, current, previous_end = [], [], 0
+    gap = after_heading = False
+    for index, (start, end, kind) in enumerate(spans):
+        if (kind == "heading" or "\n" in text[previous_end:start]) and current:
+            paragraphs.append(" ".join(current))
+            current, after_heading = [], False
+        previous_end = end
+        if index not in chosen:
+            gap = True
+            continue
+        if gap and paragraphs and not current and not after_heading and kind != "heading":
+            paragraphs.append(GAP_MARKER)
+        gap = False
+        if kind == "heading":
+            paragraphs.append(text[start:end])
+            after_heading = True
+        else:
+            current.append(text[start:end])
+    if current:
+        paragraphs.append(" ".join(current))
+    return "\n\n".join(paragraphs)
@@ -0,0 +1,183 @@
+"""
+Content extraction using requests + BeautifulSoup
+
+Python port of the extension's content.js / readability.js logic. The
+returned dictionaries use the same camelCase keys as the extension's
+extractContent payload so they can be fed to the same prompts.
+"""
+
+import math
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+USER_AGENT = "Mozilla/5.0 (compatible; AIContentEnhancer/1.0; +https://github.com/)"
+
+UNWANTED_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "iframe", "form"]
+
+UNWANTED_CLASSES = [
+    "advertisement", "ad", "sidebar", "navigation", "menu",
+    "social", "share", "comments", "comment", "related",
+    "recommended", "popup", "modal", "overlay",
+]
+
+CONTENT_SELECTORS = [
+    "article",
+    "main",
+    "[role=main]",
+    ".content",
+    ".post-content",
+    ".entry-content",
+    ".article-content",
+    ".main-content",
+    "#content",
+    "#main",
+    ".post",
+    ".article",
+]
+
+WORDS_PER_MINUTE = 200
+
+
+class ExtractionError(Exception):
+    """Raised when a page cannot be fetched or has no usable content"""
+
+
+class ContentExtractor:
+    """Fetch pages and extract their main readable content"""
+
+    def __init__(self, session: Optional[requests.Session] = None, timeout: float = 30,
+                 char_threshold: int = 500):
+        self.session = session or requests.Session()
+        self.session.headers.setdefault("User-Agent", USER_AGENT)
+        self.timeout = timeout
+        self.char_threshold = char_threshold
+
+    def fetch(self, url: str) -> str:
+        """Download the raw HTML for a URL"""
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise ExtractionError(f"Failed to fetch {url}: {e}") from e
+        response.encoding = response.encoding or response.apparent_encoding
+        return response.text
+
+    def extract(self, url: str, html: Optional[str] = None) -> Dict:
+        """Extract content from a URL, fetching it unless html is supplied"""
+        if html is None:
+            html = self.fetch(url)
+
+        soup = BeautifulSoup(html, "html.parser")
+        metadata = self.extract_metadata(soup, url)
+
+        for tag in soup(UNWANTED_TAGS):
+            tag.decompose()
+
+        element, method = self.find_main_content(soup)
+        if element is None:
+            raise ExtractionError(f"No content extracted from {url}")
+
+        text = self.clean_text(element.get_text(" "))
+        word_count = self.count_words(text)
+
+        return {
+            **metadata,
+            "content": str(element),
+            "textContent": text,
+            "excerpt": self.extract_excerpt(text),
+            "images": self.extract_images(element, url),
+            "links": self.extract_links(element, url),
+            "wordCount": word_count,
+            "readingTime": math.ceil(word_count / WORDS_PER_MINUTE),
+            "extractionMethod": method,
+            "extractedAt": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def extract_metadata(self, soup: BeautifulSoup, url: str) -> Dict:
+        """Read the same meta tags content.js collects"""
+        def get_meta_content(name):
+            meta = soup.find("meta", attrs={"name": name}) or soup.find("meta", attrs={"property": name})
+            return meta.get("content", "") if meta else ""
+
+        canonical = soup.find("link", rel="canonical")
+        html_tag = soup.find("html")
+
+        return {
+            "title": soup.title.get_text(strip=True) if soup.title else "",
+            "url": url,
+            "description": get_meta_content("description"),
+            "author": get_meta_content("author") or get_meta_content("article:author"),
+            "publishedDate": get_meta_content("article:published_time") or get_meta_content("datePublished"),
+            "modifiedDate": get_meta_content("article:modified_time") or get_meta_content("dateModified"),
+            "siteName": get_meta_content("og:site_name") or get_meta_content("application-name"),
+            "language": (html_tag.get("lang") if html_tag else None) or "en",
+            "keywords": get_meta_content("keywords"),
+            "canonicalUrl": urljoin(url, canonical["href"]) if canonical and canonical.get("href") else url,
+        }
+
+    def find_main_content(self, soup: BeautifulSoup):
+        """Return (element, method) for the best content candidate"""
+        for selector in CONTENT_SELECTORS:
+            element = soup.select_one(selector)
+            if element is not None and self.is_valid_content(element):
+                return element, "selector"
+
+        candidates = [el for el in soup.find_all(["div", "section", "article", "main"])
+                      if self.is_valid_content(el)]
+        if candidates:
+            return max(candidates, key=lambda el: len(el.get_text())), "heuristic"
+
+        return soup.body or soup, "fallback"
+
+    def is_valid_content(self, element) -> bool:
+        if self.is_unwanted_element(element):
+            return False
+        return len(element.get_text().strip()) > self.char_threshold
+
+    def is_unwanted_element(self, element) -> bool:
+        classes = element.get("class") or []
+        element_id = element.get("id") or ""
+        return any(name in classes or name in element_id for name in UNWANTED_CLASSES)
+
+    def clean_text(self, text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip()
+
+    def extract_excerpt(self, text: str) -> str:
+        first_sentence = re.split(r"[.!?]+", text, maxsplit=1)[0].strip()
+        return first_sentence if len(first_sentence) > 50 else text[:200] + "..."
+
+    def extract_images(self, element, base_url: str) -> List[Dict]:
+        images = []
+        for img in element.find_all("img"):
+            src = img.get("src")
+            if not src or src.startswith("data:"):
+                continue
+            images.append({
+                "src": urljoin(base_url, src),
+                "alt": img.get("alt", ""),
+                "title": img.get("title", ""),
+                "width": img.get("width"),
+                "height": img.get("height"),
+            })
+        return images
+
+    def extract_links(self, element, base_url: str) -> List[Dict]:
+        links = []
+        for link in element.find_all("a", href=True):
+            text = link.get_text(strip=True)
+            if not text:
+                continue
+            links.append({
+                "href": urljoin(base_url, link["href"]),
+                "text": text,
+                "title": link.get("title", ""),
+            })
+        return links
+
+    def count_words(self, text: str) -> int:
+        return len(text.split())
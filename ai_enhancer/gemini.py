@@ -0,0 +1,761 @@
+"""
+Gemini enhancement client
+
+Python counterpart of AIEnhancerBackground.prepareContentForAI / buildPrompt /
+callGeminiAI / parseAIResponse in background.js.
+"""
+
+import copy
+import json
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from .budget import PromptBudget, estimate_tokens
+from .cache import ResponseCache, cache_key, result_scope
+from .chunking import chunk_content
+from .dedupe import REUSE_THRESHOLD, NearDuplicateIndex, minhash
+from .extractive import EXTRACTIVE_RATIO, summarize
+from .metrics import PipelineMetrics
+from .revisions import chunk_paragraphs, fingerprints_only, revision_key, worth_chunking
+from .routing import DEFAULT_MODEL, GENERATION_CONFIG, ROUTING, ModelRouter
+from .scheduler import RequestScheduler, SchedulerError
+from .singleflight import SingleFlight, flight_key
+
+GEMINI_API_BASE = ROUTING["apiBase"]
+
+# Structured output: Gemini returns bare JSON matching these schemas (no prose or code fences)
+RESPONSE_PROPERTIES = {
+    "title": {"type": "STRING"},
+    "summary": {"type": "STRING"},
+    "enhancedContent": {"type": "STRING"},
+    "keyPoints": {"type": "ARRAY", "items": {"type": "STRING"}},
+    "sources": {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {"title": {"type": "STRING"}, "url": {"type": "STRING"}, "relevance": {"type": "STRING"}},
+            "required": ["title"],
+        },
+    },
+    "insights": {"type": "STRING"},
+    "recommendations": {"type": "STRING"},
+    "metadata": {
+        "type": "OBJECT",
+        "properties": {"wordCount": {"type": "INTEGER"}, "readingTime": {"type": "INTEGER"},
+                       "confidence": {"type": "NUMBER"}},
+    },
+}
+
+
+def response_schema(fields: List[str]) -> Dict:
+    return {
+        "type": "OBJECT",
+        "properties": {field: RESPONSE_PROPERTIES[field] for field in fields},
+        "required": [field for field in fields if field not in ("metadata", "sources")],
+        "propertyOrdering": fields,
+    }
+
+
+RESPONSE_SCHEMAS = {
+    "document": response_schema(["title", "summary", "keyPoints", "enhancedContent", "insights",
+                                 "recommendations", "sources", "metadata"]),
+    "chunk": response_schema(["summary", "keyPoints", "enhancedContent", "insights", "recommendations", "sources"]),
+    "reduce": response_schema(["title", "summary", "keyPoints", "insights", "recommendations"]),
+}
+
+
+def json_generation_config(schema: Dict, base: Optional[Dict] = None) -> Dict:
+    return {**(base or GENERATION_CONFIG), "responseMimeType": "application/json", "responseSchema": schema}
+
+
+ENHANCEMENT_INSTRUCTIONS = {
+    "summarize": "Focus on creating a concise, well-structured summary that captures the essential information.",
+    "expand": "Expand the content with additional context, explanations, and background information to provide deeper understanding.",
+    "validate": "Validate claims and facts, add reasoning and evidence, and provide a balanced analysis with proper citations.",
+    "comprehensive": "Provide a comprehensive enhancement including summary, expansion, validation, and actionable insights.",
+}
+
+RESPONSE_FORMAT = """{
+  "title": "Enhanced title",
+  "summary": "Brief summary of the content",
+  "enhancedContent": "Main enhanced content with proper formatting",
+  "keyPoints": ["Point 1", "Point 2", "Point 3"],
+  "sources": [{"title": "Source title", "url": "source_url", "relevance": "Why this source is relevant"}],
+  "insights": "Additional insights and analysis",
+  "recommendations": "Actionable recommendations based on the content",
+  "metadata": {
+    "wordCount": 0,
+    "readingTime": 0,
+    "confidence": 0.95
+  }
+}"""
+
+CHUNK_RESPONSE_FORMAT = """{
+  "summary": "Brief summary of this part",
+  "enhancedContent": "Enhanced content for this part with proper formatting",
+  "keyPoints": ["Point 1", "Point 2"],
+  "sources": [{"title": "Source title", "url": "source_url", "relevance": "Why this source is relevant"}],
+  "insights": "Insights specific to this part",
+  "recommendations": "Recommendations specific to this part"
+}"""
+
+REDUCE_RESPONSE_FORMAT = """{
+  "title": "Enhanced title",
+  "summary": "Brief summary of the whole document",
+  "keyPoints": ["Point 1", "Point 2", "Point 3"],
+  "insights": "Additional insights and analysis",
+  "recommendations": "Actionable recommendations based on the content"
+}"""
+
+
+def extract_json(response_text: str) -> Optional[Dict]:
+    parsed = parse_json_response(response_text)
+    return parsed[0] if parsed else None
+
+
+def parse_json_response(text: str) -> Optional[Tuple[Dict, bool]]:
+    """Tolerant parse of a model response, same as StreamingJSONParser.parse in background.js
+
+    Returns (value, repaired) or None. Code fences and surrounding prose are
+    ignored; truncation, trailing commas and raw control characters are repaired.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        value = json.loads(text[start:])
+        return (value, False) if isinstance(value, dict) else None
+    except ValueError:
+        pass
+    repaired = repair_json(text, start)
+    if repaired is None:
+        return None
+    try:
+        value = json.loads(repaired[0])
+    except ValueError:
+        return None
+    # An object cut off before its first field carries nothing worth keeping
+    return (value, repaired[1]) if isinstance(value, dict) and value else None
+
+
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def repair_json(text: str, start: int = 0) -> Optional[Tuple[str, bool]]:
+    """Close the first top-level object, cutting a truncated tail back to the last complete value"""
+    out: List[str] = []
+    closers: List[str] = []
+    in_string = escaped = is_key = expect_key = changed = False
+    safe = (0, "")
+
+    def mark_safe():
+        nonlocal safe
+        safe = (len(out), "".join(reversed(closers)))
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+                out.append(ch)
+            elif ch == "\\":
+                escaped = True
+                out.append(ch)
+            elif ch == '"':
+                in_string = False
+                out.append(ch)
+                if not is_key:
+                    mark_safe()
+            elif ch < " ":
+                out.append(CONTROL_ESCAPES.get(ch, ""))
+                changed = True
+            else:
+                out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string, is_key = True, expect_key
+            out.append(ch)
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            expect_key = ch == "{"
+            out.append(ch)
+            mark_safe()
+        elif ch in "}]":
+            # Drop a trailing comma before the closer
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ",":
+                del out[end - 1]
+                changed = True
+            if closers:
+                closers.pop()
+            expect_key = False
+            out.append(ch)
+            if not closers:
+                return "".join(out), changed
+            mark_safe()
+        elif ch == ",":
+            expect_key = bool(closers) and closers[-1] == "}"
+            out.append(ch)
+        elif ch == ":":
+            expect_key = False
+            out.append(ch)
+        else:
+            out.append(ch)
+            # A number or literal is complete once a delimiter follows it
+            if (ch.isalnum() or ch in "._+-") and i + 1 < len(text) and (text[i + 1].isspace() or text[i + 1] in ",}]"):
+                mark_safe()
+
+    if safe[0] == 0:
+        return None
+    if in_string and not is_key:
+        # Truncated inside a string value: keep the partial text and close it
+        partial = "".join(out)
+        if escaped:
+            partial = partial[:-1]
+        partial = re.sub(r"\\u[0-9a-fA-F]{0,3}$", "", partial)
+        return partial + '"' + "".join(reversed(closers)), True
+    return "".join(out[:safe[0]]) + safe[1], True
+
+
+def describe_route(route: Dict) -> Dict:
+    """The chosen route as recorded in processingInfo"""
+    return {
+        "name": route["name"],
+        "model": route["model"],
+        "budget": route["budget"],
+        "inputTokens": route["inputTokens"],
+        "maxOutputTokens": route["generationConfig"].get("maxOutputTokens"),
+    }
+
+
+class GeminiError(Exception):
+    """Raised when the Gemini API returns an error or no content"""
+
+
+class GeminiClient:
+    """Enhance extracted content with the Gemini generateContent API"""
+
+    def __init__(self, api_key: str, model: Optional[str] = None,
+                 session: Optional[requests.Session] = None, timeout: float = 120,
+                 base_url: str = GEMINI_API_BASE, cache: Optional[ResponseCache] = None,
+                 scheduler: Optional[RequestScheduler] = None, metrics: Optional[PipelineMetrics] = None,
+                 revisions: Optional[ResponseCache] = None, duplicates: Optional[NearDuplicateIndex] = None,
+                 router: Optional[ModelRouter] = None):
+        if not api_key:
+            raise GeminiError("Gemini API key not found. Pass --api-key or set GEMINI_API_KEY.")
+        self.api_key = api_key
+        # Passing a model pins every request to it; otherwise each request is routed
+        self.router = router or ModelRouter(pinned_model=model)
+        self.model = model or self.router.default_model
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.scheduler = scheduler or RequestScheduler(deadline=timeout)
+        self.metrics = metrics or PipelineMetrics()
+        # Per-URL chunk results for incremental re-enhancement; None disables it
+        self.revisions = revisions
+        # MinHash index of earlier documents, checked before enhancing syndicated copies
+        self.duplicates = duplicates
+        # Concurrent calls for the same page and settings share one enhancement
+        self.in_flight = SingleFlight()
+
+    def enhance(self, content: Dict, settings: Dict) -> Dict:
+        """Enhance content, joining an identical call that is already in flight"""
+        enhanced, shared = self.in_flight.run(flight_key(content, settings),
+                                              lambda: self.enhance_once(content, settings))
+        if not shared:
+            return enhanced
+        self.metrics.record("coalesced", 1, "requests")
+        enhanced = copy.deepcopy(enhanced)
+        enhanced["processingInfo"] = {**enhanced.get("processingInfo", {}), "coalesced": True}
+        return enhanced
+
+    def enhance_once(self, content: Dict, settings: Dict) -> Dict:
+        """Run the full prepare -> prompt -> generate -> parse -> post-process flow"""
+        processed = self.prepare(content, settings)
+        route = self.router.route(processed["tokenUsage"]["content"], processed["enhancementType"],
+                                  settings.get("routingBudget"))
+        # The route depends on the fitted size, so the first fit uses the default model's limits;
+        # a different routed model gets its own fit
+        if route["model"] != self.model:
+            processed = self.prepare(content, settings, route["model"])
+        processed["route"] = route
+        self.metrics.record("contentBytes", len(content.get("textContent") or ""), "chars")
+        self.metrics.record("promptTokens", processed["tokenUsage"]["content"], "tokens")
+
+        # A long page seen before is re-enhanced chunk by chunk. The first visit is a normal
+        # request that only records the paragraph fingerprints for next time
+        revision_chunks, previous = [], None
+        if self.revisions is not None and settings.get("incrementalEnhancement", True) and content.get("url"):
+            revision_chunks = chunk_paragraphs(processed["promptContent"])
+            previous = self.revisions.get(revision_key(content["url"], settings, route["model"]))
+        if len(revision_chunks) > 1 and worth_chunking(previous, revision_chunks):
+            mode = "incremental"
+        elif settings.get("parallelChunkEnhancement") and len(processed["chunks"]) > 1:
+            mode = "mapReduce"
+        else:
+            mode = "single"
+
+        key = None
+        if self.cache is not None:
+            key = self.result_key(processed, settings, mode)
+            # bypassCache skips the lookup but still refreshes the stored entry
+            cached = None if settings.get("bypassCache") else self.cache.get(key)
+            if cached is not None:
+                cached["processingInfo"] = {**cached.get("processingInfo", {}), "cacheHit": True}
+                return self.post_process(cached, content, settings)
+
+        # Only copies enhanced with the same settings and model are candidates
+        signature, duplicate = None, None
+        scope = result_scope(settings, route["model"], route["generationConfig"])
+        if self.duplicates is not None and content.get("url"):
+            signature = minhash(processed["promptContent"])
+        if signature is not None:
+            with self.metrics.time("duplicateLookup"):
+                duplicate = self.duplicates.query(signature, exclude_url=content["url"], scope=scope)
+
+        # A near-identical copy reuses the earlier result; a long, partly changed one only sends its new chunks
+        # `previous` stays this URL's own revision; a copy's revision only seeds the incremental path
+        reused = self.reuse_duplicate(duplicate) if mode != "incremental" else None
+        seed = previous
+        if reused is None and mode != "incremental" and len(revision_chunks) > 1 and duplicate is not None:
+            candidate = self.revisions.get(revision_key(duplicate["url"], settings, route["model"]))
+            if worth_chunking(candidate, revision_chunks) and any(chunk["partial"] for chunk in candidate["chunks"]):
+                seed = candidate
+                mode = "incremental"
+                key = key and self.result_key(processed, settings, mode)
+        if reused is not None:
+            enhanced = reused
+        elif mode == "incremental":
+            enhanced = self.enhance_incremental(processed, revision_chunks, settings, seed)
+        elif mode == "mapReduce":
+            enhanced = self.enhance_map_reduce(processed, settings.get("chunkParallelism", 3))
+        else:
+            prompt = self.build_prompt(processed)
+            response_text = self.generate(prompt, json_generation_config(RESPONSE_SCHEMAS["document"],
+                                                                         route["generationConfig"]), route["model"])
+            with self.metrics.time("parse"):
+                enhanced = self.parse_response(response_text, processed)
+
+        enhanced["processingInfo"] = {**enhanced.get("processingInfo", {}),
+                                      "tokens": self.describe_token_usage(processed, mode),
+                                      "route": describe_route(route)}
+        if duplicate is not None:
+            enhanced["processingInfo"]["duplicateOf"] = {"url": duplicate["url"],
+                                                         "similarity": duplicate["similarity"],
+                                                         "reused": reused is not None}
+        if len(revision_chunks) > 1 and mode != "incremental" and previous is None:
+            self.revisions.set(revision_key(content["url"], settings, route["model"]),
+                               fingerprints_only(content["url"], revision_chunks))
+        if key is not None:
+            self.cache.set(key, enhanced)
+        if signature is not None:
+            self.duplicates.add(content["url"], signature, key, scope)
+        return self.post_process(enhanced, content, settings)
+
+    def result_key(self, processed: Dict, settings: Dict, mode: str) -> str:
+        route = processed["route"]
+        return cache_key(processed["promptContent"], {**settings, "mode": mode}, route["model"],
+                         route["generationConfig"])
+
+    def prepare(self, content: Dict, settings: Dict, model: Optional[str] = None) -> Dict:
+        with self.metrics.time("promptBuild"):
+            processed = self.prepare_content(content, settings, model)
+        # Optional local pre-summary: the model only sees the highest-ranked sentences
+        if settings.get("extractiveSummary") and processed["enhancementType"] == "summarize":
+            with self.metrics.time("extractive"):
+                processed = self.condense(processed, settings)
+        return processed
+
+    def prepare_content(self, content: Dict, settings: Dict, model: Optional[str] = None) -> Dict:
+        fitted = self.fit_content(content, settings.get("maxContentLength"), model)
+        return {
+            "originalContent": content,
+            "promptContent": fitted["text"],
+            "tokenUsage": {
+                "content": fitted["tokens"],
+                "budget": fitted["budget"],
+                "source": fitted["source"],
+                "originalContent": fitted["totalTokens"],
+                "keptBlocks": fitted["keptBlocks"],
+                "boilerplateBlocks": fitted["boilerplateBlocks"],
+                "trimmed": fitted["trimmed"],
+            },
+            "chunks": chunk_content(fitted["text"]),
+            "enhancementType": settings.get("enhancementType", "summarize"),
+            "pdfStyle": settings.get("pdfStyle", "academic"),
+            "includeImages": settings.get("includeImages", True),
+            "includeSources": settings.get("includeSources", True),
+            "metadata": {
+                "title": content.get("title"),
+                "url": content.get("url"),
+                "author": content.get("author"),
+                "publishedDate": content.get("publishedDate"),
+                "wordCount": content.get("wordCount"),
+                "readingTime": content.get("readingTime"),
+            },
+        }
+
+    def condense(self, processed: Dict, settings: Dict) -> Dict:
+        """Replace the fitted content with its TF-IDF/TextRank extract"""
+        summary = summarize(processed["promptContent"], ratio=settings.get("extractiveRatio", EXTRACTIVE_RATIO))
+        if not summary["applied"]:
+            return processed
+        return {
+            **processed,
+            "promptContent": summary["text"],
+            "chunks": chunk_content(summary["text"]),
+            "tokenUsage": {
+                **processed["tokenUsage"],
+                "content": summary["tokens"],
+                "extractive": {"fittedTokens": summary["originalTokens"], "sentences": summary["sentences"],
+                               "keptSentences": summary["keptSentences"]},
+            },
+        }
+
+    def fit_content(self, content: Dict, max_content_length: Optional[int] = None,
+                    model: Optional[str] = None) -> Dict:
+        """Fit the article into the model's input budget, confirming with countTokens near the limit"""
+        model = model or self.model
+        budget = PromptBudget(model, max_content_length)
+        fitted = {**budget.fit(content), "source": "estimate"}
+
+        # The local estimate can be off by ~10%; near the limit ask the API for the exact figure
+        if fitted["tokens"] >= budget.max_tokens * 0.9:
+            try:
+                counted = self.count_tokens(fitted["text"], model)
+            except GeminiError:
+                counted = None
+            if counted is not None and counted > budget.max_tokens:
+                scaled = int(fitted["budget"] * (budget.max_tokens / counted) * 0.95)
+                fitted = {**budget.fit(content, scaled), "source": "estimate"}
+            elif counted is not None:
+                fitted = {**fitted, "tokens": counted, "source": "countTokens"}
+        return fitted
+
+    def describe_token_usage(self, processed: Dict, mode: str) -> Dict:
+        # Prompt tokens = fitted content + the template around it
+        usage = dict(processed["tokenUsage"])
+        content = usage.pop("content")
+        template = self.build_prompt({**processed, "promptContent": ""}) if mode == "single" else ""
+        return {"prompt": content + estimate_tokens(template), "content": content, **usage}
+
+    def build_prompt(self, processed: Dict) -> str:
+        metadata = processed["metadata"]
+        enhancement_type = processed["enhancementType"]
+
+        prompt = f"""You are an AI content enhancer. Transform the following web content into a high-quality, enriched document.
+
+ORIGINAL CONTENT:
+Title: {metadata['title']}
+URL: {metadata['url']}
+Author: {metadata['author'] or 'Unknown'}
+Published: {metadata['publishedDate'] or 'Unknown'}
+
+Content:
+{processed.get('promptContent', processed['originalContent'].get('textContent', ''))}
+
+ENHANCEMENT REQUIREMENTS:
+- Enhancement Type: {enhancement_type}
+- PDF Style: {processed['pdfStyle']}
+- Include sources and citations: {str(processed['includeSources']).lower()}
+- Include images: {str(processed['includeImages']).lower()}
+
+Please provide your response in the following JSON format:
+{RESPONSE_FORMAT}"""
+
+        instruction = ENHANCEMENT_INSTRUCTIONS.get(enhancement_type)
+        return prompt + f"\n\n{instruction}" if instruction else prompt
+
+    def enhance_map_reduce(self, processed: Dict, parallelism: int = 3) -> Dict:
+        """Enhance chunks concurrently, then merge them with a small reduce pass"""
+        chunks = processed["chunks"]
+        partials = self.enhance_chunks(processed, chunks, range(len(chunks)), parallelism)
+        return self.merge_chunk_results(partials, self.reduce_partials(processed, partials), processed)
+
+    def enhance_incremental(self, processed: Dict, chunks: List[Dict], settings: Dict,
+                            previous: Optional[Dict] = None) -> Dict:
+        """Re-enhance only the chunks whose paragraphs changed since the last run for this URL
+
+        `previous` is this URL's stored revision, or its near-duplicate's on a first visit.
+        """
+        model = self.route_for(processed)["model"]
+        key = revision_key(processed["metadata"]["url"], settings, model)
+        previous = previous or {"chunks": [], "reduced": None}
+        # A first visit stored fingerprints only; those chunks are enhanced now
+        known = {chunk["id"]: chunk["partial"] for chunk in previous["chunks"] if chunk["partial"] is not None}
+        changed = [index for index, chunk in enumerate(chunks) if chunk["id"] not in known]
+
+        texts = [chunk["text"] for chunk in chunks]
+        fresh = dict(zip(changed, self.enhance_chunks(processed, texts, changed, settings.get("chunkParallelism", 3))))
+        partials = [fresh[index] if index in fresh else known[chunk["id"]] for index, chunk in enumerate(chunks)]
+
+        # The reduce pass only sees chunk summaries, so it is redone whenever any chunk changed
+        if not changed and len(previous["chunks"]) == len(chunks) and previous["reduced"]:
+            reduced = previous["reduced"]
+        else:
+            reduced = self.reduce_partials(processed, partials)
+
+        self.revisions.set(key, {
+            "url": processed["metadata"]["url"],
+            "chunks": [{"id": chunk["id"], "fingerprints": chunk["fingerprints"], "partial": partial}
+                       for chunk, partial in zip(chunks, partials)],
+            "reduced": reduced,
+        })
+        self.metrics.record("reusedChunks", len(chunks) - len(changed), "chunks")
+
+        enhanced = self.merge_chunk_results(partials, reduced, processed)
+        enhanced["processingInfo"].update(mode="incremental", incremental={
+            "chunks": len(chunks),
+            "reused": len(chunks) - len(changed),
+            "changed": len(changed),
+            "sentTokens": estimate_tokens("\n\n".join(texts[index] for index in changed)),
+        })
+        return enhanced
+
+    def reuse_duplicate(self, duplicate: Optional[Dict]) -> Optional[Dict]:
+        """The cached result of a near-identical document, if it is still in the cache"""
+        if (duplicate is None or duplicate["similarity"] < REUSE_THRESHOLD
+                or self.cache is None or not duplicate["result_key"]):
+            return None
+        return self.cache.get(duplicate["result_key"])
+
+    def enhance_chunks(self, processed: Dict, chunks: List[str], indices, parallelism: int = 3) -> List[Dict]:
+        """Partial results for chunks[index] for each index, at most `parallelism` requests in flight"""
+        route = self.route_for(processed)
+
+        def enhance_chunk(index):
+            text = self.generate(self.build_chunk_prompt(processed, chunks[index], index, len(chunks)),
+                                 json_generation_config(RESPONSE_SCHEMAS["chunk"], route["generationConfig"]),
+                                 route["model"])
+            return extract_json(text) or {"enhancedContent": text}
+
+        with ThreadPoolExecutor(max_workers=max(1, int(parallelism))) as executor:
+            return list(executor.map(enhance_chunk, indices))
+
+    def reduce_partials(self, processed: Dict, partials: List[Dict]) -> Optional[Dict]:
+        route = self.route_for(processed)
+        config = json_generation_config(RESPONSE_SCHEMAS["reduce"], route["generationConfig"])
+        try:
+            return extract_json(self.generate(self.build_reduce_prompt(processed, partials), config, route["model"]))
+        except GeminiError:
+            return None
+
+    def build_chunk_prompt(self, processed: Dict, chunk: str, index: int, total: int) -> str:
+        metadata = processed["metadata"]
+        enhancement_type = processed["enhancementType"]
+        return f"""You are an AI content enhancer. You are processing part {index + 1} of {total} of a longer document. Enhance only this part; other parts are handled separately and merged afterwards.
+
+DOCUMENT:
+Title: {metadata['title']}
+URL: {metadata['url']}
+
+PART {index + 1} OF {total}:
+{chunk}
+
+ENHANCEMENT REQUIREMENTS:
+- Enhancement Type: {enhancement_type}
+- Include sources and citations: {str(processed['includeSources']).lower()}
+
+Please provide your response in the following JSON format:
+{CHUNK_RESPONSE_FORMAT}
+
+{ENHANCEMENT_INSTRUCTIONS.get(enhancement_type, '')}""".strip()
+
+    def build_reduce_prompt(self, processed: Dict, partials: List[Dict]) -> str:
+        metadata = processed["metadata"]
+        sections = "\n".join(json.dumps({
+            "part": index + 1,
+            "summary": partial.get("summary", ""),
+            "keyPoints": partial.get("keyPoints", []),
+            "insights": partial.get("insights", ""),
+            "recommendations": partial.get("recommendations", ""),
+        }, ensure_ascii=False) for index, partial in enumerate(partials))
+
+        return f"""You are an AI content enhancer. A long document was enhanced in {len(partials)} parts. Merge the partial results below into a single coherent result for the whole document, removing duplicates.
+
+DOCUMENT:
+Title: {metadata['title']}
+URL: {metadata['url']}
+
+PARTIAL RESULTS (one JSON object per line):
+{sections}
+
+ENHANCEMENT REQUIREMENTS:
+- Enhancement Type: {processed['enhancementType']}
+
+Please provide your response in the following JSON format:
+{REDUCE_RESPONSE_FORMAT}"""
+
+    def merge_chunk_results(self, partials: List[Dict], reduced: Optional[Dict], processed: Dict) -> Dict:
+        """Stitch enhancedContent in chunk order and take merged fields from the reduce pass"""
+        reduced = reduced or {}
+
+        def join_field(field):
+            return "\n\n".join(str(partial[field]) for partial in partials if partial.get(field))
+
+        def unique(values, key=lambda value: value):
+            seen, result = set(), []
+            for value in values:
+                marker = json.dumps(key(value), sort_keys=True) if value else None
+                if marker is None or marker in seen:
+                    continue
+                seen.add(marker)
+                result.append(value)
+            return result
+
+        enhanced_content = join_field("enhancedContent")
+        word_count = len(enhanced_content.split())
+        return {
+            "title": reduced.get("title") or processed["originalContent"].get("title", ""),
+            "summary": reduced.get("summary") or join_field("summary"),
+            "enhancedContent": enhanced_content,
+            "keyPoints": reduced.get("keyPoints") or unique(p for partial in partials for p in partial.get("keyPoints") or []),
+            "sources": unique((s for partial in partials for s in partial.get("sources") or []),
+                              key=lambda source: source.get("url") or source.get("title") if isinstance(source, dict) else source),
+            "insights": reduced.get("insights") or join_field("insights"),
+            "recommendations": reduced.get("recommendations") or join_field("recommendations"),
+            "metadata": {
+                "wordCount": word_count,
+                "readingTime": math.ceil(word_count / 200),
+                "confidence": 0.9 if reduced else 0.8,
+            },
+            "processingInfo": {
+                "enhancedAt": datetime.now(timezone.utc).isoformat(),
+                "enhancementType": processed["enhancementType"],
+                "pdfStyle": processed["pdfStyle"],
+                "model": self.route_for(processed)["model"],
+                "mode": "mapReduce",
+                "chunks": len(partials),
+            },
+        }
+
+    def route_for(self, processed: Dict) -> Dict:
+        """The route chosen in enhance(), or the one this content would get"""
+        return processed.get("route") or self.router.route(processed["tokenUsage"]["content"],
+                                                           processed["enhancementType"])
+
+    def endpoint(self, method: str = "generateContent", model: Optional[str] = None) -> str:
+        return f"{self.base_url}/{model or self.model}:{method}"
+
+    def count_tokens(self, text: str, model: Optional[str] = None) -> int:
+        """Exact prompt size from the countTokens endpoint"""
+        def send(timeout):
+            return self.session.post(self.endpoint("countTokens", model), params={"key": self.api_key},
+                                     json={"contents": [{"parts": [{"text": text}]}]},
+                                     timeout=min(self.timeout, timeout))
+
+        try:
+            response = self.scheduler.execute(self.api_key, send)
+        except (requests.RequestException, SchedulerError) as e:
+            raise GeminiError(f"countTokens request failed: {e}") from e
+        if not response.ok:
+            raise GeminiError(f"countTokens failed: {response.reason}")
+        try:
+            return int(response.json()["totalTokens"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise GeminiError("countTokens returned no totalTokens") from e
+
+    def generate(self, prompt: str, generation_config: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        """Call generateContent and return the first candidate's text"""
+        body = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": generation_config or GENERATION_CONFIG,
+        }
+        self.metrics.record("promptBytes", len(json.dumps(body)), "chars")
+
+        def send(timeout):
+            # Timed per attempt, excluding time queued in the scheduler
+            started = time.perf_counter()
+            response = self.session.post(self.endpoint(model=model), params={"key": self.api_key},
+                                         json=body, timeout=min(self.timeout, timeout))
+            total = (time.perf_counter() - started) * 1000
+            # requests reads the whole body; `elapsed` stops at the response headers
+            elapsed = getattr(response, "elapsed", None)
+            ttfb = elapsed.total_seconds() * 1000 if elapsed is not None else total
+            self.metrics.record("ttfb", ttfb)
+            self.metrics.record("generation", max(0.0, total - ttfb))
+            return response
+
+        try:
+            response = self.scheduler.execute(self.api_key, send)
+        except (requests.RequestException, SchedulerError) as e:
+            raise GeminiError(f"Gemini API request failed: {e}") from e
+
+        if not response.ok:
+            try:
+                message = response.json().get("error", {}).get("message")
+            except ValueError:
+                message = None
+            raise GeminiError(f"Gemini API error: {message or response.reason}")
+
+        data = response.json()
+        try:
+            text = data["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            text = None
+        if not text:
+            raise GeminiError("No content generated by Gemini")
+        self.metrics.record("responseBytes", len(text), "chars")
+        return text
+
+    def parse_response(self, response_text: str, processed: Dict) -> Dict:
+        processing_info = {
+            "enhancedAt": datetime.now(timezone.utc).isoformat(),
+            "enhancementType": processed["enhancementType"],
+            "pdfStyle": processed["pdfStyle"],
+            "model": self.route_for(processed)["model"],
+        }
+
+        # JSON mode normally returns bare JSON; truncated or wrapped output is repaired
+        parsed = parse_json_response(response_text)
+        if parsed is not None:
+            value, repaired = parsed
+            return {
+                "title": processed["originalContent"].get("title", ""),
+                "summary": "",
+                "enhancedContent": "",
+                "keyPoints": [],
+                "sources": [],
+                "insights": "",
+                "recommendations": "",
+                **value,
+                "processingInfo": {**processing_info, "responseRepaired": repaired},
+            }
+
+        # Fallback if JSON parsing fails
+        words = response_text.split()
+        return {
+            "title": processed["originalContent"].get("title", ""),
+            "summary": response_text[:500] + "...",
+            "enhancedContent": response_text,
+            "keyPoints": [],
+            "sources": [],
+            "insights": "",
+            "recommendations": "",
+            "metadata": {
+                "wordCount": len(words),
+                "readingTime": math.ceil(len(words) / 200),
+                "confidence": 0.8,
+            },
+            "processingInfo": processing_info,
+        }
+
+    def post_process(self, enhanced: Dict, content: Dict, settings: Dict) -> Dict:
+        return {
+            **enhanced,
+            "originalUrl": content.get("url"),
+            "originalTitle": content.get("title"),
+            "images": content.get("images", []) if settings.get("includeImages", True) else [],
+            "links": content.get("links", []) if settings.get("includeSources", True) else [],
+        }
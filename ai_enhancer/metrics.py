@@ -0,0 +1,73 @@
+"""
+Pipeline timing and payload metrics
+
+Same model as PipelineMetrics in background.js: every named series keeps a
+bounded window of samples, summarised as count / p50 / p95 / max / mean plus a
+power-of-two histogram. Metric names match the extension's so reports from
+both sides can be compared directly.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+METRIC_WINDOW = 200
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, math.ceil(fraction * len(values)) - 1)]
+
+
+def histogram(values: List[float]) -> Dict[int, int]:
+    """Counts per power-of-two bucket, keyed by the bucket's upper bound"""
+    buckets: Dict[int, int] = {}
+    for value in values:
+        bound = 1 if value <= 1 else 2 ** math.ceil(math.log2(value))
+        buckets[bound] = buckets.get(bound, 0) + 1
+    return buckets
+
+
+class PipelineMetrics:
+    """Thread-safe sample windows for stage durations, sizes and token counts"""
+
+    def __init__(self, window: int = METRIC_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.series: Dict[str, Tuple[str, List[float]]] = {}
+
+    def record(self, name: str, value: float, unit: str = "ms") -> None:
+        with self.lock:
+            _, samples = self.series.setdefault(name, (unit, []))
+            samples.append(round(value, 2))
+            # Trimmed in batches so recording stays O(1) amortized
+            if len(samples) > self.window * 2:
+                del samples[:-self.window]
+
+    @contextmanager
+    def time(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    def summary(self) -> Dict[str, Dict]:
+        with self.lock:
+            series = {name: (unit, sorted(samples[-self.window:])) for name, (unit, samples) in self.series.items()}
+        return {
+            name: {
+                "unit": unit,
+                "count": len(values),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+                "max": values[-1],
+                "mean": round(sum(values) / len(values), 2),
+                "histogram": histogram(values),
+            }
+            for name, (unit, values) in series.items() if values
+        }
@@ -0,0 +1,139 @@
+"""
+PDF rendering with reportlab
+
+Lays out the same sections as PDFGenerator.createPDFTemplate in background.js
+and produces real PDF bytes.
+"""
+
+import io
+import re
+import time
+from datetime import datetime
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import ListFlowable, ListItem, Paragraph, SimpleDocTemplate, Spacer
+
+ACCENT = colors.HexColor("#667eea")
+HEADING = colors.HexColor("#2c3e50")
+MUTED = colors.HexColor("#666666")
+
+
+class PDFRenderer:
+    """Render enhanced content dictionaries to PDF bytes"""
+
+    def __init__(self, page_size=A4, margin: float = inch):
+        self.page_size = page_size
+        self.margin = margin
+        self.styles = self.build_styles()
+
+    def build_styles(self) -> Dict[str, ParagraphStyle]:
+        base = getSampleStyleSheet()
+        return {
+            "title": ParagraphStyle("PdfTitle", parent=base["Title"], fontSize=24, leading=30,
+                                    textColor=HEADING, alignment=TA_CENTER, spaceAfter=12),
+            "meta": ParagraphStyle("PdfMeta", parent=base["Normal"], fontSize=9, textColor=MUTED,
+                                   alignment=TA_CENTER),
+            "heading": ParagraphStyle("PdfHeading", parent=base["Heading2"], fontSize=16, leading=20,
+                                      textColor=HEADING, spaceBefore=18, spaceAfter=8),
+            "body": ParagraphStyle("PdfBody", parent=base["BodyText"], fontSize=11, leading=16,
+                                   alignment=TA_JUSTIFY, spaceAfter=8),
+            "footer": ParagraphStyle("PdfFooter", parent=base["Normal"], fontSize=9, textColor=MUTED,
+                                     alignment=TA_CENTER, spaceBefore=24),
+        }
+
+    def render(self, enhanced: Dict, settings: Dict) -> bytes:
+        """Build the PDF document and return its bytes"""
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=self.page_size,
+                                leftMargin=self.margin, rightMargin=self.margin,
+                                topMargin=self.margin, bottomMargin=self.margin,
+                                title=enhanced.get("title") or "Enhanced Content",
+                                author="AI Content-to-PDF Enhancer")
+        doc.build(self.build_story(enhanced, settings))
+        return buffer.getvalue()
+
+    def build_story(self, enhanced: Dict, settings: Dict) -> List:
+        styles = self.styles
+        story = [
+            Paragraph(escape(enhanced.get("title") or "Untitled"), styles["title"]),
+            Paragraph(f"<b>Source:</b> {escape(enhanced.get('originalUrl') or 'Unknown')}", styles["meta"]),
+            Paragraph(f"<b>Enhanced:</b> {self.format_date(enhanced)} &nbsp; "
+                      f"<b>Reading Time:</b> {(enhanced.get('metadata') or {}).get('readingTime', 'Unknown')} minutes",
+                      styles["meta"]),
+            Spacer(1, 18),
+        ]
+
+        if enhanced.get("summary"):
+            story += self.section("Summary", [escape(enhanced["summary"])])
+
+        story += self.section("Enhanced Content", self.format_content(enhanced.get("enhancedContent") or ""))
+
+        if enhanced.get("keyPoints"):
+            story.append(Paragraph("Key Points", styles["heading"]))
+            story.append(self.bullet_list([escape(str(point)) for point in enhanced["keyPoints"]]))
+
+        if enhanced.get("insights"):
+            story += self.section("Insights &amp; Analysis", [escape(str(enhanced["insights"]))])
+
+        if enhanced.get("recommendations"):
+            story += self.section("Recommendations", [escape(str(enhanced["recommendations"]))])
+
+        if enhanced.get("sources"):
+            story.append(Paragraph("Sources &amp; References", styles["heading"]))
+            story.append(self.bullet_list([self.format_source(source) for source in enhanced["sources"]]))
+
+        story.append(Paragraph(f"Generated by AI Content-to-PDF Enhancer | {datetime.now():%Y-%m-%d}",
+                               styles["footer"]))
+        return story
+
+    def section(self, heading: str, paragraphs: List[str]) -> List:
+        return [Paragraph(heading, self.styles["heading"])] + [
+            Paragraph(text, self.styles["body"]) for text in paragraphs if text
+        ]
+
+    def bullet_list(self, items: List[str]) -> ListFlowable:
+        return ListFlowable([ListItem(Paragraph(item, self.styles["body"])) for item in items],
+                            bulletType="bullet", leftIndent=18)
+
+    def format_source(self, source) -> str:
+        if not isinstance(source, dict):
+            return escape(str(source))
+        url = escape(source.get("url") or "")
+        parts = [f"<b>{escape(source.get('title') or '')}</b>"]
+        if url:
+            parts.append(f'<link href="{url}" color="#667eea">{url}</link>')
+        if source.get("relevance"):
+            parts.append(f"<i>{escape(source['relevance'])}</i>")
+        return "<br/>".join(parts)
+
+    def format_content(self, content: str) -> List[str]:
+        """Convert the markdown-like enhancedContent into reportlab paragraph markup"""
+        paragraphs = []
+        for block in re.split(r"\n\s*\n", str(content)):
+            block = escape(block.strip())
+            if not block:
+                continue
+            block = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", block)
+            block = re.sub(r"\*(.+?)\*", r"<i>\1</i>", block)
+            paragraphs.append(block.replace("\n", "<br/>"))
+        return paragraphs
+
+    def format_date(self, enhanced: Dict) -> str:
+        enhanced_at = (enhanced.get("processingInfo") or {}).get("enhancedAt")
+        if enhanced_at:
+            try:
+                return datetime.fromisoformat(enhanced_at.replace("Z", "+00:00")).strftime("%Y-%m-%d")
+            except ValueError:
+                pass
+        return datetime.now().strftime("%Y-%m-%d")
+
+    def generate_filename(self, title: str) -> str:
+        """Same naming scheme as PDFGenerator.generateFilename"""
+        sanitized = re.sub(r"\s+", "_", re.sub(r"[^a-zA-Z0-9\s]", "", title or "")).strip("_")
+        return f"enhanced_{sanitized or 'document'}_{int(time.time() * 1000)}.pdf"
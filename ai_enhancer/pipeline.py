@@ -0,0 +1,234 @@
+"""
+Batch pipeline running extract -> enhance -> render over a URL list
+
+Each stage has its own bounded queue and worker pool so slow Gemini calls
+never block extraction or rendering. Progress is appended to a JSONL
+checkpoint so an interrupted run resumes without re-spending API calls.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from .metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("extract", "enhance", "render")
+
+DEFAULT_WORKERS = {
+    "extract": 8,
+    "enhance": 4,
+    "render": 2,
+}
+
+# Stage durations use the extension's metric names
+STAGE_METRICS = {
+    "extract": "extraction",
+    "enhance": "enhance",
+    "render": "render",
+}
+
+_STOP = object()
+
+
+def job_key(url: str) -> str:
+    """Stable short identifier for a URL, used for checkpoint and cache files"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+
+def settings_hash(settings: Dict) -> str:
+    """Short hash of the run settings; checkpoint entries are only reused under the same hash"""
+    material = json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()[:16]
+
+
+class Checkpoint:
+    """Append-only JSONL log of the last completed stage per URL"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict]:
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted run
+                    continue
+                records[record["url"]] = record
+        return records
+
+    def record(self, url: str, stage: str, **fields) -> None:
+        entry = {
+            "url": url,
+            "stage": stage,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            **fields,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class BatchPipeline:
+    """Process many URLs through bounded per-stage worker pools"""
+
+    def __init__(self, extractor, client, renderer, output_dir: str, settings: Dict,
+                 workers: Optional[Dict[str, int]] = None, queue_size: int = 64,
+                 checkpoint_path: Optional[str] = None, metrics: Optional[PipelineMetrics] = None):
+        self.extractor = extractor
+        self.client = client
+        self.renderer = renderer
+        self.output_dir = output_dir
+        self.settings = settings
+        self.settings_hash = settings_hash(settings)
+        self.workers = {**DEFAULT_WORKERS, **(workers or {})}
+        self.queue_size = queue_size
+        self.enhanced_dir = os.path.join(output_dir, ".enhanced")
+        self.checkpoint = Checkpoint(checkpoint_path or os.path.join(output_dir, "checkpoint.jsonl"))
+        # Shared with the client so Gemini timings land in the same report
+        self.metrics = metrics or getattr(client, "metrics", None) or PipelineMetrics()
+
+        self.lock = threading.Lock()
+        self.results: List[Dict] = []
+        self.finished_workers: Dict[str, int] = {}
+
+    def run(self, urls: Iterable[str]) -> Dict:
+        """Process every URL and return a summary of the run"""
+        os.makedirs(self.enhanced_dir, exist_ok=True)
+        started = time.monotonic()
+
+        self.results = []
+        self.finished_workers = {stage: 0 for stage in STAGES}
+        queues = {stage: queue.Queue(maxsize=self.queue_size) for stage in STAGES}
+
+        threads = []
+        for index, stage in enumerate(STAGES):
+            outbox = queues[STAGES[index + 1]] if index + 1 < len(STAGES) else None
+            for n in range(self.workers[stage]):
+                thread = threading.Thread(target=self.worker, args=(stage, queues[stage], outbox),
+                                          name=f"{stage}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        previous = self.checkpoint.load()
+        skipped = 0
+        seen = set()
+        for url in urls:
+            url = url.strip()
+            if not url or url.startswith("#") or url in seen:
+                continue
+            seen.add(url)
+
+            job = {"url": url, "key": job_key(url)}
+            record = previous.get(url, {})
+            # Work checkpointed under other settings (or before hashes were recorded) is redone
+            if record.get("settings_hash") != self.settings_hash:
+                record = {}
+            if record.get("stage") == "done" and os.path.exists(record.get("pdf_path", "")):
+                skipped += 1
+                continue
+            if record.get("stage") == "enhanced" and self.load_enhanced(job):
+                queues["render"].put(job)
+            else:
+                queues["extract"].put(job)
+
+        for _ in range(self.workers["extract"]):
+            queues["extract"].put(_STOP)
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.monotonic() - started
+        done = sum(1 for result in self.results if result["stage"] == "done")
+        summary = {
+            "total": len(seen),
+            "done": done,
+            "failed": len(self.results) - done,
+            "skipped": skipped,
+            "elapsed": round(elapsed, 3),
+            "docs_per_minute": round(done / elapsed * 60, 1) if elapsed > 0 else 0.0,
+            "metrics": self.metrics.summary(),
+            "results": self.results,
+        }
+        logger.info("Batch complete: %d done, %d failed, %d skipped in %.1fs",
+                    summary["done"], summary["failed"], skipped, elapsed)
+        return summary
+
+    def worker(self, stage: str, inbox: queue.Queue, outbox: Optional[queue.Queue]) -> None:
+        handler = getattr(self, stage)
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+            try:
+                with self.metrics.time(STAGE_METRICS[stage]):
+                    job = handler(job)
+            except Exception as e:
+                logger.warning("%s failed for %s: %s", stage, job["url"], e)
+                self.finish(job, "failed", failed_stage=stage, error=str(e))
+                continue
+            if outbox is not None:
+                outbox.put(job)
+
+        # The last worker out of a stage tells the next stage to stop
+        with self.lock:
+            self.finished_workers[stage] += 1
+            last = self.finished_workers[stage] == self.workers[stage]
+        if last and outbox is not None:
+            next_stage = STAGES[STAGES.index(stage) + 1]
+            for _ in range(self.workers[next_stage]):
+                outbox.put(_STOP)
+
+    def extract(self, job: Dict) -> Dict:
+        job["content"] = self.extractor.extract(job["url"])
+        return job
+
+    def enhance(self, job: Dict) -> Dict:
+        enhanced = self.client.enhance(job.pop("content"), self.settings)
+        path = os.path.join(self.enhanced_dir, f"{job['key']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(enhanced, f, ensure_ascii=False)
+        job["enhanced"] = enhanced
+        self.checkpoint.record(job["url"], "enhanced", key=job["key"], settings_hash=self.settings_hash)
+        return job
+
+    def render(self, job: Dict) -> Dict:
+        enhanced = job.pop("enhanced")
+        pdf_bytes = self.renderer.render(enhanced, self.settings)
+        filename = f"{job['key']}_{self.renderer.generate_filename(enhanced.get('title') or '')}"
+        pdf_path = os.path.join(self.output_dir, filename)
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+        self.metrics.record("pdfBytes", len(pdf_bytes), "bytes")
+        self.finish(job, "done", pdf_path=pdf_path, size=len(pdf_bytes))
+        return job
+
+    def load_enhanced(self, job: Dict) -> bool:
+        path = os.path.join(self.enhanced_dir, f"{job['key']}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                job["enhanced"] = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def finish(self, job: Dict, stage: str, **fields) -> None:
+        self.checkpoint.record(job["url"], stage, key=job["key"], settings_hash=self.settings_hash, **fields)
+        with self.lock:
+            self.results.append({"url": job["url"], "stage": stage, **fields})
@@ -0,0 +1,91 @@
+"""
+Paragraph fingerprints for incremental re-enhancement
+
+Same scheme as ContentRevisions in background.js. The fitted prompt text is
+split into paragraphs and each one is fingerprinted. Paragraphs are grouped
+into chunks at content-defined boundaries, so an edit, insertion or deletion
+only changes the chunk around it. The first enhancement of a page is a normal
+request that only stores its fingerprints. From the next run on, every chunk's
+enhanced result is stored per URL, and a re-run only sends the chunks whose
+fingerprints changed.
+"""
+
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional
+
+from .cache import normalize_text
+
+CHUNK_MIN = 1000
+CHUNK_MAX = 4000
+BOUNDARY_MASK = 0x3
+REVISION_TTL = 30 * 24 * 60 * 60
+
+
+def split_paragraphs(text: str) -> List[str]:
+    return [paragraph.strip() for paragraph in re.split(r"\n\s*\n", text or "") if paragraph.strip()]
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_paragraphs(text: str, max_size: int = CHUNK_MAX, min_size: int = CHUNK_MIN) -> List[Dict]:
+    """[{id, fingerprints, text}] in document order"""
+    groups, current = [], None
+    for paragraph in split_paragraphs(text):
+        if current and current["size"] + len(paragraph) > max_size:
+            groups.append(current)
+            current = None
+        current = current or {"paragraphs": [], "fingerprints": [], "size": 0}
+        mark = fingerprint(normalize_text(paragraph))
+        current["paragraphs"].append(paragraph)
+        current["fingerprints"].append(mark)
+        current["size"] += len(paragraph) + 2
+
+        # The boundary depends only on the paragraph itself, so chunks re-align right after a change
+        if current["size"] >= min_size and int(mark[:8], 16) & BOUNDARY_MASK == 0:
+            groups.append(current)
+            current = None
+    if current:
+        groups.append(current)
+
+    return [{
+        "id": fingerprint(":".join(group["fingerprints"])),
+        "fingerprints": group["fingerprints"],
+        "text": "\n\n".join(group["paragraphs"]),
+    } for group in groups]
+
+
+def fingerprints_only(url: str, chunks: List[Dict]) -> Dict:
+    """The revision recorded on a first visit: chunk fingerprints without results"""
+    return {
+        "url": url,
+        "chunks": [{"id": chunk["id"], "fingerprints": chunk["fingerprints"], "partial": None} for chunk in chunks],
+        "reduced": None,
+    }
+
+
+def worth_chunking(previous: Optional[Dict], chunks: List[Dict]) -> bool:
+    """Use the chunked path only for a page seen before
+
+    Stored chunk results make it cheap. With fingerprints only, it is worth it
+    once the page has changed, which stores the results for the runs after.
+    An unchanged page stays a normal request, which the response cache answers.
+    """
+    if previous is None:
+        return False
+    return (any(chunk["partial"] is not None for chunk in previous["chunks"])
+            or [chunk["id"] for chunk in previous["chunks"]] != [chunk["id"] for chunk in chunks])
+
+
+def revision_key(url: str, settings: Dict, model: str) -> str:
+    # Chunk results depend on the enhancement type and sources flag, not on the PDF style
+    material = json.dumps({
+        "url": url,
+        "enhancementType": settings.get("enhancementType"),
+        "includeSources": bool(settings.get("includeSources", True)),
+        "model": model,
+    }, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
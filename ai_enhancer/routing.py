@@ -0,0 +1,63 @@
+"""
+Model routing from one config
+
+Same table and rules as ModelRouter in background.js. Both read
+chrome-extension/models.json, so the extension and the Python tooling pick
+models from one place. Routes are tried in order; the first one whose
+enhancement types, latency/cost budget and input-token range all match sets
+the model and its generation config (merged over the table's defaults).
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+ROUTES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "chrome-extension", "models.json")
+BUDGETS = ("economy", "balanced", "quality")
+
+
+def load_routes(path: Optional[str] = None) -> Dict:
+    with open(path or ROUTES_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+ROUTING = load_routes()
+DEFAULT_MODEL = ROUTING["defaultModel"]
+GENERATION_CONFIG = ROUTING["generationConfig"]
+
+
+def matches(route: Dict, input_tokens: int, enhancement_type: str, budget: str) -> bool:
+    return (enhancement_type in route.get("enhancementTypes", [enhancement_type])
+            and budget in route.get("budgets", [budget])
+            and input_tokens >= route.get("minInputTokens", 0)
+            and input_tokens <= route.get("maxInputTokens", input_tokens))
+
+
+class ModelRouter:
+    """Pick the model and generation config for a request"""
+
+    def __init__(self, table: Optional[Dict] = None, pinned_model: Optional[str] = None):
+        self.table = table or ROUTING
+        # An explicitly chosen model bypasses the routes but keeps the default generation config
+        self.pinned_model = pinned_model
+
+    @property
+    def default_model(self) -> str:
+        return self.pinned_model or self.table["defaultModel"]
+
+    def route(self, input_tokens: int, enhancement_type: str, budget: Optional[str] = None) -> Dict:
+        budget = budget if budget in BUDGETS else self.table.get("defaultBudget", "balanced")
+        chosen = {"name": "default", "model": self.table["defaultModel"]}
+        if self.pinned_model:
+            chosen = {"name": "pinned", "model": self.pinned_model}
+        else:
+            chosen = next((route for route in self.table["routes"]
+                           if matches(route, input_tokens, enhancement_type, budget)), chosen)
+        return {
+            "name": chosen["name"],
+            "model": chosen["model"],
+            "budget": budget,
+            "inputTokens": input_tokens,
+            "generationConfig": {**self.table["generationConfig"], **chosen.get("generationConfig", {})},
+        }
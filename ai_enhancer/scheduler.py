@@ -0,0 +1,237 @@
+"""
+Rate-limit aware request scheduler for the Gemini API
+
+Python counterpart of GeminiRequestScheduler in background.js: per-key token
+bucket, concurrency cap, retries with full-jitter exponential backoff that
+honour Retry-After, per-request deadlines and a circuit breaker.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+import requests
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SchedulerError(Exception):
+    """Base class for requests the scheduler gave up on"""
+
+
+class DeadlineExceeded(SchedulerError):
+    """The request could not complete before its deadline"""
+
+
+class CircuitOpenError(SchedulerError):
+    """The circuit breaker is open after repeated failures"""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self) -> None:
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; one trial request after `cooldown`"""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def check(self) -> bool:
+        """Raise while open; return True when the caller was let through as the half-open trial"""
+        with self.lock:
+            if self.state != "open":
+                return False
+            if self.clock() - self.opened_at < self.cooldown or self.trial_in_flight:
+                raise CircuitOpenError("Gemini API is temporarily unavailable after repeated failures")
+            # Half-open: let a single trial request through
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = self.clock()
+                self.trial_in_flight = False
+
+
+class RequestScheduler:
+    """Shared gatekeeper for every Gemini call made by a process"""
+
+    def __init__(self, requests_per_minute: float = 60, burst: Optional[int] = None,
+                 max_concurrent: int = 4, max_retries: int = 4, base_delay: float = 1.0,
+                 max_delay: float = 30.0, deadline: float = 120.0, failure_threshold: int = 5,
+                 cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst or max(1, int(requests_per_minute // 6))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.clock = clock
+        self.sleep = sleep
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown, clock)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0, "rejected": 0}
+
+    def bucket(self, api_key: str) -> TokenBucket:
+        with self.lock:
+            if api_key not in self.buckets:
+                self.buckets[api_key] = TokenBucket(self.requests_per_minute / 60.0, self.burst, self.clock)
+            return self.buckets[api_key]
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.stats[name] += 1
+
+    def execute(self, api_key: str, send: Callable[[float], requests.Response],
+                deadline: Optional[float] = None) -> requests.Response:
+        """Run send(timeout) under rate limiting, retries and the circuit breaker
+
+        Non-retryable responses are returned as-is. After the last retry the
+        final retryable response is returned too, so callers can report the
+        API's own error message.
+        """
+        deadline_at = self.clock() + (deadline or self.deadline)
+        trial = self.check_circuit()
+
+        # The half-open trial must end in a success or a failure, whichever way execute exits,
+        # or the breaker would reject every later request
+        try:
+            retry = 0
+            while True:
+                self.acquire_token(api_key, deadline_at)
+                remaining = deadline_at - self.clock()
+                if remaining <= 0 or not self.slots.acquire(timeout=remaining):
+                    self.count("failures")
+                    raise DeadlineExceeded("Gemini request deadline exceeded while queued")
+
+                response, failure = None, None
+                self.count("requests")
+                try:
+                    response = send(max(0.001, deadline_at - self.clock()))
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    failure = e
+                finally:
+                    self.slots.release()
+
+                if response is not None and response.status_code not in RETRYABLE_STATUSES:
+                    self.breaker.record_success()
+                    trial = False
+                    return response
+
+                self.breaker.record_failure()
+                trial = False
+                delay = self.backoff_delay(retry)
+                if response is not None:
+                    if response.status_code == 429:
+                        self.count("throttled")
+                    retry_after = self.retry_after_delay(response)
+                    delay = delay if retry_after is None else retry_after
+
+                if retry >= self.max_retries or self.clock() + delay >= deadline_at:
+                    if response is not None:
+                        return response
+                    self.count("failures")
+                    if isinstance(failure, requests.Timeout) or self.clock() >= deadline_at:
+                        raise DeadlineExceeded(f"Gemini request deadline exceeded: {failure}") from failure
+                    raise failure
+
+                self.count("retries")
+                self.sleep(delay)
+                retry += 1
+                trial = self.check_circuit()
+        finally:
+            if trial:
+                self.breaker.record_failure()
+
+    def check_circuit(self) -> bool:
+        try:
+            return self.breaker.check()
+        except CircuitOpenError:
+            self.count("rejected")
+            raise
+
+    def acquire_token(self, api_key: str, deadline_at: float) -> None:
+        bucket = self.bucket(api_key)
+        wait = bucket.reserve()
+        if wait <= 0:
+            return
+        if self.clock() + wait >= deadline_at:
+            bucket.refund()
+            self.count("failures")
+            raise DeadlineExceeded("Gemini request deadline exceeded while rate limited")
+        self.sleep(wait)
+
+    def backoff_delay(self, retry: int) -> float:
+        """Full jitter: uniform between 0 and the exponential cap"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def retry_after_delay(self, response: requests.Response) -> Optional[float]:
+        header = response.headers.get("Retry-After") if response.headers else None
+        if header:
+            try:
+                return min(max(0.0, float(header)), self.max_delay)
+            except ValueError:
+                try:
+                    return min(max(0.0, parsedate_to_datetime(header).timestamp() - time.time()), self.max_delay)
+                except (TypeError, ValueError):
+                    pass
+
+        # Gemini also reports google.rpc.RetryInfo in the error body, e.g. "retryDelay": "17s"
+        try:
+            details = response.json().get("error", {}).get("details", [])
+        except (ValueError, AttributeError):
+            return None
+        for detail in details:
+            if isinstance(detail, dict) and detail.get("retryDelay"):
+                try:
+                    return min(float(str(detail["retryDelay"]).rstrip("s")), self.max_delay)
+                except ValueError:
+                    return None
+        return None
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {**self.stats, "circuit": self.breaker.state}
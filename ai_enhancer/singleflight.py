@@ -0,0 +1,60 @@
+"""
+Single-flight coalescing of identical requests
+
+Python counterpart of SingleFlight in background.js. A thread asking for a key
+that is already in flight waits for that call and gets its result, or its
+exception, instead of starting its own. Worker threads cannot be interrupted,
+so unlike the extension there is no cancellation: the call always runs to
+completion for the threads waiting on it.
+"""
+
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+
+def flight_key(content: Dict, settings: Dict) -> str:
+    """Hash the extracted page and the settings; the extraction timestamp is left out"""
+    material = json.dumps({
+        "content": {name: value for name, value in content.items() if name != "extractedAt"},
+        "settings": settings,
+    }, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Run one call per key at a time and share its outcome with concurrent callers"""
+
+    def __init__(self):
+        self.flights: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.stats = {"started": 0, "coalesced": 0}
+
+    def run(self, key: str, work: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another thread's call was joined"""
+        with self.lock:
+            future = self.flights.get(key)
+            if future is None:
+                future = self.flights[key] = Future()
+                self.stats["started"] += 1
+                leader = True
+            else:
+                self.stats["coalesced"] += 1
+                leader = False
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(work())
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self.lock:
+                del self.flights[key]
+        return future.result(), False
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {**self.stats, "inFlight": len(self.flights)}
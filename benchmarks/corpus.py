@@ -0,0 +1,161 @@
+"""
+Saved HTML corpus for the benchmarks
+
+The pages in benchmarks/corpus/ were written by build_page() with fixed
+seeds and are committed so every run measures identical input. They mimic
+real article pages: navigation, share bars, inline scripts, ads, sidebars
+and footers around the article body. Regenerate with:
+
+    python -m benchmarks.corpus
+"""
+
+import os
+import random
+from html import escape
+from typing import Dict, List
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+WORDS = """
+analysis approach architecture average balance batch browser budget cache capacity change
+client cluster compression concurrency content context cost data dataset decision default
+delay deployment design developer document effect engine error estimate evaluation event
+experiment extraction failure feature field format framework function generation graph
+growth hardware history impact index input insight interface iteration kernel language
+latency layer layout library limit load market memory method metric migration model
+network number operation optimization output overhead page parser pattern performance
+pipeline platform policy practice prediction pressure process profile program prompt
+protocol quality query queue rate reader record region release report request research
+resource response result review risk runtime sample scale schedule schema search server
+service session signal size source speed stage storage strategy stream structure study
+summary system table target task team test thread throughput time token tool traffic
+trend usage user value variance version window worker workload
+""".split()
+VERBS = """
+improves reduces increases measures changes supports affects limits explains shows
+drives replaces extends shapes tracks predicts balances exposes hides delays
+""".split()
+CJK = "数据模型性能系统网络内存延迟吞吐请求响应文档内容分析结果方法研究用户服务缓存队列"
+
+# name -> spec; sizes are approximate and grow with the section count
+PAGES: Dict[str, Dict] = {
+    "short-news": {"seed": 1, "sections": 2, "paragraphs": 4, "topic": "Cache latency report"},
+    "blog-post": {"seed": 2, "sections": 6, "paragraphs": 5, "topic": "Scaling a queue worker"},
+    "docs-page": {"seed": 3, "sections": 8, "paragraphs": 3, "topic": "Stream protocol reference",
+                  "code": True, "tables": True},
+    "link-heavy": {"seed": 4, "sections": 3, "paragraphs": 2, "topic": "Weekly research links",
+                   "links": 12},
+    "cjk-article": {"seed": 5, "sections": 4, "paragraphs": 4, "topic": "模型性能分析", "cjk": True},
+    "longform": {"seed": 6, "sections": 30, "paragraphs": 7, "topic": "Memory pressure study",
+                 "code": True, "tables": True},
+}
+
+
+def sentence(rng: random.Random, topic: List[str]) -> str:
+    words = [rng.choice(topic if rng.random() < 0.15 else WORDS) for _ in range(rng.randint(6, 18))]
+    words.insert(rng.randint(1, len(words) - 1), rng.choice(VERBS))
+    if rng.random() < 0.4:
+        words.insert(rng.randint(1, len(words) - 1), f"{rng.randint(2, 990)}%,")
+    text = " ".join(words)
+    return text[0].upper() + text[1:] + rng.choice(".....?!")
+
+
+def cjk_sentence(rng: random.Random) -> str:
+    return "".join(rng.choice(CJK) for _ in range(rng.randint(12, 40))) + "。"
+
+
+def paragraph(rng: random.Random, spec: Dict, topic: List[str]) -> str:
+    if spec.get("cjk"):
+        return "".join(cjk_sentence(rng) for _ in range(rng.randint(3, 7)))
+    return " ".join(sentence(rng, topic) for _ in range(rng.randint(3, 8)))
+
+
+def boilerplate(rng: random.Random) -> Dict[str, str]:
+    nav = "".join(f'<li><a href="/section/{word}">{word.title()}</a></li>' for word in rng.sample(WORDS, 12))
+    script = "window.dataLayer=window.dataLayer||[];" + "".join(
+        f'dataLayer.push({{"event":"{rng.choice(WORDS)}","value":{rng.random():.6f}}});' for _ in range(60))
+    sidebar = "".join(f'<li><a href="/post/{n}">{escape(sentence(rng, WORDS))}</a></li>' for n in range(10))
+    footer = "".join(f'<a href="/legal/{word}">{word.title()}</a> ' for word in rng.sample(WORDS, 15))
+    return {"nav": nav, "script": script, "sidebar": sidebar, "footer": footer}
+
+
+def build_page(name: str) -> str:
+    """Deterministic HTML for one corpus page"""
+    spec = PAGES[name]
+    rng = random.Random(spec["seed"])
+    topic = spec["topic"].lower().split()
+    chrome = boilerplate(rng)
+    lang = "zh" if spec.get("cjk") else "en"
+
+    body = [f"<h1>{escape(spec['topic'])}</h1>",
+            '<div class="share">Share this: <a href="#tw">Twitter</a> <a href="#fb">Facebook</a></div>']
+    for section in range(spec["sections"]):
+        heading = cjk_sentence(rng)[:8] if spec.get("cjk") else sentence(rng, topic).rstrip(".?!")
+        body.append(f"<h2>{escape(heading)}</h2>")
+        for n in range(spec["paragraphs"]):
+            body.append(f"<p>{escape(paragraph(rng, spec, topic))}</p>")
+            if section % 3 == 1 and n == 0:
+                body.append('<div class="advertisement">Advertisement<script>loadAd()</script></div>')
+        if spec.get("links"):
+            body.append("<ul>" + "".join(
+                f'<li><a href="https://example.org/{section}/{n}">{escape(sentence(rng, topic))}</a> '
+                f"{escape(sentence(rng, topic))}</li>"
+                for n in range(spec["links"])) + "</ul>")
+        if spec.get("code") and section % 2 == 0:
+            lines = "\n".join(f"    {rng.choice(WORDS)} = {rng.choice(WORDS)}({rng.randint(1, 64)})"
+                              for _ in range(rng.randint(6, 14)))
+            body.append(f"<pre><code>def {rng.choice(WORDS)}():\n{lines}</code></pre>")
+        if spec.get("tables") and section % 3 == 0:
+            rows = "".join(f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 9999)}</td>"
+                           f"<td>{rng.random():.3f}</td></tr>" for _ in range(rng.randint(4, 10)))
+            body.append(f"<table><tr><th>Name</th><th>Count</th><th>Ratio</th></tr>{rows}</table>")
+        if section % 4 == 0:
+            body.append(f'<figure><img src="/images/{name}-{section}.png" alt="{escape(heading)}">'
+                        f"<figcaption>{escape(heading)}</figcaption></figure>")
+    body.append('<p class="newsletter">Subscribe to our newsletter for weekly updates.</p>')
+
+    return f"""<!DOCTYPE html>
+<html lang="{lang}"><head>
+<meta charset="utf-8">
+<title>{escape(spec['topic'])} | Example Tech</title>
+<meta name="author" content="Example Author">
+<meta property="og:site_name" content="Example Tech">
+<link rel="canonical" href="https://example.com/{name}">
+<script>{chrome['script']}</script>
+<style>body{{font-family:sans-serif}}.advertisement{{min-height:250px}}</style>
+</head><body>
+<header><nav><ul>{chrome['nav']}</ul></nav></header>
+<main>
+<article class="post-content">
+{chr(10).join(body)}
+</article>
+<aside class="sidebar"><h3>Popular</h3><ul>{chrome['sidebar']}</ul></aside>
+</main>
+<section class="comments"><h3>Comments</h3><p>{escape(sentence(rng, WORDS))}</p></section>
+<footer>{chrome['footer']}<p>Copyright Example Tech. All rights reserved.</p></footer>
+</body></html>
+"""
+
+
+def load_corpus(directory: str = CORPUS_DIR) -> Dict[str, str]:
+    """name -> saved HTML, in file name order"""
+    pages = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".html"):
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                pages[filename[:-5]] = f.read()
+    return pages
+
+
+def main() -> int:
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    for name in PAGES:
+        html = build_page(name)
+        with open(os.path.join(CORPUS_DIR, f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        print(f"{name}.html: {len(html.encode('utf-8')) / 1024:.1f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
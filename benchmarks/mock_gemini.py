@@ -0,0 +1,199 @@
+"""
+Local stand-in for the Gemini REST API
+
+Serves generateContent, streamGenerateContent (SSE) and countTokens on
+127.0.0.1 with a configurable latency model and seeded error injection, so
+benchmarks and tests exercise the real HTTP, retry and parsing paths without
+an API key. Corpus pages can be served from /pages/<name> for extraction.
+
+    with MockGeminiServer(latency=0.2, error_rate=0.05) as server:
+        client = GeminiClient("test-key", base_url=server.base_url)
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from ai_enhancer.budget import estimate_tokens
+
+ROUTE = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent|countTokens)$")
+
+
+class MockGeminiServer:
+    """Threaded HTTP server mimicking the Gemini endpoints the project calls
+
+    latency        seconds before the response headers (time to first byte)
+    token_latency  seconds per generated output token, spread over the stream
+    error_rate     fraction of generate calls answered with error_status
+    output_ratio   output tokens per prompt token, capped at max_output_tokens
+    """
+
+    def __init__(self, latency: float = 0.05, token_latency: float = 0.0002, error_rate: float = 0.0,
+                 error_status: int = 503, retry_after: float = 0.05, output_ratio: float = 0.25,
+                 max_output_tokens: int = 2048, stream_chunks: int = 8, seed: int = 0,
+                 pages: Optional[Dict[str, str]] = None, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.output_ratio = output_ratio
+        self.max_output_tokens = max_output_tokens
+        self.stream_chunks = stream_chunks
+        self.pages = pages or {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "streams": 0, "pages": 0, "in_flight": 0, "max_in_flight": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """Value for GeminiClient(base_url=...)"""
+        return f"{self.url}/v1beta/models"
+
+    def page_url(self, name: str, copy: int = 0) -> str:
+        # Distinct URLs for the same page keep checkpoints and caches from deduplicating copies
+        return f"{self.url}/pages/{name}?copy={copy}"
+
+    def start(self) -> "MockGeminiServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="mock-gemini", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockGeminiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += amount
+            if name == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return dict(self.stats)
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def generate_text(self, prompt: str) -> str:
+        """A schema-shaped JSON document whose size follows the prompt size"""
+        title = re.search(r"^Title: (.*)$", prompt, re.M)
+        words = max(20, int(estimate_tokens(prompt) * self.output_ratio * 0.75))
+        words = min(words, int(self.max_output_tokens * 0.75))
+        body = " ".join(f"word{n % 97}" for n in range(words))
+        return json.dumps({
+            "title": title.group(1) if title else "Enhanced document",
+            "summary": "Summary of the enhanced document.",
+            "enhancedContent": f"## Overview\n\n{body}",
+            "keyPoints": ["First point", "Second point", "Third point"],
+            "sources": [{"title": "Example source", "url": "https://example.org", "relevance": "Reference"}],
+            "insights": "Insights.",
+            "recommendations": "Recommendations.",
+            "metadata": {"wordCount": words, "readingTime": max(1, words // 200), "confidence": 0.9},
+        })
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                name = path[len("/pages/"):] if path.startswith("/pages/") else None
+                if name not in server.pages:
+                    return self.send_json(404, {"error": {"code": 404, "message": "Not found"}})
+                server.count("pages")
+                self.send_body(200, server.pages[name].encode("utf-8"), "text/html; charset=utf-8")
+
+            def do_POST(self):
+                route = ROUTE.match(urlsplit(self.path).path)
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self.send_json(400, {"error": {"code": 400, "message": "Invalid JSON payload"}})
+                if not route:
+                    return self.send_json(404, {"error": {"code": 404, "message": "Unknown method"}})
+
+                prompt = "".join(part.get("text", "") for content in body.get("contents", [])
+                                 for part in content.get("parts", []))
+                if route.group("method") == "countTokens":
+                    return self.send_json(200, {"totalTokens": estimate_tokens(prompt)})
+
+                server.count("requests")
+                server.count("in_flight")
+                try:
+                    self.generate(route.group("method"), prompt)
+                finally:
+                    server.count("in_flight", -1)
+
+            def generate(self, method, prompt):
+                time.sleep(server.latency)
+                if server.should_fail():
+                    server.count("errors")
+                    status = server.error_status
+                    return self.send_json(status, {"error": {"code": status, "message": "Mock overload"}},
+                                          {"Retry-After": str(server.retry_after)})
+
+                text = server.generate_text(prompt)
+                generation_time = estimate_tokens(text) * server.token_latency
+                if method == "generateContent":
+                    time.sleep(generation_time)
+                    return self.send_json(200, self.candidate(text))
+
+                # SSE: headers now, then the text in evenly spaced chunks
+                server.count("streams")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                size = max(1, -(-len(text) // server.stream_chunks))
+                for start in range(0, len(text), size):
+                    time.sleep(generation_time / server.stream_chunks)
+                    event = f"data: {json.dumps(self.candidate(text[start:start + size]))}\r\n\r\n".encode("utf-8")
+                    self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            @staticmethod
+            def candidate(text):
+                return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+            def send_json(self, status, payload, headers=None):
+                self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+            def send_body(self, status, data, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
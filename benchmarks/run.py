@@ -0,0 +1,287 @@
+"""
+Offline benchmark runner: python -m benchmarks.run -o results.json
+
+Runs the saved corpus through the real extractor, prompt budget, Gemini
+client (against MockGeminiServer) and PDF renderer, then the batch pipeline
+at several concurrency levels. Results are written as JSON tagged with the
+git commit so runs can be compared:
+
+    python -m benchmarks.run -o after.json --baseline before.json
+    python -m benchmarks.run --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import requests
+
+from ai_enhancer.budget import estimate_tokens
+from ai_enhancer.chunking import chunk_content
+from ai_enhancer.config import extension_settings, load_config
+from ai_enhancer.extractor import ContentExtractor
+from ai_enhancer.gemini import GeminiClient
+from ai_enhancer.metrics import PipelineMetrics
+from ai_enhancer.pdf import PDFRenderer
+from ai_enhancer.pipeline import BatchPipeline
+from ai_enhancer.scheduler import RequestScheduler
+
+from .corpus import CORPUS_DIR, load_corpus
+from .mock_gemini import MockGeminiServer
+
+RESULTS_SCHEMA = 1
+API_KEY = "benchmark-key"
+
+PROFILES = {
+    "default": {"repeats": 5, "latency": 0.2, "token_latency": 0.0005, "error_rate": 0.02,
+                "concurrency": [1, 4, 8], "copies": 4},
+    # Fast enough for CI or a pre-commit check
+    "quick": {"repeats": 1, "latency": 0.01, "token_latency": 0.0, "error_rate": 0.02,
+              "concurrency": [1, 4], "copies": 2},
+}
+
+
+def git_revision() -> Dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def compact(summary: Dict) -> Dict:
+    # Histograms are only useful for the live extension view
+    return {name: {key: value for key, value in stats.items() if key != "histogram"}
+            for name, stats in summary.items()}
+
+
+def peak_kb(work) -> int:
+    """Peak Python heap allocated while running work()"""
+    tracemalloc.start()
+    try:
+        work()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def make_client(server: MockGeminiServer, max_concurrent: int = 4) -> GeminiClient:
+    # Retry-After from the mock keeps backoff short; the rate limit is effectively off
+    scheduler = RequestScheduler(requests_per_minute=1e6, max_concurrent=max_concurrent,
+                                 base_delay=0.05, max_delay=1.0, deadline=60, failure_threshold=50)
+    return GeminiClient(API_KEY, base_url=server.base_url, scheduler=scheduler, timeout=60)
+
+
+def stream_once(server: MockGeminiServer, prompt: str, metrics: PipelineMetrics) -> None:
+    """Time to first SSE event and to the end of the stream"""
+    started = time.perf_counter()
+    body = {"contents": [{"parts": [{"text": prompt}]}]}
+    with requests.post(f"{server.base_url}/bench:streamGenerateContent", params={"alt": "sse", "key": API_KEY},
+                       json=body, stream=True, timeout=60) as response:
+        first = None
+        for line in response.iter_lines():
+            if first is None and line.startswith(b"data:"):
+                first = time.perf_counter()
+                metrics.record("streamTtfb", (first - started) * 1000)
+    metrics.record("streamTotal", (time.perf_counter() - started) * 1000)
+
+
+def bench_page(name: str, html: str, server: MockGeminiServer, settings: Dict, repeats: int) -> Dict:
+    url = f"https://example.com/{name}"
+    extractor, renderer = ContentExtractor(), PDFRenderer()
+    client = make_client(server)
+    metrics = client.metrics
+    metrics.record("pageBytes", len(html.encode("utf-8")), "bytes")
+
+    content = None
+    for _ in range(repeats):
+        with metrics.time("extraction"):
+            content = extractor.extract(url, html=html)
+        with metrics.time("chunking"):
+            chunks = chunk_content(content["textContent"])
+        metrics.record("chunks", len(chunks), "chunks")
+
+    processed = client.prepare_content(content, settings)
+    prompt = client.build_prompt(processed)
+    metrics.record("promptChars", len(prompt), "chars")
+    metrics.record("promptEstimatedTokens", estimate_tokens(prompt), "tokens")
+
+    for _ in range(repeats):
+        with metrics.time("endToEnd"):
+            enhanced = client.enhance(content, settings)
+            with metrics.time("render"):
+                pdf = renderer.render(enhanced, settings)
+        metrics.record("pdfBytes", len(pdf), "bytes")
+        stream_once(server, prompt, metrics)
+
+    metrics.record("extractionPeakKb", peak_kb(lambda: extractor.extract(url, html=html)), "KB")
+    metrics.record("endToEndPeakKb", peak_kb(lambda: renderer.render(client.enhance(content, settings), settings)), "KB")
+    return {"words": content["wordCount"], "metrics": compact(metrics.summary())}
+
+
+def bench_throughput(server: MockGeminiServer, names: List[str], settings: Dict, concurrency: int,
+                     copies: int) -> Dict:
+    """Whole corpus through the batch pipeline, pages fetched over HTTP from the mock server"""
+    client = make_client(server, max_concurrent=concurrency)
+    urls = [server.page_url(name, copy) for copy in range(copies) for name in names]
+    before = server.get_stats()
+    with tempfile.TemporaryDirectory() as output:
+        pipeline = BatchPipeline(ContentExtractor(), client, PDFRenderer(), output, settings,
+                                 workers={"extract": concurrency, "enhance": concurrency, "render": 2})
+        summary = pipeline.run(urls)
+    after = server.get_stats()
+    return {
+        "concurrency": concurrency,
+        "documents": summary["total"],
+        "done": summary["done"],
+        "failed": summary["failed"],
+        "elapsed": summary["elapsed"],
+        "docs_per_minute": summary["docs_per_minute"],
+        "injected_errors": after["errors"] - before["errors"],
+        "max_in_flight": after["max_in_flight"],
+        "scheduler": client.scheduler.get_stats(),
+        "metrics": compact(summary["metrics"]),
+    }
+
+
+def run(profile: Dict, corpus_dir: str = CORPUS_DIR, pages: Optional[List[str]] = None,
+        progress=None) -> Dict:
+    """Run every benchmark and return the results document"""
+    corpus = load_corpus(corpus_dir)
+    if pages:
+        corpus = {name: html for name, html in corpus.items() if name in pages}
+    settings = extension_settings(load_config())
+    progress = progress or (lambda message: None)
+
+    results = {
+        "schema": RESULTS_SCHEMA,
+        **git_revision(),
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "profile": profile,
+        "pages": {},
+        "throughput": [],
+    }
+
+    # Single-document runs see no injected errors, so latencies are comparable across commits
+    with MockGeminiServer(latency=profile["latency"], token_latency=profile["token_latency"]) as server:
+        for name, html in corpus.items():
+            progress(f"page {name}")
+            results["pages"][name] = bench_page(name, html, server, settings, profile["repeats"])
+
+    with MockGeminiServer(latency=profile["latency"], token_latency=profile["token_latency"],
+                          error_rate=profile["error_rate"], pages=corpus) as server:
+        for concurrency in profile["concurrency"]:
+            progress(f"throughput x{concurrency}")
+            results["throughput"].append(bench_throughput(server, list(corpus), settings, concurrency,
+                                                          profile["copies"]))
+
+    results["maxRssKb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+
+def comparable(results: Dict) -> Dict[str, float]:
+    """Flatten the figures worth comparing: medians, peaks and throughput"""
+    values = {}
+    for name, page in results.get("pages", {}).items():
+        for metric, stats in page["metrics"].items():
+            values[f"pages.{name}.{metric}.p50"] = stats["p50"]
+    for entry in results.get("throughput", []):
+        values[f"throughput.x{entry['concurrency']}.docs_per_minute"] = entry["docs_per_minute"]
+    return values
+
+
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """Per-figure change; positive `regression` means worse (slower, larger, fewer docs/min)"""
+    old, new = comparable(baseline), comparable(current)
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        if not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        rows.append({
+            "metric": key,
+            "baseline": old[key],
+            "current": new[key],
+            "change_pct": round(change, 1),
+            "regression_pct": round(-change if key.endswith("docs_per_minute") else change, 1),
+        })
+    return rows
+
+
+def print_comparison(rows: List[Dict], threshold: float) -> int:
+    regressions = 0
+    for row in rows:
+        flag = ""
+        if row["regression_pct"] > threshold:
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"{row['metric']:<60} {row['baseline']:>12} {row['current']:>12} {row['change_pct']:>+8.1f}%{flag}")
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description="Offline pipeline benchmarks")
+    parser.add_argument("-o", "--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="default")
+    parser.add_argument("--pages", nargs="+", metavar="NAME", help="Only these corpus pages")
+    parser.add_argument("--repeats", type=int, help="Override the profile's repeats per page")
+    parser.add_argument("--latency", type=float, help="Mock time to first byte in seconds")
+    parser.add_argument("--error-rate", type=float, help="Mock error rate for the throughput runs")
+    parser.add_argument("--concurrency", type=int, nargs="+", help="Pipeline concurrency levels")
+    parser.add_argument("--baseline", help="Compare the new results against this results file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Only compare two existing results files")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Regression threshold in percent for a non-zero exit (default: 10)")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], "r", encoding="utf-8") as f:
+            current = json.load(f)
+        return 1 if print_comparison(compare(baseline, current), args.threshold) else 0
+
+    profile = dict(PROFILES[args.profile])
+    for key in ("repeats", "latency", "error_rate", "concurrency"):
+        if getattr(args, key) is not None:
+            profile[key] = getattr(args, key)
+
+    results = run(profile, pages=args.pages, progress=lambda message: print(f"… {message}", file=sys.stderr))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            return 1 if print_comparison(compare(json.load(f), results), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
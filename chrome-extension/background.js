@@ -1,421 +1,3364 @@
 // Background service worker for AI processing and PDF generation
 // Includes PDF generator functionality directly
 
-// PDF Generator class
-class PDFGenerator {
-    constructor() {
-        this.setupLogging();
+// Structured output: Gemini returns bare JSON matching these schemas (no prose or code fences)
+const RESPONSE_PROPERTIES = {
+    title: { type: 'STRING' },
+    summary: { type: 'STRING' },
+    enhancedContent: { type: 'STRING' },
+    keyPoints: { type: 'ARRAY', items: { type: 'STRING' } },
+    sources: {
+        type: 'ARRAY',
+        items: {
+            type: 'OBJECT',
+            properties: { title: { type: 'STRING' }, url: { type: 'STRING' }, relevance: { type: 'STRING' } },
+            required: ['title']
+        }
+    },
+    insights: { type: 'STRING' },
+    recommendations: { type: 'STRING' },
+    metadata: {
+        type: 'OBJECT',
+        properties: { wordCount: { type: 'INTEGER' }, readingTime: { type: 'INTEGER' }, confidence: { type: 'NUMBER' } }
     }
+};
+const RESPONSE_SCHEMAS = {
+    // propertyOrdering keeps title and summary first so streamed sections arrive early
+    document: ['title', 'summary', 'keyPoints', 'enhancedContent', 'insights', 'recommendations', 'sources', 'metadata'],
+    chunk: ['summary', 'keyPoints', 'enhancedContent', 'insights', 'recommendations', 'sources'],
+    reduce: ['title', 'summary', 'keyPoints', 'insights', 'recommendations']
+};
+for (const [name, fields] of Object.entries(RESPONSE_SCHEMAS)) {
+    RESPONSE_SCHEMAS[name] = {
+        type: 'OBJECT',
+        properties: Object.fromEntries(fields.map(field => [field, RESPONSE_PROPERTIES[field]])),
+        required: fields.filter(field => field !== 'metadata' && field !== 'sources'),
+        propertyOrdering: fields
+    };
+}
 
-    async generatePDF(enhancedContent, settings) {
-        this.logInfo('Starting PDF generation', { 
-            title: enhancedContent.title,
-            wordCount: enhancedContent.metadata?.wordCount 
-        });
+// Model routing: the model and generation config of every request come from models.json,
+// the table shared with the Python tooling. Routes are tried in order; the first whose
+// enhancement types, latency/cost budget and input-token range all match is used.
+const MODEL_ROUTES_FILE = 'models.json';
+const ROUTING_BUDGETS = ['economy', 'balanced', 'quality'];
 
-        try {
-            // Create HTML template for PDF
-            const htmlContent = this.createPDFTemplate(enhancedContent, settings);
-            
-            // Generate PDF using Chrome's printing API
-            const pdfData = await this.generatePDFData(htmlContent);
-            
-            this.logInfo('PDF generation completed', { 
-                size: pdfData.length,
-                filename: this.generateFilename(enhancedContent.title)
+class ModelRouter {
+    constructor(url = chrome.runtime.getURL(MODEL_ROUTES_FILE)) {
+        this.url = url;
+        this.table = null;
+    }
+
+    async load() {
+        // Packaged with the extension, so it is read once per service worker lifetime
+        if (!this.table) {
+            this.table = fetch(this.url).then(response => response.json()).catch((error) => {
+                this.table = null;
+                throw error;
             });
-            
-            return {
-                pdfData: pdfData,
-                filename: this.generateFilename(enhancedContent.title),
-                size: pdfData.length
-            };
-            
-        } catch (error) {
-            this.logError('PDF generation failed', error);
-            throw error;
         }
+        return this.table;
     }
 
-    createPDFTemplate(enhancedContent, settings) {
-        const { pdfStyle } = settings;
-        
-        return `
-        <div class="pdf-container">
-            <header class="pdf-header">
-                <h1 class="title">${this.escapeHtml(enhancedContent.title)}</h1>
-                <div class="metadata">
-                    <p><strong>Source:</strong> ${this.escapeHtml(enhancedContent.originalUrl || 'Unknown')}</p>
-                    <p><strong>Enhanced:</strong> ${new Date(enhancedContent.processingInfo?.enhancedAt || Date.now()).toLocaleDateString()}</p>
-                    <p><strong>Reading Time:</strong> ${enhancedContent.metadata?.readingTime || 'Unknown'} minutes</p>
-                </div>
-            </header>
-            
-            <main class="pdf-content">
-                ${enhancedContent.summary ? `
-                    <section class="summary">
-                        <h2>Summary</h2>
-                        <p>${this.escapeHtml(enhancedContent.summary)}</p>
-                    </section>
-                ` : ''}
-                
-                <section class="enhanced-content">
-                    <h2>Enhanced Content</h2>
-                    <div class="content-body">
-                        ${this.formatContentForPDF(enhancedContent.enhancedContent)}
-                    </div>
-                </section>
-                
-                ${enhancedContent.keyPoints && enhancedContent.keyPoints.length > 0 ? `
-                    <section class="key-points">
-                        <h2>Key Points</h2>
-                        <ul>
-                            ${enhancedContent.keyPoints.map(point => `<li>${this.escapeHtml(point)}</li>`).join('')}
-                        </ul>
-                    </section>
-                ` : ''}
-                
-                ${enhancedContent.insights ? `
-                    <section class="insights">
-                        <h2>Insights & Analysis</h2>
-                        <p>${this.escapeHtml(enhancedContent.insights)}</p>
-                    </section>
-                ` : ''}
-                
-                ${enhancedContent.recommendations ? `
-                    <section class="recommendations">
-                        <h2>Recommendations</h2>
-                        <p>${this.escapeHtml(enhancedContent.recommendations)}</p>
-                    </section>
-                ` : ''}
-                
-                ${enhancedContent.sources && enhancedContent.sources.length > 0 ? `
-                    <section class="sources">
-                        <h2>Sources & References</h2>
-                        <ul>
-                            ${enhancedContent.sources.map(source => `
-                                <li>
-                                    <strong>${this.escapeHtml(source.title)}</strong><br>
-                                    <a href="${this.escapeHtml(source.url)}">${this.escapeHtml(source.url)}</a><br>
-                                    <em>${this.escapeHtml(source.relevance)}</em>
-                                </li>
-                            `).join('')}
-                        </ul>
-                    </section>
-                ` : ''}
-            </main>
-            
-            <footer class="pdf-footer">
-                <p>Generated by AI Content-to-PDF Enhancer | ${new Date().toLocaleDateString()}</p>
-            </footer>
-        </div>`;
+    matches(route, inputTokens, enhancementType, budget) {
+        return (route.enhancementTypes || [enhancementType]).includes(enhancementType)
+            && (route.budgets || [budget]).includes(budget)
+            && inputTokens >= (route.minInputTokens ?? 0)
+            && inputTokens <= (route.maxInputTokens ?? inputTokens);
     }
 
-    async generatePDFData(htmlContent) {
-        try {
-            // Create a complete HTML document with proper styling for PDF
-            const fullHtmlDocument = `
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Enhanced Content PDF</title>
-    <style>
-        @media print {
-            body { margin: 0; padding: 20px; }
-            .page-break { page-break-before: always; }
-            .no-print { display: none; }
+    async route(inputTokens, enhancementType, budget) {
+        const table = await this.load();
+        budget = ROUTING_BUDGETS.includes(budget) ? budget : table.defaultBudget || 'balanced';
+        const chosen = table.routes.find(route => this.matches(route, inputTokens, enhancementType, budget))
+            || { name: 'default', model: table.defaultModel };
+        return this.describe(table, chosen, { budget, inputTokens });
+    }
+
+    async defaultRoute() {
+        const table = await this.load();
+        return this.describe(table, { name: 'default', model: table.defaultModel }, {});
+    }
+
+    describe(table, route, extra) {
+        return {
+            name: route.name,
+            model: route.model,
+            endpoint: `${table.apiBase}/${route.model}`,
+            generationConfig: { ...table.generationConfig, ...route.generationConfig },
+            ...extra
+        };
+    }
+}
+
+// Capped log shared by the worker's classes; trimmed in batches so appending stays
+// O(1) amortized. With a storageKey the entries are also persisted in debounced
+// writes. The worker is the only writer of those keys (pages send their entries
+// here), so concurrent contexts cannot overwrite each other.
+class LogBuffer {
+    constructor(options = {}) {
+        this.maxLogs = options.maxLogs || 500;
+        this.storageKey = options.storageKey || null;
+        this.flushDelay = options.flushDelay ?? 1000;
+        this.entries = [];
+        this.flushTimer = null;
+        this.ready = this.storageKey ? this.load() : Promise.resolve();
+        if (this.storageKey && chrome.runtime?.onSuspend) {
+            chrome.runtime.onSuspend.addListener(() => this.flush());
         }
-        
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
+    }
+
+    async load() {
+        const result = await chrome.storage.local.get([this.storageKey]);
+        const stored = Array.isArray(result[this.storageKey]) ? result[this.storageKey] : [];
+        this.entries = [...stored, ...this.entries]; // entries added while loading go last
+        this.trim();
+    }
+
+    add(entry) {
+        this.entries.push(entry);
+        if (this.entries.length > this.maxLogs * 2) {
+            this.trim();
         }
-        
-        .pdf-container {
-            max-width: 800px;
-            margin: 0 auto;
+        if (this.storageKey && !this.flushTimer) {
+            this.flushTimer = setTimeout(() => this.flush(), this.flushDelay);
         }
-        
-        .pdf-header {
-            border-bottom: 3px solid #667eea;
-            padding-bottom: 30px;
-            margin-bottom: 40px;
-            text-align: center;
+    }
+
+    async flush() {
+        clearTimeout(this.flushTimer);
+        this.flushTimer = null;
+        await this.ready;
+        this.trim();
+        await chrome.storage.local.set({ [this.storageKey]: this.entries });
+    }
+
+    trim() {
+        if (this.entries.length > this.maxLogs) {
+            this.entries.splice(0, this.entries.length - this.maxLogs);
         }
-        
-        .title {
-            font-size: 32px;
-            color: #2c3e50;
-            margin-bottom: 20px;
-            font-weight: 700;
+    }
+
+    toArray() {
+        return this.entries.slice(-this.maxLogs);
+    }
+}
+
+// Offscreen document manager: the service worker has no Blob URLs or DOM, so
+// binary PDF rendering and extraction of fetched pages happen in offscreen.html
+class OffscreenDocument {
+    constructor(path = 'offscreen.html') {
+        this.path = path;
+        this.creating = null;
+    }
+
+    isSupported() {
+        return typeof chrome !== 'undefined' && !!chrome.offscreen;
+    }
+
+    async ensure() {
+        const documentUrl = chrome.runtime.getURL(this.path);
+        if (chrome.runtime.getContexts) {
+            const contexts = await chrome.runtime.getContexts({
+                contextTypes: ['OFFSCREEN_DOCUMENT'],
+                documentUrls: [documentUrl]
+            });
+            if (contexts.length > 0) {
+                return;
+            }
         }
-        
-        .metadata {
-            font-size: 14px;
-            color: #666;
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 10px;
-            max-width: 600px;
-            margin: 0 auto;
+
+        // Only one offscreen document may exist; concurrent callers share the creation
+        if (!this.creating) {
+            this.creating = chrome.offscreen.createDocument({
+                url: this.path,
+                reasons: ['BLOBS', 'DOM_PARSER'],
+                justification: 'Render PDFs as Blobs for chrome.downloads and parse fetched article HTML with DOMParser'
+            }).catch(error => {
+                if (!/single offscreen/i.test(error.message || '')) {
+                    throw error;
+                }
+            }).finally(() => {
+                this.creating = null;
+            });
         }
-        
-        .metadata p {
-            margin: 5px 0;
+        await this.creating;
+    }
+
+    async send(action, payload = {}) {
+        await this.ensure();
+        const response = await chrome.runtime.sendMessage({ target: 'offscreen', action, ...payload });
+        if (!response || !response.success) {
+            throw new Error(response?.error || `Offscreen ${action} failed`);
         }
-        
-        .pdf-content section {
-            margin-bottom: 40px;
-            page-break-inside: avoid;
+        return response;
+    }
+}
+
+// Single-pass markdown to HTML renderer for the enhanced content.
+// Lines are tokenized once as they arrive (write() may be fed streamed chunks),
+// inline markup is resolved with a delimiter stack, and text is HTML-escaped on
+// the way into a single output buffer.
+const MARKDOWN_ESCAPES = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+const MARKDOWN_ESCAPE_PATTERN = /[&<>"']/g;
+
+class MarkdownRenderer {
+    constructor(options = {}) {
+        // '#' maps to <h(1 + headingOffset)>; PDF content sits below the template's h1/h2
+        this.headingOffset = options.headingOffset ?? 2;
+        this.out = [];
+        this.pending = '';
+        this.block = null;      // 'p' | 'list' | 'code' | 'table' | 'quote'
+        this.lists = [];        // open list stack: { indent, tag }
+        this.tableHeader = null;
+    }
+
+    render(content) {
+        return this.write(String(content || '')) + this.end();
+    }
+
+    // Feed a chunk; returns the HTML for every block line completed so far
+    write(chunk) {
+        this.pending += chunk;
+        let start = 0;
+        let newline;
+        while ((newline = this.pending.indexOf('\n', start)) !== -1) {
+            this.line(this.pending.slice(start, newline));
+            start = newline + 1;
         }
-        
-        .pdf-content h2 {
-            font-size: 24px;
-            color: #2c3e50;
-            margin-bottom: 20px;
-            border-left: 5px solid #667eea;
-            padding-left: 20px;
-            font-weight: 600;
+        this.pending = this.pending.slice(start);
+        return this.drain();
+    }
+
+    // Flush the trailing partial line and close any open block
+    end() {
+        if (this.pending) {
+            this.line(this.pending);
+            this.pending = '';
         }
-        
-        .pdf-content h3 {
-            font-size: 20px;
-            color: #34495e;
-            margin: 25px 0 15px 0;
-            font-weight: 600;
+        this.closeBlock();
+        return this.drain();
+    }
+
+    drain() {
+        const html = this.out.join('');
+        this.out = [];
+        return html;
+    }
+
+    line(raw) {
+        const line = raw.endsWith('\r') ? raw.slice(0, -1) : raw;
+        const trimmed = line.trim();
+
+        if (this.block === 'code') {
+            if (trimmed.startsWith('```')) {
+                this.closeBlock();
+            } else {
+                this.out.push(this.escape(line), '\n');
+            }
+            return;
         }
-        
-        .pdf-content p {
-            margin-bottom: 18px;
-            text-align: justify;
-            font-size: 16px;
+
+        if (!trimmed) {
+            this.closeBlock();
+            return;
         }
-        
-        .pdf-content ul, .pdf-content ol {
-            margin: 20px 0;
-            padding-left: 40px;
+
+        if (trimmed.startsWith('```')) {
+            this.closeBlock();
+            const language = trimmed.slice(3).trim().replace(/[^\w-]/g, '');
+            this.out.push(language ? `<pre><code class="language-${language}">` : '<pre><code>');
+            this.block = 'code';
+            return;
         }
-        
-        .pdf-content li {
-            margin-bottom: 10px;
-            font-size: 16px;
+
+        const heading = /^(#{1,6})\s+(.*?)\s*#*$/.exec(trimmed);
+        if (heading) {
+            this.closeBlock();
+            const level = Math.min(6, heading[1].length + this.headingOffset);
+            this.out.push(`<h${level}>`);
+            this.inline(heading[2]);
+            this.out.push(`</h${level}>`);
+            return;
         }
-        
-        .pdf-content a {
-            color: #667eea;
-            text-decoration: none;
-            border-bottom: 1px solid transparent;
-            transition: border-bottom 0.3s ease;
+
+        if (/^([-*_])(\s*\1){2,}$/.test(trimmed)) {
+            this.closeBlock();
+            this.out.push('<hr>');
+            return;
         }
-        
-        .pdf-content a:hover {
-            border-bottom-color: #667eea;
+
+        const item = /^(\s*)([-*+]|\d{1,9}[.)])\s+(.*)$/.exec(line);
+        if (item) {
+            this.listItem(item[1].replace(/\t/g, '    ').length, item[2], item[3]);
+            return;
         }
-        
-        .summary {
-            background: #f8f9fa;
-            padding: 25px;
-            border-radius: 10px;
-            border-left: 5px solid #28a745;
+
+        if (trimmed.startsWith('|')) {
+            this.tableRow(trimmed);
+            return;
         }
-        
-        .key-points {
-            background: #e8f4fd;
-            padding: 25px;
-            border-radius: 10px;
-            border-left: 5px solid #17a2b8;
+
+        if (trimmed.startsWith('>')) {
+            if (this.block !== 'quote') {
+                this.closeBlock();
+                this.out.push('<blockquote><p>');
+                this.block = 'quote';
+            } else {
+                this.out.push('<br>');
+            }
+            this.inline(trimmed.replace(/^>\s?/, ''));
+            return;
         }
-        
-        .insights {
-            background: #fff3cd;
-            padding: 25px;
-            border-radius: 10px;
-            border-left: 5px solid #ffc107;
+
+        if (this.block === 'list') {
+            // Continuation of the current list item
+            this.out.push(' ');
+            this.inline(trimmed);
+            return;
         }
-        
-        .recommendations {
-            background: #d4edda;
-            padding: 25px;
-            border-radius: 10px;
-            border-left: 5px solid #28a745;
+
+        if (this.block === 'p') {
+            this.out.push('<br>');
+        } else {
+            this.closeBlock();
+            this.out.push('<p>');
+            this.block = 'p';
         }
-        
-        .sources {
-            background: #f8f9fa;
-            padding: 25px;
-            border-radius: 10px;
-            border: 1px solid #dee2e6;
+        this.inline(trimmed);
+    }
+
+    listItem(indent, marker, text) {
+        const ordered = /\d/.test(marker);
+        const tag = ordered ? 'ol' : 'ul';
+        if (this.block !== 'list') {
+            this.closeBlock();
+            this.block = 'list';
         }
-        
-        .sources ul {
-            list-style: none;
-            padding-left: 0;
+
+        while (this.lists.length > 1 && indent < this.lists[this.lists.length - 1].indent) {
+            this.out.push(`</li></${this.lists.pop().tag}>`);
         }
-        
-        .sources li {
-            margin-bottom: 20px;
-            padding: 15px;
-            background: white;
-            border-radius: 8px;
-            border-left: 3px solid #667eea;
+
+        const current = this.lists[this.lists.length - 1];
+        const openTag = ordered && parseInt(marker, 10) !== 1 ? `<ol start="${parseInt(marker, 10)}">` : `<${tag}>`;
+        if (!current || indent > current.indent) {
+            // First item, or a nested list inside the open <li>
+            this.out.push(openTag);
+            this.lists.push({ indent, tag });
+        } else if (current.tag !== tag) {
+            this.out.push(`</li></${current.tag}>`, openTag);
+            current.tag = tag;
+        } else {
+            this.out.push('</li>');
         }
-        
-        .source-title {
-            font-weight: 600;
-            color: #2c3e50;
-            margin-bottom: 5px;
+
+        this.out.push('<li>');
+        this.inline(text);
+    }
+
+    tableRow(trimmed) {
+        const cells = this.splitCells(trimmed);
+        const isSeparator = cells.length > 0 && cells.every(cell => /^:?-+:?$/.test(cell));
+
+        if (this.block !== 'table') {
+            this.closeBlock();
+            this.block = 'table';
+            this.tableHeader = cells;
+            return;
         }
-        
-        .source-url {
-            color: #667eea;
-            font-size: 14px;
-            margin-bottom: 8px;
-            word-break: break-all;
+
+        if (this.tableHeader) {
+            const header = this.tableHeader;
+            this.tableHeader = null;
+            if (isSeparator) {
+                this.out.push('<table><thead>');
+                this.row(header, 'th');
+                this.out.push('</thead><tbody>');
+                return;
+            }
+            this.out.push('<table><tbody>');
+            this.row(header, 'td');
         }
-        
-        .source-relevance {
-            font-style: italic;
-            color: #666;
-            font-size: 14px;
+
+        if (!isSeparator) {
+            this.row(cells, 'td');
         }
-        
-        .pdf-footer {
-            border-top: 2px solid #dee2e6;
-            padding-top: 30px;
-            margin-top: 50px;
-            text-align: center;
-            color: #666;
-            font-size: 14px;
+    }
+
+    splitCells(trimmed) {
+        const cells = [];
+        let cell = '';
+        for (let i = trimmed.startsWith('|') ? 1 : 0; i < trimmed.length; i++) {
+            const char = trimmed[i];
+            if (char === '\\' && trimmed[i + 1] === '|') {
+                cell += '|';
+                i++;
+            } else if (char === '|') {
+                cells.push(cell.trim());
+                cell = '';
+            } else {
+                cell += char;
+            }
         }
-        
-        @media print {
-            .pdf-container {
-                max-width: none;
-                padding: 20px;
+        if (cell.trim()) {
+            cells.push(cell.trim());
+        }
+        return cells;
+    }
+
+    row(cells, tag) {
+        this.out.push('<tr>');
+        for (const cell of cells) {
+            this.out.push(`<${tag}>`);
+            this.inline(cell);
+            this.out.push(`</${tag}>`);
+        }
+        this.out.push('</tr>');
+    }
+
+    closeBlock() {
+        switch (this.block) {
+            case 'p':
+                this.out.push('</p>');
+                break;
+            case 'quote':
+                this.out.push('</p></blockquote>');
+                break;
+            case 'code':
+                this.out.push('</code></pre>');
+                break;
+            case 'list':
+                while (this.lists.length > 0) {
+                    this.out.push(`</li></${this.lists.pop().tag}>`);
+                }
+                break;
+            case 'table':
+                if (this.tableHeader) {
+                    this.out.push('<table><tbody>');
+                    this.row(this.tableHeader, 'td');
+                    this.tableHeader = null;
+                }
+                this.out.push('</tbody></table>');
+                break;
+        }
+        this.block = null;
+    }
+
+    // Inline pass over text[start, end): code spans, links, escapes and emphasis
+    inline(text, start = 0, end = text.length) {
+        const out = this.out;
+        const delimiters = [];
+        let plainStart = start;
+        let noLinkAfter = end;   // no ']' exists at or after this index
+        let i = start;
+
+        const flush = (upTo) => {
+            if (upTo > plainStart) {
+                out.push(this.escape(text.slice(plainStart, upTo)));
             }
-            
-            .pdf-content section {
-                page-break-inside: avoid;
+        };
+
+        while (i < end) {
+            const char = text[i];
+
+            if (char === '\\' && i + 1 < end && /[\\`*_\[\]()#+\-.!|>]/.test(text[i + 1])) {
+                flush(i);
+                out.push(this.escape(text[i + 1]));
+                i += 2;
+                plainStart = i;
+                continue;
             }
-            
-            .pdf-content h2 {
-                page-break-after: avoid;
+
+            if (char === '`') {
+                let run = 1;
+                while (text[i + run] === '`') run++;
+                const fence = '`'.repeat(run);
+                const close = text.indexOf(fence, i + run);
+                if (close !== -1 && close + run <= end) {
+                    flush(i);
+                    out.push('<code>', this.escape(text.slice(i + run, close).trim()), '</code>');
+                    i = close + run;
+                    plainStart = i;
+                } else {
+                    i += run;
+                }
+                continue;
             }
+
+            if (char === '[' && i < noLinkAfter) {
+                const labelEnd = text.indexOf(']', i + 1);
+                if (labelEnd === -1 || labelEnd >= end) {
+                    noLinkAfter = i;
+                } else if (text[labelEnd + 1] === '(') {
+                    const urlEnd = text.indexOf(')', labelEnd + 2);
+                    const href = urlEnd !== -1 && urlEnd < end ? this.safeUrl(text.slice(labelEnd + 2, urlEnd)) : null;
+                    if (href !== null) {
+                        flush(i);
+                        out.push(`<a href="${this.escape(href)}">`);
+                        this.inline(text, i + 1, labelEnd);
+                        out.push('</a>');
+                        i = urlEnd + 1;
+                        plainStart = i;
+                        continue;
+                    }
+                }
+                i++;
+                continue;
+            }
+
+            if (char === '*' || char === '_') {
+                let run = 1;
+                while (i + run < end && text[i + run] === char) run++;
+                const before = i > start ? text[i - 1] : ' ';
+                const after = i + run < end ? text[i + run] : ' ';
+                let canOpen = !/\s/.test(after);
+                let canClose = !/\s/.test(before);
+                if (char === '_') {
+                    // No intraword emphasis for underscores (snake_case stays literal)
+                    canOpen = canOpen && !/[\p{L}\p{N}]/u.test(before);
+                    canClose = canClose && !/[\p{L}\p{N}]/u.test(after);
+                }
+
+                flush(i);
+                const index = out.length;
+                out.push(char.repeat(run));
+                i += run;
+                plainStart = i;
+
+                let remaining = run;
+                let closing = '';
+                if (canClose) {
+                    for (let k = delimiters.length - 1; k >= 0 && remaining > 0;) {
+                        const opener = delimiters[k];
+                        // CommonMark "rule of 3": a delimiter that can both open and close
+                        // doesn't pair up when the combined run length is a multiple of 3
+                        const multipleOfThree = (opener.both || (canOpen && canClose))
+                            && (opener.length + run) % 3 === 0
+                            && !(opener.length % 3 === 0 && run % 3 === 0);
+                        if (opener.char !== char || multipleOfThree) {
+                            k--;
+                            continue;
+                        }
+                        const used = remaining >= 2 && opener.count >= 2 ? 2 : 1;
+                        const tag = used === 2 ? 'strong' : 'em';
+                        opener.count -= used;
+                        opener.html = `<${tag}>${opener.html}`;
+                        out[opener.index] = opener.prefix + char.repeat(opener.count) + opener.html;
+                        closing += `</${tag}>`;
+                        remaining -= used;
+                        // Openers between this one and the closer can no longer match
+                        delimiters.length = opener.count > 0 ? k + 1 : k;
+                        if (opener.count === 0) k--;
+                    }
+                    out[index] = closing + char.repeat(remaining);
+                }
+                if (remaining > 0 && canOpen) {
+                    delimiters.push({
+                        char, count: remaining, length: run, both: canClose, index, prefix: closing, html: ''
+                    });
+                }
+                continue;
+            }
+
+            i++;
         }
-        
-        @page {
-            margin: 1in;
-            size: A4;
-        }
-    </style>
-</head>
-<body>
-    ${htmlContent}
-</body>
-</html>`;
-
-            // For now, return HTML data URL - Chrome will handle PDF conversion
-            // The user can print to PDF using Chrome's print dialog
-            const dataUrl = `data:text/html;charset=utf-8,${encodeURIComponent(fullHtmlDocument)}`;
-            
-            return dataUrl;
-            
-        } catch (error) {
-            this.logError('PDF data generation failed', error);
-            throw new Error('Failed to generate PDF data');
-        }
+        flush(end);
     }
 
-    formatContentForPDF(content) {
-        // Convert markdown-like formatting to HTML
-        return content
-            .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-            .replace(/\*(.*?)\*/g, '<em>$1</em>')
-            .replace(/\n\n/g, '</p><p>')
-            .replace(/\n/g, '<br>')
-            .replace(/^/, '<p>')
-            .replace(/$/, '</p>');
+    safeUrl(url) {
+        const trimmed = url.trim().split(/\s+/)[0] || '';
+        return /^(https?:|mailto:|#|\/)/i.test(trimmed) ? trimmed : null;
     }
 
-    escapeHtml(text) {
-        if (typeof text !== 'string') {
-            return '';
+    escape(text) {
+        return text.replace(MARKDOWN_ESCAPE_PATTERN, char => MARKDOWN_ESCAPES[char]);
+    }
+}
+
+// Compiled HTML template for the printable PDF document.
+// pdf-template.html is parsed once into static strings and field lookups.
+// Sections whose names contain ':' (the style:<pdfStyle> stylesheets) are
+// compile-time constants folded into the static text, so rendering a document
+// only concatenates its own values.
+class PDFTemplate {
+    constructor(source, constants = {}, escape = text => text) {
+        this.escape = escape;
+        this.nodes = this.compile(this.tokenize(source.replace(/<!--[\s\S]*?-->/g, '')), constants);
+    }
+
+    tokenize(source) {
+        const tokens = [];
+        const pattern = /\{\{\{\s*([\w.:]+)\s*\}\}\}|\{\{\s*([#\/]?)\s*([\w.:]+)\s*\}\}/g;
+        let last = 0;
+        let match;
+        while ((match = pattern.exec(source)) !== null) {
+            if (match.index > last) {
+                tokens.push({ type: 'text', value: source.slice(last, match.index) });
+            }
+            if (match[1]) {
+                tokens.push({ type: 'raw', name: match[1] });
+            } else {
+                const type = { '#': 'open', '/': 'close' }[match[2]] || 'var';
+                tokens.push({ type, name: match[3] });
+            }
+            last = pattern.lastIndex;
         }
-        
-        return text
-            .replace(/&/g, '&amp;')
-            .replace(/</g, '&lt;')
-            .replace(/>/g, '&gt;')
-            .replace(/"/g, '&quot;')
-            .replace(/'/g, '&#39;')
-            .replace(/\//g, '&#x2F;');
+        if (last < source.length) {
+            tokens.push({ type: 'text', value: source.slice(last) });
+        }
+        return tokens;
     }
 
-    generateFilename(title) {
-        const sanitized = title.replace(/[^a-zA-Z0-9\s]/g, '').replace(/\s+/g, '_');
-        return `enhanced_${sanitized}_${Date.now()}.pdf`;
+    compile(tokens, constants) {
+        const stack = [{ name: null, children: [] }];
+        for (const token of tokens) {
+            const frame = stack[stack.length - 1];
+            const constant = token.name !== undefined && token.name.includes(':');
+
+            switch (token.type) {
+                case 'text':
+                    frame.children.push(token.value);
+                    break;
+                case 'open':
+                    stack.push({ name: token.name, children: [], constant });
+                    break;
+                case 'close': {
+                    if (stack.length === 1 || frame.name !== token.name) {
+                        throw new Error(`Unexpected {{/${token.name}}} in PDF template`);
+                    }
+                    stack.pop();
+                    const parent = stack[stack.length - 1].children;
+                    if (!frame.constant) {
+                        parent.push({ type: 'section', path: this.path(frame.name), children: this.merge(frame.children) });
+                    } else if (constants[frame.name]) {
+                        parent.push(...frame.children);
+                    }
+                    break;
+                }
+                default:
+                    if (constant) {
+                        const value = constants[token.name] == null ? '' : String(constants[token.name]);
+                        frame.children.push(token.type === 'raw' ? value : this.escape(value));
+                    } else {
+                        frame.children.push({ type: token.type, path: this.path(token.name) });
+                    }
+            }
+        }
+        if (stack.length !== 1) {
+            throw new Error(`Unclosed {{#${stack[stack.length - 1].name}}} in PDF template`);
+        }
+        return this.merge(stack[0].children);
     }
 
-    setupLogging() {
-        this.logs = [];
+    path(name) {
+        return name === '.' ? [] : name.split('.');
     }
 
-    logInfo(message, data = {}) {
-        const logEntry = {
-            timestamp: new Date().toISOString(),
-            level: 'INFO',
-            message,
-            data
-        };
-        this.logs.push(logEntry);
-        console.log('[PDF Generator]', logEntry);
+    merge(nodes) {
+        // Join adjacent static strings so rendering pushes each run once
+        const merged = [];
+        for (const node of nodes) {
+            if (typeof node === 'string' && typeof merged[merged.length - 1] === 'string') {
+                merged[merged.length - 1] += node;
+            } else {
+                merged.push(node);
+            }
+        }
+        return merged;
     }
 
-    logError(message, error) {
-        const logEntry = {
-            timestamp: new Date().toISOString(),
-            level: 'ERROR',
-            message,
-            error: error.message || error,
-            stack: error.stack
-        };
-        this.logs.push(logEntry);
-        console.error('[PDF Generator]', logEntry);
+    render(view) {
+        const out = [];
+        this.renderNodes(this.nodes, [view], out);
+        return out.join('');
+    }
+
+    renderNodes(nodes, contexts, out) {
+        for (const node of nodes) {
+            if (typeof node === 'string') {
+                out.push(node);
+                continue;
+            }
+
+            const value = this.lookup(node.path, contexts);
+            if (node.type === 'var') {
+                out.push(this.escape(value == null ? '' : String(value)));
+            } else if (node.type === 'raw') {
+                out.push(value == null ? '' : String(value));
+            } else if (Array.isArray(value)) {
+                for (const item of value) {
+                    contexts.push(item);
+                    this.renderNodes(node.children, contexts, out);
+                    contexts.pop();
+                }
+            } else if (value) {
+                const nested = typeof value === 'object';
+                if (nested) contexts.push(value);
+                this.renderNodes(node.children, contexts, out);
+                if (nested) contexts.pop();
+            }
+        }
+    }
+
+    lookup(path, contexts) {
+        if (path.length === 0) {
+            return contexts[contexts.length - 1];
+        }
+        // Innermost context that defines the first key wins
+        for (let i = contexts.length - 1; i >= 0; i--) {
+            let value = contexts[i];
+            if (value === null || typeof value !== 'object' || !(path[0] in value)) {
+                continue;
+            }
+            for (const key of path) {
+                value = value == null ? undefined : value[key];
+            }
+            return value;
+        }
+        return undefined;
     }
 }
 
-// Main AI Enhancer Background class
-class AIEnhancerBackground {
-    constructor() {
-        this.setupMessageListener();
+// PDF Generator class
+class PDFGenerator {
+    constructor(offscreen = new OffscreenDocument()) {
+        this.offscreen = offscreen;
+        this.templateSource = null;   // pdf-template.html, fetched once
+        this.templates = new Map();   // pdfStyle -> compiled PDFTemplate
         this.setupLogging();
-        this.pdfGenerator = new PDFGenerator();
     }
 
-    setupMessageListener() {
-        chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
-            this.handleMessage(request, sender, sendResponse);
-            return true; // Keep message channel open for async response
-        });
-    }
+    async generatePDF(enhancedContent, settings) {
+        this.logInfo('Starting PDF generation', { 
+            title: enhancedContent.title,
+            wordCount: enhancedContent.metadata?.wordCount 
+        });
+
+        try {
+            // The source page text is not part of the PDF; keep it off the message channel
+            const { originalContent, ...pdfContent } = enhancedContent;
+            const result = this.offscreen.isSupported()
+                ? await this.renderBinaryPDF(pdfContent, settings)
+                : await this.renderHTMLFallback(pdfContent, settings);
+
+            this.logInfo('PDF generation completed', { 
+                size: result.size,
+                mimeType: result.mimeType,
+                filename: result.filename
+            });
+            
+            return result;
+            
+        } catch (error) {
+            this.logError('PDF generation failed', error);
+            throw error;
+        }
+    }
+
+    async generateBundlePDF(documents, settings, title = null) {
+        // One layout and one file for many documents, with shared contents and sources
+        const bundle = this.buildBundle(documents, title);
+        this.logInfo('Starting bundle PDF generation', { documents: bundle.documents.length, sources: bundle.sources.length });
+
+        try {
+            let result;
+            const response = this.offscreen.isSupported()
+                ? await this.offscreen.send('renderBundlePDF', {
+                    data: { ...bundle, documents: bundle.documents.map(document => this.withMarkup(document)) },
+                    settings
+                })
+                : null;
+            if (response && !response.unsupported) {
+                result = {
+                    pdfData: response.pdfUrl,
+                    filename: this.generateFilename(bundle.title),
+                    size: response.size,
+                    mimeType: 'application/pdf'
+                };
+            } else {
+                if (response) this.logInfo('Bundle has text the PDF fonts cannot show, rendering HTML');
+                const template = await this.getTemplate(settings?.pdfStyle || 'academic');
+                const pdfData = await this.generatePDFData(template.render(this.buildBundleView(bundle)));
+                result = {
+                    pdfData,
+                    filename: this.generateFilename(bundle.title).replace(/\.pdf$/, '.html'),
+                    size: pdfData.length,
+                    mimeType: 'text/html'
+                };
+            }
+            this.logInfo('Bundle PDF generation completed', { size: result.size, filename: result.filename });
+            return { ...result, documents: bundle.documents.length, sources: bundle.sources.length };
+        } catch (error) {
+            this.logError('Bundle PDF generation failed', error);
+            throw error;
+        }
+    }
+
+    buildBundle(documents, title = null) {
+        // Sources cited by several documents are listed once, with the documents that cite them
+        const sources = new Map();
+        const stripped = documents.map((enhancedContent, index) => {
+            const { originalContent, sources: documentSources, ...pdfContent } = enhancedContent;
+            for (const source of Array.isArray(documentSources) ? documentSources : []) {
+                if (!source || typeof source !== 'object' || !(source.url || source.title)) continue;
+                const key = this.sourceKey(source);
+                const merged = sources.get(key);
+                if (!merged) {
+                    sources.set(key, {
+                        title: source.title || '',
+                        url: source.url || '',
+                        relevance: source.relevance || '',
+                        documents: [index + 1]
+                    });
+                } else if (!merged.documents.includes(index + 1)) {
+                    merged.documents.push(index + 1);
+                    merged.title = merged.title || source.title || '';
+                    merged.relevance = merged.relevance || source.relevance || '';
+                }
+            }
+            return { ...pdfContent, sources: [] };
+        });
+
+        const first = stripped[0]?.title || 'Enhanced Content';
+        return {
+            title: title || (stripped.length > 1 ? `${first} and ${stripped.length - 1} more` : first),
+            documents: stripped,
+            sources: [...sources.values()]
+        };
+    }
+
+    sourceKey(source) {
+        // Same page despite fragments, tracking parameters, www. or a trailing slash
+        if (source.url) {
+            try {
+                const url = new URL(source.url);
+                url.hash = '';
+                for (const name of [...url.searchParams.keys()]) {
+                    if (/^(utm_|fbclid$|gclid$|ref$)/i.test(name)) url.searchParams.delete(name);
+                }
+                const path = url.pathname.replace(/\/+$/, '');
+                return `${url.hostname.replace(/^www\./, '').toLowerCase()}${path}${url.search}`;
+            } catch (error) {
+                return source.url.trim().toLowerCase();
+            }
+        }
+        return `title:${source.title.trim().toLowerCase().replace(/\s+/g, ' ')}`;
+    }
+
+    async renderBinaryPDF(enhancedContent, settings) {
+        // Real PDF bytes rendered in the offscreen document; only the blob: URL crosses back
+        const response = await this.offscreen.send('renderPDF', { data: this.withMarkup(enhancedContent), settings });
+        if (response.unsupported) {
+            this.logInfo('Content has text the PDF fonts cannot show, rendering HTML', { title: enhancedContent.title });
+            return this.renderHTMLFallback(enhancedContent, settings);
+        }
+        return {
+            pdfData: response.pdfUrl,
+            filename: this.generateFilename(enhancedContent.title),
+            size: response.size,
+            mimeType: 'application/pdf'
+        };
+    }
+
+    withMarkup(enhancedContent) {
+        // PDFWriter lays out this HTML rather than parsing markdown a second time
+        const render = text => new MarkdownRenderer().render(text);
+        return {
+            ...enhancedContent,
+            markup: {
+                summary: render(enhancedContent.summary),
+                content: this.formatContentForPDF(enhancedContent.enhancedContent),
+                keyPoints: (Array.isArray(enhancedContent.keyPoints) ? enhancedContent.keyPoints : []).map(point => render(point)),
+                insights: render(enhancedContent.insights),
+                recommendations: render(enhancedContent.recommendations)
+            }
+        };
+    }
+
+    async renderHTMLFallback(enhancedContent, settings) {
+        // Browsers without chrome.offscreen, and scripts outside WinAnsi, get the printable HTML document instead
+        const htmlDocument = await this.createPDFTemplate(enhancedContent, settings);
+        const pdfData = await this.generatePDFData(htmlDocument);
+        return {
+            pdfData: pdfData,
+            filename: this.generateFilename(enhancedContent.title).replace(/\.pdf$/, '.html'),
+            size: pdfData.length,
+            mimeType: 'text/html'
+        };
+    }
+
+    async createPDFTemplate(enhancedContent, settings) {
+        const template = await this.getTemplate(settings?.pdfStyle || 'academic');
+        const view = this.buildTemplateView(enhancedContent);
+        // The template lays out a list of documents; a single PDF is a list of one
+        return template.render({
+            title: view.title,
+            bundle: false,
+            documents: [{ ...view, number: 1, anchor: 'document-1' }],
+            generationDate: view.generationDate
+        });
+    }
+
+    buildBundleView(bundle) {
+        const documents = bundle.documents.map((document, index) => ({
+            ...this.buildTemplateView(document),
+            number: index + 1,
+            anchor: `document-${index + 1}`
+        }));
+        return {
+            title: bundle.title,
+            bundle: true,
+            documentCount: documents.length,
+            documents,
+            sources: bundle.sources.map(source => ({ ...source, citedIn: source.documents.join(', ') })),
+            hasSources: bundle.sources.length > 0,
+            generationDate: new Date().toLocaleDateString()
+        };
+    }
+
+    async getTemplate(pdfStyle) {
+        if (!this.templates.has(pdfStyle)) {
+            if (!this.templateSource) {
+                this.templateSource = fetch(chrome.runtime.getURL('pdf-template.html'))
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error(`Failed to load PDF template: ${response.status}`);
+                        }
+                        return response.text();
+                    })
+                    .catch(error => {
+                        this.templateSource = null;
+                        throw error;
+                    });
+            }
+            const source = await this.templateSource;
+            if (!this.templates.has(pdfStyle)) {
+                const constants = { [`style:${pdfStyle}`]: true };
+                this.templates.set(pdfStyle, new PDFTemplate(source, constants, text => this.escapeHtml(text)));
+                this.logInfo('Compiled PDF template', { pdfStyle });
+            }
+        }
+        return this.templates.get(pdfStyle);
+    }
+
+    buildTemplateView(enhancedContent) {
+        const keyPoints = Array.isArray(enhancedContent.keyPoints) ? enhancedContent.keyPoints.map(String) : [];
+        const sources = (Array.isArray(enhancedContent.sources) ? enhancedContent.sources : [])
+            .filter(source => source && typeof source === 'object')
+            .map(source => ({
+                title: source.title || '',
+                url: source.url || '',
+                relevance: source.relevance || '',
+                citedIn: ''
+            }));
+
+        return {
+            title: enhancedContent.title || 'Enhanced Content',
+            originalUrl: enhancedContent.originalUrl || 'Unknown',
+            enhancedDate: new Date(enhancedContent.processingInfo?.enhancedAt || Date.now()).toLocaleDateString(),
+            readingTime: enhancedContent.metadata?.readingTime || 'Unknown',
+            summary: enhancedContent.summary || '',
+            contentHtml: this.formatContentForPDF(enhancedContent.enhancedContent),
+            keyPoints,
+            hasKeyPoints: keyPoints.length > 0,
+            insights: enhancedContent.insights || '',
+            recommendations: enhancedContent.recommendations || '',
+            sources,
+            hasSources: sources.length > 0,
+            generationDate: new Date().toLocaleDateString()
+        };
+    }
+
+    async generatePDFData(htmlDocument) {
+        try {
+            // Printable HTML document; the offscreen path produces real PDF bytes instead
+            return `data:text/html;charset=utf-8,${encodeURIComponent(htmlDocument)}`;
+        } catch (error) {
+            this.logError('PDF data generation failed', error);
+            throw new Error('Failed to generate PDF data');
+        }
+    }
+
+    formatContentForPDF(content) {
+        // Convert markdown formatting to escaped HTML in a single pass
+        return new MarkdownRenderer().render(content);
+    }
+
+    escapeHtml(text) {
+        if (typeof text !== 'string') {
+            return '';
+        }
+        
+        return text
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;')
+            .replace(/'/g, '&#39;')
+            .replace(/\//g, '&#x2F;');
+    }
+
+    generateFilename(title) {
+        const sanitized = title.replace(/[^a-zA-Z0-9\s]/g, '').replace(/\s+/g, '_');
+        return `enhanced_${sanitized}_${Date.now()}.pdf`;
+    }
+
+    setupLogging() {
+        this.logs = new LogBuffer({ maxLogs: 500 });
+    }
+
+    logInfo(message, data = {}) {
+        const logEntry = {
+            timestamp: new Date().toISOString(),
+            level: 'INFO',
+            message,
+            data
+        };
+        this.logs.add(logEntry);
+        console.log('[PDF Generator]', logEntry);
+    }
+
+    logError(message, error) {
+        const logEntry = {
+            timestamp: new Date().toISOString(),
+            level: 'ERROR',
+            message,
+            error: error.message || error,
+            stack: error.stack
+        };
+        this.logs.add(logEntry);
+        console.error('[PDF Generator]', logEntry);
+    }
+}
+
+// Shared scheduler for Gemini API requests: per-key token-bucket rate limiting,
+// a concurrency cap, retries with jittered exponential backoff that honour
+// Retry-After, per-request deadlines and a circuit breaker.
+class GeminiRequestScheduler {
+    constructor(options = {}) {
+        this.configure(options);
+        this.buckets = new Map();
+        this.active = 0;
+        this.waiting = [];
+        this.breaker = { state: 'closed', failures: 0, openedAt: 0, trialInFlight: false };
+        this.stats = { requests: 0, retries: 0, throttled: 0, failures: 0, rejected: 0 };
+    }
+
+    configure(options = {}) {
+        this.requestsPerMinute = options.requestsPerMinute || this.requestsPerMinute || 60;
+        this.burst = options.burst || this.burst || Math.max(1, Math.ceil(this.requestsPerMinute / 6));
+        this.maxConcurrent = options.maxConcurrent || this.maxConcurrent || 4;
+        this.maxRetries = options.maxRetries ?? this.maxRetries ?? 4;
+        this.baseDelay = options.baseDelay || this.baseDelay || 1000;
+        this.maxDelay = options.maxDelay || this.maxDelay || 30000;
+        this.deadline = options.deadline || this.deadline || 120000;
+        this.failureThreshold = options.failureThreshold || this.failureThreshold || 5;
+        this.cooldown = options.cooldown || this.cooldown || 30000;
+    }
+
+    isRetryableStatus(status) {
+        return status === 429 || status === 500 || status === 502 || status === 503 || status === 504;
+    }
+
+    // attempt(signal) must return a fetch Response. Non-retryable responses are returned
+    // as-is so callers keep their own error handling. options.signal cancels the request
+    // and any further retries.
+    async execute(apiKey, attempt, options = {}) {
+        const deadlineAt = Date.now() + (options.deadline || this.deadline);
+        const cancelled = options.signal;
+        let trial = this.checkCircuit();
+
+        // The half-open trial must end in a success or a failure, whichever way execute exits,
+        // or the breaker would reject every later request
+        try {
+            for (let retry = 0; ; retry++) {
+                await this.acquireToken(apiKey, deadlineAt);
+                await this.acquireSlot(deadlineAt);
+                if (cancelled?.aborted) {
+                    this.releaseSlot();
+                    throw new Error('Enhancement cancelled');
+                }
+
+                const controller = new AbortController();
+                const remaining = deadlineAt - Date.now();
+                const timer = setTimeout(() => controller.abort(), remaining);
+                const cancel = () => controller.abort();
+                cancelled?.addEventListener('abort', cancel, { once: true });
+                const aborted = new Promise((resolve, reject) => {
+                    controller.signal.addEventListener('abort', () => reject(new Error('aborted')));
+                });
+                aborted.catch(() => {});
+
+                let response = null;
+                let failure = null;
+                this.stats.requests++;
+                try {
+                    response = await Promise.race([attempt(controller.signal), aborted]);
+                } catch (error) {
+                    failure = controller.signal.aborted
+                        ? new Error('Gemini request deadline exceeded')
+                        : error;
+                } finally {
+                    // A streamed body is read after execute returns; readSSE bounds it itself
+                    clearTimeout(timer);
+                    cancelled?.removeEventListener('abort', cancel);
+                    this.releaseSlot();
+                }
+
+                if (response && !this.isRetryableStatus(response.status)) {
+                    this.recordSuccess();
+                    trial = false;
+                    return response;
+                }
+
+                if (cancelled?.aborted) {
+                    throw new Error('Enhancement cancelled');
+                }
+                this.recordFailure();
+                trial = false;
+                const deadlineHit = controller.signal.aborted;
+                let delay = this.backoffDelay(retry);
+
+                if (response) {
+                    if (response.status === 429) {
+                        this.stats.throttled++;
+                    }
+                    delay = await this.retryAfterDelay(response) ?? delay;
+                    failure = new Error(`Gemini API error: HTTP ${response.status} ${response.statusText || ''}`.trim());
+                    failure.status = response.status;
+                }
+
+                if (deadlineHit || retry >= this.maxRetries || Date.now() + delay >= deadlineAt) {
+                    if (response && !deadlineHit) {
+                        // Out of retries: hand the last response back so the caller reports the API's message
+                        return response;
+                    }
+                    this.stats.failures++;
+                    throw failure;
+                }
+
+                this.stats.retries++;
+                await this.sleep(delay);
+                trial = this.checkCircuit();
+            }
+        } finally {
+            if (trial) {
+                this.endTrial(cancelled?.aborted);
+            }
+        }
+    }
+
+    backoffDelay(retry) {
+        // Full jitter: uniform between 0 and the exponential cap
+        const cap = Math.min(this.maxDelay, this.baseDelay * 2 ** retry);
+        return Math.round(Math.random() * cap);
+    }
+
+    async retryAfterDelay(response) {
+        const header = response.headers?.get?.('Retry-After');
+        if (header) {
+            const seconds = Number(header);
+            const delay = Number.isFinite(seconds) ? seconds * 1000 : Date.parse(header) - Date.now();
+            if (Number.isFinite(delay)) {
+                return Math.max(0, Math.min(delay, this.maxDelay));
+            }
+        }
+
+        // Gemini also reports google.rpc.RetryInfo in the error body, e.g. "retryDelay": "17s"
+        try {
+            const body = await response.clone().json();
+            const retryInfo = (body.error?.details || []).find(detail => detail.retryDelay);
+            const seconds = parseFloat(retryInfo?.retryDelay);
+            if (Number.isFinite(seconds)) {
+                return Math.min(seconds * 1000, this.maxDelay);
+            }
+        } catch (error) {
+            // Body was not JSON
+        }
+        return null;
+    }
+
+    async acquireToken(apiKey, deadlineAt) {
+        const refillRate = this.requestsPerMinute / 60000;
+        let bucket = this.buckets.get(apiKey);
+        if (!bucket) {
+            bucket = { tokens: this.burst, updatedAt: Date.now() };
+            this.buckets.set(apiKey, bucket);
+        }
+
+        while (true) {
+            const now = Date.now();
+            bucket.tokens = Math.min(this.burst, bucket.tokens + (now - bucket.updatedAt) * refillRate);
+            bucket.updatedAt = now;
+
+            if (bucket.tokens >= 1) {
+                bucket.tokens -= 1;
+                return;
+            }
+
+            const wait = Math.ceil((1 - bucket.tokens) / refillRate);
+            if (now + wait >= deadlineAt) {
+                throw new Error('Gemini request deadline exceeded while rate limited');
+            }
+            await this.sleep(wait);
+        }
+    }
+
+    async acquireSlot(deadlineAt) {
+        if (this.active < this.maxConcurrent) {
+            this.active++;
+            return;
+        }
+
+        await new Promise((resolve, reject) => {
+            const waiter = { resolve };
+            const timer = setTimeout(() => {
+                this.waiting = this.waiting.filter(item => item !== waiter);
+                reject(new Error('Gemini request deadline exceeded while queued'));
+            }, Math.max(0, deadlineAt - Date.now()));
+            waiter.resolve = () => {
+                clearTimeout(timer);
+                resolve();
+            };
+            this.waiting.push(waiter);
+        });
+    }
+
+    releaseSlot() {
+        const next = this.waiting.shift();
+        if (next) {
+            // Hand the slot straight to the next waiter
+            next.resolve();
+        } else {
+            this.active--;
+        }
+    }
+
+    checkCircuit() {
+        const breaker = this.breaker;
+        if (breaker.state === 'open') {
+            if (Date.now() - breaker.openedAt < this.cooldown || breaker.trialInFlight) {
+                this.stats.rejected++;
+                throw new Error('Gemini API is temporarily unavailable after repeated failures. Please try again shortly.');
+            }
+            // Half-open: let a single trial request through
+            breaker.trialInFlight = true;
+            return true;
+        }
+        return false;
+    }
+
+    recordSuccess() {
+        this.breaker = { state: 'closed', failures: 0, openedAt: 0, trialInFlight: false };
+    }
+
+    endTrial(cancelled) {
+        // A trial that never got an answer counts as failed; a cancelled one says nothing
+        // about the API's health and just frees the slot for the next request
+        if (cancelled) {
+            this.breaker.trialInFlight = false;
+        } else {
+            this.recordFailure();
+        }
+    }
+
+    recordFailure() {
+        const breaker = this.breaker;
+        breaker.failures++;
+        if (breaker.trialInFlight || breaker.failures >= this.failureThreshold) {
+            breaker.state = 'open';
+            breaker.openedAt = Date.now();
+            breaker.trialInFlight = false;
+        }
+    }
+
+    getStats() {
+        return {
+            ...this.stats,
+            active: this.active,
+            queued: this.waiting.length,
+            circuit: this.breaker.state
+        };
+    }
+
+    sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+}
+
+// Incremental parser for the enhanced-content JSON object as it streams in.
+// Reports each top-level field once its value is complete, plus the decoded
+// text of a top-level string that is still arriving. Prose or code fences
+// before the opening brace are skipped.
+class StreamingJSONParser {
+    constructor(onField, onPartial = null) {
+        this.onField = onField;
+        this.onPartial = onPartial;
+        this.text = '';
+        this.pos = 0;
+        this.depth = 0;
+        this.inString = false;
+        this.escaped = false;
+        this.state = 'start';
+        this.keyStart = -1;
+        this.key = null;
+        this.valueStart = -1;
+        this.fields = {};
+    }
+
+    push(chunk) {
+        this.text += chunk;
+        this.scan();
+
+        if (this.onPartial && this.state === 'value' && this.inString && this.depth === 1) {
+            const partial = this.decodePartialString();
+            if (partial !== null) {
+                this.onPartial(this.key, partial);
+            }
+        }
+    }
+
+    scan() {
+        const text = this.text;
+
+        for (; this.pos < text.length; this.pos++) {
+            const ch = text[this.pos];
+
+            if (this.state === 'start') {
+                if (ch === '{') {
+                    this.depth = 1;
+                    this.state = 'expectKey';
+                }
+                continue;
+            }
+
+            if (this.state === 'done') {
+                return;
+            }
+
+            if (this.inString) {
+                if (this.escaped) {
+                    this.escaped = false;
+                } else if (ch === '\\') {
+                    this.escaped = true;
+                } else if (ch === '"') {
+                    this.inString = false;
+                    if (this.state === 'key') {
+                        this.key = JSON.parse(text.slice(this.keyStart, this.pos + 1));
+                        this.state = 'colon';
+                    }
+                }
+                continue;
+            }
+
+            if (ch === '"') {
+                this.inString = true;
+                if (this.state === 'expectKey') {
+                    this.state = 'key';
+                    this.keyStart = this.pos;
+                }
+            } else if (ch === ':' && this.state === 'colon') {
+                this.state = 'value';
+                this.valueStart = this.pos + 1;
+            } else if (ch === '{' || ch === '[') {
+                this.depth++;
+            } else if ((ch === '}' || ch === ']') && this.depth > 1) {
+                this.depth--;
+            } else if (this.depth === 1 && (ch === ',' || ch === '}')) {
+                if (this.state === 'value') {
+                    this.completeField(text.slice(this.valueStart, this.pos));
+                }
+                this.state = ch === ',' ? 'expectKey' : 'done';
+                if (ch === '}') {
+                    this.depth = 0;
+                }
+            }
+        }
+    }
+
+    completeField(rawValue) {
+        try {
+            const value = JSON.parse(rawValue);
+            this.fields[this.key] = value;
+            this.onField(this.key, value);
+        } catch (error) {
+            // Malformed field; the final full parse decides what to do with it
+        }
+    }
+
+    decodePartialString() {
+        let raw = this.text.slice(this.valueStart).trimStart();
+        if (!raw.startsWith('"')) {
+            return null;
+        }
+        // Drop an incomplete escape sequence at the end before decoding
+        raw = raw.replace(/\\(u[0-9a-fA-F]{0,3})?$/, '');
+        try {
+            return JSON.parse(raw + '"');
+        } catch (error) {
+            return null;
+        }
+    }
+
+    isComplete() {
+        return this.state === 'done';
+    }
+
+    // Tolerant one-shot parse of a model response. Returns { value, repaired } or null.
+    // Accepts code fences and surrounding prose, and repairs truncation, trailing
+    // commas and raw control characters instead of discarding the whole response.
+    static parse(text) {
+        const start = text.indexOf('{');
+        if (start === -1) {
+            return null;
+        }
+        try {
+            return { value: JSON.parse(start === 0 ? text : text.slice(start)), repaired: false };
+        } catch (error) {
+            // Fall through to the repairing scan
+        }
+        const repaired = StreamingJSONParser.repair(text, start);
+        if (repaired === null) {
+            return null;
+        }
+        try {
+            const value = JSON.parse(repaired.text);
+            // An object cut off before its first field carries nothing worth keeping
+            return value && typeof value === 'object' && Object.keys(value).length > 0
+                ? { value, repaired: repaired.changed }
+                : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    static repair(text, start = 0) {
+        // Single pass over the first top-level object. `safe` marks the end of the last
+        // complete value so a truncated tail can be cut off and the brackets closed.
+        const out = [];
+        const closers = [];
+        let inString = false;
+        let escaped = false;
+        let isKey = false;
+        let expectKey = false;
+        let changed = false;
+        let safe = { length: 0, closers: '' };
+        const markSafe = () => {
+            safe = { length: out.length, closers: closers.slice().reverse().join('') };
+        };
+
+        for (let i = start; i < text.length; i++) {
+            const ch = text[i];
+
+            if (inString) {
+                if (escaped) {
+                    escaped = false;
+                    out.push(ch);
+                } else if (ch === '\\') {
+                    escaped = true;
+                    out.push(ch);
+                } else if (ch === '"') {
+                    inString = false;
+                    out.push(ch);
+                    if (!isKey) markSafe();
+                } else if (ch < ' ') {
+                    out.push(ch === '\n' ? '\\n' : ch === '\r' ? '\\r' : ch === '\t' ? '\\t' : '');
+                    changed = true;
+                } else {
+                    out.push(ch);
+                }
+                continue;
+            }
+
+            if (ch === '"') {
+                inString = true;
+                isKey = expectKey;
+                out.push(ch);
+            } else if (ch === '{' || ch === '[') {
+                closers.push(ch === '{' ? '}' : ']');
+                expectKey = ch === '{';
+                out.push(ch);
+                markSafe();
+            } else if (ch === '}' || ch === ']') {
+                // Drop a trailing comma before the closer
+                let end = out.length;
+                while (end > 0 && /\s/.test(out[end - 1])) end--;
+                if (out[end - 1] === ',') {
+                    out.splice(end - 1, 1);
+                    changed = true;
+                }
+                closers.pop();
+                expectKey = false;
+                out.push(ch);
+                if (closers.length === 0) {
+                    return { text: out.join(''), changed };
+                }
+                markSafe();
+            } else if (ch === ',') {
+                expectKey = closers[closers.length - 1] === '}';
+                out.push(ch);
+            } else if (ch === ':') {
+                expectKey = false;
+                out.push(ch);
+            } else {
+                out.push(ch);
+                // A number or literal is complete once a delimiter follows it
+                if (/[\w.+-]/.test(ch) && i + 1 < text.length && /[\s,}\]]/.test(text[i + 1])) {
+                    markSafe();
+                }
+            }
+        }
+
+        if (safe.length === 0) {
+            return null;
+        }
+        if (inString && !isKey) {
+            // Truncated inside a string value: keep the partial text and close it
+            let partial = out.join('');
+            if (escaped) partial = partial.slice(0, -1);
+            partial = partial.replace(/\\u[0-9a-fA-F]{0,3}$/, '');
+            return { text: partial + '"' + closers.slice().reverse().join(''), changed: true };
+        }
+        return { text: out.slice(0, safe.length).join('') + safe.closers, changed: true };
+    }
+}
+
+// Content-addressed cache of Gemini enhancement results
+// Entries live in chrome.storage.local under their own keys; a small index tracks
+// size and last access for LRU eviction and TTL expiry.
+class EnhancementCache {
+    constructor(options = {}) {
+        this.maxBytes = options.maxBytes || 5 * 1024 * 1024;
+        this.ttl = options.ttl || 7 * 24 * 60 * 60 * 1000;
+        this.indexKey = options.indexKey || 'enhancementCacheIndex';
+        this.entryPrefix = options.entryPrefix || 'enhancementCache:';
+        this.flushDelay = options.flushDelay ?? 1000;
+        this.flushTimer = null;
+        this.indexPromise = null;
+        this.entries = {};
+        this.stats = { hits: 0, misses: 0, writes: 0, evictions: 0, expired: 0 };
+        if (chrome.runtime?.onSuspend) {
+            chrome.runtime.onSuspend.addListener(() => {
+                if (this.flushTimer) this.saveIndex();
+            });
+        }
+    }
+
+    async buildKey(text, settings) {
+        const material = JSON.stringify({
+            text: this.normalizeText(text),
+            enhancementType: settings.enhancementType,
+            pdfStyle: settings.pdfStyle,
+            includeSources: Boolean(settings.includeSources),
+            includeImages: Boolean(settings.includeImages),
+            mode: settings.mode || 'single',
+            model: settings.model || null,
+            generationConfig: settings.generationConfig || null
+        });
+
+        const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(material));
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    normalizeText(text) {
+        return (text || '').replace(/\s+/g, ' ').trim();
+    }
+
+    async loadIndex() {
+        if (!this.indexPromise) {
+            this.indexPromise = chrome.storage.local.get([this.indexKey]).then(result => {
+                const stored = result[this.indexKey] || {};
+                this.entries = stored.entries || {};
+                this.stats = { ...this.stats, ...stored.stats };
+            });
+        }
+        return this.indexPromise;
+    }
+
+    async get(key) {
+        await this.loadIndex();
+        const entry = this.entries[key];
+
+        if (entry && Date.now() - entry.storedAt > this.ttl) {
+            this.stats.expired++;
+            await this.remove(key);
+        } else if (entry) {
+            const result = await chrome.storage.local.get([this.entryPrefix + key]);
+            const value = result[this.entryPrefix + key];
+            if (value) {
+                entry.lastAccess = Date.now();
+                this.stats.hits++;
+                this.scheduleSave();
+                return value;
+            }
+            delete this.entries[key];
+            this.scheduleSave();
+        }
+
+        // A plain miss changes only the counters, which the next write carries along
+        this.stats.misses++;
+        return null;
+    }
+
+    async set(key, value) {
+        await this.loadIndex();
+        const size = JSON.stringify(value).length;
+        if (size > this.maxBytes) {
+            return false;
+        }
+
+        delete this.entries[key];
+        await this.evict(size);
+
+        this.entries[key] = { size, storedAt: Date.now(), lastAccess: Date.now() };
+        this.stats.writes++;
+        await chrome.storage.local.set({ [this.entryPrefix + key]: value });
+        await this.saveIndex();
+        return true;
+    }
+
+    async evict(incomingSize) {
+        const now = Date.now();
+        const byLastAccess = Object.entries(this.entries).sort((a, b) => a[1].lastAccess - b[1].lastAccess);
+        let total = byLastAccess.reduce((sum, [, entry]) => sum + entry.size, 0);
+        const stale = [];
+
+        for (const [key, entry] of byLastAccess) {
+            const expired = now - entry.storedAt > this.ttl;
+            if (!expired && total + incomingSize <= this.maxBytes) {
+                continue;
+            }
+            stale.push(key);
+            total -= entry.size;
+            delete this.entries[key];
+            if (expired) {
+                this.stats.expired++;
+            } else {
+                this.stats.evictions++;
+            }
+        }
+
+        if (stale.length > 0) {
+            await chrome.storage.local.remove(stale.map(key => this.entryPrefix + key));
+        }
+    }
+
+    async remove(key) {
+        delete this.entries[key];
+        await chrome.storage.local.remove(this.entryPrefix + key);
+        await this.saveIndex();
+    }
+
+    async clear() {
+        await this.loadIndex();
+        await chrome.storage.local.remove(Object.keys(this.entries).map(key => this.entryPrefix + key));
+        this.entries = {};
+        this.stats = { hits: 0, misses: 0, writes: 0, evictions: 0, expired: 0 };
+        await this.saveIndex();
+    }
+
+    async getStats() {
+        await this.loadIndex();
+        const sizes = Object.values(this.entries).map(entry => entry.size);
+        const lookups = this.stats.hits + this.stats.misses;
+        return {
+            ...this.stats,
+            entries: sizes.length,
+            bytes: sizes.reduce((sum, size) => sum + size, 0),
+            maxBytes: this.maxBytes,
+            hitRate: lookups > 0 ? this.stats.hits / lookups : 0
+        };
+    }
+
+    scheduleSave() {
+        // Hits only move lastAccess; one write per flushDelay covers all of them
+        if (!this.flushTimer) {
+            this.flushTimer = setTimeout(() => this.saveIndex(), this.flushDelay);
+        }
+    }
+
+    async saveIndex() {
+        clearTimeout(this.flushTimer);
+        this.flushTimer = null;
+        await chrome.storage.local.set({ [this.indexKey]: { entries: this.entries, stats: this.stats } });
+    }
+}
+
+// Single-flight coalescing: concurrent calls with the same key share one in-flight
+// promise, and every caller gets its result or its error. Events emitted by the work
+// are fanned out to all callers; a late joiner first gets the latest event per name.
+// A caller can leave through its own AbortSignal, and the shared work is only aborted
+// once every caller has left.
+class SingleFlight {
+    constructor() {
+        this.flights = new Map();
+        this.stats = { started: 0, coalesced: 0, cancelled: 0 };
+    }
+
+    has(key) {
+        return this.flights.has(key);
+    }
+
+    // work(signal, emit) runs once per key; emit is null when the first caller has no onEvent
+    run(key, work, options = {}) {
+        const { signal, onEvent } = options;
+        if (signal?.aborted) {
+            return Promise.reject(this.cancelledError());
+        }
+
+        let flight = this.flights.get(key);
+        if (flight) {
+            this.stats.coalesced++;
+            for (const args of flight.events.values()) {
+                onEvent?.(...args);
+            }
+        } else {
+            flight = { controller: new AbortController(), waiters: new Set(), events: new Map() };
+            const emit = onEvent ? (...args) => {
+                flight.events.set(args[0], args);
+                for (const waiter of flight.waiters) {
+                    waiter.onEvent?.(...args);
+                }
+            } : null;
+            this.flights.set(key, flight);
+            this.stats.started++;
+            flight.promise = Promise.resolve()
+                .then(() => work(flight.controller.signal, emit))
+                .finally(() => this.settle(key, flight));
+            flight.promise.catch(() => {}); // rejections reach the waiters, if any are left
+        }
+        return this.join(key, flight, signal, onEvent);
+    }
+
+    join(key, flight, signal, onEvent) {
+        return new Promise((resolve, reject) => {
+            const waiter = { onEvent };
+            const leave = () => {
+                if (!flight.waiters.delete(waiter)) return;
+                reject(this.cancelledError());
+                if (flight.waiters.size === 0) {
+                    this.stats.cancelled++;
+                    this.settle(key, flight);
+                    flight.controller.abort();
+                }
+            };
+            flight.waiters.add(waiter);
+            signal?.addEventListener('abort', leave, { once: true });
+            flight.promise.then(resolve, reject).finally(() => {
+                flight.waiters.delete(waiter);
+                signal?.removeEventListener('abort', leave);
+            });
+        });
+    }
+
+    settle(key, flight) {
+        // A flight that is done or abandoned no longer takes new callers
+        if (this.flights.get(key) === flight) {
+            this.flights.delete(key);
+        }
+    }
+
+    cancelledError() {
+        const error = new Error('Enhancement cancelled');
+        error.name = 'AbortError';
+        return error;
+    }
+
+    getStats() {
+        return { ...this.stats, inFlight: this.flights.size };
+    }
+}
+
+// Incremental re-enhancement: the fitted prompt text is split into paragraphs and each
+// one is fingerprinted. Paragraphs are grouped into chunks at content-defined boundaries,
+// so an edit, insertion or deletion only changes the chunk around it. The first
+// enhancement of a page is a normal request that only stores its fingerprints; from the
+// next run on every chunk's result is stored per URL, and a re-run only sends the
+// chunks that changed.
+const REVISION_CHUNK_MIN = 1000;
+const REVISION_CHUNK_MAX = 4000;
+const REVISION_BOUNDARY_MASK = 0x3;
+
+class ContentRevisions {
+    constructor(store = new EnhancementCache({
+        indexKey: 'enhancementRevisionIndex',
+        entryPrefix: 'enhancementRevision:',
+        maxBytes: 2 * 1024 * 1024,
+        ttl: 30 * 24 * 60 * 60 * 1000
+    })) {
+        this.store = store;
+    }
+
+    paragraphs(text) {
+        return (text || '').split(/\n\s*\n/).map(paragraph => paragraph.trim()).filter(Boolean);
+    }
+
+    async fingerprint(text) {
+        const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+        return Array.from(new Uint8Array(digest, 0, 8), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    async chunk(text, maxSize = REVISION_CHUNK_MAX, minSize = REVISION_CHUNK_MIN) {
+        const paragraphs = this.paragraphs(text);
+        const fingerprints = await Promise.all(paragraphs.map(paragraph => this.fingerprint(this.store.normalizeText(paragraph))));
+        const groups = [];
+        let current = null;
+
+        paragraphs.forEach((paragraph, index) => {
+            if (current && current.size + paragraph.length > maxSize) {
+                groups.push(current);
+                current = null;
+            }
+            current = current || { paragraphs: [], fingerprints: [], size: 0 };
+            current.paragraphs.push(paragraph);
+            current.fingerprints.push(fingerprints[index]);
+            current.size += paragraph.length + 2;
+
+            // The boundary depends only on the paragraph itself, so chunks re-align right after a change
+            if (current.size >= minSize && (parseInt(fingerprints[index].slice(0, 8), 16) & REVISION_BOUNDARY_MASK) === 0) {
+                groups.push(current);
+                current = null;
+            }
+        });
+        if (current) {
+            groups.push(current);
+        }
+
+        return Promise.all(groups.map(async group => ({
+            id: await this.fingerprint(group.fingerprints.join(':')),
+            fingerprints: group.fingerprints,
+            text: group.paragraphs.join('\n\n')
+        })));
+    }
+
+    buildKey(url, settings) {
+        // Chunk results depend on the enhancement type, sources flag and model, not on the PDF style
+        return this.store.buildKey(url, {
+            enhancementType: settings.enhancementType,
+            includeSources: settings.includeSources,
+            model: settings.model,
+            mode: 'incremental'
+        });
+    }
+
+    async load(key) {
+        return (await this.store.get(key)) || { chunks: [], reduced: null };
+    }
+
+    worthChunking(previous, chunks) {
+        // Stored chunk results make the chunked path cheap. With fingerprints only it pays
+        // off once the page has changed; an unchanged page stays a normal (cacheable) request
+        if (previous.chunks.length === 0) {
+            return false;
+        }
+        return previous.chunks.some(chunk => chunk.partial !== null)
+            || previous.chunks.map(chunk => chunk.id).join() !== chunks.map(chunk => chunk.id).join();
+    }
+
+    async save(key, url, chunks, partials, reduced) {
+        await this.store.set(key, {
+            url,
+            chunks: chunks.map((chunk, index) => ({ id: chunk.id, fingerprints: chunk.fingerprints, partial: partials[index] })),
+            reduced
+        });
+    }
+}
+
+// Prompt budgeting: the article is split into blocks, boilerplate is dropped and,
+// when the text does not fit the model's input budget (and maxContentLength),
+// the most salient paragraphs are kept in their original order.
+const MODEL_INPUT_TOKEN_LIMITS = {
+    'gemini-2.5-flash': 1048576,
+    'gemini-2.5-flash-lite': 1048576,
+    'gemini-2.5-pro': 1048576,
+    'gemini-2.0-flash': 1048576,
+    'gemini-1.5-flash': 1048576
+};
+const DEFAULT_INPUT_TOKEN_LIMIT = 32768;
+const PROMPT_BLOCK_PATTERN = /<(\/?)(h[1-6]|p|li|blockquote|pre|td|th|dt|dd|figcaption|div|section|article|tr|br|hr)\b[^>]*>/gi;
+const PROMPT_BOILERPLATE = /^(?:advertisement|sponsored|share (?:this|on)|follow us|subscribe|sign up|newsletter|related (?:articles|posts|stories)|read more|recommended for you|we use cookies|accept cookies|all rights reserved|copyright|©|click here|skip to|back to top|print this|tags?:)/i;
+const PROMPT_CJK = /[\p{Script=Han}\p{Script=Hiragana}\p{Script=Katakana}\p{Script=Hangul}]/u;
+const PROMPT_TOKEN_PATTERN = /[\p{Script=Han}\p{Script=Hiragana}\p{Script=Katakana}\p{Script=Hangul}]|[^\s\p{P}\p{S}\p{Script=Han}\p{Script=Hiragana}\p{Script=Katakana}\p{Script=Hangul}]+|[\p{P}\p{S}]/gu;
+const PROMPT_STOPWORDS = new Set([
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'any', 'can', 'had', 'her', 'was', 'one', 'our',
+    'out', 'has', 'have', 'his', 'how', 'its', 'may', 'new', 'now', 'see', 'who', 'did', 'get', 'him', 'she',
+    'too', 'use', 'that', 'with', 'this', 'from', 'they', 'will', 'would', 'there', 'their', 'what', 'about',
+    'which', 'when', 'were', 'been', 'more', 'also', 'into', 'than', 'then', 'them', 'these', 'some', 'such',
+    'only', 'over', 'most', 'other', 'just', 'like', 'your', 'each', 'very', 'could', 'should'
+]);
+
+class PromptBudget {
+    constructor(options = {}) {
+        this.model = options.model || null;
+        this.maxContentLength = options.maxContentLength || 50000;
+        // Tokens kept free for the prompt template and enhancement instructions
+        this.reservedTokens = options.reservedTokens ?? 2048;
+        this.inputLimit = MODEL_INPUT_TOKEN_LIMITS[this.model] || DEFAULT_INPUT_TOKEN_LIMIT;
+        this.maxTokens = options.maxTokens || this.inputLimit - this.reservedTokens;
+    }
+
+    estimateTokens(text) {
+        // Local approximation of Gemini's SentencePiece tokenizer: about four characters
+        // per token for words, one per CJK character and one per punctuation mark
+        if (!text) {
+            return 0;
+        }
+        let tokens = 0;
+        for (const match of text.matchAll(PROMPT_TOKEN_PATTERN)) {
+            const piece = match[0];
+            tokens += piece.length > 4 && !PROMPT_CJK.test(piece) ? Math.ceil(piece.length / 4) : 1;
+        }
+        return tokens;
+    }
+
+    segment(contentData) {
+        // textContent is whitespace-collapsed, so paragraphs come from the article HTML
+        const blocks = contentData.content ? this.blocksFromHTML(contentData.content) : [];
+        return blocks.length > 0 ? blocks : this.blocksFromText(contentData.textContent || '');
+    }
+
+    blocksFromHTML(html) {
+        const source = html
+            .replace(/<(script|style|noscript|template)\b[\s\S]*?<\/\1\s*>/gi, ' ')
+            .replace(/<!--[\s\S]*?-->/g, ' ');
+        const blocks = [];
+        let cursor = 0;
+        let level = 0;
+
+        const flush = (end) => {
+            const text = this.decodeEntities(source.slice(cursor, end).replace(/<[^>]*>/g, ' ')).replace(/\s+/g, ' ').trim();
+            if (text) {
+                blocks.push(...this.splitLong(text).map(part => ({ text: part, level })));
+            }
+        };
+
+        for (const match of source.matchAll(PROMPT_BLOCK_PATTERN)) {
+            flush(match.index);
+            cursor = match.index + match[0].length;
+            const tag = match[2].toLowerCase();
+            if (/^h[1-6]$/.test(tag)) {
+                level = match[1] ? 0 : Number(tag[1]);
+            }
+        }
+        flush(source.length);
+        return blocks;
+    }
+
+    blocksFromText(text) {
+        return text.split(/\n\s*\n|\n/)
+            .map(part => part.replace(/\s+/g, ' ').trim())
+            .filter(Boolean)
+            .flatMap(part => this.splitLong(part))
+            .map(part => ({ text: part, level: 0 }));
+    }
+
+    splitLong(text, size = 1200) {
+        // Very long runs (e.g. collapsed textContent) become sentence groups of about `size` chars
+        if (text.length <= size) {
+            return [text];
+        }
+        const parts = [];
+        let current = '';
+        for (const sentence of text.match(/[^.!?]+(?:[.!?]+|$)\s*/g) || [text]) {
+            if (current && current.length + sentence.length > size) {
+                parts.push(current.trim());
+                current = '';
+            }
+            current += sentence;
+            while (current.length > size * 2) {
+                const cut = current.lastIndexOf(' ', size);
+                const index = cut > 0 ? cut : size;
+                parts.push(current.slice(0, index).trim());
+                current = current.slice(index);
+            }
+        }
+        if (current.trim()) {
+            parts.push(current.trim());
+        }
+        return parts;
+    }
+
+    decodeEntities(text) {
+        const named = { amp: '&', lt: '<', gt: '>', quot: '"', apos: "'", nbsp: ' ', mdash: '—', ndash: '–', hellip: '…' };
+        return text.replace(/&(#x[0-9a-f]+|#\d+|[a-z]+);/gi, (entity, name) => {
+            if (name[0] === '#') {
+                const code = name[1] === 'x' || name[1] === 'X' ? parseInt(name.slice(2), 16) : parseInt(name.slice(1), 10);
+                return code > 0 && code <= 0x10FFFF ? String.fromCodePoint(code) : entity;
+            }
+            return named[name.toLowerCase()] ?? entity;
+        });
+    }
+
+    isBoilerplate(block, seen) {
+        const key = block.text.toLowerCase();
+        if (seen.has(key)) {
+            return true; // repeated bylines, captions, share bars
+        }
+        seen.add(key);
+        return block.text.length < 200 && PROMPT_BOILERPLATE.test(block.text);
+    }
+
+    terms(text) {
+        return (text.toLowerCase().match(/[\p{L}\p{N}]{3,}/gu) || []).filter(term => !PROMPT_STOPWORDS.has(term));
+    }
+
+    rank(blocks, title) {
+        // Salience = position in the article + overlap with the title and the
+        // enclosing section heading + how central the paragraph's terms are
+        const titleTerms = new Set(this.terms(title || ''));
+        const documentFrequency = new Map();
+        const termSets = blocks.map(block => new Set(this.terms(block.text)));
+        termSets.forEach(terms => terms.forEach(term => documentFrequency.set(term, (documentFrequency.get(term) || 0) + 1)));
+
+        // Terms shared with other blocks signal the topic; terms in most blocks are template noise
+        const common = Math.max(2, Math.floor(blocks.length / 2));
+        let sectionTerms = new Set();
+        let sectionStart = true;
+        blocks.forEach((block, index) => {
+            const terms = termSets[index];
+            if (block.level) {
+                sectionTerms = terms;
+                sectionStart = true;
+                return;
+            }
+            let focus = 0;
+            let shared = 0;
+            terms.forEach(term => {
+                if (titleTerms.has(term) || sectionTerms.has(term)) focus++;
+                const frequency = documentFrequency.get(term);
+                if (frequency >= 2 && frequency <= common) shared++;
+            });
+            block.focus = terms.size ? Math.min(1, focus / Math.sqrt(terms.size)) : 0;
+            block.centrality = terms.size ? shared / terms.size : 0;
+            block.lead = sectionStart ? 0.1 : 0;
+            sectionStart = false;
+        });
+
+        blocks.forEach((block, index) => {
+            if (block.level) {
+                return;
+            }
+            const position = 1 - index / blocks.length;
+            block.salience = 0.35 * position + 0.4 * block.focus + 0.25 * block.centrality + block.lead;
+        });
+    }
+
+    fit(contentData, maxTokens = this.maxTokens) {
+        const seen = new Set();
+        const all = this.segment(contentData);
+        const blocks = all.filter(block => !this.isBoilerplate(block, seen));
+        blocks.forEach(block => {
+            block.tokens = this.estimateTokens(block.text);
+        });
+
+        const totalTokens = blocks.reduce((sum, block) => sum + block.tokens, 0);
+        const totalChars = blocks.reduce((sum, block) => sum + block.text.length + 2, 0);
+        let kept = blocks;
+
+        if (totalTokens > maxTokens || totalChars > this.maxContentLength) {
+            kept = this.select(blocks, contentData.title, maxTokens);
+        }
+
+        const text = this.join(blocks, new Set(kept));
+        return {
+            text,
+            tokens: this.estimateTokens(text),
+            budget: maxTokens,
+            totalTokens,
+            blocks: all.length,
+            keptBlocks: kept.length,
+            boilerplateBlocks: all.length - blocks.length,
+            trimmed: kept.length < blocks.length
+        };
+    }
+
+    select(blocks, title, maxTokens) {
+        this.rank(blocks, title);
+
+        // Each paragraph knows its section heading; the heading is paid for with its first kept paragraph
+        let heading = null;
+        const headingOf = new Map();
+        blocks.forEach(block => {
+            if (block.level) heading = block;
+            else headingOf.set(block, heading);
+        });
+
+        const chosen = new Set();
+        let tokens = 0;
+        let chars = 0;
+        const candidates = blocks.filter(block => !block.level).sort((a, b) => b.salience - a.salience);
+        for (const block of candidates) {
+            const section = headingOf.get(block);
+            const extra = section && !chosen.has(section) ? [section, block] : [block];
+            const cost = extra.reduce((sum, item) => sum + item.tokens + 2, 0);
+            const length = extra.reduce((sum, item) => sum + item.text.length + 7, 0); // separator or gap marker
+            if (tokens + cost > maxTokens || chars + length > this.maxContentLength) {
+                continue;
+            }
+            extra.forEach(item => chosen.add(item));
+            tokens += cost;
+            chars += length;
+        }
+
+        if (chosen.size === 0 && candidates.length > 0) {
+            // Nothing fits whole: keep the start of the most salient paragraph
+            const limit = Math.min(this.maxContentLength, maxTokens * 4);
+            return [{ ...candidates[0], text: candidates[0].text.slice(0, limit) }];
+        }
+        return blocks.filter(block => chosen.has(block));
+    }
+
+    join(blocks, kept) {
+        const parts = [];
+        let gap = false;
+        for (const block of blocks) {
+            if (!kept.has(block)) {
+                gap = true;
+                continue;
+            }
+            if (gap && parts.length > 0) {
+                parts.push('[…]');
+            }
+            gap = false;
+            parts.push(block.level ? `${'#'.repeat(block.level)} ${block.text}` : block.text);
+        }
+        // The oversized-paragraph fallback returns a copy that is not in `blocks`
+        if (parts.length === 0 && kept.size > 0) {
+            parts.push(...[...kept].map(block => block.text));
+        }
+        return parts.join('\n\n');
+    }
+}
+
+// Sentence- and heading-aware chunking. The text is segmented into headings and sentences
+// as [start, end) offsets without copying it; sentence ends keep their punctuation and skip
+// decimals, URLs, initials and common abbreviations. Chunks are filled greedily up to a
+// token budget, a heading starts a new chunk once the current one is half full, and
+// consecutive chunks can share trailing sentences of overlap. Everything is one pass.
+const CHUNK_TOKENS = 1000;
+const CHUNK_CHARS_PER_TOKEN = 4;
+const CHUNK_BLOCK_BREAK = /\n[ \t]*\n\s*|\n(?=#{1,6}\s)/g;
+const CHUNK_HEADING = /#{1,6}\s/y;
+const CHUNK_SENTENCE_END = /[.!?…]+["'”’)\]]*(?=\s|$)|[。！？]+["'”’」』)\]]*/g;
+const CHUNK_WORD = /\S+\s*/g;
+const CHUNK_DOTTED = /^(?:\w\.)+\w$/;
+const CHUNK_ABBREVIATIONS = new Set(`
+    mr mrs ms dr prof sr jr st mt vs etc inc ltd co corp dept est approx fig figs eq no nos vol vols
+    p pp ch sec jan feb mar apr jun jul aug sep sept oct nov dec
+`.split(/\s+/).filter(Boolean));
+
+class ContentChunker {
+    constructor(budget = new PromptBudget()) {
+        this.budget = budget;
+    }
+
+    skipSpace(text, position) {
+        while (position < text.length && /\s/.test(text[position])) {
+            position++;
+        }
+        return position;
+    }
+
+    isAbbreviation(text, sentenceStart, match, end) {
+        // Punctuation followed by a lowercase word, or a single '.' after an abbreviation or initial
+        const following = this.skipSpace(text, match.index + match[0].length);
+        if (following < end && text[following] !== text[following].toUpperCase()) {
+            return true;
+        }
+        if (match[0] !== '.') {
+            return false;
+        }
+        const word = text.slice(Math.max(sentenceStart, text.lastIndexOf(' ', match.index - 1) + 1), match.index)
+            .replace(/^[("'“‘]+/, '');
+        return CHUNK_ABBREVIATIONS.has(word.toLowerCase()) || /^[A-Z]$/.test(word) || CHUNK_DOTTED.test(word);
+    }
+
+    *blocks(text) {
+        // Paragraphs; a Markdown heading line always starts a new block
+        let position = 0;
+        for (const match of text.matchAll(CHUNK_BLOCK_BREAK)) {
+            yield [position, match.index];
+            position = match.index + match[0].length;
+        }
+        yield [position, text.length];
+    }
+
+    segments(text) {
+        const spans = [];
+        for (let [start, end] of this.blocks(text)) {
+            start = this.skipSpace(text, start);
+            while (end > start && /\s/.test(text[end - 1])) {
+                end--;
+            }
+            if (start >= end) {
+                continue;
+            }
+            CHUNK_HEADING.lastIndex = start;
+            if (CHUNK_HEADING.test(text)) {
+                const newline = text.indexOf('\n', start);
+                const lineEnd = newline === -1 || newline > end ? end : newline;
+                spans.push([start, lineEnd, 'heading']);
+                start = this.skipSpace(text, lineEnd);
+            }
+
+            let sentenceStart = start;
+            CHUNK_SENTENCE_END.lastIndex = start;
+            let match;
+            while ((match = CHUNK_SENTENCE_END.exec(text)) && match.index < end) {
+                if (this.isAbbreviation(text, sentenceStart, match, end)) {
+                    continue;
+                }
+                spans.push([sentenceStart, match.index + match[0].length, 'sentence']);
+                sentenceStart = this.skipSpace(text, match.index + match[0].length);
+            }
+            if (sentenceStart < end) {
+                spans.push([sentenceStart, end, 'sentence']);
+            }
+        }
+        return spans;
+    }
+
+    splitWords(text, start, end, maxTokens) {
+        // Break a run longer than maxTokens at word boundaries
+        const pieces = [];
+        let pieceStart = start;
+        let tokens = 0;
+        let last = start;
+        CHUNK_WORD.lastIndex = start;
+        let match;
+        while ((match = CHUNK_WORD.exec(text)) && match.index < end) {
+            const wordEnd = Math.min(end, match.index + match[0].length);
+            const wordTokens = this.budget.estimateTokens(text.slice(match.index, wordEnd));
+            if (tokens && tokens + wordTokens > maxTokens) {
+                pieces.push([pieceStart, last, tokens]);
+                pieceStart = match.index;
+                tokens = 0;
+            }
+            tokens += wordTokens;
+            last = match.index + text.slice(match.index, wordEnd).trimEnd().length;
+        }
+        if (tokens) {
+            pieces.push([pieceStart, last, tokens]);
+        }
+        return pieces;
+    }
+
+    chunk(text, { maxTokens = CHUNK_TOKENS, overlapTokens = 0 } = {}) {
+        // [{start, end, tokens}] offsets into text; overlap is never carried across a heading
+        maxTokens = Math.max(1, maxTokens);
+        overlapTokens = Math.min(overlapTokens, Math.floor(maxTokens / 2));
+        const pieces = [];
+        for (const [start, end, kind] of this.segments(text || '')) {
+            const tokens = this.budget.estimateTokens(text.slice(start, end));
+            if (tokens <= maxTokens) {
+                pieces.push([start, end, kind, tokens]);
+            } else {
+                for (const [pieceStart, pieceEnd, pieceTokens] of this.splitWords(text, start, end, maxTokens)) {
+                    pieces.push([pieceStart, pieceEnd, pieceStart === start ? kind : 'sentence', pieceTokens]);
+                }
+            }
+        }
+
+        const chunks = [];
+        let first = 0;
+        let tokens = 0;
+        let fresh = 0;
+        pieces.forEach(([, , kind, pieceTokens], index) => {
+            const atHeading = kind === 'heading' && tokens >= Math.floor(maxTokens / 2);
+            if (fresh && (tokens + pieceTokens > maxTokens || atHeading)) {
+                chunks.push({ start: pieces[first][0], end: pieces[index - 1][1], tokens });
+                const previous = first;
+                first = index;
+                tokens = 0;
+                fresh = 0;
+                // Trailing sentences of the finished chunk are repeated as context
+                while (overlapTokens && !atHeading && first - 1 > previous && pieces[first - 1][2] !== 'heading'
+                    && tokens + pieces[first - 1][3] <= overlapTokens) {
+                    first--;
+                    tokens += pieces[first][3];
+                }
+            }
+            if (tokens + pieceTokens > maxTokens) {
+                // Overlap only: drop it rather than exceed the budget
+                first = index;
+                tokens = 0;
+            }
+            tokens += pieceTokens;
+            fresh++;
+        });
+        if (fresh) {
+            chunks.push({ start: pieces[first][0], end: pieces[pieces.length - 1][1], tokens });
+        }
+        return chunks;
+    }
+}
+
+// Extractive pre-summarization for summarize mode: sentences become sublinear TF-IDF
+// vectors and TextRank runs over their cosine-similarity graph. The top-ranked sentences
+// are kept in document order within a token budget, each section heading with its first
+// kept sentence. The graph is never built: one TextRank step is two sparse products.
+const EXTRACTIVE_RATIO = 0.35;
+const EXTRACTIVE_MIN_TOKENS = 1500;
+const EXTRACTIVE_DAMPING = 0.85;
+const EXTRACTIVE_MAX_ITERATIONS = 50;
+const EXTRACTIVE_TOLERANCE = 1e-6;
+const EXTRACTIVE_LEAD_BOOST = 1.2;
+const EXTRACTIVE_GAP_MARKER = '[…]';
+const EXTRACTIVE_CJK_RUN = /[\p{Script=Han}\p{Script=Hiragana}\p{Script=Katakana}\p{Script=Hangul}]+/gu;
+
+class ExtractiveSummarizer {
+    constructor(budget = new PromptBudget()) {
+        this.budget = budget;
+        this.chunker = new ContentChunker(budget);
+    }
+
+    terms(text) {
+        // Content words; CJK runs, which have no spaces, become character bigrams
+        const words = this.budget.terms(text.replace(EXTRACTIVE_CJK_RUN, ' '));
+        for (const [run] of text.matchAll(EXTRACTIVE_CJK_RUN)) {
+            const characters = [...run];
+            for (let i = 0; i < Math.max(1, characters.length - 1); i++) {
+                words.push(characters.slice(i, i + 2).join(''));
+            }
+        }
+        return words;
+    }
+
+    tfidf(sentenceTerms) {
+        // Triples of the L2-normalised TF-IDF matrix
+        const vocabulary = new Map();
+        const rows = [];
+        const columns = [];
+        const counts = [];
+        sentenceTerms.forEach((words, row) => {
+            const frequency = new Map();
+            for (const word of words) {
+                if (!vocabulary.has(word)) {
+                    vocabulary.set(word, vocabulary.size);
+                }
+                const column = vocabulary.get(word);
+                frequency.set(column, (frequency.get(column) || 0) + 1);
+            }
+            for (const [column, count] of frequency) {
+                rows.push(row);
+                columns.push(column);
+                counts.push(count);
+            }
+        });
+
+        const documentFrequency = new Float64Array(vocabulary.size);
+        for (const column of columns) {
+            documentFrequency[column]++;
+        }
+        const weights = new Float64Array(counts.length);
+        const norms = new Float64Array(sentenceTerms.length);
+        counts.forEach((count, index) => {
+            const idf = Math.log((1 + sentenceTerms.length) / (1 + documentFrequency[columns[index]])) + 1;
+            weights[index] = (1 + Math.log(count)) * idf;
+            norms[rows[index]] += weights[index] ** 2;
+        });
+        weights.forEach((weight, index) => {
+            weights[index] = weight / Math.max(Math.sqrt(norms[rows[index]]), 1e-12);
+        });
+        return { rows: Int32Array.from(rows), columns: Int32Array.from(columns), weights, vocabulary: vocabulary.size };
+    }
+
+    textrank({ rows, columns, weights, vocabulary }, sentences) {
+        // (N Nᵀ - I) vector; the identity removes each sentence's self-similarity
+        const similarityTimes = (vector) => {
+            const projected = new Float64Array(vocabulary);
+            for (let i = 0; i < weights.length; i++) {
+                projected[columns[i]] += weights[i] * vector[rows[i]];
+            }
+            const result = new Float64Array(sentences);
+            for (let i = 0; i < weights.length; i++) {
+                result[rows[i]] += weights[i] * projected[columns[i]];
+            }
+            for (let i = 0; i < sentences; i++) {
+                result[i] -= vector[i];
+            }
+            return result;
+        };
+
+        const degree = similarityTimes(new Float64Array(sentences).fill(1));
+        let scores = new Float64Array(sentences).fill(1 / sentences);
+        for (let iteration = 0; iteration < EXTRACTIVE_MAX_ITERATIONS; iteration++) {
+            const spread = similarityTimes(scores.map((score, i) => degree[i] > 1e-9 ? score / degree[i] : 0));
+            const updated = spread.map(value => (1 - EXTRACTIVE_DAMPING) / sentences + EXTRACTIVE_DAMPING * value);
+            const change = updated.reduce((sum, value, i) => sum + Math.abs(value - scores[i]), 0);
+            scores = updated;
+            if (change < EXTRACTIVE_TOLERANCE) {
+                break;
+            }
+        }
+        // Sentences sharing no terms with the rest of the page are never selected
+        return scores.map((score, i) => degree[i] > 1e-9 ? score : 0);
+    }
+
+    summarize(text, { maxTokens = null, ratio = EXTRACTIVE_RATIO, minTokens = EXTRACTIVE_MIN_TOKENS } = {}) {
+        const originalTokens = this.budget.estimateTokens(text);
+        maxTokens = maxTokens || Math.max(1, Math.floor(originalTokens * ratio));
+        const result = {
+            text, tokens: originalTokens, originalTokens, budget: maxTokens,
+            sentences: 0, keptSentences: 0, applied: false
+        };
+        if (originalTokens < minTokens || originalTokens <= maxTokens) {
+            return result;
+        }
+
+        // Sentences without content terms (gap markers, bare numbers) are never worth a slot
+        const spans = this.chunker.segments(text);
+        const sentences = [];
+        const headingOf = new Map();
+        let heading = null;
+        let previousEnd = 0;
+        spans.forEach(([start, end, kind], index) => {
+            const opensParagraph = index === 0 || text.slice(previousEnd, start).includes('\n');
+            previousEnd = end;
+            if (kind === 'heading') {
+                heading = index;
+                return;
+            }
+            const sentence = text.slice(start, end);
+            const words = this.terms(sentence);
+            if (words.length > 0 && sentence !== EXTRACTIVE_GAP_MARKER) {
+                sentences.push({ index, words, lead: opensParagraph });
+                headingOf.set(index, heading);
+            }
+        });
+        result.sentences = sentences.length;
+        if (sentences.length < 2) {
+            return result;
+        }
+
+        const ranks = this.textrank(this.tfidf(sentences.map(sentence => sentence.words)), sentences.length);
+        const order = sentences.map((sentence, position) => ({
+            index: sentence.index,
+            score: ranks[position] * (sentence.lead ? EXTRACTIVE_LEAD_BOOST : 1)
+        })).sort((a, b) => b.score - a.score);
+
+        const chosen = new Set();
+        let tokens = 0;
+        for (const { index, score } of order) {
+            if (score <= 0) {
+                break;
+            }
+            const section = headingOf.get(index);
+            const extra = section === null || chosen.has(section) ? [index] : [section, index];
+            const cost = extra.reduce((sum, item) => sum + this.budget.estimateTokens(text.slice(spans[item][0], spans[item][1])) + 1, 0);
+            if (tokens + cost > maxTokens) {
+                continue;
+            }
+            extra.forEach(item => chosen.add(item));
+            tokens += cost;
+        }
+
+        if (chosen.size === 0) {
+            return result;
+        }
+        const summary = this.join(text, spans, chosen);
+        return {
+            ...result,
+            text: summary,
+            tokens: this.budget.estimateTokens(summary),
+            keptSentences: [...chosen].filter(index => spans[index][2] !== 'heading').length,
+            applied: true
+        };
+    }
+
+    join(text, spans, chosen) {
+        // A paragraph's kept sentences on one line, a gap marker where text was dropped
+        const paragraphs = [];
+        let current = [];
+        let previousEnd = 0;
+        let gap = false;
+        let afterHeading = false;
+        spans.forEach(([start, end, kind], index) => {
+            if ((kind === 'heading' || text.slice(previousEnd, start).includes('\n')) && current.length > 0) {
+                paragraphs.push(current.join(' '));
+                current = [];
+                afterHeading = false;
+            }
+            previousEnd = end;
+            if (!chosen.has(index)) {
+                gap = true;
+                return;
+            }
+            if (gap && paragraphs.length > 0 && current.length === 0 && !afterHeading && kind !== 'heading') {
+                paragraphs.push(EXTRACTIVE_GAP_MARKER);
+            }
+            gap = false;
+            if (kind === 'heading') {
+                paragraphs.push(text.slice(start, end));
+                afterHeading = true;
+            } else {
+                current.push(text.slice(start, end));
+            }
+        });
+        if (current.length > 0) {
+            paragraphs.push(current.join(' '));
+        }
+        return paragraphs.join('\n\n');
+    }
+}
+
+// Persistent job queue: MV3 evicts an idle service worker after ~30s, so enhance/PDF
+// work is tracked as job records in IndexedDB. Each stage's output is saved as soon
+// as it completes, and a restarted worker resumes unfinished jobs from their next stage.
+const JOB_ALARM = 'jobQueueKeepAlive';
+const JOB_TERMINAL_STATES = new Set(['done', 'failed']);
+const JOB_MAX_ATTEMPTS = 3;
+const JOB_RETENTION = 7 * 24 * 60 * 60 * 1000;
+
+class JobStore {
+    constructor(name = 'ai-enhancer-jobs') {
+        this.name = name;
+        this.dbPromise = null;
+    }
+
+    open() {
+        if (!this.dbPromise) {
+            this.dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(this.name, 1);
+                request.onupgradeneeded = () => {
+                    const store = request.result.createObjectStore('jobs', { keyPath: 'id' });
+                    store.createIndex('key', 'key');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        }
+        return this.dbPromise;
+    }
+
+    async request(mode, operation) {
+        const db = await this.open();
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction('jobs', mode);
+            const request = operation(transaction.objectStore('jobs'));
+            // Resolve on commit so a put is durable before the caller moves on
+            transaction.oncomplete = () => resolve(request.result);
+            transaction.onerror = () => reject(transaction.error);
+            transaction.onabort = () => reject(transaction.error);
+        });
+    }
+
+    get(id) {
+        return this.request('readonly', store => store.get(id));
+    }
+
+    put(job) {
+        return this.request('readwrite', store => store.put(job));
+    }
+
+    delete(id) {
+        return this.request('readwrite', store => store.delete(id));
+    }
+
+    all() {
+        return this.request('readonly', store => store.getAll());
+    }
+
+    byKey(key) {
+        return this.request('readonly', store => store.index('key').getAll(key));
+    }
+}
+
+class JobQueue {
+    constructor(stages, options = {}) {
+        // stages: { extracting, enhancing, rendering } -> async (job, live) => fields to save
+        this.stages = stages;
+        this.store = options.store || new JobStore();
+        this.concurrency = options.concurrency || 2;
+        this.onSettled = options.onSettled || null;
+        // Fills in the stored processing settings, so a job keeps the ones it was queued with
+        this.resolveSettings = options.resolveSettings || (async settings => settings);
+        this.pending = [];
+        this.running = new Map(); // id -> live (in-memory) state such as streamed sections
+        this.watchers = new Map(); // id -> listeners pushed every state change and section
+        this.keepAliveTimer = null;
+    }
+
+    watch(id, listener) {
+        if (!this.watchers.has(id)) {
+            this.watchers.set(id, new Set());
+        }
+        this.watchers.get(id).add(listener);
+        return () => {
+            this.watchers.get(id)?.delete(listener);
+            if (this.watchers.get(id)?.size === 0) {
+                this.watchers.delete(id);
+            }
+        };
+    }
+
+    publish(job) {
+        const listeners = this.watchers.get(job.id);
+        if (!listeners) return;
+        const view = this.describe(job);
+        for (const listener of listeners) {
+            listener(view);
+        }
+    }
+
+    nextStage(job) {
+        if (job.documents) {
+            // Bundles extract and enhance all documents in one stage; failed documents are left out
+            if (job.documents.some(document => !document.enhanced && !document.error)) return 'enhancing';
+        } else {
+            if (!job.content) return 'extracting';
+            if (!job.enhanced) return 'enhancing';
+        }
+        if (!job.result) return 'rendering';
+        return null;
+    }
+
+    jobKey(url, settings) {
+        // Every setting takes part, so jobs that differ in anything that changes the output
+        // (routing budget, extractive summary, ...) are never merged
+        return JSON.stringify([url, Object.entries(settings).sort(([a], [b]) => a.localeCompare(b))]);
+    }
+
+    async enqueue({ url = null, content = null, settings = {}, source = 'popup', download = false, force = false }) {
+        url = url || content?.url || null;
+        if (!url && !content) {
+            throw new Error('A job needs a URL or extracted content');
+        }
+
+        // A page already queued or in progress with the same settings is not enhanced twice
+        settings = await this.resolveSettings(settings);
+        const key = this.jobKey(url, settings);
+        if (!force) {
+            const existing = (await this.store.byKey(key)).find(job => !JOB_TERMINAL_STATES.has(job.state));
+            if (existing) {
+                return existing;
+            }
+        }
+
+        return await this.add({ key, source, url, title: content?.title || null, settings, download, content, enhanced: null });
+    }
+
+    async enqueueBundle({ items = [], title = null, settings = {}, source = 'popup', download = false, force = false }) {
+        // items: URLs or extracted content; the same page is only included once
+        settings = await this.resolveSettings(settings);
+        const documents = [];
+        const seen = new Set();
+        for (const item of items) {
+            const content = typeof item === 'string' ? null : item;
+            const url = typeof item === 'string' ? item : item?.url || null;
+            if ((!url && !content) || (url && seen.has(url))) continue;
+            if (url) seen.add(url);
+            documents.push({ url, title: content?.title || null, content, enhanced: null, error: null });
+        }
+        if (documents.length === 0) {
+            throw new Error('A bundle needs at least one URL or extracted page');
+        }
+
+        const key = this.jobKey(`bundle:${documents.map(document => document.url).join('|')}`, settings);
+        if (!force) {
+            const existing = (await this.store.byKey(key)).find(job => !JOB_TERMINAL_STATES.has(job.state));
+            if (existing) {
+                return existing;
+            }
+        }
+        return await this.add({ key, source, url: null, title, settings, download, documents });
+    }
+
+    async add(fields) {
+        const now = Date.now();
+        const job = {
+            id: crypto.randomUUID(),
+            state: 'queued',
+            result: null,
+            error: null,
+            attempts: 0,
+            createdAt: now,
+            updatedAt: now,
+            ...fields
+        };
+        await this.store.put(job);
+        this.schedule(job.id);
+        return job;
+    }
+
+    schedule(id) {
+        if (!this.running.has(id) && !this.pending.includes(id)) {
+            this.pending.push(id);
+        }
+        this.pump();
+    }
+
+    pump() {
+        while (this.running.size < this.concurrency && this.pending.length > 0) {
+            const id = this.pending.shift();
+            const live = { sections: {}, cancelled: new AbortController() };
+            this.running.set(id, live);
+            this.run(id, live)
+                .catch(error => console.error('[AI Enhancer] Job runner error', error))
+                .finally(() => {
+                    this.running.delete(id);
+                    this.pump();
+                });
+        }
+        this.updateKeepAlive();
+    }
+
+    async run(id, live) {
+        let job = await this.store.get(id);
+        while (job && !JOB_TERMINAL_STATES.has(job.state)) {
+            const stage = this.nextStage(job);
+            if (!stage) {
+                job = await this.update(job, { state: 'done' });
+                break;
+            }
+            // Attempts count stage starts; a stage that keeps dying with the worker gives up
+            if (job.attempts >= JOB_MAX_ATTEMPTS) {
+                job = await this.update(job, { state: 'failed', error: `Interrupted during ${stage} too many times` });
+                break;
+            }
+            job = await this.update(job, { state: stage, attempts: job.attempts + 1 });
+
+            let fields;
+            try {
+                fields = await this.stages[stage](job, live);
+            } catch (error) {
+                const current = await this.store.get(id);
+                if (current?.state === 'failed') {
+                    return; // cancelled: keep the reason cancel() recorded
+                }
+                job = await this.update(current || job, { state: 'failed', error: error.message });
+                break;
+            }
+
+            const current = await this.store.get(id);
+            if (!current || current.state === 'failed') {
+                return; // cancelled or cleared while the stage ran
+            }
+            job = await this.update(current, { ...fields, attempts: 0 });
+        }
+        if (job && this.onSettled) {
+            this.onSettled(job);
+        }
+    }
+
+    async update(job, fields) {
+        const updated = { ...job, ...fields, updatedAt: Date.now() };
+        await this.store.put(updated);
+        this.publish(updated);
+        return updated;
+    }
+
+    async resume() {
+        // Called on worker start and by the keep-alive alarm: pick up unfinished jobs
+        const jobs = await this.store.all();
+        const now = Date.now();
+        for (const job of jobs.sort((a, b) => a.createdAt - b.createdAt)) {
+            if (!JOB_TERMINAL_STATES.has(job.state)) {
+                this.schedule(job.id);
+            } else if (now - job.updatedAt > JOB_RETENTION) {
+                await this.store.delete(job.id);
+            }
+        }
+        this.updateKeepAlive();
+    }
+
+    updateKeepAlive() {
+        const busy = this.running.size > 0 || this.pending.length > 0;
+        if (busy && !this.keepAliveTimer) {
+            // Extension API calls reset the idle timer (Chrome 110+); the alarm restarts
+            // an evicted worker so resume() can continue from the saved stage
+            this.keepAliveTimer = setInterval(() => chrome.runtime.getPlatformInfo(() => {}), 20000);
+            if (chrome.alarms) {
+                chrome.alarms.create(JOB_ALARM, { periodInMinutes: 1 });
+            }
+        } else if (!busy && this.keepAliveTimer) {
+            clearInterval(this.keepAliveTimer);
+            this.keepAliveTimer = null;
+            if (chrome.alarms) {
+                chrome.alarms.clear(JOB_ALARM);
+            }
+        }
+    }
+
+    describe(job) {
+        // Small view for polling clients; extracted and enhanced content stay in the store
+        if (!job) {
+            return null;
+        }
+        const live = this.running.get(job.id);
+        return {
+            id: job.id,
+            state: job.state,
+            source: job.source,
+            url: job.url,
+            title: job.enhanced?.title || job.title,
+            error: job.error,
+            documents: job.documents ? job.documents.map(document => ({
+                url: document.url,
+                title: document.enhanced?.title || document.title,
+                done: Boolean(document.enhanced),
+                error: document.error
+            })) : undefined,
+            result: job.result,
+            sections: live && Object.keys(live.sections).length > 0 ? live.sections : null,
+            createdAt: job.createdAt,
+            updatedAt: job.updatedAt
+        };
+    }
+
+    async get(id) {
+        return this.describe(await this.store.get(id));
+    }
+
+    async list() {
+        const jobs = await this.store.all();
+        return jobs.sort((a, b) => b.createdAt - a.createdAt).map(job => this.describe(job));
+    }
+
+    async cancel(id) {
+        const job = await this.store.get(id);
+        if (!job || JOB_TERMINAL_STATES.has(job.state)) {
+            return this.describe(job);
+        }
+        this.pending = this.pending.filter(pendingId => pendingId !== id);
+        const updated = await this.update(job, { state: 'failed', error: 'Cancelled' });
+        this.running.get(id)?.cancelled.abort();
+        return this.describe(updated);
+    }
+
+    async retry(id) {
+        // Resumes from the first missing stage output, so finished stages are not re-run
+        const job = await this.store.get(id);
+        if (!job || job.state !== 'failed') {
+            return this.describe(job);
+        }
+        const documents = job.documents?.map(document => ({ ...document, error: null }));
+        const updated = await this.update(job, { state: 'queued', error: null, attempts: 0, ...(documents && { documents }) });
+        this.schedule(id);
+        return this.describe(updated);
+    }
+
+    async clearFinished() {
+        const jobs = await this.store.all();
+        const finished = jobs.filter(job => JOB_TERMINAL_STATES.has(job.state));
+        await Promise.all(finished.map(job => this.store.delete(job.id)));
+        return finished.length;
+    }
+}
+
+// Pipeline instrumentation: stage timings, payload sizes and token counts are kept
+// as bounded sample windows (for p50/p95 and histograms) and persisted on a debounced
+// timer so they survive service worker restarts.
+const METRIC_WINDOW = 200;
+
+class PipelineMetrics {
+    constructor(options = {}) {
+        this.window = options.window || METRIC_WINDOW;
+        this.storageKey = options.storageKey || 'pipelineMetrics';
+        this.flushDelay = options.flushDelay ?? 5000;
+        this.series = {}; // name -> { unit, samples: [[timestamp, value, url]] }
+        this.flushTimer = null;
+        this.ready = this.load();
+    }
+
+    async load() {
+        try {
+            const result = await chrome.storage.local.get([this.storageKey]);
+            const stored = result[this.storageKey] || {};
+            for (const [name, series] of Object.entries(stored)) {
+                // Samples recorded before loading finished stay newest
+                const current = this.series[name];
+                this.series[name] = {
+                    unit: series.unit,
+                    samples: [...series.samples, ...(current ? current.samples : [])].slice(-this.window)
+                };
+            }
+        } catch (error) {
+            console.error('[AI Enhancer] Failed to load metrics', error);
+        }
+    }
+
+    record(name, value, unit = 'ms', url = null) {
+        if (!Number.isFinite(value)) {
+            return;
+        }
+        let series = this.series[name];
+        if (!series) {
+            series = this.series[name] = { unit, samples: [] };
+        }
+        series.samples.push([Date.now(), Math.round(value * 100) / 100, url]);
+        // Trimmed in batches so recording stays O(1) amortized
+        if (series.samples.length > this.window * 2) {
+            series.samples.splice(0, series.samples.length - this.window);
+        }
+        this.scheduleFlush();
+    }
+
+    async time(name, work, url = null) {
+        const started = performance.now();
+        try {
+            return await work();
+        } finally {
+            this.record(name, performance.now() - started, 'ms', url);
+        }
+    }
+
+    percentile(sorted, fraction) {
+        // Nearest-rank percentile of an ascending array
+        if (sorted.length === 0) {
+            return null;
+        }
+        return sorted[Math.min(sorted.length - 1, Math.ceil(fraction * sorted.length) - 1)];
+    }
+
+    histogram(sorted) {
+        // Power-of-two buckets keyed by their upper bound
+        const buckets = {};
+        for (const value of sorted) {
+            const bound = value <= 1 ? 1 : 2 ** Math.ceil(Math.log2(value));
+            buckets[bound] = (buckets[bound] || 0) + 1;
+        }
+        return buckets;
+    }
+
+    getSummary() {
+        const metrics = {};
+        for (const [name, series] of Object.entries(this.series)) {
+            const values = series.samples.slice(-this.window).map(sample => sample[1]).sort((a, b) => a - b);
+            if (values.length === 0) continue;
+            metrics[name] = {
+                unit: series.unit,
+                count: values.length,
+                p50: this.percentile(values, 0.5),
+                p95: this.percentile(values, 0.95),
+                max: values[values.length - 1],
+                mean: Math.round(values.reduce((sum, value) => sum + value, 0) / values.length * 100) / 100,
+                histogram: this.histogram(values)
+            };
+        }
+        return { window: this.window, metrics };
+    }
+
+    toLogEntries() {
+        // Same entry shape as Logger, so exports can be merged with the app logs
+        const entries = [];
+        for (const [name, series] of Object.entries(this.series)) {
+            series.samples.forEach(([timestamp, value, url], index) => {
+                entries.push({
+                    id: `${name}-${timestamp.toString(36)}-${index}`,
+                    timestamp: new Date(timestamp).toISOString(),
+                    level: 'METRIC',
+                    message: `${name}=${value}${series.unit}`,
+                    data: { name, value, unit: series.unit },
+                    url: url || 'unknown'
+                });
+            });
+        }
+        return entries.sort((a, b) => a.timestamp.localeCompare(b.timestamp));
+    }
+
+    exportMetrics(format = 'json') {
+        // Formats and columns match Logger.exportLogs
+        const entries = this.toLogEntries();
+        switch (format.toLowerCase()) {
+            case 'csv':
+                if (entries.length === 0) return '';
+                return ['timestamp,level,message,url', ...entries.map(entry =>
+                    [entry.timestamp, entry.level, `"${entry.message.replace(/"/g, '""')}"`, entry.url].join(',')
+                )].join('\n');
+            case 'txt':
+                return entries.map(entry => `[${entry.timestamp}] ${entry.level}: ${entry.message} (${entry.url})`).join('\n');
+            default:
+                return JSON.stringify(entries, null, 2);
+        }
+    }
+
+    scheduleFlush() {
+        if (!this.flushTimer) {
+            this.flushTimer = setTimeout(() => this.flush(), this.flushDelay);
+        }
+    }
+
+    async flush() {
+        clearTimeout(this.flushTimer);
+        this.flushTimer = null;
+        await this.ready;
+        const stored = {};
+        for (const [name, series] of Object.entries(this.series)) {
+            stored[name] = { unit: series.unit, samples: series.samples.slice(-this.window) };
+        }
+        try {
+            await chrome.storage.local.set({ [this.storageKey]: stored });
+        } catch (error) {
+            console.error('[AI Enhancer] Failed to persist metrics', error);
+        }
+    }
+
+    async clear() {
+        this.series = {};
+        clearTimeout(this.flushTimer);
+        this.flushTimer = null;
+        await chrome.storage.local.remove(this.storageKey);
+    }
+}
+
+// Main AI Enhancer Background class
+class AIEnhancerBackground {
+    constructor() {
+        this.setupMessageListener();
+        this.setupLogging();
+        this.offscreen = new OffscreenDocument();
+        this.pdfGenerator = new PDFGenerator(this.offscreen);
+        this.responseCache = new EnhancementCache();
+        this.inFlight = new SingleFlight();
+        this.revisions = new ContentRevisions();
+        this.router = new ModelRouter();
+        this.scheduler = new GeminiRequestScheduler();
+        this.metrics = new PipelineMetrics();
+        this.setupJobs();
+        this.setupContextMenu();
+    }
+
+    setupJobs() {
+        this.jobs = new JobQueue({
+            extracting: async (job) => {
+                const content = await this.metrics.time('extraction', () => this.extractURL(job.url), job.url);
+                return { content, title: content.title };
+            },
+            enhancing: async (job, live) => {
+                if (job.documents) {
+                    return { documents: await this.enhanceBundle(job, live) };
+                }
+                const enhanced = await this.enhanceContent(job.content, job.settings, {
+                    onSection: (name, value) => {
+                        live.sections[name] = value;
+                        this.jobs.publish(job);
+                    },
+                    signal: live.cancelled.signal
+                });
+                // The extracted page is already stored on the job
+                const { originalContent, ...stored } = enhanced;
+                return { enhanced: stored };
+            },
+            rendering: async (job) => job.documents ? { result: await this.renderJob(job) } : {
+                result: await this.renderJob(job),
+                // Only the rendered output is needed from here on
+                content: { url: job.content.url, title: job.content.title }
+            }
+        }, {
+            onSettled: (job) => this.onJobSettled(job),
+            resolveSettings: async (settings) => ({ ...(await this.getProcessingSettings()), ...settings })
+        });
+
+        if (chrome.alarms) {
+            chrome.alarms.onAlarm.addListener((alarm) => {
+                if (alarm.name === JOB_ALARM) {
+                    this.jobs.resume();
+                }
+            });
+        }
+        this.jobs.resume().catch(error => this.logError('Failed to resume jobs', error));
+    }
+
+    async enhanceBundle(job, live) {
+        // Documents are enhanced concurrently; each finished one is saved so a restarted
+        // worker or a retry only redoes the rest. Each document can fan out into
+        // chunkParallelism requests of its own, so the two limits are separate
+        const documents = job.documents.map(document => ({ ...document }));
+        const parallelism = Math.max(1, parseInt(job.settings.bundleParallelism, 10) || 2);
+        let cancelled = false;
+        let saving = Promise.resolve();
+        const save = () => {
+            saving = saving.then(async () => {
+                const current = await this.jobs.store.get(job.id);
+                if (!current || JOB_TERMINAL_STATES.has(current.state)) {
+                    cancelled = true;
+                    return;
+                }
+                const updated = { ...current, documents, updatedAt: Date.now() };
+                await this.jobs.store.put(updated);
+                this.jobs.publish(updated);
+            });
+            return saving;
+        };
+
+        const pending = documents.filter(document => !document.enhanced && !document.error);
+        await this.mapWithConcurrency(pending, parallelism, async (document) => {
+            if (cancelled) return;
+            try {
+                const content = document.content
+                    || await this.metrics.time('extraction', () => this.extractURL(document.url), document.url);
+                const { originalContent, ...enhanced } = await this.enhanceContent(content, job.settings, { signal: live?.cancelled.signal });
+                // The extracted page is not needed once the document is enhanced
+                Object.assign(document, { url: document.url || content.url, title: enhanced.title || content.title, content: null, enhanced });
+            } catch (error) {
+                this.logError('Bundle document failed', { url: document.url, error: error.message });
+                document.error = error.message;
+            }
+            await save();
+        });
+        await saving;
+        return documents;
+    }
+
+    async renderJob(job) {
+        if (!job.documents) {
+            return await this.generatePDF(job.enhanced, job.settings);
+        }
+        // A bundle is laid out and rendered once, whatever its size
+        const enhanced = job.documents.filter(document => document.enhanced).map(document => document.enhanced);
+        if (enhanced.length === 0) {
+            throw new Error('None of the bundled pages could be enhanced');
+        }
+        const result = await this.metrics.time('render', () => this.pdfGenerator.generateBundlePDF(enhanced, job.settings, job.title));
+        this.metrics.record('pdfBytes', result.size, 'bytes');
+        return result;
+    }
+
+    setupContextMenu() {
+        if (!chrome.contextMenus) {
+            return;
+        }
+        chrome.runtime.onInstalled.addListener(() => {
+            chrome.contextMenus.removeAll(() => {
+                chrome.contextMenus.create({
+                    id: 'enhanceToPDF',
+                    title: 'Enhance to PDF in background',
+                    contexts: ['page', 'link']
+                });
+            });
+        });
+        chrome.contextMenus.onClicked.addListener(async (info) => {
+            if (info.menuItemId !== 'enhanceToPDF') {
+                return;
+            }
+            try {
+                const settings = await chrome.storage.sync.get({
+                    enhancementType: 'summarize',
+                    pdfStyle: 'academic',
+                    includeImages: true,
+                    includeSources: true
+                });
+                await this.jobs.enqueue({
+                    url: info.linkUrl || info.pageUrl,
+                    settings,
+                    source: 'contextMenu',
+                    download: true
+                });
+            } catch (error) {
+                this.logError('Failed to queue context menu job', error);
+            }
+        });
+    }
+
+    async onJobSettled(job) {
+        if (job.state === 'failed') {
+            this.logError('Job failed', { id: job.id, url: job.url, error: job.error });
+        } else if (job.download) {
+            try {
+                await this.downloadJob(job.id, false);
+            } catch (error) {
+                this.logError('Job download failed', error);
+            }
+        }
+    }
+
+    async downloadJob(jobId, saveAs = true) {
+        const job = await this.jobs.store.get(jobId);
+        if (!job || job.state !== 'done') {
+            throw new Error('Job is not finished');
+        }
+        return await this.metrics.time('download', () => this.startDownload(job, saveAs), job.url);
+    }
+
+    async startDownload(job, saveAs) {
+        try {
+            return await chrome.downloads.download({ url: job.result.pdfData, filename: job.result.filename, saveAs });
+        } catch (error) {
+            // Blob URLs do not outlive the offscreen document; rendering again costs no API calls
+            const result = await this.renderJob(job);
+            await this.jobs.update(job, { result });
+            return await chrome.downloads.download({ url: result.pdfData, filename: result.filename, saveAs });
+        }
+    }
+
+    setupMessageListener() {
+        chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
+            if (request.target === 'offscreen') {
+                return false; // Handled by the offscreen document
+            }
+            this.handleMessage(request, sender, sendResponse);
+            return true; // Keep message channel open for async response
+        });
+
+        // Long-lived port used by the popup to follow a job: state changes and enhanced
+        // sections are pushed as they happen instead of being polled
+        chrome.runtime.onConnect.addListener((port) => {
+            if (port.name === 'jobProgress') {
+                this.handleJobPort(port);
+            }
+        });
+    }
+
+    handleJobPort(port) {
+        let connected = true;
+        let unwatch = () => {};
+        // Closing the popup only stops the updates; the job keeps running
+        port.onDisconnect.addListener(() => {
+            connected = false;
+            unwatch();
+        });
+
+        const post = (message) => {
+            if (!connected) return;
+            try {
+                port.postMessage(message);
+            } catch (error) {
+                connected = false;
+                unwatch();
+            }
+        };
+
+        port.onMessage.addListener(async (request) => {
+            if (request.action !== 'watchJob') {
+                post({ type: 'error', error: 'Unknown action' });
+                return;
+            }
+            unwatch();
+            unwatch = this.jobs.watch(request.jobId, job => post({ type: 'job', job }));
+            post({ type: 'job', job: await this.jobs.get(request.jobId) });
+        });
+    }
+
+    async handleMessage(request, sender, sendResponse) {
+        try {
+            switch (request.action) {
+                case 'enhanceContent':
+                    const enhancedContent = await this.enhanceContent(request.data, request.settings);
+                    sendResponse({ success: true, data: enhancedContent });
+                    break;
+                    
+                case 'generatePDF':
+                    const pdfResult = await this.generatePDF(request.data, request.settings);
+                    sendResponse({ success: true, ...pdfResult });
+                    break;
+
+                case 'generateBundlePDF':
+                    sendResponse({ success: true, ...(await this.renderJob({ documents: request.data.map(enhanced => ({ enhanced })), settings: request.settings, title: request.title })) });
+                    break;
+
+                case 'getCacheStats':
+                    sendResponse({
+                        success: true,
+                        data: { ...(await this.responseCache.getStats()), revisions: await this.revisions.store.getStats() }
+                    });
+                    break;
+
+                case 'logExtraction':
+                    this.extractionLog.add(request.data);
+                    sendResponse({ success: true });
+                    break;
+
+                case 'getSchedulerStats':
+                    sendResponse({ success: true, data: { ...this.scheduler.getStats(), coalescing: this.inFlight.getStats() } });
+                    break;
+
+                case 'getMetrics':
+                    await this.metrics.ready;
+                    sendResponse({ success: true, data: this.metrics.getSummary() });
+                    break;
+
+                case 'exportMetrics':
+                    await this.metrics.ready;
+                    sendResponse({ success: true, data: this.metrics.exportMetrics(request.format) });
+                    break;
+
+                case 'recordMetrics':
+                    // Timings measured outside the service worker (script injection, in-page extraction)
+                    for (const sample of request.samples || []) {
+                        this.metrics.record(sample.name, sample.value, sample.unit, sample.url || sender.tab?.url);
+                    }
+                    sendResponse({ success: true });
+                    break;
+
+                case 'clearMetrics':
+                    await this.metrics.clear();
+                    sendResponse({ success: true });
+                    break;
+
+                case 'clearCache':
+                    await this.responseCache.clear();
+                    await this.revisions.store.clear();
+                    sendResponse({ success: true });
+                    break;
+
+                case 'extractURL':
+                    sendResponse({ success: true, data: await this.extractURL(request.url) });
+                    break;
+
+                case 'extractURLs':
+                    sendResponse({ success: true, results: await this.extractURLs(request.urls, request.concurrency) });
+                    break;
+
+                case 'enqueueJob': {
+                    const job = await this.jobs.enqueue({
+                        url: request.url,
+                        content: request.data,
+                        settings: request.settings,
+                        source: request.source,
+                        download: request.download,
+                        force: request.force
+                    });
+                    sendResponse({ success: true, job: this.jobs.describe(job) });
+                    break;
+                }
+
+                case 'enqueueJobs': {
+                    const jobs = [];
+                    for (const url of request.urls || []) {
+                        const job = await this.jobs.enqueue({ url, settings: request.settings, source: request.source || 'batch', download: request.download });
+                        jobs.push(this.jobs.describe(job));
+                    }
+                    sendResponse({ success: true, jobs });
+                    break;
+                }
+
+                case 'enqueueBundle': {
+                    const job = await this.jobs.enqueueBundle({
+                        items: request.data || request.urls,
+                        title: request.title,
+                        settings: request.settings,
+                        source: request.source,
+                        download: request.download,
+                        force: request.force
+                    });
+                    sendResponse({ success: true, job: this.jobs.describe(job) });
+                    break;
+                }
+
+                case 'getJob':
+                    sendResponse({ success: true, job: await this.jobs.get(request.jobId) });
+                    break;
+
+                case 'listJobs':
+                    sendResponse({ success: true, jobs: await this.jobs.list() });
+                    break;
+
+                case 'cancelJob':
+                    sendResponse({ success: true, job: await this.jobs.cancel(request.jobId) });
+                    break;
 
-    async handleMessage(request, sender, sendResponse) {
-        try {
-            switch (request.action) {
-                case 'enhanceContent':
-                    const enhancedContent = await this.enhanceContent(request.data, request.settings);
-                    sendResponse({ success: true, data: enhancedContent });
+                case 'retryJob':
+                    sendResponse({ success: true, job: await this.jobs.retry(request.jobId) });
                     break;
-                    
-                case 'generatePDF':
-                    const pdfResult = await this.generatePDF(request.data, request.settings);
-                    sendResponse({ success: true, ...pdfResult });
+
+                case 'downloadJob':
+                    sendResponse({ success: true, downloadId: await this.downloadJob(request.jobId, request.saveAs !== false) });
+                    break;
+
+                case 'clearFinishedJobs':
+                    sendResponse({ success: true, removed: await this.jobs.clearFinished() });
                     break;
                     
                 default:
@@ -428,18 +3371,59 @@ class AIEnhancerBackground {
         }
     }
 
-    async enhanceContent(contentData, settings) {
+    async enhanceContent(contentData, settings, callbacks = {}) {
+        // Concurrent requests for the same page and settings (popups, jobs, bundles) share
+        // one enhancement; callbacks.signal lets a caller leave without cancelling the others
+        settings = { ...(await this.getProcessingSettings()), ...settings };
+        const key = await this.flightKey(contentData, settings);
+        const joining = this.inFlight.has(key);
+        if (joining) {
+            this.logInfo('Joining in-flight enhancement', { url: contentData.url });
+            this.metrics.record('coalesced', 1, 'requests', contentData.url);
+        }
+
+        const finalContent = await this.inFlight.run(key,
+            (signal, onSection) => this.runEnhancement(contentData, settings, { onSection, signal }),
+            { signal: callbacks.signal, onEvent: callbacks.onSection });
+        return joining
+            ? { ...finalContent, processingInfo: { ...finalContent.processingInfo, coalesced: true } }
+            : finalContent;
+    }
+
+    async flightKey(contentData, settings) {
+        // Content hash plus settings; the extraction timestamp differs between identical requests
+        const { extractedAt, ...content } = contentData;
+        const material = JSON.stringify({
+            content,
+            settings: Object.entries(settings).sort(([a], [b]) => a.localeCompare(b))
+        });
+        const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(material));
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    async runEnhancement(contentData, settings, callbacks = {}) {
         this.logInfo('Starting content enhancement', { 
             url: contentData.url, 
             enhancementType: settings.enhancementType 
         });
 
+        const started = performance.now();
         try {
             // Prepare content for AI processing
-            const processedContent = await this.prepareContentForAI(contentData, settings);
-            
-            // Call Gemini AI for enhancement
-            const enhancedContent = await this.callGeminiAI(processedContent, settings);
+            let processedContent = await this.prepareAndCondense(contentData, settings);
+            const route = await this.router.route(processedContent.tokenUsage.content, processedContent.enhancementType, settings.routingBudget);
+            // The route depends on the fitted size, so the first fit uses the default model's limits;
+            // a different routed model gets its own fit
+            if (route.model !== (await this.router.defaultRoute()).model) {
+                processedContent = await this.prepareAndCondense(contentData, settings, route);
+            }
+            processedContent.route = route;
+            processedContent.signal = callbacks.signal;
+            this.metrics.record('contentBytes', (contentData.textContent || '').length, 'chars', contentData.url);
+            this.metrics.record('promptTokens', processedContent.tokenUsage.content, 'tokens', contentData.url);
+
+            // Call Gemini AI for enhancement, unless an identical request is already cached
+            const enhancedContent = await this.getCachedOrEnhance(processedContent, settings, callbacks);
             
             // Post-process the enhanced content
             const finalContent = await this.postProcessContent(enhancedContent, contentData, settings);
@@ -448,6 +3432,7 @@ class AIEnhancerBackground {
                 originalWordCount: contentData.wordCount,
                 enhancedWordCount: finalContent.wordCount 
             });
+            this.metrics.record('enhance', performance.now() - started, 'ms', contentData.url);
             
             return finalContent;
             
@@ -457,14 +3442,127 @@ class AIEnhancerBackground {
         }
     }
 
-    async prepareContentForAI(contentData, settings) {
+    async getCachedOrEnhance(processedContent, settings, callbacks = {}) {
+        // A long page seen before is re-enhanced chunk by chunk. The first visit is a normal
+        // request that only records the paragraph fingerprints for next time
+        const { route } = processedContent;
+        const url = processedContent.metadata.url;
+        const revisionChunks = settings.incrementalEnhancement && url
+            ? await this.revisions.chunk(processedContent.promptContent)
+            : [];
+        const revisionKey = revisionChunks.length > 1
+            ? await this.revisions.buildKey(url, { ...settings, model: route.model })
+            : null;
+        const previous = revisionKey ? await this.revisions.load(revisionKey) : null;
+        const mode = previous && this.revisions.worthChunking(previous, revisionChunks) ? 'incremental'
+            : this.shouldMapReduce(processedContent, settings) ? 'mapReduce' : 'single';
+        const cacheKey = settings.enableResponseCache
+            ? await this.responseCache.buildKey(processedContent.promptContent, {
+                ...settings, mode, model: route.model, generationConfig: route.generationConfig
+            })
+            : null;
+
+        // bypassCache skips the lookup but still refreshes the stored entry
+        if (cacheKey && !settings.bypassCache) {
+            const cached = await this.responseCache.get(cacheKey);
+            if (cached) {
+                this.logInfo('Enhancement cache hit', { url: processedContent.metadata.url });
+                this.emitSections(cached, callbacks.onSection);
+                return {
+                    ...cached,
+                    originalContent: processedContent.originalContent,
+                    processingInfo: { ...cached.processingInfo, cacheHit: true }
+                };
+            }
+        }
+
+        // Long pages can be mapped over chunks in parallel
+        let enhancedContent;
+        if (mode === 'incremental') {
+            enhancedContent = await this.callGeminiIncremental(processedContent, revisionChunks, settings, revisionKey, previous);
+            this.emitSections(enhancedContent, callbacks.onSection);
+        } else if (mode === 'mapReduce') {
+            enhancedContent = await this.callGeminiMapReduce(processedContent, settings);
+            this.emitSections(enhancedContent, callbacks.onSection);
+        } else {
+            enhancedContent = await this.callGeminiAI(processedContent, settings, callbacks.onSection);
+        }
+
+        enhancedContent.processingInfo = {
+            ...enhancedContent.processingInfo,
+            tokens: this.describeTokenUsage(processedContent, settings, mode),
+            route: {
+                name: route.name,
+                model: route.model,
+                budget: route.budget,
+                inputTokens: route.inputTokens,
+                maxOutputTokens: route.generationConfig.maxOutputTokens
+            }
+        };
+
+        if (previous && previous.chunks.length === 0) {
+            try {
+                await this.revisions.save(revisionKey, url, revisionChunks, revisionChunks.map(() => null), null);
+            } catch (error) {
+                this.logError('Failed to store content revision', error);
+            }
+        }
+
+        if (cacheKey) {
+            const { originalContent, ...cacheable } = enhancedContent;
+            try {
+                await this.responseCache.set(cacheKey, cacheable);
+            } catch (error) {
+                this.logError('Failed to store enhancement in cache', error);
+            }
+        }
+
+        return enhancedContent;
+    }
+
+    describeTokenUsage(processedContent, settings, mode) {
+        // Prompt tokens = fitted content + the template around it
+        const template = mode === 'single'
+            ? this.buildPrompt({ ...processedContent, promptContent: '' }, settings.enhancementType, settings.pdfStyle)
+            : '';
+        const { content, ...usage } = processedContent.tokenUsage;
+        return {
+            prompt: content + new PromptBudget().estimateTokens(template),
+            content,
+            ...usage
+        };
+    }
+
+    async prepareAndCondense(contentData, settings, route = null) {
+        let processedContent = await this.metrics.time('promptBuild', () => this.prepareContentForAI(contentData, settings, route), contentData.url);
+        // Optional local pre-summary: the model only sees the highest-ranked sentences
+        if (settings.extractiveSummary && processedContent.enhancementType === 'summarize') {
+            processedContent = await this.metrics.time('extractive', () => this.condenseContent(processedContent, settings), contentData.url);
+        }
+        return processedContent;
+    }
+
+    async prepareContentForAI(contentData, settings, route = null) {
         const { enhancementType, pdfStyle } = settings;
+
+        // Fit the article into the model's input budget before building any prompt
+        const fitted = await this.fitContentToBudget(contentData, settings, route);
         
         // Chunk content if too long
-        const chunks = this.chunkContent(contentData.textContent, 4000);
+        const chunks = this.chunkContent(fitted.text, 4000);
         
         return {
             originalContent: contentData,
+            promptContent: fitted.text,
+            tokenUsage: {
+                content: fitted.tokens,
+                budget: fitted.budget,
+                source: fitted.source,
+                originalContent: fitted.totalTokens,
+                keptBlocks: fitted.keptBlocks,
+                boilerplateBlocks: fitted.boilerplateBlocks,
+                trimmed: fitted.trimmed
+            },
             chunks: chunks,
             enhancementType: enhancementType,
             pdfStyle: pdfStyle,
@@ -481,80 +3579,511 @@ class AIEnhancerBackground {
         };
     }
 
-    chunkContent(text, maxChunkSize) {
-        const sentences = text.split(/[.!?]+/);
-        const chunks = [];
-        let currentChunk = '';
-        
-        for (const sentence of sentences) {
-            if (currentChunk.length + sentence.length > maxChunkSize && currentChunk) {
-                chunks.push(currentChunk.trim());
-                currentChunk = sentence;
-            } else {
-                currentChunk += (currentChunk ? '. ' : '') + sentence;
+    condenseContent(processedContent, settings) {
+        // Replace the fitted content with its TF-IDF/TextRank extract
+        const summary = new ExtractiveSummarizer().summarize(processedContent.promptContent, {
+            ratio: settings.extractiveRatio || EXTRACTIVE_RATIO
+        });
+        if (!summary.applied) {
+            return processedContent;
+        }
+        return {
+            ...processedContent,
+            promptContent: summary.text,
+            chunks: this.chunkContent(summary.text, 4000),
+            tokenUsage: {
+                ...processedContent.tokenUsage,
+                content: summary.tokens,
+                extractive: {
+                    fittedTokens: summary.originalTokens,
+                    sentences: summary.sentences,
+                    keptSentences: summary.keptSentences
+                }
+            }
+        };
+    }
+
+    async fitContentToBudget(contentData, settings, route = null) {
+        const { model, endpoint } = route || await this.router.defaultRoute();
+        const budget = new PromptBudget({ model, maxContentLength: settings.maxContentLength });
+        let fitted = { ...budget.fit(contentData), source: 'estimate' };
+
+        // The local estimate can be off by ~10%; near the limit ask countTokens for the exact figure
+        const apiKey = fitted.tokens >= budget.maxTokens * 0.9 ? await this.getAPIKey() : null;
+        if (apiKey) {
+            try {
+                const counted = await this.countTokens(apiKey, fitted.text, endpoint);
+                if (counted > budget.maxTokens) {
+                    const scaled = Math.floor(fitted.budget * (budget.maxTokens / counted) * 0.95);
+                    fitted = { ...budget.fit(contentData, scaled), source: 'estimate' };
+                } else {
+                    fitted = { ...fitted, tokens: counted, source: 'countTokens' };
+                }
+            } catch (error) {
+                this.logError('countTokens failed, using local estimate', error);
             }
         }
-        
-        if (currentChunk.trim()) {
-            chunks.push(currentChunk.trim());
+
+        if (fitted.trimmed) {
+            this.logInfo('Content trimmed to fit prompt budget', {
+                url: contentData.url,
+                tokens: fitted.tokens,
+                originalTokens: fitted.totalTokens,
+                budget: fitted.budget
+            });
         }
-        
-        return chunks;
+        return fitted;
+    }
+
+    async countTokens(apiKey, text, endpoint = null) {
+        endpoint = endpoint || (await this.router.defaultRoute()).endpoint;
+        const response = await this.scheduler.execute(apiKey, (signal) => fetch(`${endpoint}:countTokens?key=${apiKey}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                contents: [{ parts: [{ text }] }]
+            }),
+            signal
+        }));
+
+        if (!response.ok) {
+            throw new Error(`countTokens failed: ${response.status}`);
+        }
+        const data = await response.json();
+        return data.totalTokens;
     }
 
-    async callGeminiAI(processedContent, settings) {
+    chunkContent(text, maxChunkSize) {
+        // Sentence-aware chunks of about maxChunkSize characters
+        const maxTokens = Math.max(1, Math.floor(maxChunkSize / CHUNK_CHARS_PER_TOKEN));
+        return new ContentChunker().chunk(text, { maxTokens }).map(chunk => text.slice(chunk.start, chunk.end));
+    }
+
+    emitSections(enhancedContent, onSection) {
+        if (!onSection) return;
+        for (const name of ['title', 'summary', 'keyPoints', 'enhancedContent', 'insights', 'recommendations', 'sources']) {
+            if (enhancedContent[name] !== undefined) {
+                onSection(name, enhancedContent[name]);
+            }
+        }
+    }
+
+    async callGeminiAI(processedContent, settings, onSection = null) {
         const { enhancementType, pdfStyle } = settings;
         
         // Get API key from storage
-        const apiKey = await this.getAPIKey();
-        if (!apiKey) {
-            throw new Error('Gemini API key not found. Please configure it in the extension settings.');
-        }
+        const apiKey = await this.requireAPIKey();
 
         const prompt = this.buildPrompt(processedContent, enhancementType, pdfStyle);
         
         try {
-            // Use the latest Gemini 2.5 Flash model with v1beta API
-            const response = await fetch(`https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key=${apiKey}`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    contents: [{
-                        parts: [{
-                            text: prompt
-                        }]
-                    }],
-                    generationConfig: {
-                        temperature: 0.3,
-                        topK: 40,
-                        topP: 0.95,
-                        maxOutputTokens: 8192,
-                    }
-                })
-            });
+            const { route } = processedContent;
+            const generationConfig = this.jsonGenerationConfig(RESPONSE_SCHEMAS.document, route);
+            const generatedText = onSection
+                ? await this.requestGeminiStream(apiKey, prompt, onSection, generationConfig, route, processedContent.signal)
+                : await this.requestGemini(apiKey, prompt, generationConfig, route, processedContent.signal);
+            return this.parseAIResponse(generatedText, processedContent);
+
+        } catch (error) {
+            this.logError('Gemini API call failed', error);
+            throw error;
+        }
+    }
+
+    jsonGenerationConfig(schema, route) {
+        return { ...route.generationConfig, responseMimeType: 'application/json', responseSchema: schema };
+    }
+
+    async requestGemini(apiKey, prompt, generationConfig, route, signal = null) {
+        const body = JSON.stringify({
+            contents: [{
+                parts: [{
+                    text: prompt
+                }]
+            }],
+            generationConfig
+        });
+        this.metrics.record('promptBytes', body.length, 'chars');
+        const response = await this.scheduler.execute(apiKey, (signal) => this.timedFetch(`${route.endpoint}:generateContent?key=${apiKey}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body,
+            signal
+        }), { signal });
+        const headersAt = performance.now();
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(`Gemini API error: ${errorData.error?.message || response.statusText}`);
+        }
+
+        const data = await response.json();
+        const generatedText = data.candidates?.[0]?.content?.parts?.[0]?.text;
+        
+        if (!generatedText) {
+            throw new Error('No content generated by Gemini');
+        }
+
+        this.recordGeneration(headersAt, generatedText);
+        return generatedText;
+    }
 
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(`Gemini API error: ${errorData.error?.message || response.statusText}`);
+    async requestGeminiStream(apiKey, prompt, onSection, generationConfig, route, signal = null) {
+        // The scheduler's deadline also bounds reading the stream body
+        const deadlineAt = Date.now() + this.scheduler.deadline;
+        const body = JSON.stringify({
+            contents: [{
+                parts: [{
+                    text: prompt
+                }]
+            }],
+            generationConfig
+        });
+        this.metrics.record('promptBytes', body.length, 'chars');
+        const response = await this.scheduler.execute(apiKey, (signal) => this.timedFetch(`${route.endpoint}:streamGenerateContent?alt=sse&key=${apiKey}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body,
+            signal
+        }), { signal });
+        const headersAt = performance.now();
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(`Gemini API error: ${errorData.error?.message || response.statusText}`);
+        }
+
+        // Partial strings are forwarded at most every 250ms to keep the port quiet
+        let lastPartialAt = 0;
+        const parser = new StreamingJSONParser(
+            (name, value) => onSection(name, value),
+            (name, value) => {
+                const now = Date.now();
+                if (now - lastPartialAt >= 250) {
+                    lastPartialAt = now;
+                    onSection(name, value, true);
+                }
             }
+        );
 
-            const data = await response.json();
-            const generatedText = data.candidates?.[0]?.content?.parts?.[0]?.text;
-            
-            if (!generatedText) {
-                throw new Error('No content generated by Gemini');
+        let generatedText = '';
+        await this.readSSE(response, (event) => {
+            const text = (event.candidates?.[0]?.content?.parts || []).map(part => part.text || '').join('');
+            if (text) {
+                generatedText += text;
+                parser.push(text);
             }
+        }, { signal, deadlineAt });
 
-            return this.parseAIResponse(generatedText, processedContent);
+        if (!generatedText) {
+            throw new Error('No content generated by Gemini');
+        }
+
+        this.recordGeneration(headersAt, generatedText);
+        return generatedText;
+    }
+
+    async timedFetch(url, init) {
+        // Time to response headers for the attempt itself, excluding time queued in the scheduler
+        const started = performance.now();
+        const response = await fetch(url, init);
+        this.metrics.record('ttfb', performance.now() - started);
+        return response;
+    }
+
+    recordGeneration(headersAt, generatedText) {
+        // Headers to last byte of the generated body
+        this.metrics.record('generation', performance.now() - headersAt);
+        this.metrics.record('responseBytes', generatedText.length, 'chars');
+    }
+
+    async readSSE(response, onEvent, { signal = null, deadlineAt = Infinity } = {}) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        // A cancel or the deadline stops the read; either way the body is incomplete
+        let stopped = null;
+        const stop = (reason) => {
+            stopped = stopped || reason;
+            reader.cancel().catch(() => {});
+        };
+        const onAbort = () => stop('Enhancement cancelled');
+        const timer = Number.isFinite(deadlineAt)
+            ? setTimeout(() => stop('Gemini request deadline exceeded'), Math.max(0, deadlineAt - Date.now()))
+            : null;
+        if (signal?.aborted) {
+            onAbort();
+        }
+        signal?.addEventListener('abort', onAbort, { once: true });
+
+        const dispatch = (block) => {
+            const data = block.split(/\r?\n/)
+                .filter(line => line.startsWith('data:'))
+                .map(line => line.slice(5).trimStart())
+                .join('\n');
+            if (data) {
+                onEvent(JSON.parse(data));
+            }
+        };
+
+        try {
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                const blocks = buffer.split(/\r?\n\r?\n/);
+                buffer = blocks.pop();
+                blocks.forEach(dispatch);
+            }
+        } finally {
+            clearTimeout(timer);
+            signal?.removeEventListener('abort', onAbort);
+        }
+        if (stopped) {
+            throw new Error(stopped);
+        }
+
+        buffer += decoder.decode();
+        if (buffer.trim()) {
+            dispatch(buffer);
+        }
+    }
+
+    shouldMapReduce(processedContent, settings) {
+        return Boolean(settings.parallelChunkEnhancement) && processedContent.chunks.length > 1;
+    }
+
+    async callGeminiMapReduce(processedContent, settings) {
+        const { enhancementType } = settings;
+        const { chunks } = processedContent;
+        const parallelism = Math.max(1, parseInt(settings.chunkParallelism, 10) || 3);
+
+        const apiKey = await this.requireAPIKey();
+
+        this.logInfo('Starting map-reduce enhancement', { chunks: chunks.length, parallelism });
+
+        try {
+            // Map: enhance every chunk independently, at most `parallelism` requests in flight
+            const partials = await this.mapWithConcurrency(chunks, parallelism, (chunk, index) =>
+                this.requestChunk(apiKey, processedContent, chunk, index, chunks.length, enhancementType));
+
+            // Reduce: merge the partial results into the final document schema
+            const reduced = await this.requestReduce(apiKey, processedContent, partials, enhancementType);
+            return this.mergeChunkResults(partials, reduced, processedContent);
 
         } catch (error) {
-            this.logError('Gemini API call failed', error);
+            this.logError('Gemini map-reduce enhancement failed', error);
+            throw error;
+        }
+    }
+
+    async callGeminiIncremental(processedContent, chunks, settings, key, previous) {
+        const { enhancementType } = settings;
+        const parallelism = Math.max(1, parseInt(settings.chunkParallelism, 10) || 3);
+        const url = processedContent.metadata.url;
+
+        // A first visit stored fingerprints only; those chunks are enhanced now
+        const known = new Map(previous.chunks.filter(chunk => chunk.partial !== null).map(chunk => [chunk.id, chunk.partial]));
+        const changed = chunks.map((chunk, index) => index).filter(index => !known.has(chunks[index].id));
+        this.logInfo('Starting incremental enhancement', { url, chunks: chunks.length, changed: changed.length });
+
+        // The reduce pass only sees chunk summaries, so it is redone whenever any chunk changed
+        const reuseReduced = changed.length === 0 && previous.chunks.length === chunks.length && Boolean(previous.reduced);
+        const apiKey = changed.length > 0 || !reuseReduced ? await this.requireAPIKey() : null;
+        try {
+            const fresh = await this.mapWithConcurrency(changed, parallelism, index =>
+                this.requestChunk(apiKey, processedContent, chunks[index].text, index, chunks.length, enhancementType));
+            const partials = chunks.map(chunk => known.get(chunk.id));
+            changed.forEach((index, position) => {
+                partials[index] = fresh[position];
+            });
+
+            const reduced = reuseReduced
+                ? previous.reduced
+                : await this.requestReduce(apiKey, processedContent, partials, enhancementType);
+
+            try {
+                await this.revisions.save(key, url, chunks, partials, reduced);
+            } catch (error) {
+                this.logError('Failed to store content revision', error);
+            }
+
+            const merged = this.mergeChunkResults(partials, reduced, processedContent);
+            this.metrics.record('reusedChunks', chunks.length - changed.length, 'chunks', url);
+            merged.processingInfo = {
+                ...merged.processingInfo,
+                mode: 'incremental',
+                incremental: {
+                    chunks: chunks.length,
+                    reused: chunks.length - changed.length,
+                    changed: changed.length,
+                    sentTokens: new PromptBudget().estimateTokens(changed.map(index => chunks[index].text).join('\n\n'))
+                }
+            };
+            return merged;
+
+        } catch (error) {
+            this.logError('Gemini incremental enhancement failed', error);
             throw error;
         }
     }
 
+    async requestChunk(apiKey, processedContent, chunk, index, total, enhancementType) {
+        const prompt = this.buildChunkPrompt(processedContent, chunk, index, total, enhancementType);
+        const { route } = processedContent;
+        const generatedText = await this.requestGemini(apiKey, prompt, this.jsonGenerationConfig(RESPONSE_SCHEMAS.chunk, route), route, processedContent.signal);
+        return this.extractJSON(generatedText) || { enhancedContent: generatedText };
+    }
+
+    async requestReduce(apiKey, processedContent, partials, enhancementType) {
+        const { route } = processedContent;
+        try {
+            const generatedText = await this.requestGemini(
+                apiKey,
+                this.buildReducePrompt(processedContent, partials, enhancementType),
+                this.jsonGenerationConfig(RESPONSE_SCHEMAS.reduce, route),
+                route,
+                processedContent.signal
+            );
+            return this.extractJSON(generatedText);
+        } catch (error) {
+            if (processedContent.signal?.aborted) {
+                throw error;
+            }
+            this.logError('Reduce pass failed, merging partial results locally', error);
+            return null;
+        }
+    }
+
+    async mapWithConcurrency(items, limit, worker) {
+        const results = new Array(items.length);
+        let nextIndex = 0;
+
+        const runners = Array.from({ length: Math.min(limit, items.length) }, async () => {
+            while (nextIndex < items.length) {
+                const index = nextIndex++;
+                results[index] = await worker(items[index], index);
+            }
+        });
+
+        await Promise.all(runners);
+        return results;
+    }
+
+    buildChunkPrompt(processedContent, chunk, index, total, enhancementType) {
+        const { metadata } = processedContent;
+
+        return `You are an AI content enhancer. You are processing part ${index + 1} of ${total} of a longer document. Enhance only this part; other parts are handled separately and merged afterwards.
+
+DOCUMENT:
+Title: ${metadata.title}
+URL: ${metadata.url}
+
+PART ${index + 1} OF ${total}:
+${chunk}
+
+ENHANCEMENT REQUIREMENTS:
+- Enhancement Type: ${enhancementType}
+- Include sources and citations: ${processedContent.includeSources}
+
+Please provide your response in the following JSON format:
+{
+  "summary": "Brief summary of this part",
+  "enhancedContent": "Enhanced content for this part with proper formatting",
+  "keyPoints": ["Point 1", "Point 2"],
+  "sources": [{"title": "Source title", "url": "source_url", "relevance": "Why this source is relevant"}],
+  "insights": "Insights specific to this part",
+  "recommendations": "Recommendations specific to this part"
+}
+
+${this.getEnhancementInstruction(enhancementType)}`.trim();
+    }
+
+    buildReducePrompt(processedContent, partials, enhancementType) {
+        const { metadata } = processedContent;
+        const sections = partials.map((partial, index) => JSON.stringify({
+            part: index + 1,
+            summary: partial.summary || '',
+            keyPoints: partial.keyPoints || [],
+            insights: partial.insights || '',
+            recommendations: partial.recommendations || ''
+        })).join('\n');
+
+        return `You are an AI content enhancer. A long document was enhanced in ${partials.length} parts. Merge the partial results below into a single coherent result for the whole document, removing duplicates.
+
+DOCUMENT:
+Title: ${metadata.title}
+URL: ${metadata.url}
+
+PARTIAL RESULTS (one JSON object per line):
+${sections}
+
+ENHANCEMENT REQUIREMENTS:
+- Enhancement Type: ${enhancementType}
+
+Please provide your response in the following JSON format:
+{
+  "title": "Enhanced title",
+  "summary": "Brief summary of the whole document",
+  "keyPoints": ["Point 1", "Point 2", "Point 3"],
+  "insights": "Additional insights and analysis",
+  "recommendations": "Actionable recommendations based on the content"
+}`;
+    }
+
+    mergeChunkResults(partials, reduced, processedContent) {
+        const unique = (values, keyOf = value => value) => {
+            const seen = new Set();
+            return values.filter(value => {
+                const key = keyOf(value);
+                if (!value || seen.has(key)) return false;
+                seen.add(key);
+                return true;
+            });
+        };
+        const joinField = (field) => partials.map(partial => partial[field]).filter(Boolean).join('\n\n');
+
+        // Enhanced content is stitched locally in chunk order so the reduce pass stays small
+        const enhancedContent = joinField('enhancedContent');
+        const wordCount = enhancedContent.split(/\s+/).filter(Boolean).length;
+
+        return {
+            title: reduced?.title || processedContent.originalContent.title,
+            summary: reduced?.summary || joinField('summary'),
+            enhancedContent: enhancedContent,
+            keyPoints: reduced?.keyPoints || unique(partials.flatMap(partial => partial.keyPoints || [])),
+            sources: unique(partials.flatMap(partial => partial.sources || []), source => source.url || source.title),
+            insights: reduced?.insights || joinField('insights'),
+            recommendations: reduced?.recommendations || joinField('recommendations'),
+            metadata: {
+                wordCount: wordCount,
+                readingTime: Math.ceil(wordCount / 200),
+                confidence: reduced ? 0.9 : 0.8
+            },
+            originalContent: processedContent.originalContent,
+            processingInfo: {
+                enhancedAt: new Date().toISOString(),
+                enhancementType: processedContent.enhancementType,
+                pdfStyle: processedContent.pdfStyle,
+                mode: 'mapReduce',
+                chunks: partials.length
+            }
+        };
+    }
+
+    extractJSON(responseText) {
+        const parsed = StreamingJSONParser.parse(responseText);
+        return parsed ? parsed.value : null;
+    }
+
     buildPrompt(processedContent, enhancementType, pdfStyle) {
         const { originalContent, metadata } = processedContent;
         
@@ -567,7 +4096,7 @@ Author: ${metadata.author || 'Unknown'}
 Published: ${metadata.publishedDate || 'Unknown'}
 
 Content:
-${originalContent.textContent}
+${processedContent.promptContent ?? originalContent.textContent}
 
 ENHANCEMENT REQUIREMENTS:
 - Enhancement Type: ${enhancementType}
@@ -591,37 +4120,53 @@ Please provide your response in the following JSON format:
   }
 }`;
 
+        const instruction = this.getEnhancementInstruction(enhancementType);
+        return instruction ? `${basePrompt}\n\n${instruction}` : basePrompt;
+    }
+
+    getEnhancementInstruction(enhancementType) {
         switch (enhancementType) {
             case 'summarize':
-                return basePrompt + '\n\nFocus on creating a concise, well-structured summary that captures the essential information.';
+                return 'Focus on creating a concise, well-structured summary that captures the essential information.';
                 
             case 'expand':
-                return basePrompt + '\n\nExpand the content with additional context, explanations, and background information to provide deeper understanding.';
+                return 'Expand the content with additional context, explanations, and background information to provide deeper understanding.';
                 
             case 'validate':
-                return basePrompt + '\n\nValidate claims and facts, add reasoning and evidence, and provide a balanced analysis with proper citations.';
+                return 'Validate claims and facts, add reasoning and evidence, and provide a balanced analysis with proper citations.';
                 
             case 'comprehensive':
-                return basePrompt + '\n\nProvide a comprehensive enhancement including summary, expansion, validation, and actionable insights.';
+                return 'Provide a comprehensive enhancement including summary, expansion, validation, and actionable insights.';
                 
             default:
-                return basePrompt;
+                return '';
         }
     }
 
     parseAIResponse(responseText, processedContent) {
+        const started = performance.now();
         try {
-            // Try to extract JSON from the response
-            const jsonMatch = responseText.match(/\{[\s\S]*\}/);
-            if (jsonMatch) {
-                const parsed = JSON.parse(jsonMatch[0]);
+            // JSON mode normally returns bare JSON; truncated or wrapped output is repaired
+            const parsed = StreamingJSONParser.parse(responseText);
+            if (parsed) {
+                if (parsed.repaired) {
+                    this.logInfo('Repaired malformed AI response', { length: responseText.length });
+                }
                 return {
-                    ...parsed,
+                    title: processedContent.originalContent.title,
+                    summary: '',
+                    enhancedContent: '',
+                    keyPoints: [],
+                    sources: [],
+                    insights: '',
+                    recommendations: '',
+                    ...parsed.value,
                     originalContent: processedContent.originalContent,
                     processingInfo: {
                         enhancedAt: new Date().toISOString(),
                         enhancementType: processedContent.enhancementType,
-                        pdfStyle: processedContent.pdfStyle
+                        pdfStyle: processedContent.pdfStyle,
+                        responseRepaired: parsed.repaired
                     }
                 };
             } else {
@@ -650,6 +4195,8 @@ Please provide your response in the following JSON format:
         } catch (error) {
             this.logError('Failed to parse AI response', error);
             throw new Error('Failed to parse AI response');
+        } finally {
+            this.metrics.record('parse', performance.now() - started, 'ms', processedContent.metadata?.url);
         }
     }
 
@@ -665,7 +4212,84 @@ Please provide your response in the following JSON format:
     }
 
     async generatePDF(enhancedContent, settings) {
-        return await this.pdfGenerator.generatePDF(enhancedContent, settings);
+        const url = enhancedContent.originalUrl;
+        const result = await this.metrics.time('render', () => this.pdfGenerator.generatePDF(enhancedContent, settings), url);
+        if (result.size) {
+            this.metrics.record('pdfBytes', result.size, 'bytes', url);
+        }
+        return result;
+    }
+
+    async extractURL(url) {
+        // Fetch and extract a page without opening a tab: one GET, parsed in the offscreen document
+        if (!/^https?:\/\//i.test(url || '')) {
+            throw new Error(`Only http(s) URLs can be extracted: ${url}`);
+        }
+        if (!this.offscreen.isSupported()) {
+            throw new Error('Background extraction requires the chrome.offscreen API (Chrome 109+)');
+        }
+
+        const { processingTimeout, maxImages, maxLinks, minImageSize } = await this.getProcessingSettings();
+        const response = await this.offscreen.send('extractURL', {
+            url,
+            options: { timeout: processingTimeout, harvest: { maxImages, maxLinks, minImageSize } }
+        });
+        this.logInfo('Extracted URL in offscreen document', {
+            url,
+            wordCount: response.data.wordCount
+        });
+        return response.data;
+    }
+
+    async extractURLs(urls, concurrency = 4) {
+        // Results keep input order; a failed page does not stop the rest
+        return await this.mapWithConcurrency(urls || [], Math.max(1, concurrency), async (url) => {
+            try {
+                return { url, success: true, data: await this.extractURL(url) };
+            } catch (error) {
+                this.logError(`Extraction failed for ${url}`, error);
+                return { url, success: false, error: error.message };
+            }
+        });
+    }
+
+    async requireAPIKey() {
+        const apiKey = await this.getAPIKey();
+        if (!apiKey) {
+            throw new Error('Gemini API key not found. Please configure it in the extension settings.');
+        }
+        return apiKey;
+    }
+
+    async getProcessingSettings() {
+        return new Promise((resolve) => {
+            chrome.storage.sync.get({
+                parallelChunkEnhancement: false,
+                chunkParallelism: 3,
+                bundleParallelism: 2,
+                incrementalEnhancement: true,
+                extractiveSummary: false,
+                extractiveRatio: EXTRACTIVE_RATIO,
+                routingBudget: 'balanced',
+                enableResponseCache: true,
+                cacheTtlHours: 168,
+                requestsPerMinute: 60,
+                maxConcurrentRequests: 4,
+                processingTimeout: 60,
+                maxContentLength: 50000,
+                maxImages: 20,
+                maxLinks: 50,
+                minImageSize: 50
+            }, (result) => {
+                this.responseCache.ttl = result.cacheTtlHours * 60 * 60 * 1000;
+                this.scheduler.configure({
+                    requestsPerMinute: result.requestsPerMinute,
+                    maxConcurrent: result.maxConcurrentRequests,
+                    deadline: result.processingTimeout * 1000
+                });
+                resolve(result);
+            });
+        });
     }
 
     async getAPIKey() {
@@ -677,7 +4301,9 @@ Please provide your response in the following JSON format:
     }
 
     setupLogging() {
-        this.logs = [];
+        this.logs = new LogBuffer({ maxLogs: 500 });
+        // Extraction entries from content scripts, persisted here so there is one writer
+        this.extractionLog = new LogBuffer({ maxLogs: 50, storageKey: 'extractionLogs' });
     }
 
     logInfo(message, data = {}) {
@@ -687,7 +4313,7 @@ Please provide your response in the following JSON format:
             message,
             data
         };
-        this.logs.push(logEntry);
+        this.logs.add(logEntry);
         console.log('[AI Enhancer]', logEntry);
     }
 
@@ -699,7 +4325,7 @@ Please provide your response in the following JSON format:
             error: error.message || error,
             stack: error.stack
         };
-        this.logs.push(logEntry);
+        this.logs.add(logEntry);
         console.error('[AI Enhancer]', logEntry);
     }
 }
@@ -1,7 +1,11 @@
 // Content script for extracting webpage content
+// Also loaded by the offscreen document, which runs it on fetched HTML parsed
+// with DOMParser instead of a live tab.
 class ContentExtractor {
-    constructor() {
-        this.setupMessageListener();
+    constructor(doc = document, pageUrl = null, harvestOptions = null) {
+        this.doc = doc;
+        this.pageUrl = pageUrl;
+        this.harvestOptions = harvestOptions;
     }
 
     setupMessageListener() {
@@ -48,7 +52,7 @@ class ContentExtractor {
             }
             
             // Clean and process content
-            const processedContent = this.processContent(content, metadata);
+            const processedContent = this.processContent(content, metadata, await this.getHarvestOptions());
             
             // Log extraction
             this.logExtraction(metadata.url, processedContent);
@@ -63,7 +67,7 @@ class ContentExtractor {
 
     async waitForPageLoad() {
         return new Promise((resolve) => {
-            if (document.readyState === 'complete') {
+            if (this.doc !== document || document.readyState === 'complete') {
                 resolve();
             } else {
                 window.addEventListener('load', resolve, { once: true });
@@ -73,33 +77,34 @@ class ContentExtractor {
 
     extractMetadata() {
         const getMetaContent = (name) => {
-            const meta = document.querySelector(`meta[name="${name}"], meta[property="${name}"]`);
+            const meta = this.doc.querySelector(`meta[name="${name}"], meta[property="${name}"]`);
             return meta ? meta.getAttribute('content') : null;
         };
 
         return {
-            title: document.title || '',
-            url: window.location.href,
+            title: this.doc.title || '',
+            url: this.pageUrl || window.location.href,
             description: getMetaContent('description') || '',
             author: getMetaContent('author') || getMetaContent('article:author') || '',
             publishedDate: getMetaContent('article:published_time') || getMetaContent('datePublished') || '',
             modifiedDate: getMetaContent('article:modified_time') || getMetaContent('dateModified') || '',
             siteName: getMetaContent('og:site_name') || getMetaContent('application-name') || '',
-            language: document.documentElement.lang || 'en',
+            language: this.doc.documentElement.lang || 'en',
             keywords: getMetaContent('keywords') || '',
             canonicalUrl: this.getCanonicalUrl()
         };
     }
 
     getCanonicalUrl() {
-        const canonical = document.querySelector('link[rel="canonical"]');
-        return canonical ? canonical.href : window.location.href;
+        const canonical = this.doc.querySelector('link[rel="canonical"]');
+        return canonical ? canonical.href : (this.pageUrl || window.location.href);
     }
 
     extractWithReadability() {
         try {
-            const documentClone = document.cloneNode(true);
-            const reader = new Readability(documentClone, {
+            // Readability only reads the document and clones the winning node,
+            // so the live page is never copied or modified
+            const reader = new Readability(this.doc, {
                 debug: false,
                 maxElemsToParse: 0,
                 nbTopCandidates: 5,
@@ -117,7 +122,8 @@ class ContentExtractor {
                     excerpt: article.excerpt,
                     byline: article.byline,
                     length: article.length,
-                    siteName: article.siteName
+                    siteName: article.siteName,
+                    root: article.root
                 };
             }
         } catch (error) {
@@ -128,6 +134,13 @@ class ContentExtractor {
     }
 
     extractWithHeuristics() {
+        // One scoring pass over the page (readability.js); selectors are checked
+        // against its cached per-node stats instead of re-reading textContent
+        const scorer = window.ContentScorer
+            ? new ContentScorer({ charThreshold: 100 }).score(this.doc.body || this.doc.documentElement)
+            : null;
+        const isValid = element => scorer ? scorer.isValid(element) : this.isValidContentElement(element);
+
         // Try to find main content using common selectors
         const contentSelectors = [
             'article',
@@ -146,28 +159,26 @@ class ContentExtractor {
         let mainElement = null;
         
         for (const selector of contentSelectors) {
-            const element = document.querySelector(selector);
-            if (element && this.isValidContentElement(element)) {
+            const element = this.doc.querySelector(selector);
+            if (element && isValid(element)) {
                 mainElement = element;
                 break;
             }
         }
 
-        if (!mainElement) {
-            // Try to find the largest text block
-            const textElements = Array.from(document.querySelectorAll('p, div, section, article'))
-                .filter(el => this.isValidContentElement(el))
-                .sort((a, b) => b.textContent.length - a.textContent.length);
-            
-            mainElement = textElements[0];
+        if (!mainElement && scorer) {
+            // Highest-scoring text block
+            mainElement = scorer.best()?.element;
         }
 
         if (mainElement) {
+            const article = scorer ? scorer.cloneCandidate(mainElement) : mainElement;
             return {
                 title: this.extractTitle(),
-                content: mainElement.innerHTML,
-                textContent: mainElement.textContent,
-                excerpt: this.extractExcerpt(mainElement.textContent)
+                root: article,
+                content: article.innerHTML,
+                textContent: article.textContent,
+                excerpt: this.extractExcerpt(article.textContent)
             };
         }
 
@@ -197,13 +208,13 @@ class ContentExtractor {
         ];
 
         for (const selector of titleSelectors) {
-            const element = document.querySelector(selector);
+            const element = this.doc.querySelector(selector);
             if (element && element.textContent.trim()) {
                 return element.textContent.trim();
             }
         }
 
-        return document.title || '';
+        return this.doc.title || '';
     }
 
     extractExcerpt(text) {
@@ -214,32 +225,49 @@ class ContentExtractor {
 
     extractAllText() {
         // Last resort - extract all visible text
-        const bodyText = document.body.textContent || '';
+        const body = this.doc.body;
+        const bodyText = body ? body.textContent || '' : '';
         return {
-            title: document.title || '',
-            content: document.body.innerHTML,
+            title: this.doc.title || '',
+            root: body,
+            content: body ? body.innerHTML : '',
             textContent: bodyText,
             excerpt: bodyText.substring(0, 200) + '...'
         };
     }
 
-    processContent(content, metadata) {
+    async getHarvestOptions() {
+        // The offscreen document passes limits in; content scripts read settings
+        if (this.harvestOptions) {
+            return { ...ContentExtractor.HARVEST_DEFAULTS, ...this.harvestOptions };
+        }
+        if (!chrome.storage) {
+            return { ...ContentExtractor.HARVEST_DEFAULTS };
+        }
+        return new Promise((resolve) => {
+            chrome.storage.sync.get(ContentExtractor.HARVEST_DEFAULTS, resolve);
+        });
+    }
+
+    processContent(content, metadata, harvestOptions = ContentExtractor.HARVEST_DEFAULTS) {
         if (!content) {
             throw new Error('No content extracted');
         }
 
+        // The article node is only used for harvesting; it can't cross the message channel
+        const { root, ...article } = content;
+
         // Clean text content
-        const cleanText = this.cleanText(content.textContent || '');
+        const cleanText = this.cleanText(article.textContent || '');
         
-        // Extract images
-        const images = this.extractImages(content.content || '');
-        
-        // Extract links
-        const links = this.extractLinks(content.content || '');
+        // Images and links come from the article itself, not the whole page
+        const scope = root || this.parseFragment(article.content || '');
+        const images = this.extractImages(scope, harvestOptions);
+        const links = this.extractLinks(scope, harvestOptions);
 
         return {
             ...metadata,
-            ...content,
+            ...article,
             textContent: cleanText,
             images: images,
             links: links,
@@ -249,6 +277,13 @@ class ContentExtractor {
         };
     }
 
+    parseFragment(html) {
+        // <template> content is inert: no image requests or scripts
+        const template = this.doc.createElement('template');
+        template.innerHTML = html;
+        return template.content;
+    }
+
     cleanText(text) {
         return text
             .replace(/\s+/g, ' ') // Replace multiple whitespace with single space
@@ -256,24 +291,83 @@ class ContentExtractor {
             .trim();
     }
 
-    extractImages(html) {
-        const imgElements = document.querySelectorAll('img');
-        return Array.from(imgElements).map(img => ({
-            src: img.src,
-            alt: img.alt || '',
-            title: img.title || '',
-            width: img.width || null,
-            height: img.height || null
-        })).filter(img => img.src && !img.src.startsWith('data:'));
+    normalizeUrl(raw) {
+        // Absolute http(s) URL without fragment or tracking parameters, or null
+        if (!raw || /^(data|javascript|mailto|tel|blob):/i.test(raw.trim())) {
+            return null;
+        }
+        try {
+            const url = new URL(raw.trim(), this.pageUrl || this.doc.baseURI);
+            if (url.protocol !== 'http:' && url.protocol !== 'https:') {
+                return null;
+            }
+            url.hash = '';
+            for (const key of [...url.searchParams.keys()]) {
+                if (ContentExtractor.TRACKING_PARAMS.test(key)) {
+                    url.searchParams.delete(key);
+                }
+            }
+            return url.href;
+        } catch (error) {
+            return null;
+        }
     }
 
-    extractLinks(html) {
-        const linkElements = document.querySelectorAll('a[href]');
-        return Array.from(linkElements).map(link => ({
-            href: link.href,
-            text: link.textContent.trim(),
-            title: link.title || ''
-        })).filter(link => link.href && link.text);
+    extractImages(scope, options) {
+        const images = [];
+        const seen = new Set();
+        for (const img of scope.querySelectorAll('img')) {
+            if (images.length >= options.maxImages) {
+                break;
+            }
+
+            const src = this.normalizeUrl(img.getAttribute('src') || img.getAttribute('data-src') || '');
+            if (!src || seen.has(src) || ContentExtractor.TRACKING_IMAGE.test(src)) {
+                continue;
+            }
+            seen.add(src);
+
+            // Declared size only (nothing is loaded); images without one are kept
+            const width = parseInt(img.getAttribute('width'), 10) || null;
+            const height = parseInt(img.getAttribute('height'), 10) || null;
+            if ((width && width < options.minImageSize) || (height && height < options.minImageSize)) {
+                continue;
+            }
+
+            images.push({
+                src: src,
+                alt: img.getAttribute('alt') || '',
+                title: img.getAttribute('title') || '',
+                width: width,
+                height: height
+            });
+        }
+        return images;
+    }
+
+    extractLinks(scope, options) {
+        const links = [];
+        const seen = new Set();
+        const page = this.normalizeUrl(this.pageUrl || this.doc.baseURI);
+        for (const link of scope.querySelectorAll('a[href]')) {
+            if (links.length >= options.maxLinks) {
+                break;
+            }
+
+            const href = this.normalizeUrl(link.getAttribute('href'));
+            const text = link.textContent.replace(/\s+/g, ' ').trim();
+            if (!href || !text || href === page || seen.has(href)) {
+                continue;
+            }
+            seen.add(href);
+
+            links.push({
+                href: href,
+                text: text,
+                title: link.getAttribute('title') || ''
+            });
+        }
+        return links;
     }
 
     countWords(text) {
@@ -297,22 +391,24 @@ class ContentExtractor {
             extractionMethod: content.extractionMethod || 'heuristic'
         };
 
-        // Store in chrome storage for debugging
-        chrome.storage.local.get(['extractionLogs'], (result) => {
-            const logs = result.extractionLogs || [];
-            logs.push(logData);
-            
-            // Keep only last 50 logs
-            if (logs.length > 50) {
-                logs.splice(0, logs.length - 50);
-            }
-            
-            chrome.storage.local.set({ extractionLogs: logs });
-        });
+        // Kept for debugging by the background (last 50), which batches the storage writes
+        if (chrome.runtime?.sendMessage) {
+            chrome.runtime.sendMessage({ action: 'logExtraction', data: logData }).catch(() => {});
+        }
 
         console.log('Content extraction logged:', logData);
     }
 }
 
-// Initialize content extractor
-new ContentExtractor();
+ContentExtractor.HARVEST_DEFAULTS = {
+    maxImages: 20,
+    maxLinks: 50,
+    minImageSize: 50
+};
+ContentExtractor.TRACKING_PARAMS = /^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref_src)$/i;
+ContentExtractor.TRACKING_IMAGE = /(pixel|beacon|tracking|spacer|analytics|doubleclick)[^/]*$/i;
+
+// Initialize content extractor in web pages; the offscreen document creates one per fetched page
+if (window.location.protocol !== 'chrome-extension:') {
+    new ContentExtractor().setupMessageListener();
+}
@@ -1,16 +1,90 @@
 // Logging system for AI Content-to-PDF Enhancer
+// Entries live in a fixed-size ring buffer and are persisted in batches: a debounced
+// flush appends new entries to numbered chunk keys (appLogs:0, appLogs:1, ...), so a
+// log line costs O(1) and a flush rewrites at most one partial chunk.
+// Chunk numbering is tracked in memory, so each storageKey must have a single writer:
+// create one Logger per extension page that needs one, with its own key. The file
+// only defines the class; it creates no instance of its own.
 class Logger {
-    constructor() {
-        this.logs = [];
-        this.maxLogs = 1000;
+    constructor(options = {}) {
+        this.storageKey = options.storageKey || 'appLogs';
+        this.maxLogs = options.maxLogs || 1000;
+        this.chunkSize = options.chunkSize || 100;
+        this.flushDelay = options.flushDelay ?? 1000;
+        this.consoleOutput = options.console !== false;
+        this.buffer = new Array(this.maxLogs);
+        this.start = 0;
+        this.count = 0;
+        this.pending = [];
+        this.flushTimer = null;
+        this.flushing = Promise.resolve();
+        this.meta = { first: 0, next: 0 };
+        this.tail = null; // newest stored chunk: { seq, entries }
         this.setupStorage();
+        this.setupShutdownFlush();
+    }
+
+    get logs() {
+        return this.toArray();
+    }
+
+    hasStorage() {
+        return typeof chrome !== 'undefined' && !!chrome.storage?.local;
+    }
+
+    chunkKey(seq) {
+        return `${this.storageKey}:${seq}`;
+    }
+
+    get metaKey() {
+        return `${this.storageKey}:meta`;
     }
 
     setupStorage() {
         // Load existing logs from storage
-        chrome.storage.local.get(['appLogs'], (result) => {
-            this.logs = result.appLogs || [];
-        });
+        if (!this.hasStorage()) {
+            this.ready = Promise.resolve();
+            return;
+        }
+        this.ready = (async () => {
+            const result = await chrome.storage.local.get([this.metaKey, this.storageKey]);
+            this.meta = result[this.metaKey] || { first: 0, next: 0 };
+            const keys = [];
+            for (let seq = this.meta.first; seq < this.meta.next; seq++) {
+                keys.push(this.chunkKey(seq));
+            }
+            const chunks = keys.length > 0 ? await chrome.storage.local.get(keys) : {};
+            const last = this.meta.next - 1;
+            this.tail = last >= this.meta.first ? { seq: last, entries: chunks[this.chunkKey(last)] || [] } : null;
+
+            // The old single-array format is moved into chunks on the next flush
+            const legacy = Array.isArray(result[this.storageKey]) ? result[this.storageKey] : [];
+            const stored = keys.flatMap(key => chunks[key] || []);
+            const early = this.toArray(); // logged while loading
+            this.start = 0;
+            this.count = 0;
+            [...legacy, ...stored, ...early].forEach(entry => this.push(entry));
+            if (legacy.length > 0) {
+                this.pending.unshift(...legacy);
+                await chrome.storage.local.remove(this.storageKey);
+                this.scheduleFlush();
+            }
+        })().catch(error => console.error('[AI Enhancer] Failed to load logs', error));
+    }
+
+    setupShutdownFlush() {
+        // Write out whatever is pending before the page or worker goes away
+        if (typeof window !== 'undefined' && window.addEventListener) {
+            window.addEventListener('pagehide', () => this.flush());
+        }
+        if (typeof document !== 'undefined' && document.addEventListener) {
+            document.addEventListener('visibilitychange', () => {
+                if (document.visibilityState === 'hidden') this.flush();
+            });
+        }
+        if (typeof chrome !== 'undefined' && chrome.runtime?.onSuspend) {
+            chrome.runtime.onSuspend.addListener(() => this.flush());
+        }
     }
 
     log(level, message, data = {}) {
@@ -21,25 +95,106 @@ class Logger {
             message,
             data: this.sanitizeData(data),
             url: this.getCurrentUrl(),
-            userAgent: navigator.userAgent
+            userAgent: typeof navigator !== 'undefined' ? navigator.userAgent : 'unknown'
         };
 
-        this.logs.push(logEntry);
-        
         // Keep only the most recent logs
-        if (this.logs.length > this.maxLogs) {
-            this.logs = this.logs.slice(-this.maxLogs);
-        }
+        this.push(logEntry);
 
-        // Save to storage
-        this.saveToStorage();
+        // Persisted in batches
+        this.pending.push(logEntry);
+        this.scheduleFlush();
 
         // Console output
-        this.outputToConsole(logEntry);
+        if (this.consoleOutput) {
+            this.outputToConsole(logEntry);
+        }
 
         return logEntry;
     }
 
+    push(entry) {
+        this.buffer[(this.start + this.count) % this.maxLogs] = entry;
+        if (this.count < this.maxLogs) {
+            this.count++;
+        } else {
+            this.start = (this.start + 1) % this.maxLogs;
+        }
+    }
+
+    toArray() {
+        const entries = new Array(this.count);
+        for (let i = 0; i < this.count; i++) {
+            entries[i] = this.buffer[(this.start + i) % this.maxLogs];
+        }
+        return entries;
+    }
+
+    scheduleFlush() {
+        if (this.pending.length >= this.chunkSize) {
+            this.flush();
+        } else if (!this.flushTimer) {
+            this.flushTimer = setTimeout(() => this.flush(), this.flushDelay);
+        }
+    }
+
+    flush() {
+        clearTimeout(this.flushTimer);
+        this.flushTimer = null;
+        // Serialized so chunk numbering stays consistent across overlapping flushes
+        this.flushing = this.flushing
+            .then(() => this.writePending())
+            .catch(error => console.error('[AI Enhancer] Failed to persist logs', error));
+        return this.flushing;
+    }
+
+    async writePending() {
+        if (!this.hasStorage()) {
+            this.pending = [];
+            return;
+        }
+        await this.ready;
+        if (this.pending.length === 0) {
+            return;
+        }
+
+        const entries = this.pending;
+        this.pending = [];
+        const meta = { ...this.meta };
+        const updates = {};
+
+        // Top up the newest chunk, then open new ones
+        let tail = this.tail ? { seq: this.tail.seq, entries: this.tail.entries.slice() } : null;
+        for (const entry of entries) {
+            if (!tail || tail.entries.length >= this.chunkSize) {
+                tail = { seq: meta.next++, entries: [] };
+            }
+            tail.entries.push(entry);
+            updates[this.chunkKey(tail.seq)] = tail.entries;
+        }
+
+        // Drop chunks that have fallen out of the ring
+        const keepChunks = Math.ceil(this.maxLogs / this.chunkSize) + 1;
+        const expired = [];
+        while (meta.next - meta.first > keepChunks) {
+            const key = this.chunkKey(meta.first);
+            // Chunks created and expired within one burst are never written
+            if (meta.first < this.meta.next) {
+                expired.push(key);
+            }
+            delete updates[key];
+            meta.first++;
+        }
+        updates[this.metaKey] = meta;
+
+        await chrome.storage.local.set(updates);
+        if (expired.length > 0) {
+            await chrome.storage.local.remove(expired);
+        }
+        this.meta = meta;
+        this.tail = tail;
+    }
+
     info(message, data = {}) {
         return this.log('info', message, data);
     }
@@ -99,10 +254,6 @@ class Logger {
         return Date.now().toString(36) + Math.random().toString(36).substr(2);
     }
 
-    saveToStorage() {
-        chrome.storage.local.set({ appLogs: this.logs });
-    }
-
     outputToConsole(logEntry) {
         const { level, message, data, timestamp } = logEntry;
         const prefix = `[AI Enhancer ${level}] ${timestamp}`;
@@ -123,7 +274,7 @@ class Logger {
     }
 
     getLogs(filter = {}) {
-        let filteredLogs = [...this.logs];
+        let filteredLogs = this.toArray();
 
         if (filter.level) {
             filteredLogs = filteredLogs.filter(log => 
@@ -191,20 +342,37 @@ class Logger {
     }
 
     clearLogs() {
-        this.logs = [];
-        this.saveToStorage();
+        this.start = 0;
+        this.count = 0;
+        this.pending = [];
+        clearTimeout(this.flushTimer);
+        this.flushTimer = null;
+        if (!this.hasStorage()) {
+            return Promise.resolve();
+        }
+        this.flushing = this.flushing.then(async () => {
+            await this.ready;
+            const keys = [this.metaKey];
+            for (let seq = this.meta.first; seq < this.meta.next; seq++) {
+                keys.push(this.chunkKey(seq));
+            }
+            this.meta = { first: 0, next: 0 };
+            this.tail = null;
+            await chrome.storage.local.remove(keys);
+        });
+        return this.flushing;
     }
 
     getStats() {
         const stats = {
-            total: this.logs.length,
+            total: this.count,
             byLevel: {},
             byHour: {},
             errors: 0,
             warnings: 0
         };
 
-        this.logs.forEach(log => {
+        this.toArray().forEach(log => {
             // Count by level
             stats.byLevel[log.level] = (stats.byLevel[log.level] || 0) + 1;
             
@@ -221,14 +389,6 @@ class Logger {
     }
 }
 
-// Create global logger instance
-const logger = new Logger();
-
-// Make logger available globally
-if (typeof window !== 'undefined') {
-    window.logger = logger;
-}
-
 // Export for use in modules
 if (typeof module !== 'undefined' && module.exports) {
     module.exports = Logger;
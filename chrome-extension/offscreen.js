@@ -0,0 +1,139 @@
+// Offscreen document for work the service worker cannot do itself
+// (Blob URLs for downloads, DOMParser for fetched pages). Messages are
+// addressed with target: 'offscreen'.
+
+class OffscreenWorker {
+    constructor() {
+        this.pdfWriter = new PDFWriter();
+        this.objectUrls = [];
+        this.maxObjectUrls = 5;
+        this.parser = new DOMParser();
+
+        chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
+            if (request.target !== 'offscreen') {
+                return false;
+            }
+            this.handleMessage(request, sendResponse);
+            return true; // Keep message channel open for async response
+        });
+    }
+
+    async handleMessage(request, sendResponse) {
+        try {
+            switch (request.action) {
+                case 'renderPDF':
+                    sendResponse({ success: true, ...(await this.renderPDF(request.data, request.settings)) });
+                    break;
+
+                case 'renderBundlePDF':
+                    sendResponse({ success: true, ...(await this.renderBundlePDF(request.data, request.settings)) });
+                    break;
+
+                case 'extractURL':
+                    sendResponse({ success: true, data: await this.extractURL(request.url, request.options) });
+                    break;
+
+                default:
+                    sendResponse({ success: false, error: 'Unknown action' });
+            }
+        } catch (error) {
+            console.error('[Offscreen]', error);
+            sendResponse({ success: false, error: error.message });
+        }
+    }
+
+    async renderPDF(enhancedContent, settings) {
+        // The caller falls back to the HTML renderer for text the built-in fonts cannot show
+        if (!this.pdfWriter.canRender(enhancedContent)) {
+            return { unsupported: true };
+        }
+        return this.toObjectUrl(await this.pdfWriter.render(enhancedContent, settings || {}));
+    }
+
+    async renderBundlePDF(bundle, settings) {
+        if (!this.pdfWriter.canRenderBundle(bundle)) {
+            return { unsupported: true };
+        }
+        return this.toObjectUrl(await this.pdfWriter.renderBundle(bundle, settings || {}));
+    }
+
+    toObjectUrl(bytes) {
+        const blob = new Blob([bytes], { type: 'application/pdf' });
+        return {
+            pdfUrl: this.keepObjectUrl(URL.createObjectURL(blob)),
+            size: blob.size
+        };
+    }
+
+    async extractURL(url, options = {}) {
+        // One plain GET: no rendering, scripts, stylesheets or images
+        const controller = new AbortController();
+        const timer = setTimeout(() => controller.abort(), (options.timeout || 30) * 1000);
+        let html;
+        let finalUrl;
+        try {
+            const response = await fetch(url, {
+                signal: controller.signal,
+                credentials: 'omit',
+                headers: { 'Accept': 'text/html,application/xhtml+xml' }
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status} fetching ${url}`);
+            }
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType && !/html|xml/i.test(contentType)) {
+                throw new Error(`Unsupported content type: ${contentType}`);
+            }
+            const buffer = await response.arrayBuffer();
+            if (buffer.byteLength > (options.maxBytes || 5 * 1024 * 1024)) {
+                throw new Error(`Page too large: ${buffer.byteLength} bytes`);
+            }
+            html = this.decodeHTML(buffer, contentType);
+            finalUrl = response.url || url;
+        } catch (error) {
+            if (error.name === 'AbortError') {
+                throw new Error(`Timed out fetching ${url}`);
+            }
+            throw error;
+        } finally {
+            clearTimeout(timer);
+        }
+
+        const doc = this.parser.parseFromString(html, 'text/html');
+        // Resolve relative image and link URLs against the page, not this document
+        if (!doc.querySelector('base[href]')) {
+            const base = doc.createElement('base');
+            base.href = finalUrl;
+            doc.head.prepend(base);
+        }
+
+        const extractor = new ContentExtractor(doc, finalUrl, options.harvest);
+        return await extractor.extractContent();
+    }
+
+    decodeHTML(buffer, contentType) {
+        // Charset from the Content-Type header, else a <meta charset> in the first 1KB
+        let charset = /charset=["']?([\w-]+)/i.exec(contentType)?.[1];
+        if (!charset) {
+            const head = new TextDecoder('latin1').decode(buffer.slice(0, 1024));
+            charset = /<meta[^>]+charset=["']?([\w-]+)/i.exec(head)?.[1];
+        }
+        try {
+            return new TextDecoder(charset || 'utf-8').decode(buffer);
+        } catch (error) {
+            return new TextDecoder('utf-8').decode(buffer);
+        }
+    }
+
+    keepObjectUrl(url) {
+        // Blob URLs stay valid for the lifetime of this document; only the most
+        // recent few are kept so repeated generations do not pin old PDFs in memory
+        this.objectUrls.push(url);
+        while (this.objectUrls.length > this.maxObjectUrls) {
+            URL.revokeObjectURL(this.objectUrls.shift());
+        }
+        return url;
+    }
+}
+
+new OffscreenWorker();
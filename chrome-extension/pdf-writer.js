@@ -0,0 +1,688 @@
+// Minimal PDF writer for enhanced content
+// Lays out the same sections as PDFGenerator.createPDFTemplate using the
+// standard Helvetica and Courier fonts and produces real PDF bytes (no printing).
+// Markdown is not parsed here: the background's MarkdownRenderer turns each
+// markdown field into HTML (enhancedContent.markup) and parseMarkup() reads
+// back that fixed tag set.
+// Those fonts only cover WinAnsiEncoding; content with other scripts (CJK,
+// Cyrillic, Greek, Arabic...) is reported by canRender() and rendered as HTML.
+// Runs in the offscreen document, where Blob URLs are available.
+
+class PDFWriter {
+    constructor(options = {}) {
+        this.pageWidth = options.pageWidth || 595.28;   // A4
+        this.pageHeight = options.pageHeight || 841.89;
+        this.margin = options.margin || 72;
+        this.compress = options.compress !== false && typeof CompressionStream !== 'undefined';
+
+        this.fonts = {
+            regular: { name: 'F1', base: 'Helvetica', widths: PDFWriter.HELVETICA_WIDTHS },
+            bold: { name: 'F2', base: 'Helvetica-Bold', widths: PDFWriter.HELVETICA_BOLD_WIDTHS },
+            italic: { name: 'F3', base: 'Helvetica-Oblique', widths: PDFWriter.HELVETICA_WIDTHS },
+            boldItalic: { name: 'F4', base: 'Helvetica-BoldOblique', widths: PDFWriter.HELVETICA_BOLD_WIDTHS },
+            mono: { name: 'F5', base: 'Courier', widths: PDFWriter.COURIER_WIDTHS }
+        };
+
+        this.colors = {
+            text: [0.2, 0.2, 0.2],
+            heading: [0.17, 0.24, 0.31],
+            accent: [0.4, 0.49, 0.92],
+            muted: [0.4, 0.4, 0.4]
+        };
+    }
+
+    static canEncode(text) {
+        for (const char of text) {
+            if (char.charCodeAt(0) > 255 && !PDFWriter.WIN_ANSI[char]) {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    canRender(enhancedContent) {
+        // Only the fields the layout prints; metadata in other scripts does not matter
+        const { title, originalUrl, summary, enhancedContent: body, keyPoints, insights, recommendations, sources } = enhancedContent;
+        return PDFWriter.canEncode(JSON.stringify([title, originalUrl, summary, body, keyPoints, insights, recommendations, sources]));
+    }
+
+    canRenderBundle(bundle) {
+        return PDFWriter.canEncode(JSON.stringify([bundle.title, bundle.sources]))
+            && bundle.documents.every(document => this.canRender(document));
+    }
+
+    async render(enhancedContent, settings = {}) {
+        this.pages = [];
+        this.newPage();
+        this.writeDocument(enhancedContent);
+        this.writeFooters();
+        return this.serialize(enhancedContent.title || 'Enhanced Content');
+    }
+
+    async renderBundle(bundle, settings = {}) {
+        // Documents are laid out first so the contents pages know where each one starts
+        this.pages = [];
+        const starts = [];
+        bundle.documents.forEach(document => {
+            this.newPage();
+            starts.push(this.pages.length - 1);
+            this.writeDocument(document);
+        });
+        if (bundle.sources.length > 0) {
+            this.newPage();
+            this.writeHeading('Sources & References');
+            bundle.sources.forEach(source => this.writeSource(source));
+        }
+        const body = this.pages;
+
+        // Page numbers do not change line breaks, so one pass counts the contents pages
+        const pageCount = this.layoutContents(bundle, starts, 0).length;
+        const front = this.layoutContents(bundle, starts, pageCount);
+        this.pages = front.concat(body);
+        this.writeFooters();
+
+        const outline = bundle.documents.map((document, index) => ({
+            title: String(document.title || `Document ${index + 1}`),
+            page: front.length + starts[index]
+        }));
+        return this.serialize(bundle.title || 'Enhanced Documents', outline);
+    }
+
+    layoutContents(bundle, starts, offset) {
+        this.pages = [];
+        this.newPage();
+        const readingTime = bundle.documents.reduce((sum, document) => sum + (Number(document.metadata?.readingTime) || 0), 0);
+        this.writeTitleBlock(String(bundle.title || 'Enhanced Documents'), [
+            `${bundle.documents.length} documents   Generated: ${new Date().toLocaleDateString()}`,
+            `${readingTime > 0 ? `Total Reading Time: ${readingTime} minutes   ` : ''}Unique Sources: ${bundle.sources.length}`
+        ]);
+        this.writeHeading('Contents');
+        bundle.documents.forEach((document, index) => {
+            const page = offset + starts[index];
+            this.writeLines([{ text: `${index + 1}. ${document.title || 'Untitled'}`, style: 'regular' }],
+                { size: 11, leading: 17, color: this.colors.text, right: String(page + 1), link: page });
+            if (document.originalUrl) {
+                this.writeLines([{ text: document.originalUrl, style: 'regular' }],
+                    { size: 8, leading: 11, color: this.colors.muted, indent: 14 });
+            }
+            this.y -= 4;
+        });
+        return this.pages;
+    }
+
+    writeDocument(enhancedContent) {
+        const markup = enhancedContent.markup || {};
+        this.writeHeader(enhancedContent);
+
+        if (enhancedContent.summary) {
+            this.writeHeading('Summary');
+            this.writeBlocks(this.blocks(markup.summary, enhancedContent.summary));
+        }
+
+        this.writeHeading('Enhanced Content');
+        this.writeBlocks(this.blocks(markup.content, enhancedContent.enhancedContent));
+
+        if (Array.isArray(enhancedContent.keyPoints) && enhancedContent.keyPoints.length > 0) {
+            this.writeHeading('Key Points');
+            enhancedContent.keyPoints.forEach((point, index) => {
+                this.writeBullet(this.inlineRuns(this.blocks(markup.keyPoints?.[index], point)));
+            });
+        }
+
+        if (enhancedContent.insights) {
+            this.writeHeading('Insights & Analysis');
+            this.writeBlocks(this.blocks(markup.insights, enhancedContent.insights));
+        }
+
+        if (enhancedContent.recommendations) {
+            this.writeHeading('Recommendations');
+            this.writeBlocks(this.blocks(markup.recommendations, enhancedContent.recommendations));
+        }
+
+        if (Array.isArray(enhancedContent.sources) && enhancedContent.sources.length > 0) {
+            this.writeHeading('Sources & References');
+            enhancedContent.sources.forEach(source => this.writeSource(source));
+        }
+    }
+
+    // ---- Layout ----
+
+    newPage() {
+        this.page = { ops: [], links: [] };
+        this.pages.push(this.page);
+        this.y = this.pageHeight - this.margin;
+    }
+
+    ensureSpace(height) {
+        if (this.y - height < this.margin) {
+            this.newPage();
+        }
+    }
+
+    writeHeader(enhancedContent) {
+        const enhancedAt = new Date(enhancedContent.processingInfo?.enhancedAt || Date.now()).toLocaleDateString();
+        this.writeTitleBlock(String(enhancedContent.title || 'Untitled'), [
+            `Source: ${enhancedContent.originalUrl || 'Unknown'}`,
+            `Enhanced: ${enhancedAt}   Reading Time: ${enhancedContent.metadata?.readingTime || 'Unknown'} minutes`
+        ]);
+    }
+
+    writeTitleBlock(title, meta) {
+        this.writeLines([{ text: title, style: 'bold' }], { size: 20, leading: 26, color: this.colors.heading, align: 'center' });
+        this.y -= 6;
+
+        meta.forEach(line => this.writeLines([{ text: line, style: 'regular' }], { size: 9, leading: 13, color: this.colors.muted, align: 'center' }));
+
+        this.y -= 8;
+        this.page.ops.push(`${this.rgb(this.colors.accent, 'RG')} 2 w ${this.margin} ${this.y.toFixed(2)} m ${(this.pageWidth - this.margin).toFixed(2)} ${this.y.toFixed(2)} l S`);
+        this.y -= 16;
+    }
+
+    writeHeading(text, size = 15) {
+        this.ensureSpace(size * 3);
+        this.y -= size * 0.6;
+        this.page.ops.push(`${this.rgb(this.colors.accent, 'rg')} ${this.margin} ${(this.y - size * 1.1).toFixed(2)} 3 ${(size * 1.3).toFixed(2)} re f`);
+        this.writeLines([{ text, style: 'bold' }], { size, leading: size * 1.4, color: this.colors.heading, indent: 10 });
+        this.y -= 4;
+    }
+
+    writeParagraph(runs, options = {}) {
+        this.writeLines(runs, { size: 11, leading: 15.5, color: this.colors.text, ...options });
+        this.y -= 6;
+    }
+
+    writeBullet(runs, bullet = '•', indent = 18) {
+        this.writeLines(runs, { size: 11, leading: 15.5, color: this.colors.text, indent, bullet });
+        this.y -= 3;
+    }
+
+    writeCode(text) {
+        this.writeLines([{ text: text.replace(/\n$/, ''), style: 'mono' }], { size: 9, leading: 12, color: this.colors.text, indent: 10 });
+        this.y -= 6;
+    }
+
+    writeRule() {
+        this.ensureSpace(12);
+        this.y -= 6;
+        this.page.ops.push(`${this.rgb(this.colors.muted, 'RG')} 0.5 w ${this.margin} ${this.y.toFixed(2)} m ${(this.pageWidth - this.margin).toFixed(2)} ${this.y.toFixed(2)} l S`);
+        this.y -= 6;
+    }
+
+    writeTable(rows) {
+        // Equal-width columns; a row moves to the next page as a whole
+        const columns = Math.max(0, ...rows.map(row => row.length));
+        if (columns === 0) return;
+        const size = 9.5;
+        const leading = 13;
+        const padding = 4;
+        const width = (this.pageWidth - this.margin * 2) / columns;
+        this.y -= 4;
+        for (const row of rows) {
+            const cells = row.map(cell => this.wrap(cell.header ? cell.runs.map(run => ({ ...run, style: PDFWriter.BOLD[run.style] })) : cell.runs,
+                size, width - padding * 2));
+            const height = Math.max(1, ...cells.map(lines => lines.length)) * leading + padding;
+            this.ensureSpace(height);
+            cells.forEach((lines, column) => lines.forEach((line, index) => {
+                const ops = this.wordOps(line, this.margin + column * width + padding, this.y - leading * (index + 1), size, this.colors.text);
+                this.page.ops.push(`BT ${this.rgb(this.colors.text, 'rg')} ${ops.join(' ')} ET`);
+            }));
+            this.y -= height;
+            this.page.ops.push(`${this.rgb(this.colors.muted, 'RG')} 0.5 w ${this.margin} ${this.y.toFixed(2)} m ${(this.pageWidth - this.margin).toFixed(2)} ${this.y.toFixed(2)} l S`);
+        }
+        this.y -= 8;
+    }
+
+    writeSource(source) {
+        if (!source || typeof source !== 'object') {
+            this.writeBullet([{ text: String(source || ''), style: 'regular' }]);
+            return;
+        }
+        const runs = [{ text: String(source.title || source.url || ''), style: 'bold' }];
+        if (source.url) runs.push({ text: `\n${source.url}`, style: 'regular' });
+        if (source.relevance) runs.push({ text: `\n${source.relevance}`, style: 'italic' });
+        // Bundles list each source once with the documents that cite it
+        if (Array.isArray(source.documents) && source.documents.length > 0) {
+            runs.push({ text: `\nCited in: ${source.documents.join(', ')}`, style: 'regular' });
+        }
+        this.writeBullet(runs);
+    }
+
+    // ---- Markup ----
+
+    blocks(html, text) {
+        // Content without markup (older callers) is laid out as plain paragraphs
+        if (typeof html === 'string') {
+            return this.parseMarkup(html);
+        }
+        return String(text || '').split(/\n\s*\n/).filter(part => part.trim())
+            .map(part => ({ type: 'paragraph', runs: [{ text: part.trim(), style: 'regular' }] }));
+    }
+
+    parseMarkup(html) {
+        // MarkdownRenderer output -> [{ type: heading|paragraph|item|code|table|rule, ... }]
+        const blocks = [];
+        const lists = [];           // open lists: { ordered, next }
+        const styles = { bold: 0, italic: 0, code: 0 };
+        let current = null;         // block or table cell collecting text
+        let table = null;
+        let quote = 0;
+        let href = null;
+
+        const start = (block) => {
+            blocks.push(block);
+            current = block;
+        };
+
+        for (const token of html.match(/<[^>]*>|[^<]+/g) || []) {
+            const tag = /^<(\/?)(\w+)([^>]*)>$/.exec(token);
+            if (!tag) {
+                const text = this.unescape(token);
+                if (current?.type === 'code') {
+                    current.text += text;
+                    continue;
+                }
+                if (!current) {
+                    start({ type: 'paragraph', quote: quote > 0, runs: [] });
+                }
+                const style = styles.code ? 'mono'
+                    : styles.bold && styles.italic ? 'boldItalic' : styles.bold ? 'bold' : styles.italic ? 'italic' : 'regular';
+                current.runs.push({ text, style, href });
+                continue;
+            }
+
+            const [, closing, name, attributes] = tag;
+            const delta = closing ? -1 : 1;
+            switch (name) {
+                case 'h1': case 'h2': case 'h3': case 'h4': case 'h5': case 'h6':
+                    if (closing) current = null;
+                    else start({ type: 'heading', level: Number(name[1]), runs: [] });
+                    break;
+                case 'p':
+                    if (closing) current = null;
+                    else start({ type: 'paragraph', quote: quote > 0, runs: [] });
+                    break;
+                case 'blockquote':
+                    quote += delta;
+                    break;
+                case 'br':
+                    current?.runs?.push({ text: '\n', style: 'regular', href: null });
+                    break;
+                case 'ul': case 'ol':
+                    if (closing) lists.pop();
+                    else lists.push({ ordered: name === 'ol', next: parseInt(/start="(\d+)"/.exec(attributes)?.[1], 10) || 1 });
+                    current = null;
+                    break;
+                case 'li':
+                    if (closing) {
+                        current = null;
+                    } else {
+                        const list = lists[lists.length - 1] || { ordered: false };
+                        start({ type: 'item', depth: Math.max(1, lists.length), marker: list.ordered ? `${list.next++}.` : '•', runs: [] });
+                    }
+                    break;
+                case 'pre':
+                    if (closing) current = null;
+                    else start({ type: 'code', text: '' });
+                    break;
+                case 'code':
+                    if (current?.type !== 'code') styles.code += delta;
+                    break;
+                case 'strong':
+                    styles.bold += delta;
+                    break;
+                case 'em':
+                    styles.italic += delta;
+                    break;
+                case 'a':
+                    href = closing ? null : this.unescape(/href="([^"]*)"/.exec(attributes)?.[1] || '') || null;
+                    break;
+                case 'table':
+                    if (closing) {
+                        table = null;
+                    } else {
+                        table = { type: 'table', rows: [] };
+                        blocks.push(table);
+                    }
+                    current = null;
+                    break;
+                case 'tr':
+                    if (!closing) table?.rows.push([]);
+                    break;
+                case 'th': case 'td':
+                    if (closing || !table) {
+                        current = null;
+                    } else {
+                        current = { header: name === 'th', runs: [] };
+                        table.rows[table.rows.length - 1]?.push(current);
+                    }
+                    break;
+                case 'hr':
+                    blocks.push({ type: 'rule' });
+                    current = null;
+                    break;
+            }
+        }
+        return blocks;
+    }
+
+    writeBlocks(blocks) {
+        for (const block of blocks) {
+            switch (block.type) {
+                case 'heading':
+                    // MarkdownRenderer maps '#' to <h3>
+                    this.writeHeading(block.runs.map(run => run.text).join(''), Math.max(11, 17 - block.level));
+                    break;
+                case 'paragraph':
+                    this.writeParagraph(block.runs, block.quote ? { indent: 14, color: this.colors.muted } : {});
+                    break;
+                case 'item':
+                    this.writeBullet(block.runs, block.marker, 18 * block.depth);
+                    break;
+                case 'code':
+                    this.writeCode(block.text);
+                    break;
+                case 'table':
+                    this.writeTable(block.rows);
+                    break;
+                case 'rule':
+                    this.writeRule();
+                    break;
+            }
+        }
+    }
+
+    inlineRuns(blocks) {
+        // One bullet's worth of text: blocks joined by line breaks
+        const runs = [];
+        blocks.forEach((block, index) => {
+            if (index > 0) runs.push({ text: '\n', style: 'regular' });
+            runs.push(...(block.runs || [{ text: block.text || '', style: 'mono' }]));
+        });
+        return runs;
+    }
+
+    unescape(text) {
+        return text.replace(/&(amp|lt|gt|quot|#39);/g, (entity, name) => PDFWriter.ENTITIES[name]);
+    }
+
+    writeLines(runs, options) {
+        // right: text right-aligned on the first line (contents page numbers)
+        // link: page index the lines jump to when clicked
+        const { size, leading, color, indent = 0, align = 'left', bullet = null, right = null, link = null } = options;
+        const rightWidth = right ? this.measure(right, 'regular', size) : 0;
+        const maxWidth = this.pageWidth - this.margin * 2 - indent - (right ? rightWidth + 12 : 0);
+        const lines = this.wrap(runs, size, maxWidth);
+
+        lines.forEach((line, index) => {
+            this.ensureSpace(leading);
+            this.y -= leading;
+            const lineWidth = line.reduce((sum, word) => sum + word.width, 0);
+            let x = this.margin + indent;
+            if (align === 'center') {
+                x = (this.pageWidth - lineWidth) / 2;
+            }
+
+            const ops = [`BT ${this.rgb(color, 'rg')}`];
+            if (bullet && index === 0) {
+                const bulletX = x - this.measure(`${bullet} `, 'regular', size) - 4;
+                ops.push(`/${this.fonts.regular.name} ${size} Tf 1 0 0 1 ${bulletX.toFixed(2)} ${this.y.toFixed(2)} Tm (${this.encode(bullet)}) Tj`);
+            }
+            ops.push(...this.wordOps(line, x, this.y, size, color));
+            if (right && index === 0) {
+                const rightX = this.pageWidth - this.margin - rightWidth;
+                ops.push(`/${this.fonts.regular.name} ${size} Tf 1 0 0 1 ${rightX.toFixed(2)} ${this.y.toFixed(2)} Tm (${this.encode(right)}) Tj`);
+            }
+            ops.push('ET');
+            this.page.ops.push(ops.join(' '));
+            if (link !== null) {
+                this.page.links.push({ page: link, rect: [this.margin + indent, this.y - size * 0.3, this.pageWidth - this.margin, this.y + size] });
+            }
+        });
+    }
+
+    wordOps(line, x, y, size, color) {
+        // Text operators for one wrapped line; linked words are drawn in the accent color
+        const ops = [];
+        for (const word of line) {
+            const font = this.fonts[word.style];
+            if (word.href) {
+                ops.push(this.rgb(this.colors.accent, 'rg'));
+                this.page.links.push({ uri: word.href, rect: [x, y - size * 0.3, x + word.width, y + size] });
+            }
+            ops.push(`/${font.name} ${size} Tf 1 0 0 1 ${x.toFixed(2)} ${y.toFixed(2)} Tm (${this.encode(word.text)}) Tj`);
+            if (word.href) {
+                ops.push(this.rgb(color, 'rg'));
+            }
+            x += word.width;
+        }
+        return ops;
+    }
+
+    wrap(runs, size, maxWidth) {
+        // Split runs into styled words (keeping trailing spaces) and greedily fill lines
+        const lines = [];
+        let line = [];
+        let width = 0;
+
+        const flush = () => {
+            if (line.length > 0) {
+                const lastWord = line[line.length - 1];
+                const trimmed = lastWord.text.replace(/\s+$/, '');
+                lastWord.width -= this.measure(lastWord.text.slice(trimmed.length), lastWord.style, size);
+                lastWord.text = trimmed;
+            }
+            lines.push(line);
+            line = [];
+            width = 0;
+        };
+
+        for (const run of runs) {
+            const parts = run.text.split(/(\n)/);
+            for (const part of parts) {
+                if (part === '\n') {
+                    flush();
+                    continue;
+                }
+                for (const token of part.match(/\S+\s*|\s+/g) || []) {
+                    const tokenWidth = this.measure(token, run.style, size);
+                    if (width + this.measure(token.trimEnd(), run.style, size) > maxWidth && line.length > 0) {
+                        flush();
+                        if (!token.trim()) continue;
+                    }
+                    line.push({ text: token, style: run.style, width: tokenWidth, href: run.href || null });
+                    width += tokenWidth;
+                }
+            }
+        }
+        if (line.length > 0) flush();
+        return lines;
+    }
+
+    measure(text, style, size) {
+        const widths = this.fonts[style].widths;
+        let total = 0;
+        for (const char of text) {
+            const code = char.charCodeAt(0);
+            total += code >= 32 && code <= 126 ? widths[code - 32] : 556;
+        }
+        return total * size / 1000;
+    }
+
+    writeFooters() {
+        const total = this.pages.length;
+        const generated = `Generated by AI Content-to-PDF Enhancer | ${new Date().toLocaleDateString()}`;
+        this.pages.forEach((page, index) => {
+            const text = `${generated}  -  Page ${index + 1} of ${total}`;
+            const x = (this.pageWidth - this.measure(text, 'regular', 8)) / 2;
+            page.ops.push(`BT ${this.rgb(this.colors.muted, 'rg')} /${this.fonts.regular.name} 8 Tf 1 0 0 1 ${x.toFixed(2)} ${(this.margin / 2).toFixed(2)} Tm (${this.encode(text)}) Tj ET`);
+        });
+    }
+
+    rgb(color, operator) {
+        return `${color.map(value => value.toFixed(3)).join(' ')} ${operator}`;
+    }
+
+    // ---- Serialization ----
+
+    encode(text) {
+        // Map to WinAnsiEncoding and escape PDF string delimiters
+        let out = '';
+        for (const char of text) {
+            let code = char.charCodeAt(0);
+            if (code > 255) {
+                code = PDFWriter.WIN_ANSI[char] || 63; // '?'
+            } else if (code < 32) {
+                code = 32;
+            }
+            const ch = String.fromCharCode(code);
+            out += ch === '(' || ch === ')' || ch === '\\' ? `\\${ch}` : ch;
+        }
+        return out;
+    }
+
+    async serialize(title, outline = []) {
+        const objects = [];
+        const addObject = (body) => {
+            objects.push(body);
+            return objects.length;
+        };
+
+        const catalogId = addObject(null);
+        const pagesId = addObject(null);
+        const fontIds = {};
+        for (const font of Object.values(this.fonts)) {
+            fontIds[font.name] = addObject(this.latin1(`<< /Type /Font /Subtype /Type1 /BaseFont /${font.base} /Encoding /WinAnsiEncoding >>`));
+        }
+        const fontResources = Object.entries(fontIds).map(([name, id]) => `/${name} ${id} 0 R`).join(' ');
+
+        // Page objects are numbered up front so links and bookmarks can point at any page
+        const pageIds = this.pages.map(() => addObject(null));
+        for (const [index, page] of this.pages.entries()) {
+            const stream = this.latin1(page.ops.join('\n'));
+            const data = this.compress ? await this.deflate(stream) : stream;
+            const filter = this.compress ? ' /Filter /FlateDecode' : '';
+            const contentId = addObject(this.concat([
+                this.latin1(`<< /Length ${data.length}${filter} >>\nstream\n`),
+                data,
+                this.latin1('\nendstream')
+            ]));
+            const annots = page.links.map(link => addObject(this.latin1(
+                `<< /Type /Annot /Subtype /Link /Rect [${link.rect.map(value => value.toFixed(2)).join(' ')}] /Border [0 0 0] ` +
+                (link.uri ? `/A << /S /URI /URI (${this.encode(link.uri)}) >> >>` : `/Dest [${pageIds[link.page]} 0 R /Fit] >>`)
+            )));
+            const annotRefs = annots.length > 0 ? ` /Annots [${annots.map(id => `${id} 0 R`).join(' ')}]` : '';
+            objects[pageIds[index] - 1] = this.latin1(
+                `<< /Type /Page /Parent ${pagesId} 0 R /MediaBox [0 0 ${this.pageWidth} ${this.pageHeight}] ` +
+                `/Resources << /Font << ${fontResources} >> >> /Contents ${contentId} 0 R${annotRefs} >>`
+            );
+        }
+
+        // Bookmarks: one flat outline entry per document
+        let outlineRef = '';
+        if (outline.length > 0) {
+            const rootId = addObject(null);
+            const itemIds = outline.map(() => addObject(null));
+            outline.forEach((item, index) => {
+                const links = [
+                    index > 0 ? ` /Prev ${itemIds[index - 1]} 0 R` : '',
+                    index < itemIds.length - 1 ? ` /Next ${itemIds[index + 1]} 0 R` : ''
+                ].join('');
+                objects[itemIds[index] - 1] = this.latin1(
+                    `<< /Title (${this.encode(item.title)}) /Parent ${rootId} 0 R${links} /Dest [${pageIds[item.page]} 0 R /Fit] >>`
+                );
+            });
+            objects[rootId - 1] = this.latin1(
+                `<< /Type /Outlines /First ${itemIds[0]} 0 R /Last ${itemIds[itemIds.length - 1]} 0 R /Count ${itemIds.length} >>`
+            );
+            outlineRef = ` /Outlines ${rootId} 0 R /PageMode /UseOutlines`;
+        }
+
+        objects[catalogId - 1] = this.latin1(`<< /Type /Catalog /Pages ${pagesId} 0 R${outlineRef} >>`);
+        objects[pagesId - 1] = this.latin1(`<< /Type /Pages /Kids [${pageIds.map(id => `${id} 0 R`).join(' ')}] /Count ${pageIds.length} >>`);
+        const infoId = addObject(this.latin1(`<< /Title (${this.encode(title)}) /Producer (AI Content-to-PDF Enhancer) >>`));
+
+        const chunks = [this.latin1('%PDF-1.4\n%\xE2\xE3\xCF\xD3\n')];
+        const offsets = [];
+        let offset = chunks[0].length;
+        objects.forEach((body, index) => {
+            const head = this.latin1(`${index + 1} 0 obj\n`);
+            const tail = this.latin1('\nendobj\n');
+            offsets.push(offset);
+            chunks.push(head, body, tail);
+            offset += head.length + body.length + tail.length;
+        });
+
+        const xref = [`xref\n0 ${objects.length + 1}\n0000000000 65535 f \n`];
+        offsets.forEach(value => xref.push(`${String(value).padStart(10, '0')} 00000 n \n`));
+        xref.push(`trailer\n<< /Size ${objects.length + 1} /Root ${catalogId} 0 R /Info ${infoId} 0 R >>\nstartxref\n${offset}\n%%EOF\n`);
+        chunks.push(this.latin1(xref.join('')));
+
+        return this.concat(chunks);
+    }
+
+    latin1(text) {
+        const bytes = new Uint8Array(text.length);
+        for (let i = 0; i < text.length; i++) {
+            bytes[i] = text.charCodeAt(i) & 0xFF;
+        }
+        return bytes;
+    }
+
+    concat(parts) {
+        const total = parts.reduce((sum, part) => sum + part.length, 0);
+        const bytes = new Uint8Array(total);
+        let offset = 0;
+        for (const part of parts) {
+            bytes.set(part, offset);
+            offset += part.length;
+        }
+        return bytes;
+    }
+
+    async deflate(bytes) {
+        // CompressionStream('deflate') emits zlib-wrapped data, which is what FlateDecode expects
+        const stream = new Blob([bytes]).stream().pipeThrough(new CompressionStream('deflate'));
+        return new Uint8Array(await new Response(stream).arrayBuffer());
+    }
+}
+
+// Glyph widths (1/1000 em) for character codes 32-126 from the standard Helvetica AFM files
+PDFWriter.HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+];
+
+PDFWriter.HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584
+];
+
+PDFWriter.COURIER_WIDTHS = new Array(95).fill(600);
+
+// Bold counterpart of each text style, for table header cells
+PDFWriter.BOLD = { regular: 'bold', bold: 'bold', italic: 'boldItalic', boldItalic: 'boldItalic', mono: 'mono' };
+
+// The escapes MarkdownRenderer writes
+PDFWriter.ENTITIES = { amp: '&', lt: '<', gt: '>', quot: '"', '#39': "'" };
+
+// Unicode characters outside Latin-1 that WinAnsiEncoding can still represent
+PDFWriter.WIN_ANSI = {
+    '€': 0x80, '‚': 0x82, 'ƒ': 0x83, '„': 0x84, '…': 0x85,
+    '†': 0x86, '‡': 0x87, 'ˆ': 0x88, '‰': 0x89, 'Š': 0x8A,
+    '‹': 0x8B, 'Œ': 0x8C, 'Ž': 0x8E, '‘': 0x91, '’': 0x92,
+    '“': 0x93, '”': 0x94, '•': 0x95, '–': 0x96, '—': 0x97,
+    '˜': 0x98, '™': 0x99, 'š': 0x9A, '›': 0x9B, 'œ': 0x9C,
+    'ž': 0x9E, 'Ÿ': 0x9F
+};
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = PDFWriter;
+}
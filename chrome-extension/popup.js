@@ -3,6 +3,7 @@ class AIEnhancerPopup {
         this.initializeElements();
         this.setupEventListeners();
         this.loadSettings();
+        this.resumeActiveJob();
     }
 
     initializeElements() {
@@ -11,6 +12,7 @@ class AIEnhancerPopup {
         this.status = document.getElementById('status');
         this.enhanceBtn = document.getElementById('enhanceBtn');
         this.previewBtn = document.getElementById('previewBtn');
+        this.bundleBtn = document.getElementById('bundleBtn');
         this.downloadPdfBtn = document.getElementById('downloadPdfBtn');
         this.spinner = document.getElementById('spinner');
         this.preview = document.getElementById('preview');
@@ -19,11 +21,13 @@ class AIEnhancerPopup {
         this.progressBar = document.getElementById('progressBar');
         this.progressText = document.getElementById('progressText');
         this.lastPdfData = null;
+        this.lastJobId = null;
     }
 
     setupEventListeners() {
         this.enhanceBtn.addEventListener('click', () => this.handleEnhance());
         this.previewBtn.addEventListener('click', () => this.handlePreview());
+        this.bundleBtn.addEventListener('click', () => this.handleBundle());
         this.downloadPdfBtn.addEventListener('click', () => this.handleDownloadPdf());
         
         // Add settings button handler
@@ -143,6 +147,7 @@ class AIEnhancerPopup {
             const response = await chrome.tabs.sendMessage(tab.id, { action: 'extractContent' });
             
             if (response && response.success) {
+                this.previewContent.style.whiteSpace = '';
                 this.previewContent.innerHTML = this.formatPreviewContent(response.data);
                 this.preview.style.display = 'block';
                 this.updateStatus('Content extracted successfully', 'ready');
@@ -193,20 +198,34 @@ class AIEnhancerPopup {
             
             // Step 1: Inject content script
             this.updateProgress(10, 'Preparing content extraction...');
+            const injectStarted = performance.now();
             await this.injectContentScript(tab.id);
+            const injection = performance.now() - injectStarted;
             
             // Wait for script initialization
             await new Promise(resolve => setTimeout(resolve, 100));
             
             // Step 2: Extract content
             this.updateProgress(20, 'Extracting content...');
+            const extractStarted = performance.now();
             const extractResponse = await chrome.tabs.sendMessage(tab.id, { action: 'extractContent' });
+            const extraction = performance.now() - extractStarted;
             
             if (!extractResponse || !extractResponse.success) {
                 throw new Error(extractResponse?.error || 'Failed to extract content');
             }
 
-            // Step 3: Send to background for AI processing
+            // Stage timings that only the popup can see
+            chrome.runtime.sendMessage({
+                action: 'recordMetrics',
+                samples: [
+                    { name: 'injection', value: injection, url: tab.url },
+                    { name: 'extraction', value: extraction, url: tab.url },
+                    { name: 'extractedBytes', value: JSON.stringify(extractResponse.data).length, unit: 'chars', url: tab.url }
+                ]
+            }).catch(() => {});
+
+            // Step 3: Queue the job; it keeps running in the background if the popup closes
             this.updateProgress(40, 'Processing with AI...');
             const settings = {
                 enhancementType: document.getElementById('enhancementType').value,
@@ -215,46 +234,210 @@ class AIEnhancerPopup {
                 includeSources: document.getElementById('includeSources').checked
             };
 
-            const enhanceResponse = await chrome.runtime.sendMessage({
-                action: 'enhanceContent',
+            const queued = await chrome.runtime.sendMessage({
+                action: 'enqueueJob',
                 data: extractResponse.data,
-                settings: settings
+                settings: settings,
+                source: 'popup'
             });
 
-            if (!enhanceResponse || !enhanceResponse.success) {
-                throw new Error(enhanceResponse?.error || 'AI processing failed');
+            if (!queued || !queued.success) {
+                throw new Error(queued?.error || 'Failed to queue enhancement');
             }
+            await chrome.storage.local.set({ activeJobId: queued.job.id });
 
-            // Step 4: Generate PDF
-            this.updateProgress(80, 'Generating PDF...');
-            const pdfResponse = await chrome.runtime.sendMessage({
-                action: 'generatePDF',
-                data: enhanceResponse.data,
-                settings: settings
-            });
+            // Step 4: Follow the job through enhancement and PDF rendering
+            const job = await this.waitForJob(queued.job.id);
+            this.showJobResult(job);
 
-            if (!pdfResponse || !pdfResponse.success) {
-                throw new Error(pdfResponse?.error || 'PDF generation failed');
+        } catch (error) {
+            console.error('Enhancement error:', error);
+            this.updateStatus(`Error: ${error.message}`, 'error');
+            this.showProgress(false);
+        } finally {
+            this.enhanceBtn.disabled = false;
+            this.spinner.style.display = 'none';
+        }
+    }
+
+    async handleBundle() {
+        try {
+            this.bundleBtn.disabled = true;
+            this.updateStatus('Collecting tabs...', 'processing');
+            this.showProgress(true);
+
+            // Selected tabs if several are highlighted, otherwise every page in the window
+            const tabs = await chrome.tabs.query({ currentWindow: true });
+            const highlighted = tabs.filter(tab => tab.highlighted);
+            const urls = (highlighted.length > 1 ? highlighted : tabs)
+                .map(tab => tab.url)
+                .filter(url => /^https?:/.test(url || ''));
+            if (urls.length < 2) {
+                throw new Error('Open at least two web pages to combine them into one PDF');
             }
 
-            // Step 5: Store PDF data and show download button
-            this.updateProgress(100, 'PDF ready for download...');
-            this.lastPdfData = pdfResponse;
-            this.downloadPdfBtn.style.display = 'block';
-            
-            this.updateStatus('PDF generated successfully! Click "Download PDF" to save.', 'ready');
+            this.updateProgress(10, `Queuing ${urls.length} pages...`);
+            const settings = {
+                enhancementType: document.getElementById('enhancementType').value,
+                pdfStyle: document.getElementById('pdfStyle').value,
+                includeImages: document.getElementById('includeImages').checked,
+                includeSources: document.getElementById('includeSources').checked
+            };
+            const queued = await chrome.runtime.sendMessage({
+                action: 'enqueueBundle',
+                urls,
+                settings,
+                source: 'popup'
+            });
+            if (!queued || !queued.success) {
+                throw new Error(queued?.error || 'Failed to queue the bundle');
+            }
+            await chrome.storage.local.set({ activeJobId: queued.job.id });
+
+            const job = await this.waitForJob(queued.job.id);
+            this.showJobResult(job);
+        } catch (error) {
+            console.error('Bundle error:', error);
+            this.updateStatus(`Error: ${error.message}`, 'error');
             this.showProgress(false);
+        } finally {
+            this.bundleBtn.disabled = false;
+        }
+    }
 
+    async resumeActiveJob() {
+        // Reopening the popup picks up the job started earlier
+        const { activeJobId } = await chrome.storage.local.get('activeJobId');
+        if (!activeJobId) {
+            return;
+        }
+        const response = await chrome.runtime.sendMessage({ action: 'getJob', jobId: activeJobId });
+        const job = response?.job;
+        if (!job) {
+            await chrome.storage.local.remove('activeJobId');
+            return;
+        }
+
+        try {
+            if (job.state !== 'done' && job.state !== 'failed') {
+                this.enhanceBtn.disabled = true;
+                this.spinner.style.display = 'inline-block';
+                this.updateStatus('Resuming enhancement...', 'processing');
+                this.showProgress(true);
+            }
+            this.showJobResult(await this.waitForJob(activeJobId));
         } catch (error) {
-            console.error('Enhancement error:', error);
             this.updateStatus(`Error: ${error.message}`, 'error');
             this.showProgress(false);
+            await chrome.storage.local.remove('activeJobId');
         } finally {
             this.enhanceBtn.disabled = false;
             this.spinner.style.display = 'none';
         }
     }
 
+    async waitForJob(jobId) {
+        // The background pushes every state change and streamed section over a port. If the
+        // service worker restarts the port closes; reconnecting wakes it and resumes the job
+        while (true) {
+            const job = await this.watchJob(jobId);
+            if (job) {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, 500));
+        }
+    }
+
+    watchJob(jobId) {
+        return new Promise((resolve, reject) => {
+            const port = chrome.runtime.connect({ name: 'jobProgress' });
+            let settled = false;
+            const finish = (settle, value) => {
+                if (settled) return;
+                settled = true;
+                port.disconnect();
+                settle(value);
+            };
+
+            port.onDisconnect.addListener(() => finish(resolve, null));
+            port.onMessage.addListener((message) => {
+                const job = message.job;
+                if (message.type === 'error' || !job) {
+                    finish(reject, new Error(message.error || 'Job not found'));
+                } else if (job.state === 'done') {
+                    finish(resolve, job);
+                } else if (job.state === 'failed') {
+                    finish(reject, new Error(job.error || 'Enhancement failed'));
+                } else {
+                    this.showJobProgress(job);
+                }
+            });
+            port.postMessage({ action: 'watchJob', jobId });
+        });
+    }
+
+    showJobProgress(job) {
+        const progress = { queued: [40, 'Waiting in queue...'], extracting: [30, 'Extracting content...'], enhancing: [50, 'Processing with AI...'], rendering: [85, 'Generating PDF...'] };
+        const [percentage, text] = progress[job.state] || progress.queued;
+        if (job.documents && job.state === 'enhancing') {
+            const done = job.documents.filter(document => document.done || document.error).length;
+            this.updateProgress(20 + Math.round(done / job.documents.length * 60), `Enhancing pages (${done}/${job.documents.length})...`);
+        } else if (job.sections) {
+            // Sections stream in while Gemini is still generating
+            this.renderStreamPreview(job.sections);
+            this.updateProgress(Math.min(75, percentage + Object.keys(job.sections).length * 5), text);
+        } else {
+            this.updateProgress(percentage, text);
+        }
+    }
+
+    showJobResult(job) {
+        this.updateProgress(100, 'PDF ready for download...');
+        this.lastJobId = job.id;
+        this.lastPdfData = job.result;
+        this.downloadPdfBtn.style.display = 'block';
+
+        const failed = job.documents ? job.documents.filter(document => document.error).length : 0;
+        this.updateStatus(failed > 0
+            ? `PDF generated; ${failed} of ${job.documents.length} pages could not be included. Click "Download PDF" to save.`
+            : 'PDF generated successfully! Click "Download PDF" to save.', 'ready');
+        this.showProgress(false);
+    }
+
+    renderStreamPreview(sections) {
+        const maxLength = 1500;
+        const container = document.createDocumentFragment();
+
+        const addBlock = (label, text) => {
+            const block = document.createElement('div');
+            block.style.marginBottom = '10px';
+            const heading = document.createElement('strong');
+            heading.textContent = label;
+            block.appendChild(heading);
+            block.appendChild(document.createElement('br'));
+            block.appendChild(document.createTextNode(text));
+            container.appendChild(block);
+        };
+
+        if (sections.title) {
+            addBlock('Title:', String(sections.title));
+        }
+        if (sections.summary) {
+            addBlock('Summary:', String(sections.summary));
+        }
+        if (Array.isArray(sections.keyPoints) && sections.keyPoints.length > 0) {
+            addBlock('Key Points:', sections.keyPoints.map(point => `• ${point}`).join('\n'));
+        }
+        if (sections.enhancedContent) {
+            const content = String(sections.enhancedContent);
+            addBlock('Enhanced Content:', content.length > maxLength ? content.substring(0, maxLength) + '...' : content);
+        }
+
+        this.previewContent.replaceChildren(container);
+        this.previewContent.style.whiteSpace = 'pre-wrap';
+        this.preview.style.display = 'block';
+    }
+
     async handleDownloadPdf() {
         if (!this.lastPdfData) {
             this.updateStatus('No PDF data available. Please generate a PDF first.', 'error');
@@ -265,11 +448,19 @@ class AIEnhancerPopup {
             this.downloadPdfBtn.disabled = true;
             this.updateStatus('Downloading PDF...', 'processing');
 
-            await chrome.downloads.download({
-                url: this.lastPdfData.pdfData,
-                filename: this.lastPdfData.filename,
-                saveAs: true
-            });
+            if (this.lastJobId) {
+                // The background re-renders the PDF if its Blob URL has expired
+                const response = await chrome.runtime.sendMessage({ action: 'downloadJob', jobId: this.lastJobId });
+                if (!response || !response.success) {
+                    throw new Error(response?.error || 'Download failed');
+                }
+            } else {
+                await chrome.downloads.download({
+                    url: this.lastPdfData.pdfData,
+                    filename: this.lastPdfData.filename,
+                    saveAs: true
+                });
+            }
 
             this.updateStatus('PDF downloaded successfully!', 'ready');
         } catch (error) {
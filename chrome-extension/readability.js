@@ -1,6 +1,210 @@
 // Simplified Readability.js implementation
 // This is a basic version for content extraction
 
+// Content scoring engine: one bottom-up walk over the DOM computes text length,
+// link text length, commas and paragraph scores for every element, caching them
+// per node, so candidates are ranked without re-reading textContent.
+const SCORER_SKIP_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'IFRAME', 'SVG', 'CANVAS', 'NAV', 'HEADER', 'FOOTER']);
+const SCORER_SKIP_CLASSES = new Set([
+    'advertisement', 'ad', 'sidebar', 'navigation', 'menu', 'social', 'share',
+    'comments', 'comment', 'related', 'recommended', 'popup', 'modal', 'overlay'
+]);
+const SCORER_INLINE_TAGS = new Set(['A', 'ABBR', 'B', 'BR', 'CITE', 'CODE', 'EM', 'I', 'MARK', 'Q', 'S', 'SMALL', 'SPAN', 'STRONG', 'SUB', 'SUP', 'TIME', 'U']);
+const SCORER_TAG_SCORES = {
+    ARTICLE: 10, MAIN: 8, DIV: 5, SECTION: 5, PRE: 3, TD: 3, BLOCKQUOTE: 3,
+    ADDRESS: -3, OL: -3, UL: -3, DL: -3, DD: -3, DT: -3, LI: -3, FORM: -3,
+    H1: -5, H2: -5, H3: -5, H4: -5, H5: -5, H6: -5, TH: -5
+};
+const SCORER_POSITIVE = /article|body|content|entry|main|page|post|text|blog|story/i;
+const SCORER_NEGATIVE = /comment|meta|footer|footnote|sidebar|widget|share|social|sponsor|advert|promo|related|nav|menu|banner/i;
+
+class ContentScorer {
+    constructor(options = {}) {
+        this.options = {
+            charThreshold: 500,
+            nbTopCandidates: 5,
+            maxElemsToParse: 0,
+            ...options
+        };
+        this.stats = new Map();
+        this.topCandidates = [];
+    }
+
+    shouldSkip(element) {
+        if (SCORER_SKIP_TAGS.has(element.tagName.toUpperCase())) {
+            return true;
+        }
+        const classList = element.classList;
+        for (let i = 0; classList && i < classList.length; i++) {
+            if (SCORER_SKIP_CLASSES.has(classList[i])) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    entry(element) {
+        let stats = this.stats.get(element);
+        if (!stats) {
+            stats = { textLength: 0, linkLength: 0, ownLength: 0, ownCommas: 0, contentScore: 0, score: 0 };
+            this.stats.set(element, stats);
+        }
+        return stats;
+    }
+
+    score(root) {
+        // Iterative post-order walk: children are finished before their parent
+        const stack = [[root, false]];
+        let elementCount = 0;
+
+        while (stack.length > 0) {
+            const frame = stack.pop();
+            const element = frame[0];
+
+            if (!frame[1]) {
+                if (element !== root && this.shouldSkip(element)) {
+                    continue;
+                }
+                elementCount++;
+                if (this.options.maxElemsToParse > 0 && elementCount > this.options.maxElemsToParse) {
+                    throw new Error(`Aborting parsing document; more than ${this.options.maxElemsToParse} elements found`);
+                }
+                frame[1] = true;
+                stack.push(frame);
+                const children = element.children;
+                for (let i = children.length - 1; i >= 0; i--) {
+                    stack.push([children[i], false]);
+                }
+                continue;
+            }
+
+            this.finish(element);
+        }
+        return this;
+    }
+
+    finish(element) {
+        const stats = this.entry(element);
+        const tag = element.tagName.toUpperCase();
+
+        const childNodes = element.childNodes;
+        for (let i = 0; i < childNodes.length; i++) {
+            const node = childNodes[i];
+            if (node.nodeType === 3) {
+                const text = node.data.trim();
+                stats.textLength += text.length;
+                stats.ownLength += text.length;
+                stats.ownCommas += this.countCommas(text);
+            } else if (node.nodeType === 1) {
+                const child = this.stats.get(node);
+                if (!child) continue; // skipped subtree
+                stats.textLength += child.textLength;
+                stats.linkLength += child.linkLength;
+                if (SCORER_INLINE_TAGS.has(node.tagName.toUpperCase())) {
+                    // Inline text belongs to the enclosing paragraph
+                    stats.ownLength += child.ownLength;
+                    stats.ownCommas += child.ownCommas;
+                }
+            }
+        }
+        if (tag === 'A') {
+            stats.linkLength = stats.textLength;
+        }
+
+        // Paragraph-like blocks feed their parent fully and their grandparent by half
+        if (!SCORER_INLINE_TAGS.has(tag) && stats.ownLength >= 25) {
+            const paragraphScore = 1 + stats.ownCommas + Math.min(3, Math.floor(stats.ownLength / 100));
+            const parent = element.parentElement;
+            if (parent) {
+                this.entry(parent).contentScore += paragraphScore;
+                if (parent.parentElement) {
+                    this.entry(parent.parentElement).contentScore += paragraphScore / 2;
+                }
+            }
+        }
+
+        if (stats.contentScore > 0) {
+            const linkDensity = stats.textLength ? stats.linkLength / stats.textLength : 0;
+            stats.score = (stats.contentScore + (SCORER_TAG_SCORES[tag] || 0) + this.classWeight(element)) * (1 - linkDensity);
+            this.consider(element, stats);
+        }
+    }
+
+    classWeight(element) {
+        const names = `${element.getAttribute('class') || ''} ${element.id || ''}`;
+        if (names.length <= 1) {
+            return 0;
+        }
+        let weight = 0;
+        if (SCORER_NEGATIVE.test(names)) weight -= 25;
+        if (SCORER_POSITIVE.test(names)) weight += 25;
+        return weight;
+    }
+
+    countCommas(text) {
+        let count = 0;
+        for (let index = text.indexOf(','); index !== -1; index = text.indexOf(',', index + 1)) {
+            count++;
+        }
+        return count;
+    }
+
+    consider(element, stats) {
+        if (stats.textLength <= this.options.charThreshold) {
+            return;
+        }
+        const top = this.topCandidates;
+        if (top.length === this.options.nbTopCandidates && top[top.length - 1].stats.score >= stats.score) {
+            return;
+        }
+        let index = top.length;
+        while (index > 0 && top[index - 1].stats.score < stats.score) {
+            index--;
+        }
+        top.splice(index, 0, { element, stats });
+        if (top.length > this.options.nbTopCandidates) {
+            top.pop();
+        }
+    }
+
+    best() {
+        const top = this.topCandidates[0];
+        if (!top) {
+            return null;
+        }
+        return {
+            element: top.element,
+            score: top.stats.score,
+            textLength: top.stats.textLength,
+            linkDensity: top.stats.textLength ? top.stats.linkLength / top.stats.textLength : 0
+        };
+    }
+
+    cloneCandidate(element) {
+        // Deep-clone only the chosen node, then drop the subtrees the scorer skipped
+        const clone = element.cloneNode(true);
+        const skipped = [];
+        const stack = [clone];
+        while (stack.length > 0) {
+            const children = stack.pop().children;
+            for (let i = 0; i < children.length; i++) {
+                if (this.shouldSkip(children[i])) {
+                    skipped.push(children[i]);
+                } else {
+                    stack.push(children[i]);
+                }
+            }
+        }
+        skipped.forEach(node => node.remove());
+        return clone;
+    }
+
+    isValid(element) {
+        const stats = this.stats.get(element);
+        return !!stats && stats.textLength > this.options.charThreshold;
+    }
+}
+
 class Readability {
     constructor(doc, options = {}) {
         this.doc = doc;
@@ -15,31 +219,34 @@ class Readability {
     }
 
     parse() {
+        // Non-mutating: the document is only read. Unwanted subtrees are skipped
+        // while scoring, and only the winning node is cloned and cleaned.
         try {
-            // Remove unwanted elements
-            this.removeUnwantedElements();
-            
             // Find the main content
-            const article = this.findMainContent();
+            const scorer = this.scoreDocument();
+            const best = scorer && scorer.best();
             
-            if (!article) {
+            if (!best) {
                 return null;
             }
 
             // Extract metadata
             const metadata = this.extractMetadata();
             
-            // Clean up the content
+            // Detached copy of the winner without skipped descendants
+            const article = scorer.cloneCandidate(best.element);
             this.cleanContent(article);
+            const textContent = article.textContent;
             
             return {
                 title: metadata.title,
                 content: article.innerHTML,
-                textContent: article.textContent,
-                excerpt: this.extractExcerpt(article.textContent),
+                textContent: textContent,
+                excerpt: this.extractExcerpt(textContent),
                 byline: metadata.byline,
-                length: article.textContent.length,
-                siteName: metadata.siteName
+                length: textContent.length,
+                siteName: metadata.siteName,
+                root: article
             };
         } catch (error) {
             console.error('Readability parsing error:', error);
@@ -47,111 +254,30 @@ class Readability {
         }
     }
 
-    removeUnwantedElements() {
-        const unwantedSelectors = [
-            'script',
-            'style',
-            'nav',
-            'header',
-            'footer',
-            '.advertisement',
-            '.ad',
-            '.sidebar',
-            '.navigation',
-            '.menu',
-            '.social',
-            '.share',
-            '.comments',
-            '.comment',
-            '.related',
-            '.recommended',
-            '.popup',
-            '.modal',
-            '.overlay'
-        ];
-
-        unwantedSelectors.forEach(selector => {
-            const elements = this.doc.querySelectorAll(selector);
-            elements.forEach(el => el.remove());
-        });
-    }
-
-    findMainContent() {
-        // Try different strategies to find main content
-        const strategies = [
-            () => this.findByArticleTag(),
-            () => this.findByMainTag(),
-            () => this.findByContentClass(),
-            () => this.findByHeuristics()
-        ];
-
-        for (const strategy of strategies) {
-            const content = strategy();
-            if (content && this.isValidContent(content)) {
-                return content;
-            }
+    scoreDocument() {
+        // Single scoring pass over the document
+        const root = this.doc.body || this.doc.documentElement;
+        if (!root) {
+            return null;
         }
 
-        return null;
-    }
-
-    findByArticleTag() {
-        return this.doc.querySelector('article');
-    }
-
-    findByMainTag() {
-        return this.doc.querySelector('main');
-    }
-
-    findByContentClass() {
-        const contentClasses = [
-            '.content',
-            '.post-content',
-            '.entry-content',
-            '.article-content',
-            '.main-content',
-            '.post',
-            '.article'
-        ];
+        const scorer = new ContentScorer({
+            charThreshold: this.options.charThreshold,
+            nbTopCandidates: this.options.nbTopCandidates,
+            maxElemsToParse: this.options.maxElemsToParse
+        }).score(root);
 
-        for (const className of contentClasses) {
-            const element = this.doc.querySelector(className);
-            if (element) {
-                return element;
-            }
+        if (this.options.debug) {
+            console.log('Readability top candidate:', scorer.best());
         }
-
-        return null;
-    }
-
-    findByHeuristics() {
-        // Find the element with the most text content
-        const candidates = Array.from(this.doc.querySelectorAll('div, section, article, main'))
-            .filter(el => this.isValidContent(el))
-            .sort((a, b) => b.textContent.length - a.textContent.length);
-
-        return candidates[0] || null;
+        return scorer;
     }
 
-    isValidContent(element) {
-        const text = element.textContent.trim();
-        return text.length > this.options.charThreshold &&
-               !element.querySelector('script') &&
-               !element.querySelector('style') &&
-               !this.isUnwantedElement(element);
-    }
-
-    isUnwantedElement(element) {
-        const unwantedClasses = [
-            'advertisement', 'ad', 'sidebar', 'navigation', 'menu',
-            'social', 'share', 'comments', 'comment', 'related',
-            'recommended', 'popup', 'modal', 'overlay'
-        ];
-
-        return unwantedClasses.some(className => 
-            element.classList.contains(className) ||
-            element.id.includes(className)
-        );
+    findMainContent() {
+        // The highest-scoring block in the live document (not a copy)
+        const scorer = this.scoreDocument();
+        const best = scorer && scorer.best();
+        return best ? best.element : null;
     }
 
     extractMetadata() {
@@ -218,4 +344,5 @@ class Readability {
 // Make Readability available globally
 if (typeof window !== 'undefined') {
     window.Readability = Readability;
+    window.ContentScorer = ContentScorer;
 }
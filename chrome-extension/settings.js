@@ -19,6 +19,20 @@ class SettingsManager {
         
         this.maxContentLength = document.getElementById('maxContentLength');
         this.processingTimeout = document.getElementById('processingTimeout');
+        this.parallelChunkEnhancement = document.getElementById('parallelChunkEnhancement');
+        this.chunkParallelism = document.getElementById('chunkParallelism');
+        this.bundleParallelism = document.getElementById('bundleParallelism');
+        this.incrementalEnhancement = document.getElementById('incrementalEnhancement');
+        this.extractiveSummary = document.getElementById('extractiveSummary');
+        this.extractiveRatio = document.getElementById('extractiveRatio');
+        this.routingBudget = document.getElementById('routingBudget');
+        this.requestsPerMinute = document.getElementById('requestsPerMinute');
+        this.maxConcurrentRequests = document.getElementById('maxConcurrentRequests');
+        this.enableResponseCache = document.getElementById('enableResponseCache');
+        this.cacheTtlHours = document.getElementById('cacheTtlHours');
+        this.maxImages = document.getElementById('maxImages');
+        this.maxLinks = document.getElementById('maxLinks');
+        this.minImageSize = document.getElementById('minImageSize');
         this.enableLogging = document.getElementById('enableLogging');
         this.showProcessingSteps = document.getElementById('showProcessingSteps');
         
@@ -74,6 +88,20 @@ class SettingsManager {
                 // Advanced settings
                 maxContentLength: 50000,
                 processingTimeout: 60,
+                parallelChunkEnhancement: false,
+                chunkParallelism: 3,
+                bundleParallelism: 2,
+                incrementalEnhancement: true,
+                extractiveSummary: false,
+                extractiveRatio: 0.35,
+                routingBudget: 'balanced',
+                requestsPerMinute: 60,
+                maxConcurrentRequests: 4,
+                enableResponseCache: true,
+                cacheTtlHours: 168,
+                maxImages: 20,
+                maxLinks: 50,
+                minImageSize: 50,
                 enableLogging: true,
                 showProcessingSteps: false,
                 
@@ -91,6 +119,20 @@ class SettingsManager {
             
             this.maxContentLength.value = settings.maxContentLength;
             this.processingTimeout.value = settings.processingTimeout;
+            this.parallelChunkEnhancement.checked = settings.parallelChunkEnhancement;
+            this.chunkParallelism.value = settings.chunkParallelism;
+            this.bundleParallelism.value = settings.bundleParallelism;
+            this.incrementalEnhancement.checked = settings.incrementalEnhancement;
+            this.extractiveSummary.checked = settings.extractiveSummary;
+            this.extractiveRatio.value = Math.round(settings.extractiveRatio * 100);
+            this.routingBudget.value = settings.routingBudget;
+            this.requestsPerMinute.value = settings.requestsPerMinute;
+            this.maxConcurrentRequests.value = settings.maxConcurrentRequests;
+            this.enableResponseCache.checked = settings.enableResponseCache;
+            this.cacheTtlHours.value = settings.cacheTtlHours;
+            this.maxImages.value = settings.maxImages;
+            this.maxLinks.value = settings.maxLinks;
+            this.minImageSize.value = settings.minImageSize;
             this.enableLogging.checked = settings.enableLogging;
             this.showProcessingSteps.checked = settings.showProcessingSteps;
             
@@ -116,6 +158,20 @@ class SettingsManager {
                 includeSources: this.defaultIncludeSources.checked,
                 maxContentLength: parseInt(this.maxContentLength.value),
                 processingTimeout: parseInt(this.processingTimeout.value),
+                parallelChunkEnhancement: this.parallelChunkEnhancement.checked,
+                chunkParallelism: parseInt(this.chunkParallelism.value),
+                bundleParallelism: parseInt(this.bundleParallelism.value),
+                incrementalEnhancement: this.incrementalEnhancement.checked,
+                extractiveSummary: this.extractiveSummary.checked,
+                extractiveRatio: parseInt(this.extractiveRatio.value) / 100,
+                routingBudget: this.routingBudget.value,
+                requestsPerMinute: parseInt(this.requestsPerMinute.value),
+                maxConcurrentRequests: parseInt(this.maxConcurrentRequests.value),
+                enableResponseCache: this.enableResponseCache.checked,
+                cacheTtlHours: parseInt(this.cacheTtlHours.value),
+                maxImages: parseInt(this.maxImages.value),
+                maxLinks: parseInt(this.maxLinks.value),
+                minImageSize: parseInt(this.minImageSize.value),
                 enableLogging: this.enableLogging.checked,
                 showProcessingSteps: this.showProcessingSteps.checked,
                 storeProcessingHistory: this.storeProcessingHistory.checked,
@@ -152,8 +208,9 @@ class SettingsManager {
         this.testApiKeyBtn.textContent = 'Testing...';
         
         try {
-            // Use the latest Gemini 2.5 Flash model with v1beta API
-            const response = await fetch(`https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key=${apiKey}`, {
+            // Same default model the background worker routes to (models.json)
+            const { apiBase, defaultModel } = await (await fetch(chrome.runtime.getURL('models.json'))).json();
+            const response = await fetch(`${apiBase}/${defaultModel}:generateContent?key=${apiKey}`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
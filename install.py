@@ -25,7 +25,8 @@ def install_dependencies():
         'beautifulsoup4',
         'reportlab',
         'jupyter',
-        'pillow'
+        'pillow',
+        'numpy'
     ]
     
     for dep in dependencies:
@@ -94,7 +95,7 @@ def create_config_file():
     
     config = {
         "version": "1.0.0",
-        "api_endpoint": "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent",
+        "model_routes": "chrome-extension/models.json",
         "default_settings": {
             "enhancement_type": "summarize",
             "pdf_style": "academic",
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Tests for the headless batch pipeline (ai_enhancer package)
+"""
+
+import json
+import threading
+
+from ai_enhancer.extractor import ContentExtractor
+from ai_enhancer.pdf import PDFRenderer
+from ai_enhancer.pipeline import BatchPipeline
+
+ARTICLE_HTML = """
+<html lang="en"><head>
+<title>Test Article</title>
+<meta name="author" content="Jane Doe">
+<link rel="canonical" href="/canonical">
+</head><body>
+<nav><a href="/home">Home</a></nav>
+<article>
+<h1>Test Article</h1>
+<p>{body}</p>
+<img src="/figure.png" alt="Figure">
+<a href="https://example.org/ref">Reference</a>
+</article>
+<footer>Footer text</footer>
+</body></html>
+""".format(body="This is a long paragraph about testing extraction. " * 20)
+
+
+class FakeExtractor:
+    def __init__(self):
+        self.calls = []
+
+    def extract(self, url):
+        self.calls.append(url)
+        if "broken" in url:
+            raise ValueError("cannot extract")
+        return {"url": url, "title": f"Page {url[-1]}", "textContent": "text", "images": [], "links": []}
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def enhance(self, content, settings):
+        with self.lock:
+            self.calls.append(content["url"])
+        return {"title": content["title"], "summary": "Summary", "enhancedContent": "Body **bold**",
+                "keyPoints": ["One"], "originalUrl": content["url"]}
+
+
+def test_extractor_parses_article():
+    """Main content, metadata, images and links come from the article element"""
+    content = ContentExtractor().extract("https://example.com/post", html=ARTICLE_HTML)
+
+    assert content["title"] == "Test Article"
+    assert content["author"] == "Jane Doe"
+    assert content["canonicalUrl"] == "https://example.com/canonical"
+    assert "testing extraction" in content["textContent"]
+    assert "Footer text" not in content["textContent"]
+    assert content["images"][0]["src"] == "https://example.com/figure.png"
+    assert [link["href"] for link in content["links"]] == ["https://example.org/ref"]
+    assert content["wordCount"] > 100
+
+
+def test_renderer_produces_pdf_bytes():
+    pdf = PDFRenderer().render({"title": "Doc", "summary": "S <tag>", "enhancedContent": "A\n\n**B**",
+                                "keyPoints": ["x"], "sources": [{"title": "t", "url": "https://x.y"}]}, {})
+    assert pdf.startswith(b"%PDF")
+
+
+def test_pipeline_processes_and_checkpoints(tmp_path):
+    extractor, client = FakeExtractor(), FakeClient()
+    pipeline = BatchPipeline(extractor, client, PDFRenderer(), str(tmp_path), {},
+                             workers={"extract": 2, "enhance": 2, "render": 1}, queue_size=2)
+    urls = [f"https://example.com/{n}" for n in range(5)] + ["https://example.com/broken", ""]
+
+    summary = pipeline.run(urls)
+
+    assert summary["total"] == 6
+    assert summary["done"] == 5
+    assert summary["failed"] == 1
+    assert len(list(tmp_path.glob("*.pdf"))) == 5
+
+    records = [json.loads(line) for line in (tmp_path / "checkpoint.jsonl").read_text().splitlines()]
+    assert {r["url"] for r in records if r["stage"] == "done"} == set(urls[:5])
+
+
+def test_pipeline_reports_stage_metrics(tmp_path):
+    """Every stage attempt is timed; p50/p95 come from the recorded samples"""
+    pipeline = BatchPipeline(FakeExtractor(), FakeClient(), PDFRenderer(), str(tmp_path), {})
+    urls = [f"https://example.com/{n}" for n in range(4)] + ["https://example.com/broken"]
+
+    metrics = pipeline.run(urls)["metrics"]
+
+    assert metrics["extraction"]["count"] == 5
+    assert metrics["enhance"]["count"] == 4
+    assert metrics["render"]["count"] == 4
+    assert metrics["pdfBytes"]["unit"] == "bytes"
+    assert metrics["render"]["p50"] <= metrics["render"]["p95"] <= metrics["render"]["max"]
+    assert sum(metrics["extraction"]["histogram"].values()) == 5
+
+
+def test_pipeline_resumes_without_repeating_work(tmp_path):
+    urls = [f"https://example.com/{n}" for n in range(3)]
+    BatchPipeline(FakeExtractor(), FakeClient(), PDFRenderer(), str(tmp_path), {}).run(urls)
+
+    extractor, client = FakeExtractor(), FakeClient()
+    summary = BatchPipeline(extractor, client, PDFRenderer(), str(tmp_path), {}).run(urls + ["https://example.com/9"])
+
+    assert summary["skipped"] == 3
+    assert summary["done"] == 1
+    assert client.calls == ["https://example.com/9"]
+
+
+def test_pipeline_resumes_enhanced_jobs_at_render(tmp_path):
+    url = "https://example.com/1"
+    pipeline = BatchPipeline(FakeExtractor(), FakeClient(), PDFRenderer(), str(tmp_path), {})
+    pipeline.run([url])
+    for pdf in tmp_path.glob("*.pdf"):
+        pdf.unlink()
+    # Simulate a crash between enhancement and rendering
+    lines = (tmp_path / "checkpoint.jsonl").read_text().splitlines()
+    (tmp_path / "checkpoint.jsonl").write_text("\n".join(l for l in lines if '"done"' not in l) + "\n")
+
+    client = FakeClient()
+    summary = BatchPipeline(FakeExtractor(), client, PDFRenderer(), str(tmp_path), {}).run([url])
+
+    assert summary["done"] == 1
+    assert client.calls == []
+
+
+def test_pipeline_redoes_work_checkpointed_under_other_settings(tmp_path):
+    urls = [f"https://example.com/{n}" for n in range(2)]
+    BatchPipeline(FakeExtractor(), FakeClient(), PDFRenderer(), str(tmp_path),
+                  {"enhancementType": "summarize"}).run(urls)
+
+    client = FakeClient()
+    summary = BatchPipeline(FakeExtractor(), client, PDFRenderer(), str(tmp_path),
+                            {"enhancementType": "expand"}).run(urls)
+
+    assert summary["skipped"] == 0
+    assert summary["done"] == 2
+    assert sorted(client.calls) == urls
+
+    client = FakeClient()
+    summary = BatchPipeline(FakeExtractor(), client, PDFRenderer(), str(tmp_path),
+                            {"enhancementType": "expand"}).run(urls)
+    assert summary["skipped"] == 2
+    assert client.calls == []
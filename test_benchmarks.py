@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline benchmark harness (mock Gemini server and runner)
+"""
+
+import json
+
+import requests
+
+from ai_enhancer.gemini import GeminiClient
+from ai_enhancer.scheduler import RequestScheduler
+from benchmarks.corpus import PAGES, build_page, load_corpus
+from benchmarks.mock_gemini import MockGeminiServer
+from benchmarks.run import PROFILES, compare, run
+
+CONTENT = {"url": "https://example.com/a", "title": "Mock Title", "textContent": "Body text. " * 200}
+
+
+def test_saved_corpus_matches_generator():
+    """The committed pages are exactly what build_page() produces"""
+    corpus = load_corpus()
+    assert sorted(corpus) == sorted(PAGES)
+    assert corpus["short-news"] == build_page("short-news")
+
+
+def test_mock_server_retries_injected_errors():
+    with MockGeminiServer(latency=0, token_latency=0, error_rate=0.5, seed=3) as server:
+        scheduler = RequestScheduler(requests_per_minute=1e6, base_delay=0.01, failure_threshold=50)
+        client = GeminiClient("key", base_url=server.base_url, scheduler=scheduler)
+        results = [client.enhance(CONTENT, {"enhancementType": "summarize", "pdfStyle": "academic"})
+                   for _ in range(6)]
+        stats = server.get_stats()
+
+    assert all(result["title"] == "Mock Title" for result in results)
+    assert stats["errors"] > 0
+    assert stats["requests"] == 6 + stats["errors"]
+    assert scheduler.get_stats()["retries"] == stats["errors"]
+
+
+def test_mock_server_streams_sse():
+    with MockGeminiServer(latency=0, token_latency=0, stream_chunks=4) as server:
+        response = requests.post(f"{server.base_url}/m:streamGenerateContent", params={"alt": "sse"},
+                                 json={"contents": [{"parts": [{"text": "Title: Streamed\n" + "x " * 400}]}]})
+        events = [json.loads(line[5:]) for line in response.iter_lines() if line.startswith(b"data:")]
+
+    assert len(events) == 4
+    text = "".join(event["candidates"][0]["content"]["parts"][0]["text"] for event in events)
+    assert json.loads(text)["title"] == "Streamed"
+
+
+def test_runner_emits_comparable_results():
+    profile = {**PROFILES["quick"], "latency": 0, "concurrency": [2], "copies": 1}
+    results = run(profile, pages=["short-news"])
+
+    page = results["pages"]["short-news"]["metrics"]
+    for metric in ("extraction", "chunking", "promptBuild", "ttfb", "endToEnd", "streamTtfb", "extractionPeakKb"):
+        assert page[metric]["count"] >= 1
+    assert results["throughput"][0]["done"] == 1
+    json.dumps(results)
+
+    slower = json.loads(json.dumps(results))
+    slower["pages"]["short-news"]["metrics"]["extraction"]["p50"] *= 2
+    rows = {row["metric"]: row for row in compare(results, slower)}
+    assert rows["pages.short-news.extraction.p50"]["regression_pct"] == 100.0
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the sentence- and heading-aware chunker
+"""
+
+from ai_enhancer.budget import estimate_tokens
+from ai_enhancer.chunking import chunk_text, segments
+
+TEXT = """# Intro
+
+Dr. Smith paid $3.50 at https://example.com/a.b?c=1. It rained. The U.S. Army grew 2.5% e.g. in spring! "Yes." he said.
+
+## Details
+
+数据模型性能。系统网络内存！ Final line without period"""
+
+
+def test_segments_keep_punctuation_and_skip_false_ends():
+    spans = [(TEXT[start:end], kind) for start, end, kind in segments(TEXT)]
+    assert spans == [
+        ("# Intro", "heading"),
+        ("Dr. Smith paid $3.50 at https://example.com/a.b?c=1.", "sentence"),
+        ("It rained.", "sentence"),
+        ("The U.S. Army grew 2.5% e.g. in spring!", "sentence"),
+        ('"Yes." he said.', "sentence"),
+        ("## Details", "heading"),
+        ("数据模型性能。", "sentence"),
+        ("系统网络内存！", "sentence"),
+        ("Final line without period", "sentence"),
+    ]
+
+
+def test_chunks_are_bounded_offsets_with_overlap():
+    sections = [f"## Part {n}\n\n" + " ".join(f"Sentence {n}.{i} has a few words." for i in range(40))
+                for n in range(3)]
+    text = "\n\n".join(sections)
+    chunks = chunk_text(text, max_tokens=120, overlap_tokens=20)
+
+    assert all(chunk["tokens"] <= 120 for chunk in chunks)
+    assert all(chunk["tokens"] == estimate_tokens(text, chunk["start"], chunk["end"]) for chunk in chunks)
+    assert chunks[0]["start"] == 0 and chunks[-1]["end"] == len(text)
+    # A heading reached with a half-full chunk opens the next one, without overlap
+    heading = next(chunk for chunk in chunks if chunk["start"] == text.index("## Part 2"))
+    assert chunks[chunks.index(heading) - 1]["end"] < heading["start"]
+    assert any(b["start"] < a["end"] for a, b in zip(chunks, chunks[1:]))
+    assert all(text[chunk["end"] - 1] == "." for chunk in chunks)
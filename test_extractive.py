@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for the TF-IDF/TextRank extractive pre-summary
+"""
+
+import random
+
+from ai_enhancer.budget import estimate_tokens
+from ai_enhancer.extractive import GAP_MARKER, summarize
+from ai_enhancer.gemini import GeminiClient
+from test_gemini_client import FakeSession
+
+TOPIC = "cache eviction latency queue workers throughput".split()
+
+
+def page(seed=7, sections=4, paragraphs=6):
+    rng = random.Random(seed)
+    parts = []
+    for section in range(sections):
+        parts.append(f"## Section {section} on cache latency")
+        for _ in range(paragraphs):
+            words = [rng.sample(TOPIC, 4) + [f"filler{rng.randint(0, 9999)}" for _ in range(8)] for _ in range(4)]
+            sentences = [" ".join(sentence).capitalize() + "." for sentence in words]
+            # Off-topic sentences share no terms with the rest of the page
+            sentences.append("Zz " + " ".join(f"zz{rng.randint(0, 10 ** 6)}" for _ in range(12)) + ".")
+            parts.append(" ".join(sentences))
+    return "\n\n".join(parts)
+
+
+def test_keeps_central_sentences_in_order_within_budget():
+    text = page()
+    result = summarize(text, ratio=0.3, min_tokens=100)
+
+    assert result["applied"] and result["budget"] < result["originalTokens"]
+    assert estimate_tokens(result["text"]) <= result["budget"] * 1.05
+    kept = [line for line in result["text"].split("\n\n") if line != GAP_MARKER]
+    assert not any("zz" in line for line in kept)
+    assert [text.index(line.split(". ")[0]) for line in kept] == sorted(text.index(line.split(". ")[0]) for line in kept)
+    assert kept[0].startswith("## Section 0") and not kept[1].startswith("##")
+    assert summarize("Too short. To bother.")["applied"] is False
+
+
+def test_client_sends_extract_only_in_summarize_mode():
+    content = {"url": "https://a.com/long", "title": "Long", "textContent": page(sections=12)}
+    settings = {"enhancementType": "summarize", "extractiveSummary": True, "extractiveRatio": 0.3}
+    session = FakeSession(delay=0)
+    result = GeminiClient("key", session=session).enhance(content, settings)
+    GeminiClient("key", session=session).enhance(content, {**settings, "enhancementType": "expand"})
+
+    condensed, full = session.prompts
+    assert len(condensed) < len(full) * 0.5
+    tokens = result["processingInfo"]["tokens"]
+    assert tokens["content"] < tokens["extractive"]["fittedTokens"] * 0.35
+    assert 0 < tokens["extractive"]["keptSentences"] < tokens["extractive"]["sentences"]
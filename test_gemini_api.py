@@ -7,34 +7,20 @@ import requests
 import json
 import sys
 
-def test_gemini_api(api_key):
-    """Test Gemini API with correct endpoints"""
-    
-    print("🧪 Testing Gemini API Configuration...")
-    print("=" * 50)
-    
-    # Test 1: List available models
-    print("1. Testing model listing...")
-    try:
-        response = requests.get(f"https://generativelanguage.googleapis.com/v1beta/models?key={api_key}")
-        if response.ok:
-            models = response.json().get('models', [])
-            model_names = [m['name'] for m in models if 'gemini' in m['name'].lower()]
-            print(f"   ✅ Found {len(model_names)} Gemini models:")
-            for model in model_names[:5]:  # Show first 5
-                print(f"      - {model}")
-        else:
-            print(f"   ❌ Failed to list models: {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"   ❌ Error listing models: {e}")
-        return False
-    
-    # Test 2: Test gemini-2.5-flash
-    print("\n2. Testing gemini-2.5-flash...")
+from ai_enhancer.routing import ROUTING
+
+def routed_models():
+    """Default model first, then any other model a route can pick"""
+    models = [ROUTING["defaultModel"]]
+    for route in ROUTING["routes"]:
+        if route["model"] not in models:
+            models.append(route["model"])
+    return models
+
+def check_model(api_key, model):
     try:
         response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}",
+            f"{ROUTING['apiBase']}/{model}:generateContent?key={api_key}",
             headers={'Content-Type': 'application/json'},
             json={
                 "contents": [{
@@ -49,43 +35,43 @@ def test_gemini_api(api_key):
         if response.ok:
             data = response.json()
             text = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-            print(f"   ✅ gemini-2.5-flash works! Response: {text}")
-        else:
-            error_data = response.json()
-            print(f"   ❌ gemini-2.5-flash failed: {error_data.get('error', {}).get('message', 'Unknown error')}")
-            return False
+            print(f"   ✅ {model} works! Response: {text}")
+            return True
+        error_data = response.json()
+        print(f"   ❌ {model} failed: {error_data.get('error', {}).get('message', 'Unknown error')}")
     except Exception as e:
-        print(f"   ❌ Error testing gemini-2.5-flash: {e}")
-        return False
+        print(f"   ❌ Error testing {model}: {e}")
+    return False
+
+def test_gemini_api(api_key):
+    """Test Gemini API with correct endpoints"""
+    
+    print("🧪 Testing Gemini API Configuration...")
+    print("=" * 50)
     
-    # Test 3: Test gemini-2.5-pro
-    print("\n3. Testing gemini-2.5-pro...")
+    # Test 1: List available models
+    print("1. Testing model listing...")
     try:
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-pro:generateContent?key={api_key}",
-            headers={'Content-Type': 'application/json'},
-            json={
-                "contents": [{
-                    "parts": [{"text": "Say hello in one word"}]
-                }],
-                "generationConfig": {
-                    "maxOutputTokens": 10
-                }
-            }
-        )
-        
+        response = requests.get(f"{ROUTING['apiBase']}?key={api_key}")
         if response.ok:
-            data = response.json()
-            text = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-            print(f"   ✅ gemini-2.5-pro works! Response: {text}")
+            models = response.json().get('models', [])
+            model_names = [m['name'] for m in models if 'gemini' in m['name'].lower()]
+            print(f"   ✅ Found {len(model_names)} Gemini models:")
+            for model in model_names[:5]:  # Show first 5
+                print(f"      - {model}")
         else:
-            error_data = response.json()
-            print(f"   ❌ gemini-2.5-pro failed: {error_data.get('error', {}).get('message', 'Unknown error')}")
+            print(f"   ❌ Failed to list models: {response.status_code}")
             return False
     except Exception as e:
-        print(f"   ❌ Error testing gemini-2.5-pro: {e}")
+        print(f"   ❌ Error listing models: {e}")
         return False
     
+    # Test 2+: every model the routing table can choose
+    for number, model in enumerate(routed_models(), start=2):
+        print(f"\n{number}. Testing {model}...")
+        if not check_model(api_key, model):
+            return False
+    
     print("\n" + "=" * 50)
     print("🎉 All tests passed! Your API key is working correctly.")
     print("\n📋 Next steps:")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the Python Gemini client (no API key needed)
+"""
+
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_enhancer.budget import PromptBudget, estimate_tokens
+from ai_enhancer.cache import ResponseCache
+from ai_enhancer.gemini import GeminiClient, chunk_content, parse_json_response
+from ai_enhancer.revisions import chunk_paragraphs
+from ai_enhancer.routing import ROUTING, ModelRouter
+
+
+class FakeResponse:
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status_code = status
+        self.ok = status < 400
+        self.reason = "Error"
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Answers generateContent calls and records peak concurrency"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.prompts = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def post(self, url, params=None, json=None, timeout=None, **kwargs):
+        prompt = json["contents"][0]["parts"][0]["text"]
+        with self.lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return FakeResponse({"candidates": [{"content": {"parts": [{"text": self.answer(prompt)}]}}]})
+
+    def answer(self, prompt):
+        part = re.search(r"PART (\d+) OF", prompt)
+        if part:
+            n = part.group(1)
+            return "```json\n" + json.dumps({"summary": f"s{n}", "enhancedContent": f"E{n}",
+                                             "keyPoints": ["shared", f"k{n}"],
+                                             "sources": [{"title": "t", "url": "https://x.y"}]}) + "\n```"
+        if "PARTIAL RESULTS" in prompt:
+            return json.dumps({"title": "Merged", "summary": "whole", "keyPoints": ["a", "b"]})
+        return json.dumps({"title": "Single", "summary": "one", "enhancedContent": "body"})
+
+
+def long_content():
+    text = ". ".join(f"Sentence {n} " + "word " * 40 for n in range(80))
+    return {"url": "https://example.com/a", "title": "Long", "textContent": text}
+
+
+def test_chunk_content_respects_limit():
+    chunks = chunk_content(long_content()["textContent"], 1000)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1300 for chunk in chunks)
+
+
+def test_single_request_by_default():
+    session = FakeSession(delay=0)
+    result = GeminiClient("key", session=session).enhance(long_content(), {"enhancementType": "summarize"})
+    assert len(session.prompts) == 1
+    assert result["title"] == "Single"
+    assert result["originalUrl"] == "https://example.com/a"
+
+
+def test_map_reduce_limits_parallelism_and_merges():
+    session = FakeSession()
+    settings = {"enhancementType": "summarize", "parallelChunkEnhancement": True, "chunkParallelism": 2}
+    result = GeminiClient("key", session=session).enhance(long_content(), settings)
+
+    chunk_prompts = [p for p in session.prompts if "PART " in p]
+    assert len(chunk_prompts) == len(chunk_content(long_content()["textContent"]))
+    assert session.max_in_flight == 2
+    assert session.prompts[-1].count("PARTIAL RESULTS") == 1
+
+    assert result["title"] == "Merged"
+    assert result["keyPoints"] == ["a", "b"]
+    assert result["enhancedContent"].startswith("E1\n\nE2")
+    assert result["sources"] == [{"title": "t", "url": "https://x.y"}]
+    assert result["processingInfo"]["mode"] == "mapReduce"
+
+
+def test_incremental_reenhancement_only_sends_changed_chunks(tmp_path):
+    paragraphs = [f"Update {n}: " + " ".join(f"term{(n * 7 + i) % 50}" for i in range(90)) + "." for n in range(30)]
+    page = {"url": "https://example.com/live", "title": "Live", "textContent": "\n\n".join(paragraphs)}
+    client = GeminiClient("key", session=FakeSession(delay=0), revisions=ResponseCache(str(tmp_path)))
+    settings = {"enhancementType": "summarize"}
+
+    client.enhance(page, settings)
+    chunks = len(chunk_paragraphs(client.prepare_content(page, settings)["promptContent"]))
+    # A first visit is one request that only records fingerprints, and so is an unchanged revisit
+    client.enhance(page, settings)
+    assert len(client.session.prompts) == 2 and chunks > 1
+
+    paragraphs[3] = "Update: " + paragraphs[3]
+    client.session = FakeSession(delay=0)
+    first = client.enhance({**page, "textContent": "\n\n".join(paragraphs)}, settings)
+    assert first["processingInfo"]["incremental"]["changed"] == chunks
+
+    client.session = FakeSession(delay=0)
+    again = client.enhance({**page, "textContent": "\n\n".join(paragraphs)}, settings)
+    assert client.session.prompts == []
+    assert again["enhancedContent"] == first["enhancedContent"]
+
+    paragraphs[12] = "Breaking: " + paragraphs[12]
+    client.session = FakeSession(delay=0)
+    edited = client.enhance({**page, "textContent": "\n\n".join(paragraphs)}, settings)
+    assert sum("PART " in prompt for prompt in client.session.prompts) == 1
+    assert "PARTIAL RESULTS" in client.session.prompts[-1]
+    # The edit can move a chunk boundary, but everything outside that chunk is reused
+    assert edited["processingInfo"]["incremental"]["reused"] >= chunks - 2
+
+
+def test_content_is_fitted_to_the_routed_model():
+    # The routed model has the default 32k input limit, far below the default model's
+    table = {**ROUTING, "routes": [{"name": "small", "model": "small-context-model"}]}
+    client = GeminiClient("key", session=FakeSession(delay=0), router=ModelRouter(table))
+    text = "\n\n".join(f"Paragraph {n} " + " ".join(f"term{(n * 13 + i) % 997}" for i in range(200)) for n in range(300))
+    result = client.enhance({"url": "https://example.com/big", "title": "Big", "textContent": text},
+                            {"enhancementType": "summarize", "maxContentLength": 10 ** 7})
+
+    limit = PromptBudget("small-context-model").max_tokens
+    assert estimate_tokens(text) > limit
+    assert result["processingInfo"]["route"]["model"] == "small-context-model"
+    assert result["processingInfo"]["tokens"]["content"] <= limit
+    assert result["processingInfo"]["tokens"]["trimmed"] is True
+
+
+def test_prompt_budget_keeps_salient_paragraphs_within_limit():
+    filler = "".join(f"<p>Filler paragraph {n} about unrelated gardening chores and weather.</p>" for n in range(200))
+    content = {
+        "title": "Solar storage",
+        "content": "<h2>Storage</h2><p>Share this</p><p>Solar storage batteries keep getting cheaper.</p>" + filler
+                   + "<p>Home solar storage adoption doubled.</p>",
+    }
+    fitted = PromptBudget("gemini-2.5-flash", max_content_length=2000).fit(content)
+
+    assert fitted["trimmed"] and len(fitted["text"]) <= 2000
+    assert fitted["text"].startswith("## Storage\n\nSolar storage batteries")
+    assert fitted["text"].endswith("[…]\n\nHome solar storage adoption doubled.")
+    assert "Share this" not in fitted["text"]
+    assert fitted["boilerplateBlocks"] == 1
+    assert estimate_tokens("a" * 4000) == 1000
+
+
+def test_prompt_uses_budgeted_content_and_reports_tokens():
+    session = FakeSession(delay=0)
+    client = GeminiClient("key", session=session)
+    result = client.enhance(long_content(), {"maxContentLength": 3000})
+
+    assert len(session.prompts) == 1 and "Sentence 79" not in session.prompts[0]
+    tokens = result["processingInfo"]["tokens"]
+    assert tokens["trimmed"] and tokens["source"] == "estimate"
+    assert tokens["content"] < tokens["originalContent"] < tokens["prompt"] + tokens["originalContent"]
+
+
+def test_truncated_json_response_is_repaired():
+    class TruncatingSession(FakeSession):
+        def post(self, url, params=None, json=None, timeout=None, **kwargs):
+            self.config = json["generationConfig"]
+            return FakeResponse({"candidates": [{"content": {"parts": [
+                {"text": '{"title": "Cut", "keyPoints": ["a", "b",], "enhancedContent": "Line one\nline tw'}]}}]})
+
+    session = TruncatingSession()
+    result = GeminiClient("key", session=session).enhance({"title": "T", "textContent": "Short page."}, {})
+
+    assert session.config["responseMimeType"] == "application/json"
+    assert session.config["responseSchema"]["propertyOrdering"][0] == "title"
+    assert result["title"] == "Cut" and result["keyPoints"] == ["a", "b"]
+    assert result["enhancedContent"] == "Line one\nline tw" and result["sources"] == []
+    assert result["processingInfo"]["responseRepaired"] is True
+    assert parse_json_response('Sure! ```json\n{"a": 1}\n``` Anything else? {}') == ({"a": 1}, False)
+    assert parse_json_response('{"a') is None
+
+
+def test_requests_are_routed_by_size_type_and_budget():
+    class RecordingSession(FakeSession):
+        def post(self, url, params=None, json=None, timeout=None, **kwargs):
+            self.urls = getattr(self, "urls", []) + [(url.rsplit("/", 1)[1], json["generationConfig"]["maxOutputTokens"])]
+            return super().post(url, params, json, timeout)
+
+    session = RecordingSession(delay=0)
+    client = GeminiClient("key", session=session)
+    short = {"title": "T", "textContent": "Short page."}
+    long = {"title": "Long", "textContent": long_content()["textContent"] * 3}
+    routes = [client.enhance(short, {})["processingInfo"]["route"],
+              client.enhance(long, {"maxContentLength": 100000})["processingInfo"]["route"],
+              client.enhance(short, {"enhancementType": "validate", "routingBudget": "quality"})["processingInfo"]["route"]]
+    pinned = GeminiClient("key", model="custom-model", session=session).enhance(short, {})
+
+    assert [route["name"] for route in routes] == ["lite", "standard", "quality"]
+    assert session.urls == [("gemini-2.5-flash-lite:generateContent", 2048), ("gemini-2.5-flash:generateContent", 8192),
+                            ("gemini-2.5-pro:generateContent", 16384), ("custom-model:generateContent", 8192)]
+    assert routes[0]["maxOutputTokens"] == 2048 and routes[0]["budget"] == "balanced"
+    assert pinned["processingInfo"]["route"]["name"] == "pinned" and pinned["processingInfo"]["model"] == "custom-model"
+
+
+def test_concurrent_identical_requests_share_one_call():
+    class FailingSession(FakeSession):
+        def post(self, url, **kwargs):
+            super().post(url, **kwargs)
+            return FakeResponse({"error": {"message": "bad key"}}, status=400)
+
+    content = {"url": "https://a.com/p", "title": "T", "textContent": "Short page."}
+    session = FakeSession(delay=0.2)
+    client = GeminiClient("key", session=session)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda n: client.enhance({**content, "extractedAt": str(n)}, {}), range(4)))
+        other = client.enhance(content, {"enhancementType": "expand"})
+
+    assert len(session.prompts) == 2 and other["title"] == "Single"
+    assert sorted(bool(result["processingInfo"].get("coalesced")) for result in results) == [False, True, True, True]
+    assert client.in_flight.get_stats() == {"started": 2, "coalesced": 3, "inFlight": 0}
+
+    failing = GeminiClient("key", session=FailingSession(delay=0.2))
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(failing.enhance, content, {}) for _ in range(3)]
+    assert len(failing.session.prompts) == 1
+    assert all("bad key" in str(future.exception()) for future in futures)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the MinHash/LSH near-duplicate index
+"""
+
+import random
+
+from ai_enhancer.cache import ResponseCache
+from ai_enhancer.dedupe import NearDuplicateIndex, minhash
+from ai_enhancer.gemini import GeminiClient
+from ai_enhancer.revisions import revision_key
+from test_gemini_client import FakeSession
+
+SETTINGS = {"enhancementType": "summarize", "pdfStyle": "academic"}
+
+
+def article(seed, words=400):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randint(0, 2000)}" for _ in range(words)) + "."
+
+
+def test_finds_syndicated_copy_and_persists(tmp_path):
+    path = str(tmp_path / "duplicates.db")
+    index = NearDuplicateIndex(path)
+    original = article(1)
+    index.add("https://a.com/story", minhash(original), "key-a")
+    index.add("https://b.com/other", minhash(article(2)))
+    index.close()
+
+    reopened = NearDuplicateIndex(path)
+    copy = "Reprinted with permission. " + original + " Read more at a.com"
+    match = reopened.query(minhash(copy))
+    assert match["url"] == "https://a.com/story"
+    assert match["result_key"] == "key-a"
+    assert match["similarity"] > 0.9
+    assert reopened.query(minhash(article(3))) is None
+    assert reopened.query(minhash(original), exclude_url="https://a.com/story") is None
+
+
+def test_client_reuses_result_for_copy_under_another_url(tmp_path):
+    session = FakeSession(delay=0)
+    client = GeminiClient("key", session=session, cache=ResponseCache(str(tmp_path / "cache")),
+                          duplicates=NearDuplicateIndex(str(tmp_path / "duplicates.db")))
+    text = article(4)
+    first = client.enhance({"url": "https://a.com/story", "title": "Story", "textContent": text}, SETTINGS)
+    copy = client.enhance({"url": "https://b.com/syndicated", "title": "Story",
+                           "textContent": text + " Originally published by A."}, SETTINGS)
+
+    assert len(session.prompts) == 1
+    assert copy["enhancedContent"] == first["enhancedContent"]
+    assert copy["originalUrl"] == "https://b.com/syndicated"
+    assert copy["processingInfo"]["duplicateOf"]["url"] == "https://a.com/story"
+    assert copy["processingInfo"]["duplicateOf"]["reused"] is True
+
+
+def test_copy_enhanced_with_other_settings_is_not_reused(tmp_path):
+    session = FakeSession(delay=0)
+    client = GeminiClient("key", session=session, cache=ResponseCache(str(tmp_path / "cache")),
+                          duplicates=NearDuplicateIndex(str(tmp_path / "duplicates.db")))
+    text = article(5)
+    client.enhance({"url": "https://a.com/story", "title": "Story", "textContent": text}, SETTINGS)
+    copy = client.enhance({"url": "https://b.com/syndicated", "title": "Story", "textContent": text},
+                          {**SETTINGS, "pdfStyle": "modern"})
+
+    assert len(session.prompts) == 2
+    assert "duplicateOf" not in copy["processingInfo"]
+
+
+def test_short_pages_are_not_indexed(tmp_path):
+    assert minhash("") is None
+    assert minhash("Page not found.") is None
+
+    session = FakeSession(delay=0)
+    index = NearDuplicateIndex(str(tmp_path / "duplicates.db"))
+    client = GeminiClient("key", session=session, cache=ResponseCache(str(tmp_path / "cache")), duplicates=index)
+    client.enhance({"url": "https://a.com/404", "title": "Missing", "textContent": "Page not found."}, SETTINGS)
+    other = client.enhance({"url": "https://b.com/404", "title": "Missing", "textContent": "Nothing here."}, SETTINGS)
+
+    assert len(session.prompts) == 2
+    assert "duplicateOf" not in other["processingInfo"]
+    assert index.get_stats()["documents"] == 0
+
+
+def test_copy_records_its_own_fingerprints_when_the_seed_is_unused(tmp_path):
+    # No response cache, so the copy cannot reuse a result and the original's revision is consulted
+    client = GeminiClient("key", session=FakeSession(delay=0), revisions=ResponseCache(str(tmp_path / "revisions")),
+                          duplicates=NearDuplicateIndex(str(tmp_path / "duplicates.db")))
+    text = "\n\n".join(article(seed, words=150) for seed in range(20, 40))
+    client.enhance({"url": "https://a.com/story", "title": "Story", "textContent": text}, SETTINGS)
+    copy = client.enhance({"url": "https://b.com/syndicated", "title": "Story", "textContent": text}, SETTINGS)
+
+    assert copy["processingInfo"]["duplicateOf"]["url"] == "https://a.com/story"
+    model = copy["processingInfo"]["route"]["model"]
+    assert client.revisions.get(revision_key("https://b.com/syndicated", SETTINGS, model)) is not None
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for the extension's binary PDF writer, run under Node
+"""
+
+import json
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from benchmarks.corpus import load_corpus
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+
+SCRIPT = """
+const PDFWriter = require('./chrome-extension/pdf-writer.js');
+const documents = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+(async () => {
+    const results = [];
+    for (const document of documents) {
+        const writer = new PDFWriter({ compress: false });
+        const supported = writer.canRender(document);
+        const bytes = supported ? await writer.render(document) : null;
+        results.push({ supported, header: bytes ? Buffer.from(bytes.slice(0, 5)).toString('latin1') : null });
+    }
+    console.log(JSON.stringify(results));
+})();
+"""
+
+
+# MarkdownRenderer is cut out of background.js, which only runs as a service worker
+MARKUP_SCRIPT = """
+const fs = require('fs');
+const PDFWriter = require('./chrome-extension/pdf-writer.js');
+const background = fs.readFileSync('./chrome-extension/background.js', 'utf8');
+const source = background.slice(background.indexOf('const MARKDOWN_ESCAPES'), background.indexOf('// Compiled HTML template'));
+const MarkdownRenderer = new Function(`${source}; return MarkdownRenderer;`)();
+const markdown = fs.readFileSync(0, 'utf8');
+(async () => {
+    const writer = new PDFWriter({ compress: false });
+    const blocks = writer.parseMarkup(new MarkdownRenderer().render(markdown));
+    const document = { title: 'Doc', enhancedContent: markdown, markup: { content: new MarkdownRenderer().render(markdown) } };
+    const pdf = Buffer.from(await writer.render(document)).toString('latin1');
+    console.log(JSON.stringify({ blocks, pdf }));
+})();
+"""
+
+
+def render(documents):
+    output = subprocess.run(["node", "-e", SCRIPT], input=json.dumps(documents), capture_output=True,
+                            text=True, check=True, encoding="utf-8").stdout
+    return json.loads(output)
+
+
+def render_markdown(markdown):
+    output = subprocess.run(["node", "-e", MARKUP_SCRIPT], input=markdown, capture_output=True,
+                            text=True, check=True, encoding="utf-8").stdout
+    return json.loads(output)
+
+
+def test_non_latin_text_is_left_to_the_html_renderer():
+    cjk = re.sub(r"<[^>]+>", " ", load_corpus()["cjk-article"])
+    documents = [
+        {"title": "Café “déjà vu” – 5 €", "enhancedContent": "## Résumé\n\n**Bold** naïve text…"},
+        {"title": "Article", "enhancedContent": cjk},
+        {"title": "Новости", "enhancedContent": "Plain body"},
+        {"title": "Sources", "enhancedContent": "Body", "sources": [{"title": "Ελληνικά", "url": "https://x.gr"}]},
+        # Metadata is not printed, so it does not force the fallback
+        {"title": "Article", "enhancedContent": "Body", "metadata": {"author": "李雷"}},
+    ]
+
+    results = render(documents)
+
+    assert [result["supported"] for result in results] == [True, False, False, False, True]
+    assert results[0]["header"] == "%PDF-"
+
+
+def test_background_falls_back_when_offscreen_reports_unsupported_text():
+    with open("chrome-extension/background.js", encoding="utf-8") as f:
+        background = f.read()
+    with open("chrome-extension/offscreen.js", encoding="utf-8") as f:
+        offscreen = f.read()
+
+    assert "canRender(enhancedContent)" in offscreen and "canRenderBundle(bundle)" in offscreen
+    assert "response.unsupported" in background
+    assert "return this.renderHTMLFallback(enhancedContent, settings);" in background
+
+
+def test_writer_lays_out_the_markdown_renderer_output():
+    markdown = "\n".join([
+        "# Results",
+        "",
+        "Read the [report](https://example.com/r?a=1&b=2) on **cache_size** and *latency*.",
+        "",
+        "- one",
+        "  - nested",
+        "3. third",
+        "",
+        "| Name | Value |",
+        "| --- | --- |",
+        "| hits | 42 |",
+        "",
+        "```python",
+        "print('<x>')",
+        "```",
+    ])
+
+    result = render_markdown(markdown)
+    blocks = result["blocks"]
+
+    assert [block["type"] for block in blocks] == ["heading", "paragraph", "item", "item", "item", "table", "code"]
+    link = next(run for run in blocks[1]["runs"] if run["href"])
+    assert link == {"text": "report", "style": "regular", "href": "https://example.com/r?a=1&b=2"}
+    assert {"text": "cache_size", "style": "bold", "href": None} in blocks[1]["runs"]
+    assert [(block["depth"], block["marker"]) for block in blocks[2:5]] == [(1, "•"), (2, "•"), (1, "3.")]
+    assert [[cell["runs"][0]["text"] for cell in row] for row in blocks[5]["rows"]] == [["Name", "Value"], ["hits", "42"]]
+    assert blocks[5]["rows"][0][0]["header"] is True
+    assert blocks[6]["text"] == "print('<x>')\n"
+
+    pdf = result["pdf"]
+    assert "/URI (https://example.com/r?a=1&b=2)" in pdf
+    assert "/BaseFont /Courier" in pdf and "(print\\('<x>'\\)) Tj" in pdf
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed Gemini response cache
+"""
+
+from ai_enhancer.cache import ResponseCache, cache_key
+from ai_enhancer.gemini import GENERATION_CONFIG, GeminiClient
+from test_gemini_client import FakeSession
+
+SETTINGS = {"enhancementType": "summarize", "pdfStyle": "academic"}
+
+
+def test_key_normalizes_whitespace_and_includes_settings():
+    key = cache_key("hello   world\n", SETTINGS, "m", GENERATION_CONFIG)
+    assert key == cache_key(" hello world", SETTINGS, "m", GENERATION_CONFIG)
+    assert key != cache_key("hello world", {**SETTINGS, "pdfStyle": "casual"}, "m", GENERATION_CONFIG)
+    assert key != cache_key("hello world", SETTINGS, "other-model", GENERATION_CONFIG)
+
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=250)
+    cache.set("a", {"v": "x" * 90})
+    cache.set("b", {"v": "y" * 90})
+    assert cache.get("a") is not None  # "a" is now most recently used
+    cache.set("c", {"v": "z" * 90})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_ttl_expiry_and_persistence(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.set("a", {"v": 1})
+    cache.flush()
+
+    reopened = ResponseCache(str(tmp_path), ttl=60)
+    assert reopened.get("a") == {"v": 1}
+    reopened.entries["a"]["stored_at"] -= 120
+    assert reopened.get("a") is None
+    assert reopened.get_stats()["expired"] == 1
+
+
+def test_client_serves_repeats_from_cache(tmp_path):
+    session = FakeSession(delay=0)
+    client = GeminiClient("key", session=session, cache=ResponseCache(str(tmp_path)))
+    content = {"url": "https://example.com/a", "title": "A", "textContent": "Same article text."}
+
+    first = client.enhance(content, SETTINGS)
+    second = client.enhance({**content, "url": "https://mirror.example.com/a"}, SETTINGS)
+    client.enhance(content, {**SETTINGS, "bypassCache": True})
+
+    assert len(session.prompts) == 2
+    assert "cacheHit" not in first["processingInfo"]
+    assert second["processingInfo"]["cacheHit"] is True
+    assert second["originalUrl"] == "https://mirror.example.com/a"
+    assert client.cache.get_stats()["hits"] == 1
@@ -25,6 +25,7 @@ def verify_extension_structure():
         "settings.css",
         "settings.js",
         "pdf-template.html",
+        "models.json",
         "icon16.png",
         "icon32.png", 
         "icon48.png",